@@ -1,22 +1,38 @@
+import asyncio
+import time
+from typing import Optional
 from fastapi import APIRouter, Depends
 from pydantic import BaseModel
+from app.core.config import get_settings
 from app.core.firebase_auth import AuthContext, get_current_user
 from app.services.llm_service import llm_service
+from app.services.chat_stream import event_stream_response, stream_chat_sse
+from app.services.context_builder import build_context
+from app.services.retrieval import knowledge_retriever
 
 router = APIRouter()
+settings = get_settings()
 
 class AssistantRequest(BaseModel):
     context: str # e.g., 'application', 'home', 'spaces'
     query: str
+    stream: bool = False # Return text/event-stream chunks instead of one JSON body
 
 class AssistantResponse(BaseModel):
     response: str
+    retrieval: Optional[dict] = None # Knowledge chunks cited in the prompt and retrieval time
 
 @router.post("/chat", response_model=AssistantResponse)
 async def chat_assistant(request: AssistantRequest, user: AuthContext = Depends(get_current_user)):
     """
     Context-aware assistant chat using Groq API.
+    With `stream` set, responds with OpenAI-style chunks over server-sent events.
+    Answers are grounded in matching knowledge base chunks, retrieved while the
+    prompt is put together.
     """
+    started_at = time.perf_counter()
+    retrieving = asyncio.create_task(knowledge_retriever.retrieve(request.query)) if settings.RAG_ENABLED else None
+
     # 1. Build System Prompt based on Context
     system_prompt = """You are the AmPac Smart Assistant, a helpful AI for small business owners and entrepreneurs.
 
@@ -24,7 +40,8 @@ IMPORTANT INSTRUCTIONS:
 - If the user expresses intent to "apply for a loan", "start an application", or "get financing", include this action tag at the end: <<<ACTION:{"type":"navigate","target":"Apply"}>>>
 - Keep responses concise, professional, and helpful
 - Focus on SBA loans, business financing, and AmPac services
-- Do not hallucinate specific loan terms or rates"""
+- Do not hallucinate specific loan terms or rates
+- When AmPac knowledge is provided, take policy specifics from it and cite it as [1], [2], ..."""
     
     if request.context == 'application':
         system_prompt += "\n\nCONTEXT: The user is currently filling out a loan application. Help them understand SBA 504 vs 7(a) loans, required documents, and eligibility. Be encouraging and specific about next steps."
@@ -35,7 +52,27 @@ IMPORTANT INSTRUCTIONS:
     else:
         system_prompt += "\n\nCONTEXT: Answer general questions about AmPac Business Capital, a CDC that helps small businesses access SBA financing and grow."
 
-    # 2. Call LLM with system prompt
-    response_text = await llm_service.generate_response(request.query, system_prompt)
+    # 2. Add retrieved knowledge within the prompt budget
+    retrieval = await retrieving if retrieving else None
+    built = build_context(
+        request.query,
+        system_prompt=system_prompt,
+        knowledge=retrieval.snippets() if retrieval else None,
+        knowledge_budget=settings.RAG_MAX_TOKENS,
+        route="assistant_chat",
+    )
+    retrieval_info = retrieval.to_dict(built.knowledge_used) if retrieval else None
+
+    # 3. Call LLM
+    if request.stream:
+        return event_stream_response(stream_chat_sse(
+            llm_service.stream_chat(built.messages, task="assistant", max_tokens=built.max_tokens),
+            route="assistant_chat",
+            model=llm_service.groq.model,
+            started_at=started_at,
+            final_extra={"retrieval": retrieval_info},
+        ))
+
+    response_text = await llm_service.chat(built.messages, task="assistant", max_tokens=built.max_tokens)
     
-    return AssistantResponse(response=response_text)
+    return AssistantResponse(response=response_text, retrieval=retrieval_info)
@@ -3,11 +3,16 @@ from pydantic import BaseModel
 from typing import List, Optional
 from firebase_admin import firestore
 from datetime import datetime
+import asyncio
+import time
 import uuid
+from app.core.config import get_settings
 from app.services.notification_service import notification_service
+from app.services.conversation_store import conversation_store
 from app.core.firebase_auth import AuthContext, get_current_user
 
 router = APIRouter()
+settings = get_settings()
 
 class Message(BaseModel):
     id: str
@@ -101,6 +106,12 @@ async def send_message(thread_id: str, request: CreateMessageRequest, user: Auth
         "preview": request.text[:50]
     })
     
+    # Keep the cached LLM context for this thread current
+    try:
+        await conversation_store.append(thread_id, [new_message])
+    except Exception as e:
+        print(f"Conversation store error: {e}")
+    
     # Send Notification
     try:
         if thread_doc.exists:
@@ -149,23 +160,74 @@ class ChatCompletionRequest(BaseModel):
     messages: List[dict]
     context: Optional[dict] = {}
     stream: bool = False
+    threadId: Optional[str] = None # Use the thread's stored conversation as history and record this turn
+    useKnowledge: bool = True # Ground the answer in knowledge base chunks (when RAG_ENABLED)
 
 @router.post("/completions")
 async def chat_completions(request: ChatCompletionRequest, user: AuthContext = Depends(get_current_user)):
     """
     OpenAI-compatible chat completion endpoint for RAG.
+    With `threadId`, history comes from the thread's conversation state (summary plus
+    recent messages) instead of the request, and the exchange is saved to the thread.
+    Knowledge base chunks matching the question are added to the prompt, numbered for
+    citation; `retrieval` in the response lists them with the retrieval time.
     """
+    started_at = time.perf_counter()
     print(f"Received chat completion request. Messages: {len(request.messages)}")
     try:
         from app.services.llm_service import llm_service
+        from app.services.context_builder import build_context
+        from app.services.retrieval import knowledge_retriever
         
-        # Extract last user message
+        # Last message is the question; earlier turns become history within the token budget
         last_message = request.messages[-1]['content']
         print(f"Last message: {last_message}")
+        # Retrieval runs while the thread check and history load are in flight
+        retrieving = asyncio.create_task(knowledge_retriever.retrieve(last_message)) \
+            if settings.RAG_ENABLED and request.useKnowledge else None
+        try:
+            system_prompt = "\n\n".join(m.get('content', '') for m in request.messages[:-1] if m.get('role') == 'system') or None
+            history, summary = request.messages[:-1], None
+            if request.threadId:
+                _check_thread_access(request.threadId, user)
+                conversation = await conversation_store.get(request.threadId)
+                history, summary = conversation.turns, conversation.summary
+        except BaseException:
+            if retrieving:
+                retrieving.cancel()
+            raise
+        retrieval = await retrieving if retrieving else None
+        built = build_context(
+            last_message,
+            system_prompt=system_prompt,
+            history=history,
+            summary=summary,
+            knowledge=retrieval.snippets() if retrieval else None,
+            knowledge_budget=settings.RAG_MAX_TOKENS,
+            route="chat_completions",
+        )
+        retrieval_info = retrieval.to_dict(built.knowledge_used) if retrieval else None
+        print(f"Context: {built.prompt_tokens} prompt tokens, {built.kept_turns} turns kept, "
+              f"{built.dropped_turns} dropped, {built.knowledge_used} chunks, max_tokens={built.max_tokens}")
+        
+        if request.stream:
+            from app.services.chat_stream import event_stream_response, stream_chat_sse
+            pieces = llm_service.stream_chat(built.messages, task="chat", max_tokens=built.max_tokens)
+            if request.threadId:
+                pieces = _record_streamed_turn(request.threadId, user, last_message, pieces)
+            return event_stream_response(stream_chat_sse(
+                pieces,
+                route="chat_completions",
+                model=llm_service.groq.model,
+                started_at=started_at,
+                final_extra={"context": built.to_dict(), "retrieval": retrieval_info},
+            ))
         
         # Generate response
-        response_text = await llm_service.generate_response(last_message)
+        response_text = await llm_service.chat(built.messages, task="chat", max_tokens=built.max_tokens)
         print(f"LLM Response generated: {len(response_text)} chars")
+        if request.threadId:
+            await _record_turn(request.threadId, user, last_message, response_text)
         
         return {
             "choices": [
@@ -175,8 +237,40 @@ async def chat_completions(request: ChatCompletionRequest, user: AuthContext = D
                         "content": response_text
                     }
                 }
-            ]
+            ],
+            "context": built.to_dict(),
+            "retrieval": retrieval_info
         }
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Error in chat_completions: {e}")
         raise HTTPException(status_code=500, detail=str(e))
+
+
+def _check_thread_access(thread_id: str, user: AuthContext):
+    thread_doc = firestore.client().collection("threads").document(thread_id).get()
+    if not thread_doc.exists:
+        raise HTTPException(status_code=404, detail="Thread not found")
+    thread_data = thread_doc.to_dict() or {}
+    if thread_data.get("borrowerId") != user.uid and not user.is_staff:
+        raise HTTPException(status_code=403, detail="Forbidden")
+
+
+async def _record_turn(thread_id: str, user: AuthContext, question: str, answer: str):
+    try:
+        await conversation_store.append(thread_id, [
+            {"senderRole": "staff" if user.is_staff else "borrower", "text": question},
+            {"senderRole": "assistant", "text": answer},
+        ], persist=True)
+    except Exception as e:
+        print(f"Conversation store error: {e}")
+
+
+async def _record_streamed_turn(thread_id: str, user: AuthContext, question: str, pieces):
+    """Passes the stream through and saves the exchange once it has finished."""
+    answer = []
+    async for piece in pieces:
+        answer.append(piece)
+        yield piece
+    await _record_turn(thread_id, user, question, "".join(answer))
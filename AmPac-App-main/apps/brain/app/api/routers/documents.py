@@ -1,49 +1,139 @@
-from fastapi import APIRouter, UploadFile, File, BackgroundTasks, Depends
+from fastapi import APIRouter, UploadFile, File, Form, Depends, HTTPException
 from pydantic import BaseModel
-from typing import Optional
+from typing import List, Literal, Optional
+import asyncio
+import os
 import uuid
-from app.services.document_analysis import document_analysis_agent
+from urllib.parse import quote
+from app.core.config import get_settings
+from app.services.analysis_jobs import AnalysisJob, JobNotPersisted, JobOwnedByAnotherUser, analysis_jobs, job_id_for
+from app.services.document_classifier import document_classifier
+from app.services.uploads import UploadTooLarge, spool_upload
 from app.core.firebase_auth import AuthContext, get_current_user
 
 router = APIRouter()
+settings = get_settings()
+
+Priority = Literal["high", "normal", "low"]
 
 class DocumentAnalysisRequest(BaseModel):
     documentId: str
     fileName: str
     content: Optional[str] = None
+    priority: Priority = "normal"
+
+class ClassifyDocument(BaseModel):
+    documentId: str
+    fileName: str = ""
+    text: str
+
+class ClassifyBatchRequest(BaseModel):
+    documents: List[ClassifyDocument]
+    extract: bool = True
+
+
+async def _submit(job: AnalysisJob) -> AnalysisJob:
+    try:
+        return await analysis_jobs.submit(job)
+    except asyncio.QueueFull:
+        raise HTTPException(status_code=503, detail="Document analysis queue is full, try again shortly",
+                            headers={"Retry-After": "30"})
+    except JobOwnedByAnotherUser:
+        raise HTTPException(status_code=409, detail="This document id belongs to another user")
+    except JobNotPersisted:
+        raise HTTPException(status_code=503, detail="Document analysis is unavailable, try again shortly",
+                            headers={"Retry-After": "30"})
+
+
+def _accepted(job: AnalysisJob) -> dict:
+    return {
+        "documentId": job.document_id or job.id,
+        "jobId": job.id,
+        "status": job.status,
+        "priority": job.priority,
+        "statusUrl": f"{settings.API_V1_STR}/documents/{quote(job.id, safe='/:')}/analysis",
+    }
+
 
 @router.post("/analyze")
 async def analyze_document(
     request: DocumentAnalysisRequest,
-    background_tasks: BackgroundTasks,
     user: AuthContext = Depends(get_current_user),
 ):
     """
-    Triggers background analysis of a document.
+    Queues analysis of a document. Poll statusUrl for the result.
     """
-    background_tasks.add_task(document_analysis_agent.analyze_document, request.documentId, request.fileName, request.content)
-    return {"status": "processing", "message": "Document analysis started"}
+    job = await _submit(AnalysisJob(id=job_id_for(user.uid, request.documentId), document_id=request.documentId,
+                                    file_name=request.fileName, user_id=user.uid, priority=request.priority,
+                                    content=request.content))
+    return {**_accepted(job), "message": "Document analysis queued"}
 
 @router.post("/upload")
 async def upload_document(
-    background_tasks: BackgroundTasks,
     file: UploadFile = File(...),
+    priority: Priority = Form("normal"),
     user: AuthContext = Depends(get_current_user),
 ):
     """
-    Uploads a document and triggers analysis.
-    For MVP, we generate a mock ID and trigger analysis immediately.
+    Uploads a document, stores it in Firebase Storage and queues analysis.
+    The file is streamed to disk in chunks (never read whole into memory); the
+    analysis job copies it to Storage from there before analyzing it.
     """
     doc_id = str(uuid.uuid4())
-    print(f"Received upload: {file.filename} ({file.content_type})")
-    
-    # Trigger analysis
-    if background_tasks:
-        background_tasks.add_task(document_analysis_agent.analyze_document, doc_id, file.filename)
-    
+    try:
+        upload = await spool_upload(file)
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    print(f"Received upload: {file.filename} ({file.content_type}, {upload.size} bytes)")
+
+    storage_path = f"{settings.UPLOAD_STORAGE_PREFIX}/{user.uid}/{doc_id}/{os.path.basename(upload.filename)}"
+    try:
+        job = await _submit(AnalysisJob(id=doc_id, file_name=upload.filename, user_id=user.uid, priority=priority,
+                                        sha256=upload.sha256, content_type=upload.content_type, size=upload.size,
+                                        source_path=upload.path, storage_path=storage_path))
+    except HTTPException:
+        upload.cleanup()
+        raise
+
     return {
-        "documentId": doc_id,
+        **_accepted(job),
         "fileName": file.filename,
-        "status": "processing",
-        "message": "Upload successful, analysis started"
+        "size": upload.size,
+        "sha256": upload.sha256,
+        "storagePath": storage_path,
+        "message": "Upload successful, analysis queued"
     }
+
+@router.post("/classify")
+async def classify_documents(
+    request: ClassifyBatchRequest,
+    user: AuthContext = Depends(get_current_user),
+):
+    """
+    Classifies a batch of already-extracted document texts in one pass, with their
+    fields unless `extract` is false.
+    """
+    if len(request.documents) > settings.DOC_CLASSIFY_MAX_BATCH:
+        raise HTTPException(status_code=413, detail=f"At most {settings.DOC_CLASSIFY_MAX_BATCH} documents per request")
+    results = await asyncio.to_thread(document_classifier.classify_many,
+                                      [(doc.fileName, doc.text) for doc in request.documents], request.extract)
+    return {"results": [{"documentId": doc.documentId, **result.to_dict()}
+                        for doc, result in zip(request.documents, results)]}
+
+@router.get("/{document_id:path}/analysis")  # Client document ids may contain "/"
+async def get_document_analysis(
+    document_id: str,
+    user: AuthContext = Depends(get_current_user),
+):
+    """
+    Status of a document's analysis job, with the result once it is done. Takes the
+    job id from statusUrl, or the caller's own document id as sent to /analyze.
+    """
+    job = await analysis_jobs.get(document_id)
+    if job is None and ":" not in document_id:
+        job = await analysis_jobs.get(job_id_for(user.uid, document_id))
+    if job is None:
+        raise HTTPException(status_code=404, detail="No analysis found for this document")
+    if job.user_id and job.user_id != user.uid and not user.is_staff and user.role != "dev":
+        raise HTTPException(status_code=403, detail="Not your document")
+    return job.public()
@@ -7,6 +7,13 @@ from app.services.sync_event_store import get_queue_depths, get_dead_letter
 from app.services.circuit_breaker import get_breaker_states, get_breaker
 from app.services.graph_service import graph_service
 from app.services.sync_health_store import read_sync_heartbeat
+from app.services.llm_providers import llm_providers
+from app.services.model_router import model_router
+from app.services.llm_metrics import llm_call_log
+from app.services.doc_parser import parse_pool
+from app.services.document_cache import document_cache
+from app.services.analysis_jobs import analysis_jobs
+from app.core.metrics import get_metrics_snapshot
 
 router = APIRouter()
 
@@ -181,3 +188,41 @@ async def calendar_health():
         "breaker": breaker.to_dict(),
         "hasClient": bool(graph_service.client),
     }
+
+
+@router.get("/llm")
+async def llm_health():
+    """
+    Per-route LLM calls, tokens, cost and latency; per-provider stats; model routing state.
+    """
+    return {
+        "calls": llm_call_log.summary(),
+        "providers": llm_providers.to_dict(),
+        "routing": model_router.to_dict(),
+    }
+
+
+@router.get("/parsing")
+async def parsing_health():
+    """
+    Document parse pool (worker count, tasks running and waiting, limits) and the
+    content-hash cache in front of it.
+    """
+    return {**parse_pool.stats(), "cache": document_cache.stats()}
+
+
+@router.get("/jobs")
+async def analysis_jobs_health():
+    """
+    Document analysis job queue: workers, jobs running and waiting, and the status
+    of the jobs this instance still holds in memory.
+    """
+    return analysis_jobs.stats()
+
+
+@router.get("/metrics")
+async def metrics_snapshot():
+    """
+    In-process counters, gauges and latency histograms for this worker.
+    """
+    return get_metrics_snapshot()
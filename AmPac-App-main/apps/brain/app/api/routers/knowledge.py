@@ -1,6 +1,7 @@
 from fastapi import APIRouter, HTTPException, Depends
-from app.schemas.knowledge import KnowledgeQueryRequest, KnowledgeResponse
+from app.schemas.knowledge import KnowledgeIngestRequest, KnowledgeQueryRequest, KnowledgeResponse
 from app.services.knowledge_service import knowledge_service
+from app.services.knowledge_ingestion import knowledge_ingestion
 from app.core.firebase_auth import AuthContext, get_current_user
 
 router = APIRouter()
@@ -11,3 +12,13 @@ async def query_knowledge(request: KnowledgeQueryRequest, user: AuthContext = De
         return await knowledge_service.query(request.query, request.filters)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/ingest")
+async def ingest_knowledge(request: KnowledgeIngestRequest, user: AuthContext = Depends(get_current_user)):
+    """
+    Crawls ShareFile into the knowledge base; only new or changed files are downloaded.
+    Returns per-stage throughput.
+    """
+    if not user.is_staff and user.role != "dev":
+        raise HTTPException(status_code=403, detail="Staff access required")
+    return await knowledge_ingestion.run(request.folderIds)
@@ -4,9 +4,11 @@ from typing import List, Optional
 from app.services.graph_service import GraphService
 from app.services.llm_service import LLMService
 from app.services.doc_parser import DocumentParser
+from app.services.uploads import UploadTooLarge
 
 from app.core.config import get_settings
 from app.services.token_storage import TokenStorage
+import asyncio
 import httpx
 
 router = APIRouter()
@@ -136,8 +138,12 @@ async def analyze_deal(
     # 1. Parse Attachments
     attachment_text = ""
     if attachments:
-        for file in attachments:
-            text = await DocumentParser.parse_file(file)
+        # Parsed side by side in the parse pool, off the event loop
+        try:
+            texts = await asyncio.gather(*(DocumentParser.parse_file(file) for file in attachments))
+        except UploadTooLarge as e:
+            raise HTTPException(status_code=413, detail=str(e))
+        for file, text in zip(attachments, texts):
             attachment_text += f"\n--- Attachment: {file.filename} ---\n{text}\n"
 
     # 2. Combine Context
@@ -176,7 +182,8 @@ async def analyze_deal(
     """
     
     try:
-        llm_response = await llm_service.generate_response(prompt)
+        # Borrower email content (not cacheable); the deal_analysis route queues behind interactive chat
+        llm_response = await llm_service.generate_response(prompt, task="deal_analysis", cache=False)
         
         # Parse JSON from LLM response (handle potential markdown fences)
         import json
@@ -281,7 +288,7 @@ async def draft_email(request: DraftEmailRequest):
     
     # 2. Use LLM to draft
     prompt = f"Draft a {request.tone} email for a loan application. Context: {context}"
-    draft_text = await llm_service.generate_text(prompt)
+    draft_text = await llm_service.generate_response(prompt, task="email_draft", cache=False)
     
     # Simple parsing (in reality, LLM should return JSON or structured output)
     subject = f"Update regarding Application #{request.appId}"
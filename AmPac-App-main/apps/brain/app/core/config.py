@@ -14,6 +14,103 @@ class Settings(BaseSettings):
     # Groq API for AI services
     GROQ_API_KEY: Optional[str] = None
     GROQ_MODEL: str = "llama3-8b-8192"
+    GROQ_BASE_URL: str = "https://api.groq.com/openai/v1"  # Any OpenAI-compatible endpoint
+    # Per call-site model routing; "model" defaults to GROQ_MODEL. fallback_model serves a task
+    # while its primary's recent p95 exceeds slo_p95_ms.
+    LLM_ROUTES: dict[str, dict] = {
+        "default": {},
+        "chat": {"max_tokens": 1024, "slo_p95_ms": 4000, "fallback_model": "llama-3.1-8b-instant"},
+        "assistant": {"max_tokens": 512, "slo_p95_ms": 3000, "fallback_model": "llama-3.1-8b-instant"},
+        "copilot": {"model": "llama3-70b-8192", "max_tokens": 1024, "slo_p95_ms": 6000, "fallback_model": "llama3-8b-8192"},
+        "deal_analysis": {"model": "llama3-70b-8192", "temperature": 0.0, "max_tokens": 1024, "lane": "batch",
+                          "json_mode": True, "slo_p95_ms": 20000, "fallback_model": "llama3-8b-8192"},
+        "email_draft": {"temperature": 0.4, "max_tokens": 600, "slo_p95_ms": 5000, "fallback_model": "llama-3.1-8b-instant"},
+    }
+    # Further OpenAI-compatible endpoints tried after Groq, in order:
+    # {"name", "base_url", "api_key", "models": {our name: theirs}, "requests_per_minute", "tokens_per_minute", "timeout_seconds"}
+    LLM_PROVIDERS: list[dict] = []
+    LLM_PROVIDER_TIMEOUT_SECONDS: float = 10.0
+    LLM_PROVIDER_FAILURE_THRESHOLD: int = 3  # Consecutive failures before a provider is tried last
+    LLM_PROVIDER_COOLDOWN_SECONDS: int = 30
+    LLM_HEDGE_ENABLED: bool = True  # Send a second copy to the next provider when the first is slow
+    LLM_HEDGE_QUANTILE: float = 0.9  # Hedge once the first provider is slower than this quantile of its recent latency
+    LLM_HEDGE_MIN_DELAY_MS: float = 300
+    LLM_HEDGE_MAX_DELAY_MS: float = 4000
+    LLM_HEDGE_DEFAULT_DELAY_MS: float = 1500  # Until a provider has enough samples
+    LLM_SLO_WINDOW_SECONDS: int = 120  # p95 is computed over calls in this window
+    LLM_SLO_MIN_SAMPLES: int = 20  # Recent calls needed before p95 can trigger a fallback
+    LLM_SLO_PROBE_EVERY: int = 10  # While degraded, every Nth call still tries the primary
+    GROQ_REQUESTS_PER_MINUTE: int = 30  # Starting bucket sizes; synced from x-ratelimit-* headers
+    GROQ_TOKENS_PER_MINUTE: int = 30000
+    GROQ_QUEUE_BUDGET_SECONDS: dict[str, float] = {"interactive": 8, "batch": 60}  # Max wait for quota before fallback
+    LLM_CONTEXT_WINDOW_TOKENS: int = 8192  # llama3-8b-8192
+    LLM_PROMPT_BUDGET_TOKENS: int = 6144  # System + knowledge + history + user message
+    LLM_MAX_COMPLETION_TOKENS: int = 1024
+    LLM_MIN_COMPLETION_TOKENS: int = 256
+    LLM_HISTORY_SUMMARY_TOKENS: int = 256  # Reserved for the summary of dropped turns
+    LLM_SYSTEM_PROMPT_MAX_SHARE: float = 0.5  # Of the prompt budget; longer (client-sent) system prompts are truncated
+    LLM_MIN_USER_TOKENS: int = 512  # The user message is never cut below this
+    # USD per million tokens, for the llm_cost_usd_total metric
+    LLM_MODEL_PRICES_PER_MILLION: dict[str, dict] = {
+        "llama3-8b-8192": {"prompt": 0.05, "completion": 0.08},
+        "llama-3.1-8b-instant": {"prompt": 0.05, "completion": 0.08},
+        "llama3-70b-8192": {"prompt": 0.59, "completion": 0.79},
+    }
+    LLM_CALL_LOG_SIZE: int = 200  # Recent call records kept for /health/llm
+    LLM_SHORT_CIRCUIT_TASKS: list[str] = ["assistant", "chat"]  # Tasks where small talk gets a canned reply without an LLM call
+    CONVERSATION_TAIL_TURNS: int = 12  # Recent thread messages kept verbatim for the LLM
+    CONVERSATION_SUMMARIZE_AFTER_TURNS: int = 24  # Fold older messages into the summary past this
+    CONVERSATION_SUMMARY_TOKENS: int = 256
+    CONVERSATION_CACHE_TTL_SECONDS: int = 1800
+    CONVERSATION_CACHE_MAX_ENTRIES: int = 500
+    CONVERSATION_CACHE_REDIS: bool = True  # Share thread state across workers via REDIS_URL (needs REDIS_ENABLED)
+    LLM_CACHE_ENABLED: bool = True
+    LLM_CACHE_TTL_SECONDS: int = 3600
+    LLM_CACHE_MAX_ENTRIES: int = 1000
+    LLM_CACHE_REDIS: bool = True  # Share cached answers across workers via REDIS_URL (needs REDIS_ENABLED)
+    RAG_ENABLED: bool = True  # Ground /chat/completions and /assistant/chat in knowledge base chunks
+    RAG_TOP_K: int = 4
+    RAG_MAX_TOKENS: int = 1536  # Prompt tokens the retrieved chunks may take (also capped at half of what's left)
+    RAG_CACHE_TTL_SECONDS: int = 600  # Entries are also invalidated whenever the corpus changes
+    RAG_CACHE_MAX_ENTRIES: int = 1000
+    
+    # Knowledge base search
+    KNOWLEDGE_SEARCH_MODE: str = "hybrid"  # "keyword" (BM25), "vector" or "hybrid"
+    KNOWLEDGE_EMBEDDING_DIM: int = 160  # 100k chunks = 64MB; larger dims collide less but scan slower
+    KNOWLEDGE_VECTOR_WEIGHT: float = 0.5  # Share of the hybrid score from vector similarity
+    KNOWLEDGE_HYBRID_CANDIDATES: int = 50  # Taken from each side before hybrid rescoring
+    KNOWLEDGE_MIN_SIMILARITY: float = 0.1  # Below this a vector-only match is noise (hashed features collide)
+    KNOWLEDGE_SHAREFILE_ROOTS: list[str] = []  # ShareFile folder ids crawled into the knowledge base
+    KNOWLEDGE_MANIFEST_PATH: str = "data/knowledge_manifest.json"
+    KNOWLEDGE_SNAPSHOT_DIR: Optional[str] = "data/knowledge_index"  # Published index versions; None disables snapshots
+    KNOWLEDGE_SNAPSHOT_POLL_SECONDS: float = 5.0  # How often workers check for a newer published version
+    KNOWLEDGE_SNAPSHOT_KEEP: int = 2  # Versions kept on disk (workers may still be mapping the previous one)
+    KNOWLEDGE_CHUNK_WORDS: int = 180
+    KNOWLEDGE_CHUNK_OVERLAP_WORDS: int = 30
+    KNOWLEDGE_CRAWL_CONCURRENCY: int = 4  # Folder listings in flight
+    KNOWLEDGE_DOWNLOAD_CONCURRENCY: int = 8
+    KNOWLEDGE_PARSE_CONCURRENCY: int = 2  # Files handed to the parse pool at once (it bounds the actual CPU use)
+
+    # Document parsing (process pool shared by uploads and ingestion)
+    DOC_PARSE_WORKERS: int = 2  # Parser processes per API worker
+    DOC_PARSE_PAGES_PER_TASK: int = 20  # Large PDFs are split into page ranges parsed in parallel
+    DOC_PARSE_MAX_PAGES: int = 300  # Pages past this are skipped (and noted in the text)
+    DOC_PARSE_TIMEOUT_SECONDS: float = 60.0  # Per document, including time queued for a worker
+    DOC_PARSE_TASKS_PER_WORKER: int = 200  # Worker processes are recycled after this many tasks
+    DOCUMENT_CACHE_DIR: Optional[str] = "data/document_cache"  # Parsed text + analysis by SHA-256 of the bytes; None disables
+    DOCUMENT_CACHE_MAX_MB: int = 512  # Least recently used entries are evicted past this
+    DOCUMENT_CACHE_FIRESTORE: bool = False  # Also share entries across instances through Firestore
+    DOCUMENT_CACHE_COLLECTION: str = "document_cache"
+    ANALYSIS_JOB_WORKERS: int = 2  # Document analyses running at once
+    ANALYSIS_JOB_MAX_QUEUED: int = 500  # Waiting jobs past this get a 503
+    ANALYSIS_JOB_TIMEOUT_SECONDS: float = 120.0  # Per attempt
+    ANALYSIS_JOB_MAX_ATTEMPTS: int = 3
+    ANALYSIS_JOB_LEASE_SECONDS: float = 300.0  # A "running" job older than this is re-queued on startup
+    ANALYSIS_JOB_KEEP: int = 1000  # Finished jobs kept in memory; older ones are read back from Firestore
+    ANALYSIS_JOB_COLLECTION: str = "analysis_jobs"
+    ANALYSIS_JOB_RECOVER: bool = True  # Re-queue unfinished jobs from Firestore on startup
+    ANALYSIS_JOB_INLINE_CONTENT_BYTES: int = 256 * 1024  # Longer /analyze text is kept in Storage, not the job document
+    DOC_CLASSIFY_MAX_BATCH: int = 1000  # Documents per /documents/classify request
     
     # Firebase
     FIREBASE_CREDENTIALS_PATH: str = "serviceAccountKey.json"
@@ -28,12 +125,37 @@ class Settings(BaseSettings):
     VENTURES_USERNAME: Optional[str] = None
     VENTURES_PASSWORD: Optional[str] = None
     VENTURES_MOCK_MODE: bool = True
+    VENTURES_TOKEN_TTL_SECONDS: int = 3600  # Used when /token does not report an expiry
+    VENTURES_TOKEN_REFRESH_SKEW_SECONDS: int = 120  # Refresh this long before expiry
+    VENTURES_CREDENTIAL_CACHE_SECONDS: int = 300
+    VENTURES_BASE_URL: str = "https://api.venturesgo.com/api/v4"
+    VENTURES_TIMEOUT_SECONDS: float = 15.0
+    VENTURES_MAX_CONNECTIONS: int = 20
+    VENTURES_PAGE_SIZE: int = 100
+    VENTURES_BATCH_SIZE: int = 50  # Loan ids per batched conditions request
+    VENTURES_CACHE_ENABLED: bool = True
+    VENTURES_CACHE_TTL_SECONDS: dict[str, float] = {"loan": 15, "conditions": 15, "entities": 300}
+    VENTURES_CACHE_MAX_ENTRIES: int = 2048
+    VENTURES_CACHE_REDIS: bool = False  # Share the read cache across workers via REDIS_URL
     USE_FAKE_SYNC: bool = False
 
     # ShareFile API
     SHAREFILE_CLIENT_ID: Optional[str] = None
     SHAREFILE_CLIENT_SECRET: Optional[str] = None
     SHAREFILE_SUBDOMAIN: str = "ampac" # e.g., https://ampac.sharefile.com
+    SHAREFILE_USERNAME: Optional[str] = None
+    SHAREFILE_PASSWORD: Optional[str] = None
+    SHAREFILE_KB_SUBDOMAIN: str = "ampacbusinesscapital"  # Account the knowledge base is crawled from
+    SHAREFILE_KB_BASE_URL: Optional[str] = None  # Override https://{SHAREFILE_KB_SUBDOMAIN}.sharefile.com (local stub)
+    SHAREFILE_FOLDER_CACHE_SIZE: int = 5000  # Folder path -> id entries kept in memory
+    SHAREFILE_FOLDER_CACHE_TTL_SECONDS: int = 24 * 3600  # Renamed folders keep their id, so paths go stale eventually
+    SHAREFILE_FOLDER_NEGATIVE_TTL_SECONDS: int = 30  # "Not there" from a listing, trusted this long
+    SHAREFILE_FOLDER_CACHE_FIRESTORE: bool = True  # Share resolved folder ids across instances
+    SHAREFILE_FOLDER_CACHE_COLLECTION: str = "sharefile_folders"
+    SHAREFILE_TIMEOUT_SECONDS: float = 60.0
+    SHAREFILE_UPLOAD_CHUNK_BYTES: int = 4 * 1024 * 1024  # Upload memory is about this times SHAREFILE_UPLOAD_THREADS
+    SHAREFILE_UPLOAD_THREADS: int = 4  # Chunks of one upload in flight at once
+    SHAREFILE_UPLOAD_CHUNK_RETRIES: int = 3  # Resends of a failed chunk before the upload fails
 
     # Feature flags / Integrations
     GRAPH_ENABLED: bool = True
@@ -62,6 +184,15 @@ class Settings(BaseSettings):
     
     # Storage
     STORAGE_BUCKET: Optional[str] = None
+
+    # Uploads
+    UPLOAD_MAX_BYTES: int = 50 * 1024 * 1024  # Per file; larger uploads get a 413
+    UPLOAD_MAX_REQUEST_BYTES: int = 150 * 1024 * 1024  # Multipart bodies past this are refused before they're read
+    UPLOAD_CHUNK_BYTES: int = 1024 * 1024  # Read, hashed and written this much at a time
+    UPLOAD_SPOOL_DIR: Optional[str] = None  # Temp dir for spooled uploads (system default when unset)
+    UPLOAD_STORAGE_PREFIX: str = "uploads"
+    DOCUMENT_URL_ALLOWED_HOSTS: list[str] = []  # Hosts (and their subdomains) documents may be downloaded from; none by default
+    UPLOAD_STORAGE_CHUNK_BYTES: int = 8 * 1024 * 1024  # Resumable upload chunk (a multiple of 256KB)
     
     # Error Tracking
     SENTRY_DSN: Optional[str] = None
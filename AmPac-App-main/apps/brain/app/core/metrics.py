@@ -0,0 +1,148 @@
+import threading
+from collections import deque
+from typing import Deque, Dict, Optional, Tuple
+
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _label_key(labels: Dict[str, object]) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _label_str(key: LabelKey) -> str:
+    return ",".join(f"{k}={v}" for k, v in key) or "_"
+
+
+class Counter:
+    """
+    Monotonic counter, optionally split by labels.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._values: Dict[LabelKey, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(_label_key(labels), 0)
+
+    def total(self) -> float:
+        return sum(self._values.values())
+
+    def to_dict(self) -> Dict:
+        return {_label_str(k): v for k, v in self._values.items()}
+
+
+class Gauge:
+    """
+    Point-in-time value, optionally split by labels.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._values: Dict[LabelKey, float] = {}
+
+    def set(self, value: float, **labels):
+        self._values[_label_key(labels)] = value
+
+    def inc(self, amount: float = 1, **labels):
+        key = _label_key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def value(self, **labels) -> float:
+        return self._values.get(_label_key(labels), 0)
+
+    def to_dict(self) -> Dict:
+        return {_label_str(k): v for k, v in self._values.items()}
+
+
+class Histogram:
+    """
+    Rolling-window histogram. Keeps the last `window` observations per label set
+    for percentiles, plus lifetime count/sum.
+    """
+
+    def __init__(self, name: str, window: int = 1024):
+        self.name = name
+        self.window = window
+        self._samples: Dict[LabelKey, Deque[float]] = {}
+        self._count: Dict[LabelKey, int] = {}
+        self._sum: Dict[LabelKey, float] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            samples = self._samples.get(key)
+            if samples is None:
+                samples = self._samples[key] = deque(maxlen=self.window)
+            samples.append(value)
+            self._count[key] = self._count.get(key, 0) + 1
+            self._sum[key] = self._sum.get(key, 0.0) + value
+
+    def percentile(self, pct: float, **labels) -> Optional[float]:
+        samples = self._samples.get(_label_key(labels))
+        if not samples:
+            return None
+        ordered = sorted(samples)
+        idx = min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))
+        return ordered[idx]
+
+    def to_dict(self) -> Dict:
+        out = {}
+        for key, samples in list(self._samples.items()):
+            ordered = sorted(samples)
+            n = len(ordered)
+
+            def pick(pct: float) -> float:
+                return ordered[min(n - 1, int(round(pct / 100.0 * (n - 1))))]
+
+            out[_label_str(key)] = {
+                "count": self._count.get(key, 0),
+                "sum": round(self._sum.get(key, 0.0), 6),
+                "p50": pick(50) if n else None,
+                "p95": pick(95) if n else None,
+                "p99": pick(99) if n else None,
+                "max": ordered[-1] if n else None,
+            }
+        return out
+
+
+_counters: Dict[str, Counter] = {}
+_gauges: Dict[str, Gauge] = {}
+_histograms: Dict[str, Histogram] = {}
+
+
+def counter(name: str) -> Counter:
+    if name not in _counters:
+        _counters[name] = Counter(name)
+    return _counters[name]
+
+
+def gauge(name: str) -> Gauge:
+    if name not in _gauges:
+        _gauges[name] = Gauge(name)
+    return _gauges[name]
+
+
+def histogram(name: str, window: int = 1024) -> Histogram:
+    if name not in _histograms:
+        _histograms[name] = Histogram(name, window=window)
+    return _histograms[name]
+
+
+def get_metrics_snapshot() -> Dict[str, Dict]:
+    return {
+        "counters": {name: c.to_dict() for name, c in _counters.items()},
+        "gauges": {name: g.to_dict() for name, g in _gauges.items()},
+        "histograms": {name: h.to_dict() for name, h in _histograms.items()},
+    }
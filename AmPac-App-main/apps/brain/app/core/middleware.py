@@ -71,6 +71,27 @@ class RateLimitingMiddleware(BaseHTTPMiddleware):
         return await call_next(request)
 
 
+class UploadSizeLimitMiddleware(BaseHTTPMiddleware):
+    """
+    Refuses multipart uploads whose declared Content-Length is over the limit, before
+    the form parser spools them. Bodies without a length are still capped per file
+    when the route streams them (see app.services.uploads).
+    """
+    def __init__(self, app, max_bytes: int):
+        super().__init__(app)
+        self.max_bytes = max_bytes
+
+    async def dispatch(self, request: Request, call_next):
+        if request.headers.get("content-type", "").startswith("multipart/form-data"):
+            length = request.headers.get("content-length")
+            if length and length.isdigit() and int(length) > self.max_bytes:
+                return Response(
+                    content=f"Upload too large (limit {self.max_bytes // (1024 * 1024)}MB).",
+                    status_code=413,
+                )
+        return await call_next(request)
+
+
 class APIKeyMiddleware(BaseHTTPMiddleware):
     """
     Optional API key validation middleware.
@@ -7,7 +7,7 @@ from app.services.sync_service import SyncService
 from fastapi.staticfiles import StaticFiles
 from app.api.routers import chat, documents, agents, knowledge, ventures, calendar, assistant, health, support, performance
 from app.core.logging_config import init_logging
-from app.core.middleware import RequestContextMiddleware, RateLimitingMiddleware, APIKeyMiddleware
+from app.core.middleware import RequestContextMiddleware, RateLimitingMiddleware, APIKeyMiddleware, UploadSizeLimitMiddleware
 from app.core.sentry import init_sentry
 from app.services.performance_monitor import record_api_performance
 import logging
@@ -97,6 +97,7 @@ app.mount("/static", StaticFiles(directory="app/static"), name="static")
 
 app.add_middleware(RequestContextMiddleware)
 app.add_middleware(RateLimitingMiddleware)
+app.add_middleware(UploadSizeLimitMiddleware, max_bytes=settings.UPLOAD_MAX_REQUEST_BYTES)
 
 # API Key middleware (only active if BRAIN_API_KEY is set)
 if settings.BRAIN_API_KEY:
@@ -112,6 +113,18 @@ async def startup_event():
         sync_service = SyncService()
         asyncio.create_task(sync_service.start_sync_loop())
 
+    from app.services.analysis_jobs import analysis_jobs
+    analysis_jobs.start()
+    if settings.ANALYSIS_JOB_RECOVER:
+        asyncio.create_task(analysis_jobs.recover())
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    from app.services.analysis_jobs import analysis_jobs
+    from app.services.doc_parser import parse_pool
+    await analysis_jobs.stop()
+    parse_pool.shutdown()
+
 @app.get("/")
 async def root():
     return {"message": "Welcome to AmPac Brain 🧠", "status": "operational"}
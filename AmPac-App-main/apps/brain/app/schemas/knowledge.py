@@ -18,3 +18,6 @@ class Citation(BaseModel):
 class KnowledgeResponse(BaseModel):
     answer: str
     citations: List[Citation]
+
+class KnowledgeIngestRequest(BaseModel):
+    folderIds: Optional[List[str]] = Field(None, description="ShareFile folders to crawl; defaults to KNOWLEDGE_SHAREFILE_ROOTS")
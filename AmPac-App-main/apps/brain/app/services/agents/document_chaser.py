@@ -1,6 +1,6 @@
 from app.services.graph_service import GraphService
 from app.services.llm_service import LLMService
-from app.services.sharefile_client import ShareFileClient
+from app.services.sharefile_client import FolderNotFound, ShareFileClient
 import asyncio
 
 class DocumentChaserAgent:
@@ -51,7 +51,12 @@ class DocumentChaserAgent:
                     file_content = b"Mock PDF Content" 
                     file_name = f"Document_from_{email.get('id')}.pdf"
                     
-                    file_id = await self.sharefile_client.upload_file(file_content, file_name, folder_id)
+                    try:
+                        file_id = await self.sharefile_client.upload_file(file_content, file_name, folder_id)
+                    except FolderNotFound:
+                        # The cached folder was deleted in ShareFile; it's been dropped, so resolve it afresh
+                        folder_id = await self.sharefile_client.ensure_folder_structure(borrower_name, loan_id)
+                        file_id = await self.sharefile_client.upload_file(file_content, file_name, folder_id)
                     print(f"DocumentChaser: Uploaded {file_name} to ShareFile folder {folder_id}")
                     
                     found_docs.append({
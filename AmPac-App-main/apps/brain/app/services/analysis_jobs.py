@@ -0,0 +1,350 @@
+import asyncio
+import hashlib
+import itertools
+import os
+import re
+import time
+from collections import OrderedDict
+from dataclasses import asdict, dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+from app.core.config import get_settings
+from app.core import metrics
+from app.core.firebase import get_db
+from app.services.document_analysis import DocumentAnalysisAgent, UnreadableDocument, document_analysis_agent
+from app.services.uploads import SpooledUpload, fetch_stored, fetch_text, store_text, store_upload
+
+settings = get_settings()
+
+PRIORITIES = {"high": 0, "normal": 1, "low": 2}
+ACTIVE = ("queued", "running")
+PLAIN_KEY = re.compile(r"[A-Za-z0-9_:-]{1,256}")
+
+
+class JobOwnedByAnotherUser(Exception):
+    """A job with this id already exists and belongs to a different user."""
+
+
+class JobNotPersisted(Exception):
+    """The job couldn't be written to Firestore (or its text to Storage), so it wasn't queued."""
+
+
+def job_id_for(user_id: str, document_id: str) -> str:
+    """Job ids for client-named documents are namespaced by user, so one user can't claim another's."""
+    return f"{user_id}:{document_id}"
+
+
+def doc_key(job_id: str) -> str:
+    """
+    Firestore document id for a job: the job id itself when it's plain, otherwise its
+    hash ("/" in an id would address a nested subcollection). The id is kept as a field.
+    """
+    if PLAIN_KEY.fullmatch(job_id) and not job_id.startswith("__"):
+        return job_id
+    return "h-" + hashlib.sha256(job_id.encode("utf-8")).hexdigest()
+
+
+def _camel(name: str) -> str:
+    head, *rest = name.split("_")
+    return head + "".join(part.title() for part in rest)
+
+
+def _snake(name: str) -> str:
+    return re.sub(r"[A-Z]", lambda match: "_" + match.group(0).lower(), name)
+
+
+@dataclass
+class AnalysisJob:
+    id: str  # Job id: the upload's generated document id, or job_id_for(user, client document id)
+    file_name: str
+    document_id: Optional[str] = None  # The caller's document id, when it differs from `id`
+    user_id: Optional[str] = None
+    priority: str = "normal"
+    status: str = "queued"  # queued -> running -> done | failed (back to queued for a retry)
+    sha256: Optional[str] = None
+    content_type: Optional[str] = None
+    size: Optional[int] = None
+    source_path: Optional[str] = None  # Spooled upload on the accepting instance's disk
+    storage_path: Optional[str] = None  # Firebase Storage copy, so a restarted job can fetch the bytes
+    stored: bool = False
+    content: Optional[str] = None  # Text sent with /documents/analyze instead of a file
+    content_path: Optional[str] = None  # Storage copy of `content` too long for the job document
+    attempts: int = 0
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    lease_until: Optional[float] = None  # A "running" job past this was lost with its instance
+    result: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "AnalysisJob":
+        fields = {_snake(key): value for key, value in data.items()}
+        return cls(**{key: value for key, value in fields.items() if key in cls.__dataclass_fields__})
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Firestore document, camelCase like the rest of the app's collections."""
+        data = {_camel(key): value for key, value in asdict(self).items()}
+        if self.content_path:
+            data["content"] = None  # Read back from Storage; Firestore documents are capped at 1MiB
+        return data
+
+    def public(self) -> Dict[str, Any]:
+        """What /documents/{id}/analysis returns."""
+        return {
+            "documentId": self.document_id or self.id,
+            "jobId": self.id,
+            "fileName": self.file_name,
+            "status": self.status,
+            "priority": self.priority,
+            "attempts": self.attempts,
+            "waitMs": round((self.started_at - self.created_at) * 1000) if self.started_at else None,
+            "runMs": round((self.finished_at - self.started_at) * 1000) if self.finished_at and self.started_at else None,
+            "result": self.result,
+            "error": self.error,
+        }
+
+
+class AnalysisJobQueue:
+    """
+    Document analysis as persisted jobs: a priority queue served by a bounded set of
+    workers, with every state change written to Firestore so status and results
+    can be fetched later and work survives a restart.
+
+    On startup `recover()` re-queues jobs left "queued", and "running" jobs whose
+    lease expired (their instance died mid-run). A job's bytes come from its spooled
+    upload if it is still on this instance's disk, otherwise from its Storage copy.
+    Failed runs are retried up to `max_attempts`, except for files that can't be parsed.
+    """
+
+    def __init__(self, agent: DocumentAnalysisAgent, workers: int, max_queued: int, timeout_seconds: float,
+                 max_attempts: int, lease_seconds: float, keep: int, collection: str = "analysis_jobs",
+                 db_factory: Callable = get_db):
+        self.agent = agent
+        self.workers = max(1, workers)
+        self.max_queued = max_queued
+        self.timeout_seconds = timeout_seconds
+        self.max_attempts = max_attempts
+        self.lease_seconds = max(lease_seconds, timeout_seconds)
+        self.keep = keep
+        self.collection = collection
+        self.db_factory = db_factory
+        self.jobs: "OrderedDict[str, AnalysisJob]" = OrderedDict()
+        self.running = 0
+        self._queue: Optional[asyncio.PriorityQueue] = None
+        self._tasks: List[asyncio.Task] = []
+        self._seq = itertools.count()
+        metrics.gauge("analysis_job_workers").set(self.workers)
+
+    def _export(self):
+        metrics.gauge("analysis_jobs_queue_depth").set(self._queue.qsize() if self._queue else 0)
+        metrics.gauge("analysis_jobs_running").set(self.running)
+
+    def start(self):
+        """Starts the workers on the running loop (idempotent)."""
+        if self._tasks:
+            return
+        self._queue = asyncio.PriorityQueue()
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        for job in self.jobs.values():
+            if job.status == "queued":
+                self._enqueue(job)
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        # Jobs cut off mid-run stay "running" in Firestore until their lease runs out
+
+    def _remember(self, job: AnalysisJob):
+        self.jobs[job.id] = job
+        self.jobs.move_to_end(job.id)
+        # Finished jobs beyond `keep` are only in Firestore; active ones always stay
+        finished = [key for key, kept in self.jobs.items() if kept.status not in ACTIVE]
+        for key in finished[:max(0, len(self.jobs) - self.keep)]:
+            del self.jobs[key]
+
+    def _enqueue(self, job: AnalysisJob):
+        self._queue.put_nowait((PRIORITIES.get(job.priority, PRIORITIES["normal"]), next(self._seq), job.id))
+        self._export()
+
+    def _write(self, job: AnalysisJob):
+        self.db_factory().collection(self.collection).document(doc_key(job.id)).set(job.to_dict())
+
+    async def _persist(self, job: AnalysisJob):
+        try:
+            await asyncio.to_thread(self._write, job)
+        except Exception as e:
+            print(f"[AnalysisJobs] Persisting job {job.id} failed: {e}")
+            metrics.counter("analysis_job_persist_errors_total").inc()
+
+    def _read(self, job_id: str) -> Optional[AnalysisJob]:
+        snapshot = self.db_factory().collection(self.collection).document(doc_key(job_id)).get()
+        data = snapshot.to_dict() if snapshot.exists else None
+        return AnalysisJob.from_dict(data) if isinstance(data, dict) and data.get("status") and data.get("id") == job_id else None
+
+    def _read_active(self) -> List[AnalysisJob]:
+        docs = self.db_factory().collection(self.collection).where("status", "in", list(ACTIVE)).stream()
+        jobs = []
+        for doc in docs:
+            data = doc.to_dict()
+            if isinstance(data, dict) and data.get("status"):
+                jobs.append(AnalysisJob.from_dict(data))
+        return jobs
+
+    async def submit(self, job: AnalysisJob) -> AnalysisJob:
+        """
+        Queues a job and returns it. Resubmitting a document whose job is still active
+        returns that job. Raises JobOwnedByAnotherUser if a job with this id (active or
+        finished) belongs to someone else, asyncio.QueueFull past `max_queued` waiting
+        jobs, and JobNotPersisted if it can't be stored: a job only this instance knows
+        about would be lost on restart and invisible to the others.
+        """
+        self.start()
+        existing = await self.get(job.id)
+        if existing is not None and existing.user_id and existing.user_id != job.user_id:
+            metrics.counter("analysis_jobs_rejected_total").inc(reason="owner")
+            raise JobOwnedByAnotherUser(job.id)
+        if existing is not None and existing.status in ACTIVE:
+            return existing
+        if self._queue.qsize() >= self.max_queued:
+            metrics.counter("analysis_jobs_rejected_total").inc(reason="full")
+            raise asyncio.QueueFull(f"{self._queue.qsize()} analysis jobs already queued")
+        if job.content and not job.content_path and len(job.content.encode("utf-8")) > settings.ANALYSIS_JOB_INLINE_CONTENT_BYTES:
+            path = f"{settings.UPLOAD_STORAGE_PREFIX}/{job.user_id or 'shared'}/{doc_key(job.id)}/content.txt"
+            if await store_text(job.content, path) is None:
+                metrics.counter("analysis_job_persist_errors_total").inc()
+                raise JobNotPersisted(job.id)
+            job.content_path = path
+        try:
+            await asyncio.to_thread(self._write, job)
+        except Exception as e:
+            print(f"[AnalysisJobs] Persisting job {job.id} failed, not queued: {e}")
+            metrics.counter("analysis_job_persist_errors_total").inc()
+            raise JobNotPersisted(job.id) from e
+        self._remember(job)
+        self._enqueue(job)
+        metrics.counter("analysis_jobs_submitted_total").inc(priority=job.priority)
+        return job
+
+    async def get(self, job_id: str) -> Optional[AnalysisJob]:
+        """From memory, or Firestore for jobs run elsewhere or before a restart."""
+        job = self.jobs.get(job_id)
+        if job is not None:
+            return job
+        try:
+            return await asyncio.to_thread(self._read, job_id)
+        except Exception as e:
+            print(f"[AnalysisJobs] Reading job {job_id} failed: {e}")
+            return None
+
+    async def recover(self) -> int:
+        """Re-queues persisted jobs that no instance is working on. Returns how many."""
+        self.start()
+        try:
+            jobs = await asyncio.to_thread(self._read_active)
+        except Exception as e:
+            print(f"[AnalysisJobs] Recovery query failed: {e}")
+            return 0
+        now, recovered = time.time(), 0
+        for job in jobs:
+            if job.id in self.jobs or (job.status == "running" and (job.lease_until or 0) > now):
+                continue
+            job.status = "queued"
+            self._remember(job)
+            self._enqueue(job)
+            recovered += 1
+        if recovered:
+            print(f"[AnalysisJobs] Recovered {recovered} unfinished jobs")
+            metrics.counter("analysis_jobs_recovered_total").inc(recovered)
+        return recovered
+
+    async def _worker(self):
+        while True:
+            _, _, job_id = await self._queue.get()
+            self._export()
+            job = self.jobs.get(job_id)
+            if job is None or job.status != "queued":
+                continue
+            await self._run(job)
+
+    async def _run(self, job: AnalysisJob):
+        now = time.time()
+        job.status, job.attempts, job.started_at, job.lease_until = "running", job.attempts + 1, now, now + self.lease_seconds
+        metrics.histogram("analysis_job_wait_ms").observe((now - job.created_at) * 1000, priority=job.priority)
+        self.running += 1
+        self._export()
+        await self._persist(job)
+        try:
+            job.result = await asyncio.wait_for(self._execute(job), self.timeout_seconds)
+            job.status, job.error = "done", None
+        except asyncio.CancelledError:
+            raise
+        except UnreadableDocument as e:
+            job.status, job.error = "failed", str(e)
+            print(f"[AnalysisJobs] Job {job.id} failed: {job.error}")
+        except Exception as e:
+            job.error = str(e) or type(e).__name__
+            job.status = "queued" if job.attempts < self.max_attempts else "failed"
+            print(f"[AnalysisJobs] Job {job.id} attempt {job.attempts} failed: {job.error}")
+        finally:
+            self.running -= 1
+            self._export()
+        job.finished_at, job.lease_until = time.time(), None
+        metrics.histogram("analysis_job_run_ms").observe((job.finished_at - job.started_at) * 1000)
+        metrics.counter("analysis_jobs_total").inc(outcome="retry" if job.status == "queued" else job.status)
+        if job.status != "queued" and job.source_path:
+            try:
+                os.remove(job.source_path)
+            except FileNotFoundError:
+                pass
+            job.source_path = None
+        await self._persist(job)
+        self._remember(job)
+        if job.status == "queued":
+            self._enqueue(job)
+
+    async def _execute(self, job: AnalysisJob) -> Dict[str, Any]:
+        local = job.source_path if job.source_path and os.path.exists(job.source_path) else None
+        if local and job.storage_path and not job.stored:
+            upload = SpooledUpload(job.file_name, job.content_type, local, job.size or 0, job.sha256 or "")
+            job.stored = await store_upload(upload, job.storage_path) is not None
+        source, fetched = local, None
+        if source is None and job.stored:
+            source = fetched = await fetch_stored(job.storage_path)
+        if source is None and job.storage_path:
+            raise RuntimeError("uploaded file is no longer available")
+        content = job.content
+        if content is None and job.content_path:
+            content = await fetch_text(job.content_path)
+            if content is None:
+                raise RuntimeError("analysis text is no longer available")
+        try:
+            return await self.agent.analyze_document(job.document_id or job.id, job.file_name, content or "", sha256=job.sha256, source=source)
+        finally:
+            if fetched:
+                os.remove(fetched)
+
+    def stats(self) -> Dict[str, Any]:
+        counts: Dict[str, int] = {}
+        for job in self.jobs.values():
+            counts[job.status] = counts.get(job.status, 0) + 1
+        return {
+            "workers": self.workers,
+            "running": self.running,
+            "queueDepth": self._queue.qsize() if self._queue else 0,
+            "maxQueued": self.max_queued,
+            "inMemory": counts,
+        }
+
+
+analysis_jobs = AnalysisJobQueue(
+    document_analysis_agent,
+    workers=settings.ANALYSIS_JOB_WORKERS,
+    max_queued=settings.ANALYSIS_JOB_MAX_QUEUED,
+    timeout_seconds=settings.ANALYSIS_JOB_TIMEOUT_SECONDS,
+    max_attempts=settings.ANALYSIS_JOB_MAX_ATTEMPTS,
+    lease_seconds=settings.ANALYSIS_JOB_LEASE_SECONDS,
+    keep=settings.ANALYSIS_JOB_KEEP,
+    collection=settings.ANALYSIS_JOB_COLLECTION,
+)
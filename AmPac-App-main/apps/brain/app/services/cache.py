@@ -0,0 +1,233 @@
+import contextlib
+import json
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Dict, Optional
+from app.core.config import get_settings
+from app.core import metrics
+
+
+@dataclass
+class CacheEntry:
+    value: Any
+    expires_at: float  # Wall-clock epoch seconds so entries mean the same thing in Redis
+    etag: Optional[str] = None
+
+    @property
+    def fresh(self) -> bool:
+        return time.time() < self.expires_at
+
+
+class LRUCache:
+    """
+    Size-bounded in-process cache. Expiry is left to the caller (entries carry expires_at)
+    so stale entries stay available for conditional revalidation until evicted.
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._data: "OrderedDict[str, CacheEntry]" = OrderedDict()
+
+    def get(self, key: str) -> Optional[CacheEntry]:
+        entry = self._data.get(key)
+        if entry is not None:
+            self._data.move_to_end(key)
+        return entry
+
+    def set(self, key: str, entry: CacheEntry):
+        self._data[key] = entry
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_entries:
+            self._data.popitem(last=False)
+
+    def delete(self, key: str):
+        self._data.pop(key, None)
+
+    def delete_prefix(self, prefix: str):
+        for key in [k for k in self._data if k.startswith(prefix)]:
+            del self._data[key]
+
+    def clear(self):
+        self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class RedisTier:
+    """
+    Optional shared cache tier. Fails soft: on any Redis error the tier is skipped
+    for `retry_after` seconds and callers carry on with the local tier only.
+    """
+
+    def __init__(self, url: str, retry_after: float = 30.0):
+        self.url = url
+        self.retry_after = retry_after
+        self._client = None
+        self._down_until = 0.0
+
+    def _available(self) -> bool:
+        return time.time() >= self._down_until
+
+    def _fail(self, op: str, error: Exception):
+        print(f"[Cache] Redis {op} failed, bypassing for {self.retry_after:.0f}s: {error}")
+        metrics.counter("cache_redis_errors_total").inc(op=op)
+        self._down_until = time.time() + self.retry_after
+
+    def _get_client(self):
+        if self._client is None:
+            import redis.asyncio as redis
+            self._client = redis.from_url(self.url, socket_connect_timeout=0.25, socket_timeout=0.25)
+        return self._client
+
+    async def get(self, key: str) -> Optional[CacheEntry]:
+        if not self._available():
+            return None
+        try:
+            raw = await self._get_client().get(key)
+        except Exception as e:
+            self._fail("get", e)
+            return None
+        if raw is None:
+            return None
+        data = json.loads(raw)
+        return CacheEntry(value=data["v"], expires_at=data["e"], etag=data.get("t"))
+
+    async def set(self, key: str, entry: CacheEntry, ttl_seconds: float):
+        if not self._available():
+            return
+        payload = json.dumps({"v": entry.value, "e": entry.expires_at, "t": entry.etag}, default=str)
+        try:
+            await self._get_client().set(key, payload, ex=max(1, int(ttl_seconds)))
+        except Exception as e:
+            self._fail("set", e)
+
+    async def delete(self, key: str):
+        if not self._available():
+            return
+        try:
+            await self._get_client().delete(key)
+        except Exception as e:
+            self._fail("delete", e)
+
+    async def delete_prefix(self, prefix: str):
+        if not self._available():
+            return
+        try:
+            client = self._get_client()
+            async for key in client.scan_iter(match=f"{prefix}*", count=500):
+                await client.delete(key)
+        except Exception as e:
+            self._fail("delete_prefix", e)
+
+    @contextlib.asynccontextmanager
+    async def lock(self, key: str, timeout: float = 10.0, wait: float = 5.0) -> AsyncIterator[bool]:
+        """
+        Cross-worker lock on `key`, held at most `timeout` seconds. Yields whether it was
+        acquired; when Redis is down or busy past `wait`, callers carry on unlocked.
+        """
+        lock = None
+        if self._available():
+            try:
+                lock = self._get_client().lock(f"lock:{key}", timeout=timeout, blocking_timeout=wait)
+                if not await lock.acquire():
+                    metrics.counter("cache_redis_lock_timeouts_total").inc()
+                    lock = None
+            except Exception as e:
+                self._fail("lock", e)
+                lock = None
+        try:
+            yield lock is not None
+        finally:
+            if lock is not None:
+                try:
+                    await lock.release()
+                except Exception as e:
+                    print(f"[Cache] Releasing Redis lock {key} failed: {e}")
+
+
+class TieredCache:
+    """
+    In-process LRU in front of an optional Redis tier, with hit/miss accounting.
+    `keep_stale_seconds` keeps expired entries in Redis a little longer so their
+    ETags can still be used for revalidation. With `local_tier=False` and Redis
+    configured, entries live only in Redis: for state several workers update, where
+    a per-worker copy would go stale.
+    """
+
+    def __init__(self, name: str, max_entries: int, redis_tier: Optional[RedisTier] = None, keep_stale_seconds: float = 0,
+                 local_tier: bool = True):
+        self.name = name
+        self.local = LRUCache(max_entries)
+        self.redis = redis_tier
+        self.keep_stale_seconds = keep_stale_seconds
+        self.local_tier = local_tier or redis_tier is None
+        self._counts = {"hit": 0, "stale": 0, "miss": 0}
+
+    def _record(self, result: str):
+        self._counts[result] += 1
+        metrics.counter("cache_lookups_total").inc(cache=self.name, result=result)
+        metrics.gauge("cache_hit_ratio").set(round(self.hit_ratio(), 4), cache=self.name)
+
+    def hit_ratio(self) -> float:
+        total = sum(self._counts.values())
+        return self._counts["hit"] / total if total else 0.0
+
+    async def get(self, key: str) -> Optional[CacheEntry]:
+        """
+        Returns the entry even if it is past expiry; check `entry.fresh`.
+        """
+        entry = self.local.get(key) if self.local_tier else None
+        if entry is None and self.redis is not None:
+            entry = await self.redis.get(key)
+            if entry is not None and self.local_tier:
+                self.local.set(key, entry)
+
+        if entry is None:
+            self._record("miss")
+        else:
+            self._record("hit" if entry.fresh else "stale")
+        return entry
+
+    async def set(self, key: str, value: Any, ttl_seconds: float, etag: Optional[str] = None) -> CacheEntry:
+        entry = CacheEntry(value=value, expires_at=time.time() + ttl_seconds, etag=etag)
+        if self.local_tier:
+            self.local.set(key, entry)
+        if self.redis is not None:
+            await self.redis.set(key, entry, ttl_seconds + self.keep_stale_seconds)
+        return entry
+
+    async def delete(self, key: str):
+        self.local.delete(key)
+        if self.redis is not None:
+            await self.redis.delete(key)
+
+    async def delete_prefix(self, prefix: str):
+        self.local.delete_prefix(prefix)
+        if self.redis is not None:
+            await self.redis.delete_prefix(prefix)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self._counts,
+            "hitRatio": round(self.hit_ratio(), 4),
+            "size": len(self.local),
+            "redis": self.redis is not None,
+        }
+
+
+_redis_tier: Optional[RedisTier] = None
+
+
+def get_redis_tier() -> Optional[RedisTier]:
+    """
+    Shared Redis tier, or None when REDIS_ENABLED is off.
+    """
+    global _redis_tier
+    settings = get_settings()
+    if not settings.REDIS_ENABLED:
+        return None
+    if _redis_tier is None:
+        _redis_tier = RedisTier(settings.REDIS_URL)
+    return _redis_tier
@@ -0,0 +1,151 @@
+import json
+import time
+import uuid
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+from fastapi.responses import StreamingResponse
+from app.core import metrics
+
+ACTION_OPEN = "<<<ACTION:"
+ACTION_CLOSE = ">>>"
+MAX_ACTION_CHARS = 2048  # An "open" tag longer than this is treated as plain text
+
+
+def _partial_prefix_len(text: str, marker: str) -> int:
+    """Length of the longest suffix of `text` that is a proper prefix of `marker`."""
+    for size in range(min(len(text), len(marker) - 1), 0, -1):
+        if text.endswith(marker[:size]):
+            return size
+    return 0
+
+
+def _parse_action(raw: str) -> Optional[Dict[str, Any]]:
+    try:
+        action = json.loads(raw)
+    except ValueError:
+        print(f"[ChatStream] Dropping malformed action tag: {raw[:100]}")
+        return None
+    return action if isinstance(action, dict) else None
+
+
+class ActionTagParser:
+    """
+    Splits streamed model output into visible text and <<<ACTION:{json}>>> tags.
+
+    A tag can be split across any number of chunks (even inside the "<<<" marker), so
+    text that might still become a tag is held back until it can be decided. Complete
+    tags are removed from the text and returned as parsed actions.
+    """
+
+    def __init__(self):
+        self._buffer = ""
+
+    def feed(self, text: str) -> Tuple[str, List[Dict[str, Any]]]:
+        self._buffer += text
+        visible: List[str] = []
+        actions: List[Dict[str, Any]] = []
+
+        while self._buffer:
+            start = self._buffer.find(ACTION_OPEN)
+            if start == -1:
+                keep = _partial_prefix_len(self._buffer, ACTION_OPEN)
+                split = len(self._buffer) - keep
+                visible.append(self._buffer[:split])
+                self._buffer = self._buffer[split:]
+                break
+
+            visible.append(self._buffer[:start])
+            end = self._buffer.find(ACTION_CLOSE, start + len(ACTION_OPEN))
+            if end == -1:
+                if len(self._buffer) - start > MAX_ACTION_CHARS:
+                    # Never closed; give up on it so the answer isn't swallowed
+                    visible.append(self._buffer[start:start + len(ACTION_OPEN)])
+                    self._buffer = self._buffer[start + len(ACTION_OPEN):]
+                    continue
+                self._buffer = self._buffer[start:]
+                break
+
+            action = _parse_action(self._buffer[start + len(ACTION_OPEN):end])
+            if action is not None:
+                actions.append(action)
+            self._buffer = self._buffer[end + len(ACTION_CLOSE):]
+
+        return "".join(visible), actions
+
+    def flush(self) -> str:
+        """Releases held-back text at end of stream (an unterminated tag is shown as-is)."""
+        rest, self._buffer = self._buffer, ""
+        return rest
+
+
+def _sse(payload: Any) -> str:
+    return f"data: {json.dumps(payload, default=str)}\n\n"
+
+
+async def stream_chat_sse(
+    pieces: AsyncIterator[str],
+    route: str,
+    model: str,
+    started_at: Optional[float] = None,
+    final_extra: Optional[Dict[str, Any]] = None,
+) -> AsyncIterator[str]:
+    """
+    Re-emits streamed text as OpenAI `chat.completion.chunk` server-sent events.
+
+    Action tags are stripped from the content and sent as an `action` field on their own
+    chunk. The final chunk carries `timing` with time-to-first-token and total latency,
+    which are also recorded as llm_stream_ttft_ms / llm_stream_total_ms per route,
+    plus any `final_extra` fields.
+    """
+    started_at = started_at or time.perf_counter()
+    completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+    created = int(time.time())
+
+    def chunk(delta: Dict[str, Any], finish_reason: Optional[str] = None, **extra) -> str:
+        return _sse({
+            "id": completion_id,
+            "object": "chat.completion.chunk",
+            "created": created,
+            "model": model,
+            "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+            **extra,
+        })
+
+    parser = ActionTagParser()
+    ttft_ms: Optional[float] = None
+    finish_reason = "stop"
+
+    yield chunk({"role": "assistant"})
+    try:
+        async for piece in pieces:
+            if ttft_ms is None and piece:
+                ttft_ms = (time.perf_counter() - started_at) * 1000
+                metrics.histogram("llm_stream_ttft_ms").observe(ttft_ms, route=route)
+            visible, actions = parser.feed(piece)
+            if visible:
+                yield chunk({"content": visible})
+            for action in actions:
+                yield chunk({}, action=action)
+    except Exception as e:
+        print(f"[ChatStream] Stream for {route} failed: {e}")
+        finish_reason = "error"
+
+    rest = parser.flush()
+    if rest:
+        yield chunk({"content": rest})
+
+    total_ms = (time.perf_counter() - started_at) * 1000
+    metrics.histogram("llm_stream_total_ms").observe(total_ms, route=route)
+    print(f"✅ [{route}] stream done: first token {ttft_ms or 0:.0f}ms, total {total_ms:.0f}ms")
+    yield chunk({}, finish_reason, timing={
+        "ttftMs": round(ttft_ms, 1) if ttft_ms is not None else None,
+        "totalMs": round(total_ms, 1),
+    }, **(final_extra or {}))
+    yield "data: [DONE]\n\n"
+
+
+def event_stream_response(events: AsyncIterator[str]) -> StreamingResponse:
+    return StreamingResponse(
+        events,
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -0,0 +1,201 @@
+import re
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+from app.core.config import get_settings
+from app.core import metrics
+
+settings = get_settings()
+
+# BPE vocabularies split English into pieces of roughly 4 characters; counting word
+# fragments of up to 4 chars plus each punctuation mark lands within ~10% of
+# llama3's tokenizer on our prompts, at regex speed.
+_TOKEN_PIECE = re.compile(r"\w{1,4}|[^\w\s]")
+MESSAGE_OVERHEAD_TOKENS = 4  # Role and separators the chat template adds per message
+
+
+def estimate_tokens(text: str) -> int:
+    return len(_TOKEN_PIECE.findall(text or ""))
+
+
+def message_tokens(message: Dict[str, str]) -> int:
+    return estimate_tokens(message.get("content", "")) + MESSAGE_OVERHEAD_TOKENS
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Cuts `text` at the piece boundary where it reaches `max_tokens`."""
+    if max_tokens <= 0:
+        return ""
+    for count, match in enumerate(_TOKEN_PIECE.finditer(text), start=1):
+        if count == max_tokens:
+            return text[:match.end()]
+    return text
+
+
+def _first_sentence(text: str, limit: int = 160) -> str:
+    sentence = re.split(r"(?<=[.?!])\s", text.strip(), maxsplit=1)[0]
+    return sentence if len(sentence) <= limit else sentence[:limit].rstrip() + "…"
+
+
+SUMMARY_HEADER = "Summary of earlier conversation:"
+
+
+def extend_summary(summary: Optional[str], turns: List[Dict[str, str]], max_tokens: int) -> Optional[str]:
+    """
+    Rolls `turns` into an existing summary (one line per turn: its first sentence),
+    dropping the oldest lines when it must be cut. Deliberately not an LLM call, so
+    dropping history never adds a round-trip.
+    """
+    lines = [line for line in (summary or "").splitlines() if line.startswith("- ")]
+    for turn in turns:
+        content = (turn.get("content") or "").strip()
+        if content:
+            who = "User" if turn.get("role") == "user" else "Assistant"
+            lines.append(f"- {who}: {_first_sentence(content)}")
+
+    budget = max_tokens - estimate_tokens(SUMMARY_HEADER)
+    kept: List[str] = []
+    # Newest first so the most recent context survives when the summary must be cut
+    for line in reversed(lines):
+        budget -= estimate_tokens(line)
+        if budget < 0:
+            break
+        kept.append(line)
+    if not kept:
+        return None
+    return SUMMARY_HEADER + "\n" + "\n".join(reversed(kept))
+
+
+def summarize_turns(turns: List[Dict[str, str]], max_tokens: int) -> Optional[str]:
+    """Extractive summary of dropped turns, in conversation order."""
+    return extend_summary(None, turns, max_tokens)
+
+
+@dataclass
+class BuiltContext:
+    messages: List[Dict[str, str]]
+    max_tokens: int
+    prompt_tokens: int
+    kept_turns: int
+    dropped_turns: int
+    summarized: bool
+    knowledge_used: int = 0
+    notes: List[str] = field(default_factory=list)
+
+    def to_dict(self) -> Dict:
+        return {
+            "promptTokens": self.prompt_tokens,
+            "maxTokens": self.max_tokens,
+            "keptTurns": self.kept_turns,
+            "droppedTurns": self.dropped_turns,
+            "summarized": self.summarized,
+            "knowledgeUsed": self.knowledge_used,
+        }
+
+
+def build_context(
+    user_message: str,
+    system_prompt: Optional[str] = None,
+    history: Optional[List[Dict[str, str]]] = None,
+    summary: Optional[str] = None,
+    knowledge: Optional[List[str]] = None,
+    knowledge_budget: Optional[int] = None,
+    route: str = "default",
+    prompt_budget: Optional[int] = None,
+    context_window: Optional[int] = None,
+    max_completion: Optional[int] = None,
+) -> BuiltContext:
+    """
+    Assembles [system, knowledge, summary, recent turns..., user] within the prompt budget
+    and picks max_tokens from what the context window has left.
+
+    Priority when space runs out: system prompt and user message are always kept (the
+    system prompt is cut to LLM_SYSTEM_PROMPT_MAX_SHARE of the budget, since clients can
+    send their own; the user message is truncated only if it overflows what's left, and
+    never below LLM_MIN_USER_TOKENS), then knowledge snippets in
+    the order given (within `knowledge_budget` tokens, if set), then the most recent turns. Turns that don't fit are summarized,
+    extending `summary` (a stored summary of turns older than `history`) if given.
+    """
+    prompt_budget = prompt_budget or settings.LLM_PROMPT_BUDGET_TOKENS
+    context_window = context_window or settings.LLM_CONTEXT_WINDOW_TOKENS
+    max_completion = max_completion or settings.LLM_MAX_COMPLETION_TOKENS
+    min_completion = settings.LLM_MIN_COMPLETION_TOKENS
+    prompt_budget = min(prompt_budget, context_window - min_completion)
+    notes: List[str] = []
+
+    user_floor = min(estimate_tokens(user_message), settings.LLM_MIN_USER_TOKENS)
+    system = {"role": "system", "content": system_prompt} if system_prompt else None
+    if system:
+        system_budget = min(int(prompt_budget * settings.LLM_SYSTEM_PROMPT_MAX_SHARE),
+                            prompt_budget - user_floor - MESSAGE_OVERHEAD_TOKENS) - MESSAGE_OVERHEAD_TOKENS
+        if estimate_tokens(system_prompt) > system_budget:
+            system["content"] = truncate_to_tokens(system_prompt, system_budget)
+            notes.append("system prompt truncated")
+    used = message_tokens(system) if system else 0
+
+    user_budget = max(prompt_budget - used - MESSAGE_OVERHEAD_TOKENS, user_floor)
+    if estimate_tokens(user_message) > user_budget:
+        user_message = truncate_to_tokens(user_message, user_budget)
+        notes.append("user message truncated")
+    user = {"role": "user", "content": user_message}
+    used += message_tokens(user)
+
+    # Retrieved knowledge gets at most half of what's left so history isn't starved
+    knowledge_msg = None
+    knowledge_used = 0
+    if knowledge:
+        allowance = (prompt_budget - used) // 2
+        if knowledge_budget is not None:
+            allowance = min(allowance, knowledge_budget)
+        header = "Relevant AmPac knowledge (cite by number):"
+        picked: List[str] = []
+        spent = estimate_tokens(header) + MESSAGE_OVERHEAD_TOKENS
+        for snippet in knowledge:
+            entry = f"[{len(picked) + 1}] {snippet}"
+            cost = estimate_tokens(entry)
+            if spent + cost > allowance:
+                break
+            picked.append(entry)
+            spent += cost
+        if picked:
+            knowledge_msg = {"role": "system", "content": "\n\n".join([header] + picked)}
+            knowledge_used = len(picked)
+            used += message_tokens(knowledge_msg)
+
+    # Newest turns first until the budget (less room for a summary) is spent
+    turns = [t for t in (history or []) if t.get("role") in ("user", "assistant") and t.get("content")]
+    summary_reserve = settings.LLM_HISTORY_SUMMARY_TOKENS if turns or summary else 0
+    kept: List[Dict[str, str]] = []
+    for turn in reversed(turns):
+        cost = message_tokens(turn)
+        if used + cost > prompt_budget - summary_reserve:
+            break
+        kept.append({"role": turn["role"], "content": turn["content"]})
+        used += cost
+    kept.reverse()
+    dropped = turns[:len(turns) - len(kept)]
+
+    summary_msg = None
+    if dropped or summary:
+        summary = extend_summary(summary, dropped, min(summary_reserve, prompt_budget - used) - MESSAGE_OVERHEAD_TOKENS)
+        if summary:
+            summary_msg = {"role": "system", "content": summary}
+            used += message_tokens(summary_msg)
+
+    messages = [m for m in (system, knowledge_msg, summary_msg) if m] + kept + [user]
+    max_tokens = max(min_completion, min(max_completion, context_window - used))
+
+    metrics.histogram("llm_prompt_tokens").observe(used, route=route)
+    metrics.histogram("llm_max_tokens").observe(max_tokens, route=route)
+    if dropped:
+        metrics.counter("llm_context_dropped_turns_total").inc(len(dropped), route=route)
+
+    return BuiltContext(
+        messages=messages,
+        max_tokens=max_tokens,
+        prompt_tokens=used,
+        kept_turns=len(kept),
+        dropped_turns=len(dropped),
+        summarized=summary_msg is not None,
+        knowledge_used=knowledge_used,
+        notes=notes,
+    )
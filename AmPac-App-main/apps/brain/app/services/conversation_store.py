@@ -0,0 +1,190 @@
+import asyncio
+import contextlib
+import uuid
+import weakref
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional
+from firebase_admin import firestore
+from app.core.config import get_settings
+from app.core.firebase import get_db
+from app.core import metrics
+from app.services.cache import TieredCache, get_redis_tier
+from app.services.context_builder import extend_summary
+
+settings = get_settings()
+
+# Thread messages are written by borrowers, staff and the assistant; for the model the
+# lender side (staff and assistant) is one voice.
+ROLE_FOR_SENDER = {"borrower": "user", "staff": "assistant", "assistant": "assistant"}
+
+
+@dataclass
+class ConversationState:
+    """
+    What the LLM needs from a thread: a rolling summary of older messages plus the
+    recent tail verbatim. `summarized_through` is the id of the last message folded
+    into the summary, so the tail can be rebuilt from the newest messages alone.
+    """
+    thread_id: str
+    summary: Optional[str] = None
+    summarized_through: Optional[str] = None
+    turns: List[Dict[str, str]] = field(default_factory=list)  # {"id", "role", "content"}
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "ConversationState":
+        # Copy the turns so the cached value isn't mutated through the returned state
+        return cls(**{**data, "turns": [dict(turn) for turn in data.get("turns", [])]})
+
+
+class ConversationStore:
+    """
+    Per-thread conversation state, cached so a turn doesn't re-read the thread's
+    `messages` subcollection. Once the tail grows past `summarize_after` turns, the
+    oldest are folded into the summary until `tail_turns` remain, and the summary is
+    saved on the thread document.
+
+    With Redis the state lives only there (no per-worker copy), and appends hold a
+    per-thread Redis lock around read-modify-write, so two workers appending to one
+    thread can't overwrite each other's turns. Without Redis it is per process.
+    """
+
+    def __init__(self, cache: TieredCache, ttl_seconds: float, tail_turns: int, summarize_after: int,
+                 summary_tokens: int, db_factory: Callable = get_db):
+        self.cache = cache
+        self.ttl_seconds = ttl_seconds
+        self.tail_turns = tail_turns
+        self.summarize_after = max(summarize_after, tail_turns)
+        self.summary_tokens = summary_tokens
+        self.db_factory = db_factory
+        self._locks: "weakref.WeakValueDictionary[str, asyncio.Lock]" = weakref.WeakValueDictionary()
+
+    def _key(self, thread_id: str) -> str:
+        return f"conversation:{thread_id}"
+
+    def _lock(self, thread_id: str) -> asyncio.Lock:
+        lock = self._locks.get(thread_id)
+        if lock is None:
+            lock = asyncio.Lock()
+            self._locks[thread_id] = lock
+        return lock
+
+    @contextlib.asynccontextmanager
+    async def _shared_lock(self, thread_id: str):
+        if self.cache.redis is None:
+            yield
+            return
+        async with self.cache.redis.lock(self._key(thread_id)):
+            yield
+
+    def _hydrate(self, thread_id: str) -> ConversationState:
+        """
+        Rebuilds state from Firestore: the saved summary from the thread document plus
+        the newest messages after `summarizedThrough`. At most `summarize_after`
+        messages are read, since more than that are never left unsummarized.
+        """
+        db = self.db_factory()
+        thread_ref = db.collection("threads").document(thread_id)
+        thread_data = thread_ref.get().to_dict() or {}
+        summary = thread_data.get("summary")
+        through = thread_data.get("summarizedThrough")
+        state = ConversationState(
+            thread_id=thread_id,
+            summary=summary if isinstance(summary, str) else None,
+            summarized_through=through if isinstance(through, str) else None,
+        )
+
+        docs = thread_ref.collection("messages") \
+            .order_by("createdAt", direction=firestore.Query.DESCENDING) \
+            .limit(self.summarize_after).stream()
+        turns: List[Dict[str, str]] = []
+        for doc in docs:
+            data = doc.to_dict() or {}
+            if data.get("id") == state.summarized_through:
+                break
+            role = ROLE_FOR_SENDER.get(data.get("senderRole"))
+            if role and data.get("text"):
+                turns.append({"id": data.get("id") or doc.id, "role": role, "content": data["text"]})
+        state.turns = list(reversed(turns))
+        metrics.counter("conversation_hydrations_total").inc()
+        return state
+
+    async def get(self, thread_id: str) -> ConversationState:
+        entry = await self.cache.get(self._key(thread_id))
+        if entry is not None and entry.fresh:
+            return ConversationState.from_dict(entry.value)
+        state = await asyncio.to_thread(self._hydrate, thread_id)
+        await self.cache.set(self._key(thread_id), state.to_dict(), self.ttl_seconds)
+        return state
+
+    def _fold(self, state: ConversationState) -> bool:
+        if len(state.turns) <= self.summarize_after:
+            return False
+        folded = state.turns[:len(state.turns) - self.tail_turns]
+        state.turns = state.turns[len(folded):]
+        state.summary = extend_summary(state.summary, folded, self.summary_tokens)
+        state.summarized_through = folded[-1]["id"]
+        metrics.counter("conversation_turns_summarized_total").inc(len(folded))
+        return True
+
+    async def append(self, thread_id: str, messages: List[Dict[str, Any]], persist: bool = False) -> ConversationState:
+        """
+        Adds thread messages ({"senderRole", "text"}, optionally "id") to the state.
+        With `persist`, they are also written to the thread's `messages` subcollection
+        (callers that already wrote them, like send_message, leave it off).
+        """
+        async with self._lock(thread_id), self._shared_lock(thread_id):
+            state = await self.get(thread_id)  # Read inside the locks: another worker may just have appended
+            db = self.db_factory()
+            thread_ref = db.collection("threads").document(thread_id)
+            now = datetime.utcnow()
+            known = {turn["id"] for turn in state.turns}  # A fresh hydrate may already include them
+            messages = [{"id": str(uuid.uuid4()), "threadId": thread_id,
+                         # Distinct timestamps keep question before answer when ordered by createdAt
+                         "createdAt": now + timedelta(microseconds=index), **message}
+                        for index, message in enumerate(messages)]
+            if persist:
+                await asyncio.to_thread(self._write_messages, thread_ref, messages)
+            for message in messages:
+                role = ROLE_FOR_SENDER.get(message["senderRole"])
+                if role and message.get("text") and message["id"] not in known:
+                    state.turns.append({"id": message["id"], "role": role, "content": message["text"]})
+
+            update: Dict[str, Any] = {}
+            if persist and messages:
+                update.update({"lastMessageAt": now, "preview": messages[-1]["text"][:50]})
+            if self._fold(state):
+                update.update({"summary": state.summary, "summarizedThrough": state.summarized_through})
+            if update:
+                try:
+                    await asyncio.to_thread(thread_ref.update, update)
+                except Exception as e:
+                    print(f"[Conversation] Failed to update thread {thread_id}: {e}")
+
+            await self.cache.set(self._key(thread_id), state.to_dict(), self.ttl_seconds)
+            return state
+
+    @staticmethod
+    def _write_messages(thread_ref, messages: List[Dict[str, Any]]):
+        for message in messages:
+            thread_ref.collection("messages").document(message["id"]).set(message)
+
+    def stats(self) -> Dict[str, Any]:
+        return self.cache.stats()
+
+
+conversation_store = ConversationStore(
+    TieredCache(
+        "conversations",
+        max_entries=settings.CONVERSATION_CACHE_MAX_ENTRIES,
+        redis_tier=get_redis_tier() if settings.CONVERSATION_CACHE_REDIS else None,
+        local_tier=False,
+    ),
+    ttl_seconds=settings.CONVERSATION_CACHE_TTL_SECONDS,
+    tail_turns=settings.CONVERSATION_TAIL_TURNS,
+    summarize_after=settings.CONVERSATION_SUMMARIZE_AFTER_TURNS,
+    summary_tokens=settings.CONVERSATION_SUMMARY_TOKENS,
+)
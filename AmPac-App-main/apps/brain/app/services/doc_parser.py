@@ -1,32 +1,312 @@
 import pdfplumber
+import asyncio
 import io
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass, field
+from typing import List, Optional, Tuple, Union
+from docx import Document
 from fastapi import UploadFile
+from app.core.config import get_settings
+from app.core import metrics
+from app.services.document_cache import document_cache, sha256_source
+from app.services.uploads import spool_upload
+
+settings = get_settings()
+
+# A document's bytes, or the path of a file holding them. Workers open a path
+# themselves, so a spooled upload is never copied through the pool's pipes.
+Source = Union[bytes, str]
+
+
+def _open(source: Source):
+    return io.BytesIO(source) if isinstance(source, bytes) else source
+
+
+# Module-level so the pool's worker processes can unpickle them by name
+def _pdf_page_count(source: Source) -> int:
+    with pdfplumber.open(_open(source)) as pdf:
+        return len(pdf.pages)
+
+
+def _pdf_pages(source: Source, start: int, end: Optional[int]) -> List[str]:
+    """Text of pages [start, end) (0-based; pages past the end of the file are ignored)."""
+    with pdfplumber.open(_open(source)) as pdf:
+        return [page.extract_text() or "" for page in pdf.pages[start:end]]
+
+
+def _docx_text(source: Source) -> str:
+    return "\n".join(paragraph.text for paragraph in Document(_open(source)).paragraphs)
+
+
+def _kind(filename: str) -> str:
+    name = filename.lower()
+    return name.rsplit(".", 1)[-1] if "." in name else "none"
+
+
+def _read_text(path: str) -> str:
+    with open(path, encoding="utf-8") as f:
+        return f.read()
+
+
+@dataclass
+class ParsedDocument:
+    filename: str
+    text: str = ""
+    pages: int = 0  # PDF pages extracted
+    total_pages: int = 0
+    notes: List[str] = field(default_factory=list)  # Pages skipped (limit, timeout, errors)
+    error: Optional[str] = None
+    timed_out: bool = False
+    elapsed_ms: float = 0.0
+    cached: bool = False  # Served from document_cache
+
+    @property
+    def failed(self) -> bool:
+        return self.error is not None
+
+    def render(self) -> str:
+        """Text for a prompt: the extracted text with any skipped pages called out."""
+        return "\n".join([self.text] + self.notes) if self.notes else self.text
+
 
 class DocumentParser:
     @staticmethod
     async def parse_file(file: UploadFile) -> str:
         """
-        Extracts text from PDF or Text files.
+        Extracts text from PDF, Word or text uploads in the parse pool, off the event loop.
+        The upload is spooled to disk and parsed from there rather than read into memory.
+        """
+        upload = await spool_upload(file)
+        try:
+            return (await DocumentParser.parse_source(upload.filename, upload.path, upload.sha256)).render()
+        finally:
+            upload.cleanup()
+
+    @staticmethod
+    async def parse_source(filename: str, source: Source, sha256: Optional[str] = None) -> ParsedDocument:
+        """
+        Parses in the pool unless these bytes were parsed before (document_cache).
+        Pass `sha256` when the bytes were already hashed, e.g. while spooling.
+        Failed and timed-out parses are not cached.
+        """
+        if not document_cache.enabled:
+            return await parse_pool.parse(filename, source)
+        sha256 = sha256 or await asyncio.to_thread(sha256_source, source)
+        kind = _kind(filename)
+        cached = await document_cache.get_parsed(sha256, kind)
+        if cached is not None:
+            return ParsedDocument(filename, cached["text"], cached["pages"], cached["totalPages"], list(cached["notes"]), cached=True)
+        doc = await parse_pool.parse(filename, source)
+        if not doc.failed and not doc.timed_out:
+            await document_cache.put_parsed(sha256, kind, {
+                "text": doc.text, "pages": doc.pages, "totalPages": doc.total_pages, "notes": doc.notes,
+            }, filename)
+        return doc
+
+    @staticmethod
+    def parse_bytes(filename: str, content: bytes) -> str:
+        """
+        Extracts text from PDF, Word (.docx) or text content. Blocking and unbounded;
+        async code should go through parse_pool instead.
         """
-        filename = file.filename.lower()
-        content = await file.read()
-        
+        filename = filename.lower()
         text = ""
-        
+
         try:
             if filename.endswith(".pdf"):
-                with pdfplumber.open(io.BytesIO(content)) as pdf:
-                    for page in pdf.pages:
-                        text += page.extract_text() or ""
-                        
+                text = "\n".join(_pdf_pages(content, 0, None))
+
+            elif filename.endswith(".docx"):
+                text = _docx_text(content)
+
             elif filename.endswith(".txt") or filename.endswith(".md"):
                 text = content.decode("utf-8")
-                
+
             else:
                 text = f"[Unsupported file type: {filename}]"
-                
+
         except Exception as e:
             print(f"Error parsing {filename}: {e}")
             text = f"[Error parsing file: {e}]"
-            
+
         return text
+
+
+class ParsePool:
+    """
+    Document parsing in a bounded pool of worker processes. pdfplumber is pure-Python
+    and CPU-bound, so a 200-page tax return parsed on the event loop (or in a thread,
+    holding the GIL) stalls every other request for seconds.
+
+    Large PDFs are split into page ranges parsed in parallel, and at most `workers`
+    tasks are handed to the pool at once; the rest wait here, which is what
+    doc_parse_queue_depth reports. Each document has a deadline covering its wait and
+    its parse: pages not done by then are reported as skipped rather than holding up
+    the request. A range already running can't be interrupted, but it occupies a
+    worker for at most `pages_per_task` pages.
+    """
+
+    def __init__(self, workers: int, pages_per_task: int, max_pages: int, timeout_seconds: float, tasks_per_worker: int):
+        self.workers = max(1, workers)
+        self.pages_per_task = max(1, pages_per_task)
+        self.max_pages = max_pages
+        self.timeout_seconds = timeout_seconds
+        self.tasks_per_worker = tasks_per_worker  # Recycle workers so pdfminer's caches don't grow forever
+        self.slots = asyncio.Semaphore(self.workers)
+        self.active = 0
+        self.queued = 0
+        self._executor: Optional[ProcessPoolExecutor] = None
+        metrics.gauge("doc_parse_workers").set(self.workers)
+
+    def _pool(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # Spawn, not fork: the API process runs threads (to_thread, sync loop) that fork would copy mid-lock
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                max_tasks_per_child=self.tasks_per_worker or None,
+            )
+        return self._executor
+
+    def _export(self):
+        metrics.gauge("doc_parse_active").set(self.active)
+        metrics.gauge("doc_parse_queue_depth").set(self.queued)
+
+    def _finished(self):
+        self.active -= 1
+        self.slots.release()
+        self._export()
+
+    async def _submit(self, fn, *args):
+        """Run fn in a worker once a slot is free. The slot is held until the worker is really done."""
+        self.queued += 1
+        self._export()
+        try:
+            await self.slots.acquire()
+        finally:
+            self.queued -= 1
+        self.active += 1
+        self._export()
+        loop = asyncio.get_running_loop()
+        try:
+            try:
+                future = self._pool().submit(fn, *args)
+            except BrokenProcessPool:
+                # A worker died (out of memory on a hostile PDF?): start a fresh pool
+                print("[ParsePool] Worker pool broken, restarting it")
+                self._executor = None
+                future = self._pool().submit(fn, *args)
+        except BaseException:
+            self._finished()
+            raise
+        # Cancelling the awaiting task only drops tasks that haven't started, so
+        # release the slot when the worker actually finishes
+        future.add_done_callback(lambda _: loop.call_soon_threadsafe(self._finished))
+        return await asyncio.wrap_future(future)
+
+    async def _parse_pdf(self, doc: ParsedDocument, content: Source, deadline: float, max_pages: int):
+        loop = asyncio.get_running_loop()
+        step = self.pages_per_task
+        # The first range goes out with the page count so short files take one round trip
+        ranges: List[Tuple[int, int]] = [(0, min(step, max_pages))]
+        tasks = [asyncio.create_task(self._submit(_pdf_pages, content, 0, ranges[0][1]))]
+        try:
+            doc.total_pages = await asyncio.wait_for(self._submit(_pdf_page_count, content), max(0.0, deadline - loop.time()))
+        except BaseException:
+            tasks[0].cancel()
+            raise
+        pages = min(doc.total_pages, max_pages)
+        for start in range(ranges[0][1], pages, step):
+            ranges.append((start, min(start + step, pages)))
+            tasks.append(asyncio.create_task(self._submit(_pdf_pages, content, *ranges[-1])))
+
+        _, pending = await asyncio.wait(tasks, timeout=max(0.0, deadline - loop.time()))
+        for task in pending:
+            task.cancel()
+        texts, errors = [], []
+        for (start, end), task in zip(ranges, tasks):
+            end = min(end, pages)
+            if start >= end:
+                continue
+            if task in pending:
+                doc.timed_out = True
+                doc.notes.append(f"[Pages {start + 1}-{end} not parsed: timed out after {self.timeout_seconds:g}s]")
+            elif task.exception() is not None:
+                errors.append(task.exception())
+                doc.notes.append(f"[Pages {start + 1}-{end} not parsed: {task.exception()}]")
+            else:
+                texts.extend(task.result())
+        doc.pages = len(texts)
+        doc.text = "\n".join(texts)
+        if pages < doc.total_pages:
+            doc.notes.append(f"[Only the first {pages} of {doc.total_pages} pages were parsed]")
+        if errors and not texts:
+            raise errors[0]
+
+    async def parse(self, filename: str, content: Source, timeout: Optional[float] = None,
+                    max_pages: Optional[int] = None) -> ParsedDocument:
+        """Never raises: failures come back as the legacy "[Error parsing file: ...]" text with `error` set."""
+        started = time.perf_counter()
+        name = filename.lower()
+        kind = _kind(name)
+        timeout = timeout or self.timeout_seconds
+        doc = ParsedDocument(filename)
+        outcome = "ok"
+        try:
+            if name.endswith(".pdf"):
+                deadline = asyncio.get_running_loop().time() + timeout
+                await self._parse_pdf(doc, content, deadline, max_pages or self.max_pages)
+                if doc.timed_out:
+                    outcome = "partial"
+            elif name.endswith(".docx"):
+                doc.text = await asyncio.wait_for(self._submit(_docx_text, content), timeout)
+            elif name.endswith(".txt") or name.endswith(".md"):
+                doc.text = content.decode("utf-8") if isinstance(content, bytes) else await asyncio.to_thread(_read_text, content)
+            else:
+                doc.text = f"[Unsupported file type: {name}]"
+                doc.error = "unsupported file type"
+                outcome = "unsupported"
+        except asyncio.TimeoutError:
+            doc.timed_out = True
+            doc.error = f"timed out after {timeout:g}s"
+            doc.text, doc.notes = f"[Error parsing file: {doc.error}]", []
+            outcome = "timeout"
+        except Exception as e:
+            print(f"Error parsing {name}: {e}")
+            doc.error = str(e)
+            doc.text, doc.notes = f"[Error parsing file: {e}]", []
+            outcome = "error"
+        doc.elapsed_ms = (time.perf_counter() - started) * 1000
+        metrics.counter("doc_parse_total").inc(type=kind, outcome=outcome)
+        metrics.histogram("doc_parse_ms").observe(doc.elapsed_ms, type=kind)
+        if doc.total_pages:
+            metrics.histogram("doc_parse_pages").observe(doc.total_pages)
+        return doc
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "active": self.active,
+            "queued": self.queued,
+            "pagesPerTask": self.pages_per_task,
+            "maxPages": self.max_pages,
+            "timeoutSeconds": self.timeout_seconds,
+            "started": self._executor is not None,
+        }
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+parse_pool = ParsePool(
+    workers=settings.DOC_PARSE_WORKERS,
+    pages_per_task=settings.DOC_PARSE_PAGES_PER_TASK,
+    max_pages=settings.DOC_PARSE_MAX_PAGES,
+    timeout_seconds=settings.DOC_PARSE_TIMEOUT_SECONDS,
+    tasks_per_worker=settings.DOC_PARSE_TASKS_PER_WORKER,
+)
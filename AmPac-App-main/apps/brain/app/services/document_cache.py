@@ -0,0 +1,188 @@
+import asyncio
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Union
+from app.core.config import get_settings
+from app.core import metrics
+from app.core.firebase import get_db
+
+settings = get_settings()
+
+FIRESTORE_MAX_TEXT = 900_000  # Firestore documents are capped at 1MiB
+
+
+def sha256_file(path: str, chunk_bytes: int = 1024 * 1024) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_bytes), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def sha256_source(source: Union[bytes, str]) -> str:
+    """Hash of a document's bytes, or of the file at a path."""
+    return hashlib.sha256(source).hexdigest() if isinstance(source, bytes) else sha256_file(source)
+
+
+class DocumentCache:
+    """
+    Content-addressed results for documents we have already seen, keyed by the
+    SHA-256 of their bytes: extracted text and page counts, and the
+    DocumentAnalysisAgent output. Last year's tax return arriving again costs a hash,
+    not a parse and an analysis.
+
+    Entries are JSON files under `directory` (<sha[:2]>/<sha>.json), evicted least
+    recently used past `max_bytes`; a hit touches the file's mtime so the order
+    survives restarts. With `use_firestore`, entries are also written to Firestore
+    and local misses are looked up there, so instances share what any one has parsed.
+    """
+
+    def __init__(self, directory: Optional[str], max_bytes: int, use_firestore: bool = False,
+                 collection: str = "document_cache", db_factory: Callable = get_db):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.use_firestore = use_firestore
+        self.collection = collection
+        self.db_factory = db_factory
+        self._sizes: "Optional[OrderedDict[str, int]]" = None  # sha -> bytes on disk, oldest first
+        self._total = 0
+        self._lock = threading.Lock()  # Disk work runs in threads
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.directory) or self.use_firestore
+
+    def _path(self, sha: str) -> str:
+        return os.path.join(self.directory, sha[:2], f"{sha}.json")
+
+    def _load_index(self):
+        if self._sizes is not None:
+            return
+        found = []
+        if os.path.isdir(self.directory):
+            for root, _, names in os.walk(self.directory):
+                for name in names:
+                    if name.endswith(".json"):
+                        stat = os.stat(os.path.join(root, name))
+                        found.append((stat.st_mtime, name[:-5], stat.st_size))
+        self._sizes = OrderedDict((sha, size) for _, sha, size in sorted(found))
+        self._total = sum(self._sizes.values())
+        self._export()
+
+    def _export(self):
+        metrics.gauge("doc_cache_bytes").set(self._total)
+        metrics.gauge("doc_cache_entries").set(len(self._sizes or {}))
+
+    def _read_local(self, sha: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            self._load_index()
+            if sha not in self._sizes:
+                return None
+            try:
+                with open(self._path(sha), encoding="utf-8") as f:
+                    entry = json.load(f)
+                os.utime(self._path(sha))
+            except (OSError, ValueError) as e:
+                print(f"[DocumentCache] Dropping unreadable entry {sha[:12]}: {e}")
+                self._total -= self._sizes.pop(sha)
+                return None
+            self._sizes.move_to_end(sha)
+            return entry
+
+    def _write_local(self, sha: str, entry: Dict[str, Any]):
+        with self._lock:
+            self._load_index()
+            path = self._path(sha)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp = f"{path}.{os.getpid()}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(entry, f)
+            os.replace(tmp, path)
+            self._total += os.path.getsize(path) - self._sizes.pop(sha, 0)
+            self._sizes[sha] = os.path.getsize(path)
+            while self._total > self.max_bytes and len(self._sizes) > 1:
+                oldest, size = self._sizes.popitem(last=False)
+                self._total -= size
+                try:
+                    os.remove(self._path(oldest))
+                except FileNotFoundError:
+                    pass
+                metrics.counter("doc_cache_evictions_total").inc()
+            self._export()
+
+    def _read_firestore(self, sha: str) -> Optional[Dict[str, Any]]:
+        snapshot = self.db_factory().collection(self.collection).document(sha).get()
+        return snapshot.to_dict() if snapshot.exists else None
+
+    def _write_firestore(self, sha: str, fields: Dict[str, Any]):
+        if fields.get("parsed"):
+            # Very long texts stay local-only rather than failing the whole write
+            fields = {**fields, "parsed": {kind: parsed for kind, parsed in fields["parsed"].items()
+                                           if len(parsed.get("text") or "") <= FIRESTORE_MAX_TEXT}}
+        self.db_factory().collection(self.collection).document(sha).set(fields, merge=True)
+
+    async def get(self, sha: str) -> Optional[Dict[str, Any]]:
+        """The cached entry for these bytes, or None. Never raises."""
+        entry = None
+        try:
+            if self.directory:
+                entry = await asyncio.to_thread(self._read_local, sha)
+            if entry is None and self.use_firestore:
+                entry = await asyncio.to_thread(self._read_firestore, sha)
+                if entry is not None and self.directory:
+                    await asyncio.to_thread(self._write_local, sha, entry)
+        except Exception as e:
+            print(f"[DocumentCache] Lookup failed for {sha[:12]}: {e}")
+        return entry
+
+    async def update(self, sha: str, **fields):
+        """Merges `fields` into the entry for these bytes (parse results and analysis arrive separately)."""
+        try:
+            entry = {**(await self.get(sha) or {}), **fields, "sha256": sha, "updatedAt": time.time()}
+            if self.directory:
+                await asyncio.to_thread(self._write_local, sha, entry)
+            if self.use_firestore:
+                await asyncio.to_thread(self._write_firestore, sha, {**fields, "sha256": sha, "updatedAt": entry["updatedAt"]})
+        except Exception as e:
+            print(f"[DocumentCache] Store failed for {sha[:12]}: {e}")
+
+    async def get_parsed(self, sha: str, kind: str) -> Optional[Dict[str, Any]]:
+        """Extracted text for these bytes as parsed by file type `kind` ("pdf", "docx"...)."""
+        parsed = ((await self.get(sha) or {}).get("parsed") or {}).get(kind) if self.enabled else None
+        metrics.counter("doc_cache_lookups_total").inc(kind="parse", result="hit" if parsed else "miss")
+        return parsed
+
+    async def put_parsed(self, sha: str, kind: str, parsed: Dict[str, Any], filename: str):
+        if self.enabled:
+            existing = (await self.get(sha) or {}).get("parsed") or {}
+            await self.update(sha, parsed={**existing, kind: parsed}, filename=filename)
+
+    async def get_analysis(self, sha: str) -> Optional[Dict[str, Any]]:
+        analysis = (await self.get(sha) or {}).get("analysis") if self.enabled else None
+        metrics.counter("doc_cache_lookups_total").inc(kind="analysis", result="hit" if analysis else "miss")
+        return analysis
+
+    async def put_analysis(self, sha: str, analysis: Dict[str, Any]):
+        if self.enabled:
+            await self.update(sha, analysis=analysis)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "directory": self.directory,
+            "entries": len(self._sizes) if self._sizes is not None else None,
+            "bytes": self._total,
+            "maxBytes": self.max_bytes,
+            "firestore": self.use_firestore,
+        }
+
+
+document_cache = DocumentCache(
+    settings.DOCUMENT_CACHE_DIR,
+    max_bytes=settings.DOCUMENT_CACHE_MAX_MB * 1024 * 1024,
+    use_firestore=settings.DOCUMENT_CACHE_FIRESTORE,
+    collection=settings.DOCUMENT_CACHE_COLLECTION,
+)
@@ -0,0 +1,370 @@
+import math
+import re
+import time
+import zlib
+from collections import Counter
+from dataclasses import dataclass, field
+from datetime import datetime
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+import numpy as np
+from app.core import metrics
+from app.services.search_index import index_terms
+
+UNKNOWN = "Unknown"
+
+# Seed examples per document type, in the wording of the forms and statements borrowers
+# actually send. The classifier is these averaged into one centroid per type; fit() can
+# replace them with a labeled corpus.
+TRAINING_EXAMPLES: Dict[str, List[str]] = {
+    "Tax Return": [
+        "Form 1040 U.S. Individual Income Tax Return Department of the Treasury Internal Revenue Service "
+        "filing status single married filing jointly head of household dependents wages salaries tips "
+        "taxable interest ordinary dividends total income adjusted gross income standard deduction "
+        "taxable income total tax federal income tax withheld refund amount you owe sign here",
+        "Form 1120-S U.S. Income Tax Return for an S Corporation employer identification number "
+        "gross receipts or sales returns and allowances cost of goods sold gross profit compensation of "
+        "officers salaries and wages repairs bad debts rents taxes and licenses depreciation "
+        "ordinary business income loss shareholders Schedule K-1 tax year",
+        "Form 1065 U.S. Return of Partnership Income partners distributive share guaranteed payments "
+        "to partners ordinary business income loss Schedule K-1 Schedule B-1 tax year beginning ending",
+        "Form 1120 U.S. Corporation Income Tax Return taxable income before net operating loss deduction "
+        "total tax estimated tax payments overpayment amount owed Schedule C dividends Schedule J tax computation",
+        "Schedule C Form 1040 Profit or Loss From Business sole proprietorship principal business code "
+        "gross receipts net profit or loss self-employment tax Schedule SE Internal Revenue Service",
+    ],
+    "Bank Statement": [
+        "account statement statement period account number beginning balance deposits and other credits "
+        "withdrawals and other debits checks paid ending balance daily ending balance summary",
+        "business checking account summary opening balance total deposits total withdrawals service fees "
+        "closing balance transaction detail date description amount balance direct deposit ach debit",
+        "bank statement for the period customer service member fdic account activity posted date "
+        "check number card purchase atm withdrawal online transfer overdraft nsf fee returned item new balance",
+        "savings account statement previous balance interest paid annual percentage yield earned "
+        "deposits electronic withdrawals balance forward routing number",
+    ],
+    "P&L Statement": [
+        "profit and loss statement for the period ended revenue sales cost of goods sold gross profit "
+        "operating expenses payroll rent utilities advertising total operating expenses operating income net income",
+        "income statement year to date ytd total revenue cogs gross margin general and administrative "
+        "expenses depreciation interest expense net profit before tax accrual basis",
+        "profit loss january through december total income cost of sales gross profit expenses "
+        "office supplies insurance professional fees total expenses net operating income net income",
+    ],
+    "Business License": [
+        "business license city of license number issued to business name doing business as location "
+        "license type expiration date this license must be posted in a conspicuous place",
+        "certificate of occupancy permit number issued by the department of licensing valid through "
+        "business tax certificate registration number effective date expires non-transferable",
+        "county business license seller's permit state board of equalization account number "
+        "issue date expiration date licensee owner business address renew annually",
+    ],
+}
+
+# Classifying by name alone, for documents with no text to read
+NAME_KEYWORDS: List[Tuple[str, Tuple[str, ...]]] = [
+    ("Tax Return", ("tax", "1040", "1120", "1065", "return")),
+    ("Bank Statement", ("bank", "statement", "stmt")),
+    ("Business License", ("license", "permit")),
+    ("P&L Statement", ("p&l", "pnl", "profit")),
+]
+
+UNIGRAM_WEIGHT = 1.0
+BIGRAM_WEIGHT = 1.5  # "gross receipts", "ending balance" carry more than either word
+
+
+@lru_cache(maxsize=131072)
+def _feature(feature: str, dim: int) -> Tuple[int, float]:
+    # crc32 like vector_index: stable across processes; the top bit picks the sign
+    h = zlib.crc32(feature.encode("utf-8"))
+    return h % dim, 1.0 if (h >> 31) & 1 else -1.0
+
+
+def hashed_features(texts: Sequence[str], dim: int) -> np.ndarray:
+    """
+    Feature-hashed unigram + bigram vectors for a batch of texts, one L2-normalized row
+    each, weighted by 1 + log(count). The per-text work is only counting terms; the
+    matrix is assembled in one np.bincount over every (row, bucket, weight) in the batch.
+    """
+    rows: List[int] = []
+    cols: List[int] = []
+    vals: List[float] = []
+    for row, text in enumerate(texts):
+        terms = index_terms(text)
+        counts = Counter("w:" + term for term in terms)
+        counts.update("b:" + first + " " + second for first, second in zip(terms, terms[1:]))
+        for name, count in counts.items():
+            col, sign = _feature(name, dim)
+            rows.append(row)
+            cols.append(col)
+            vals.append(sign * (BIGRAM_WEIGHT if name[0] == "b" else UNIGRAM_WEIGHT) * (1.0 + math.log(count)))
+    flat = np.asarray(rows, dtype=np.int64) * dim + np.asarray(cols, dtype=np.int64)
+    matrix = np.bincount(flat, weights=np.asarray(vals, dtype=np.float64),
+                         minlength=len(texts) * dim).reshape(len(texts), dim).astype(np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.where(norms > 0, norms, 1.0)
+
+
+# --- Field extraction ---------------------------------------------------------------
+
+# "$1,234.56", "(1,234)", "145,000.", "-2,500": grouped, decimal or $-marked, or 3+ digits,
+# so form line numbers ("11", "8b") between a label and its amount aren't taken for it
+_AMOUNT = re.compile(r"\(?-?(?:\$ ?)?(?:\d{1,3}(?:,\d{3})+|\d{3,})(?:\.\d{1,2})?\)?|\(?-?\$ ?\d+(?:\.\d{1,2})?\)?|\(?-?\d+\.\d{2}\)?")
+_ASIDE = re.compile(r"\([^()\d]*[A-Za-z][^()]*\)")  # "(attach Form 1125-A)", "(loss)": words, not a negative amount
+_DATE = r"(?:\d{1,2}/\d{1,2}/\d{2,4}|\d{4}-\d{2}-\d{2}|[A-Z][a-z]{2,8}\.? \d{1,2},? \d{4})"
+_DATES = re.compile(_DATE)  # Removed before looking for an amount: "on 01/31/2024 $5,000.00" isn't 2024
+_DATE_FORMATS = ("%m/%d/%Y", "%m/%d/%y", "%Y-%m-%d", "%B %d, %Y", "%B %d %Y", "%b %d, %Y", "%b %d %Y", "%b. %d, %Y")
+
+
+def parse_amount(raw: str) -> Optional[float]:
+    negative = raw.strip().startswith(("(", "-"))
+    digits = re.sub(r"[^\d.]", "", raw)
+    try:
+        value = float(digits)
+    except ValueError:
+        return None
+    return -value if negative else value
+
+
+def parse_date(raw: str) -> str:
+    """ISO date when the format is recognized, otherwise the text as written."""
+    cleaned = " ".join(raw.split())
+    for fmt in _DATE_FORMATS:
+        try:
+            return datetime.strptime(cleaned, fmt).date().isoformat()
+        except ValueError:
+            continue
+    return cleaned
+
+
+def _labeled_amount(lines: List[str], labels: Sequence["re.Pattern"]) -> Optional[float]:
+    """
+    The amount printed against the first line carrying one of `labels` (tried in order):
+    the first amount after the label on that line (line numbers in between are too
+    short to count, parenthesized asides and dates are skipped), or else the first on the next
+    line, where tabular layouts wrap the value under its label.
+    """
+    for label in labels:
+        for i, line in enumerate(lines):
+            match = label.search(line)
+            if not match:
+                continue
+            amount = _AMOUNT.search(_DATES.sub(" ", _ASIDE.sub(" ", line[match.end():])))
+            if amount is None and i + 1 < len(lines) and not any(other.search(lines[i + 1]) for other in labels):
+                amount = _AMOUNT.search(_DATES.sub(" ", lines[i + 1]))
+            if amount is not None:
+                return parse_amount(amount.group(0))
+    return None
+
+
+def _first(text: str, patterns: Sequence["re.Pattern"], convert: Callable[[str], Any] = str.strip) -> Any:
+    for pattern in patterns:
+        match = pattern.search(text)
+        if match:
+            return convert(match.group(1))
+    return None
+
+
+def _labels(*patterns: str) -> Tuple["re.Pattern", ...]:
+    return tuple(re.compile(r"\b" + pattern + r"\b", re.IGNORECASE) for pattern in patterns)
+
+
+# Amount fields per type: label patterns tried in order, most specific first
+AMOUNT_FIELDS: Dict[str, Dict[str, Tuple["re.Pattern", ...]]] = {
+    "Tax Return": {
+        "adjusted_gross_income": _labels(r"adjusted gross income"),
+        "total_income": _labels(r"total income"),
+        "taxable_income": _labels(r"taxable income"),
+        "wages": _labels(r"wages, salaries,? (?:and )?tips", r"salaries and wages", r"wages"),
+        "business_income": _labels(r"ordinary business income(?: \(loss\))?", r"business income(?: or \(loss\))?", r"net profit"),
+        "gross_receipts": _labels(r"gross receipts(?: or sales)?"),
+        "cost_of_goods_sold": _labels(r"cost of goods(?: sold)?"),
+        "officer_compensation": _labels(r"compensation of officers", r"officer compensation"),
+        "total_tax": _labels(r"total tax"),
+    },
+    "Bank Statement": {
+        "beginning_balance": _labels(r"beginning balance", r"opening balance", r"previous balance", r"balance forward"),
+        "ending_balance": _labels(r"ending balance", r"closing balance", r"new balance"),
+        "total_deposits": _labels(r"total deposits(?: and (?:other )?credits)?", r"deposits and (?:other )?(?:credits|additions)"),
+        "total_withdrawals": _labels(r"total withdrawals(?: and (?:other )?debits)?",
+                                     r"withdrawals and (?:other )?(?:debits|subtractions)"),
+    },
+    "P&L Statement": {
+        # A bare "Revenue"/"Sales" only where it starts the line, so "Cost of sales" isn't revenue
+        "total_revenue": _labels(r"total (?:revenue|income|sales)", r"net sales", r"gross sales")
+                         + (re.compile(r"^\s*(?:revenues?|sales)\b", re.IGNORECASE | re.MULTILINE),),
+        "cogs": _labels(r"cost of (?:goods sold|sales)", r"cogs"),
+        "gross_profit": _labels(r"gross (?:profit|margin)"),
+        "total_expenses": _labels(r"total (?:operating )?expenses"),
+        "net_income": _labels(r"net (?:income|profit)(?: \(loss\))?", r"net (?:operating )?income"),
+    },
+    "Business License": {},
+}
+
+_FORM = re.compile(r"\bform\s+(1040(?:-SR)?|1120(?:-S)?|1065)\b", re.IGNORECASE)
+_TAX_YEAR = [
+    re.compile(r"\b(?:tax year|calendar year|for the year)\s*(?:beginning\s*)?(?:[A-Za-z.]+ \d{1,2},?\s*)?(\d{4})\b", re.IGNORECASE),
+    re.compile(r"\bform\s+(?:1040(?:-SR)?|1120(?:-S)?|1065)\s*\(?(\d{4})\)?", re.IGNORECASE),
+    re.compile(r"\b((?:19|20)\d{2})\b"),
+]
+_PERIOD = re.compile(r"(?:statement period|for the period|period)\s*:?\s*(?:from\s+)?(" + _DATE + r")\s*(?:to|through|thru|-|–)\s*(" + _DATE + ")",
+                     re.IGNORECASE)
+_PERIOD_ENDED = [
+    re.compile(r"for the (?:period|year|month|quarter|(?:twelve|six|three) months) end(?:ed|ing)\s+(" + _DATE + ")", re.IGNORECASE),
+    re.compile(r"\b(?:period ending|as of)\s+(" + _DATE + ")", re.IGNORECASE),
+]
+_YTD = re.compile(r"\b(?:ytd|year to date)\b[^\n\d]{0,20}((?:19|20)\d{2})?", re.IGNORECASE)
+_BANK_NAME = re.compile(r"^\s*([A-Z][\w&.' ]{0,40}?\b(?:Bank|Credit Union|Bancorp|Savings)\b(?:[\w&.', ]{0,20}?(?:N\.A\.|NA))?)",
+                        re.MULTILINE)
+_ACCOUNT = re.compile(r"\baccount (?:number|no\.?|#)\s*:?\s*[x*•\-\d ]*?(\d{4})\b", re.IGNORECASE)
+_NSF = re.compile(r"\b(?:nsf|insufficient funds|returned item)\b", re.IGNORECASE)
+_LICENSE_NUMBER = re.compile(r"\b(?:license|permit|certificate|registration)\s*(?:number|no\.?|#)\s*:?\s*([A-Z0-9][A-Z0-9\-]{3,})",
+                             re.IGNORECASE)
+_ISSUED = [re.compile(r"\b(?:issue date|date issued|issued(?: on)?|effective(?: date)?)\s*:?\s*(" + _DATE + ")", re.IGNORECASE)]
+_EXPIRES = [re.compile(r"\b(?:expiration date|expiration|expires(?: on)?|valid (?:through|until))\s*:?\s*(" + _DATE + ")",
+                       re.IGNORECASE)]
+_JURISDICTION = re.compile(r"\b((?:City|County|State|Town|Village) of [A-Z][A-Za-z]+(?: [A-Z][A-Za-z]+){0,2})")
+_BUSINESS_NAME = re.compile(r"\b(?:business name|doing business as|dba|licensee|issued to)\s*:?\s*([^\n]{2,80})", re.IGNORECASE)
+
+
+def extract_fields(document_type: str, text: str) -> Dict[str, Any]:
+    """Fields of a document of `document_type` found in its text; only what was found is returned."""
+    lines = text.splitlines()
+    fields: Dict[str, Any] = {}
+    for name, labels in AMOUNT_FIELDS.get(document_type, {}).items():
+        value = _labeled_amount(lines, labels)
+        if value is not None:
+            fields[name] = value
+
+    if document_type == "Tax Return":
+        fields["form_type"] = _first(text, [_FORM], str.upper)
+        fields["tax_year"] = _first(text[:3000], _TAX_YEAR, int)
+    elif document_type == "Bank Statement":
+        fields["bank_name"] = _first(text[:2000], [_BANK_NAME])
+        fields["account_last4"] = _first(text, [_ACCOUNT])
+        period = _PERIOD.search(text)
+        if period:
+            fields["period_start"], fields["period_end"] = parse_date(period.group(1)), parse_date(period.group(2))
+        fields["nsf_count"] = sum(1 for line in lines if _NSF.search(line))  # "NSF FEE - INSUFFICIENT FUNDS" is one item
+    elif document_type == "P&L Statement":
+        period = _PERIOD.search(text)
+        ended = _first(text, _PERIOD_ENDED, parse_date)
+        ytd = _YTD.search(text)
+        if period:
+            fields["period"] = f"{parse_date(period.group(1))} to {parse_date(period.group(2))}"
+        elif ended:
+            fields["period"] = f"ended {ended}"
+        elif ytd:
+            fields["period"] = f"YTD {ytd.group(1)}" if ytd.group(1) else "YTD"
+    elif document_type == "Business License":
+        fields["license_number"] = _first(text, [_LICENSE_NUMBER])
+        fields["issue_date"] = _first(text, _ISSUED, parse_date)
+        fields["expiration_date"] = _first(text, _EXPIRES, parse_date)
+        fields["jurisdiction"] = _first(text, [_JURISDICTION])
+        fields["business_name"] = _first(text, [_BUSINESS_NAME])
+    return {name: value for name, value in fields.items() if value is not None}
+
+
+# --- Classification -----------------------------------------------------------------
+
+@dataclass
+class Classification:
+    document_type: str
+    confidence: float
+    method: str  # "model", or "filename" when there was no text to read
+    scores: Dict[str, float] = field(default_factory=dict)  # Cosine similarity to each type
+    fields: Dict[str, Any] = field(default_factory=dict)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "documentType": self.document_type,
+            "confidence": self.confidence,
+            "method": self.method,
+            "scores": self.scores,
+            "fields": self.fields,
+        }
+
+
+class DocumentClassifier:
+    """
+    Nearest-centroid document classifier over hashed word and word-pair features.
+
+    A document is its file name plus the first `max_chars` of its text (the first page
+    says what a document is), hashed into a `dim`-wide vector; its type is the centroid
+    with the highest cosine similarity, with a softmax over the similarities as the
+    confidence. Below `min_similarity` it is Unknown. A batch is one feature matrix
+    and one matrix product, so classifying hundreds of documents costs little more
+    than counting their words.
+    """
+
+    def __init__(self, examples: Dict[str, List[str]] = TRAINING_EXAMPLES, dim: int = 4096, max_chars: int = 8000,
+                 min_similarity: float = 0.08, temperature: float = 0.05, min_text_chars: int = 40):
+        self.dim = dim
+        self.max_chars = max_chars
+        self.min_similarity = min_similarity
+        self.temperature = temperature
+        self.min_text_chars = min_text_chars
+        self.labels: List[str] = []
+        self.centroids = np.zeros((0, dim), dtype=np.float32)
+        self.fit([text for texts in examples.values() for text in texts],
+                 [label for label, texts in examples.items() for _ in texts])
+
+    def fit(self, texts: Sequence[str], labels: Sequence[str]):
+        """Replaces the centroids with the normalized mean of each label's example vectors."""
+        features = hashed_features(texts, self.dim)
+        self.labels = list(dict.fromkeys(labels))
+        centroids = np.stack([features[[i for i, label in enumerate(labels) if label == name]].mean(axis=0)
+                              for name in self.labels])
+        self.centroids = centroids / np.linalg.norm(centroids, axis=1, keepdims=True)
+
+    def _document(self, file_name: str, text: str) -> str:
+        # "tax_return_2023.pdf" -> "tax return 2023 pdf"
+        return re.sub(r"[_\-.]+", " ", file_name or "") + "\n" + text[:self.max_chars]
+
+    def similarities(self, documents: Sequence[Tuple[str, str]]) -> np.ndarray:
+        """(documents x types) cosine similarities, columns in `self.labels` order."""
+        if not documents:
+            return np.zeros((0, len(self.labels)), dtype=np.float32)
+        return hashed_features([self._document(name, text) for name, text in documents], self.dim) @ self.centroids.T
+
+    def _by_name(self, file_name: str) -> Classification:
+        lower = (file_name or "").lower()
+        for document_type, keywords in NAME_KEYWORDS:
+            if any(keyword in lower for keyword in keywords):
+                return Classification(document_type, 0.5, "filename")
+        return Classification(UNKNOWN, 0.0, "filename")
+
+    def classify_many(self, documents: Sequence[Tuple[str, str]], extract: bool = True) -> List[Classification]:
+        """Classifies (file name, text) pairs in one pass; with `extract`, also pulls each one's fields."""
+        started = time.perf_counter()
+        readable = [i for i, (_, text) in enumerate(documents) if len((text or "").strip()) >= self.min_text_chars]
+        sims = self.similarities([documents[i] for i in readable])
+        results: List[Optional[Classification]] = [None] * len(documents)
+        if readable:
+            logits = (sims - sims.max(axis=1, keepdims=True)) / self.temperature
+            probs = np.exp(logits)
+            probs /= probs.sum(axis=1, keepdims=True)
+            best = sims.argmax(axis=1)
+            for row, i in enumerate(readable):
+                top = int(best[row])
+                known = sims[row, top] >= self.min_similarity
+                results[i] = Classification(
+                    self.labels[top] if known else UNKNOWN,
+                    round(float(probs[row, top]), 3) if known else 0.0,
+                    "model",
+                    scores={label: round(float(sims[row, col]), 3) for col, label in enumerate(self.labels)},
+                )
+        for i, (name, text) in enumerate(documents):
+            result = results[i] = results[i] or self._by_name(name)
+            if extract and result.document_type != UNKNOWN and text:
+                result.fields = extract_fields(result.document_type, text)
+            metrics.counter("doc_classify_total").inc(type=result.document_type, method=result.method)
+        metrics.histogram("doc_classify_batch_ms").observe((time.perf_counter() - started) * 1000)
+        metrics.histogram("doc_classify_batch_size").observe(len(documents))
+        return results
+
+    def classify(self, file_name: str, text: str, extract: bool = True) -> Classification:
+        return self.classify_many([(file_name, text)], extract=extract)[0]
+
+
+document_classifier = DocumentClassifier()
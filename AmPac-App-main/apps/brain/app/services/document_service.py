@@ -1,37 +1,75 @@
-import uuid
 import asyncio
+import os
+import posixpath
+import uuid
+from typing import Optional
+from app.core.config import get_settings
 from app.schemas.documents import ExtractionResponse, ExtractionData
+from app.services.doc_parser import DocumentParser
+from app.services.document_classifier import document_classifier, extract_fields
+from app.services.uploads import download_url, fetch_stored
+
+settings = get_settings()
+
+# document_type values callers send -> the classifier's type names
+DOCUMENT_TYPES = {
+    "tax_return": "Tax Return", "1040": "Tax Return", "1120": "Tax Return", "1065": "Tax Return",
+    "bank_statement": "Bank Statement",
+    "p&l": "P&L Statement", "pnl": "P&L Statement", "profit_and_loss": "P&L Statement", "income_statement": "P&L Statement",
+    "business_license": "Business License", "license": "Business License",
+}
+
 
 class DocumentService:
-    async def extract(self, doc_type: str, url: str) -> ExtractionResponse:
-        # Simulate processing time
-        await asyncio.sleep(2)
-        
+    async def _fetch(self, url: str, user_id: Optional[str]) -> Optional[str]:
+        """
+        A local copy of the document: downloaded for http(s) URLs (allowlisted hosts
+        only), else read from Storage by blob path, which must be under the user's own
+        uploads/{uid}/ folder.
+        """
+        if url.startswith(("http://", "https://")):
+            return await download_url(url)
+        if url.startswith("gs://"):
+            url = url[5:].split("/", 1)[-1]  # gs://bucket/path -> path
+        blob_path = posixpath.normpath(url.lstrip("/"))
+        if not user_id or not blob_path.startswith(f"{settings.UPLOAD_STORAGE_PREFIX}/{user_id}/"):
+            print(f"[DocumentService] Refusing to read {url}: not under the caller's uploads")
+            return None
+        return await fetch_stored(blob_path)
+
+    async def extract(self, doc_type: str, url: str, user_id: Optional[str] = None) -> ExtractionResponse:
+        """
+        Fetches and parses the document, then extracts its fields as `doc_type`; the
+        classifier's type is used when `doc_type` isn't one we know. Storage paths are
+        only read for `user_id`'s own uploads.
+        """
         extraction_id = f"ext_{uuid.uuid4().hex[:8]}"
-        
-        if "tax" in doc_type.lower() or "1040" in doc_type:
-            return ExtractionResponse(
-                extraction_id=extraction_id,
-                status="completed",
-                confidence=0.98,
-                data=ExtractionData(
-                    tax_year=2023,
-                    adjusted_gross_income=150000.0,
-                    wages=120000.0,
-                    business_income=30000.0,
-                    raw_data={"form": "1040", "filer": "John Doe"}
-                )
-            )
+        path = await self._fetch(url, user_id)
+        if path is None:
+            return ExtractionResponse(extraction_id=extraction_id, status="failed", confidence=0.0, data=ExtractionData())
+        try:
+            parsed = await DocumentParser.parse_source(os.path.basename(url.split("?", 1)[0]), path)
+        finally:
+            os.remove(path)
+        if parsed.failed:
+            return ExtractionResponse(extraction_id=extraction_id, status="failed", confidence=0.0,
+                                      data=ExtractionData(raw_data={"error": parsed.error}))
+
+        classification = await asyncio.to_thread(document_classifier.classify, parsed.filename, parsed.text)
+        requested = DOCUMENT_TYPES.get(doc_type.lower().strip())
+        if requested and requested != classification.document_type:
+            fields = await asyncio.to_thread(extract_fields, requested, parsed.text)
+            confidence = max(0.0, classification.scores.get(requested, 0.0))
         else:
-            return ExtractionResponse(
-                extraction_id=extraction_id,
-                status="completed",
-                confidence=0.95,
-                data=ExtractionData(
-                    total_deposits=45000.0,
-                    ending_balance=12500.0,
-                    raw_data={"bank": "Chase", "period": "Oct 2023"}
-                )
-            )
+            fields, confidence = classification.fields, classification.confidence
+
+        known = {name: value for name, value in fields.items() if name in ExtractionData.model_fields}
+        return ExtractionResponse(
+            extraction_id=extraction_id,
+            status="completed",
+            confidence=confidence,
+            data=ExtractionData(**known, raw_data={"document_type": requested or classification.document_type,
+                                                   "pages": parsed.total_pages, **fields}),
+        )
 
 document_service = DocumentService()
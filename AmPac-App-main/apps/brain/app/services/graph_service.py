@@ -9,6 +9,7 @@ from msgraph.generated.models.attendee_base import AttendeeBase
 from msgraph.generated.models.email_address import EmailAddress
 from msgraph.generated.models.online_meeting import OnlineMeeting
 from app.services.token_storage import TokenStorage
+from app.services.single_flight import SingleFlight
 from azure.identity import ClientSecretCredential, OnBehalfOfCredential
 # Note: OnBehalfOfCredential is for middle-tier. For refresh token flow we might need to manually refresh or use a different cred.
 # Ideally we use AuthorizationCodeCredential with the refresh token, but Azure Identity's implementation expects a client_secret too.
@@ -16,6 +17,9 @@ import time
 
 settings = get_settings()
 
+# Several borrowers booking against the same officer ask for the same schedule at once
+schedule_flights = SingleFlight("graph_schedule")
+
 class GraphService:
     """
     Service for interacting with Microsoft Graph API (Teams, Outlook).
@@ -123,7 +127,10 @@ class GraphService:
                 availability_view_interval=30
             )
             
-            result = await self.client.users.by_user_id(staff_email).calendar.get_schedule.post(request_body)
+            key = (staff_email.lower(), start_date.isoformat(), end_date.isoformat())
+            result = await schedule_flights.do(
+                key, lambda: self.client.users.by_user_id(staff_email).calendar.get_schedule.post(request_body)
+            )
             return result.value
         except Exception as e:
             print(f"Error fetching availability for {staff_email}: {e}")
@@ -1,10 +1,15 @@
 import asyncio
 import json
 import time
-from typing import List, Dict, Any, Optional
+from typing import AsyncIterator, List, Dict, Any, Optional, Tuple
 import httpx
 from groq import Groq
 from app.core.config import get_settings
+from app.services.llm_cache import llm_response_cache
+from app.services.llm_providers import llm_providers
+from app.services.intent_router import intent_router
+from app.services.llm_metrics import LLMCall
+from app.services.model_router import RouteChoice, model_router
 
 settings = get_settings()
 
@@ -12,22 +17,17 @@ class GroqService:
     """
     Groq API integration service for AI chat completions.
     Provides async interface with error handling and fallback responses.
+    Requests go through the provider pool (llm_providers), which can hedge or
+    fail over to other OpenAI-compatible endpoints configured in LLM_PROVIDERS.
     """
     
     def __init__(self, api_key: Optional[str] = None, model: str = "llama3-8b-8192"):
         self.api_key = api_key or settings.GROQ_API_KEY
         self.model = model or settings.GROQ_MODEL
-        self.timeout = 10  # 10 second timeout
-        self.base_url = "https://api.groq.com/openai/v1"
+        self.timeout = settings.LLM_PROVIDER_TIMEOUT_SECONDS
         
-        # Initialize async HTTP client for direct API calls
-        self.http_client = httpx.AsyncClient(
-            timeout=httpx.Timeout(self.timeout),
-            headers={
-                "Authorization": f"Bearer {self.api_key}" if self.api_key else "",
-                "Content-Type": "application/json"
-            }
-        )
+        # Upstream endpoints (Groq first, then LLM_PROVIDERS) with hedging and failover
+        self.providers = llm_providers
         
         # Initialize Groq client if API key is available (fallback to sync client)
         if self.api_key:
@@ -36,77 +36,243 @@ class GroqService:
             self.client = None
             print("⚠️ Groq API Key missing. Fallback mode enabled.")
     
-    async def chat_completion(self, messages: List[Dict[str, str]]) -> str:
+    def _quick_reply(self, messages: List[Dict[str, str]], task: str) -> Optional[str]:
+        """
+        Canned reply for pure small talk ("hi", "thanks!") on chat-style tasks, skipping the LLM.
+        """
+        if task not in settings.LLM_SHORT_CIRCUIT_TASKS:
+            return None
+        return intent_router.quick_reply(messages)
+    
+    def _build_payload(self, messages: List[Dict[str, str]], task: str, max_tokens: Optional[int], stream: bool) -> Tuple[Dict[str, Any], RouteChoice]:
+        """
+        Picks the model and parameters for `task` from the routing table. A max_tokens from
+        the context builder can only lower the route's limit.
+        """
+        choice = model_router.select(task)
+        route = choice.route
+        payload = {
+            "model": choice.model,
+            "messages": messages,
+            "temperature": route.temperature,
+            "max_tokens": min(route.max_tokens, max_tokens) if max_tokens else route.max_tokens,
+            "stream": stream
+        }
+        if route.json_mode:
+            payload["response_format"] = {"type": "json_object"}
+        if stream:
+            payload["stream_options"] = {"include_usage": True}
+        return payload, choice
+    
+    async def chat_completion(self, messages: List[Dict[str, str]], cache: bool = True, lane: Optional[str] = None, max_tokens: Optional[int] = None, task: str = "default") -> str:
         """
         Generate chat completion using Groq API with async HTTP client.
         
         Args:
             messages: List of message dicts with 'role' and 'content' keys
+            cache: Serve/store the answer via the response cache; pass False for personalized prompts
+            lane: Rate governor priority, "interactive" or "batch" (default: the task's route)
+            max_tokens: Completion limit chosen by the context builder (capped by the route)
+            task: Call-site tag selecting model and parameters from LLM_ROUTES
             
         Returns:
             Generated response text
         """
-        if not self.api_key:
+        call = LLMCall(task, model_router.route(task).model, messages)
+        quick = self._quick_reply(messages, task)
+        if quick is not None:
+            call.finish("short_circuit")
+            return quick
+        
+        if not self.providers.providers:
+            call.finish("fallback")
             return self._get_fallback_response(messages)
         
+        # Use async HTTP client for better performance
+        payload, choice = self._build_payload(messages, task, max_tokens, stream=False)
+        model, temperature = payload["model"], payload["temperature"]
+        call.model = model
+        
+        cache = cache and llm_response_cache is not None
+        if cache:
+            cached = await llm_response_cache.get(model, temperature, messages)
+            if cached is not None:
+                call.finish("cache_hit")
+                return cached
+        
         try:
-            # Use async HTTP client for better performance
-            payload = {
-                "model": self.model,
-                "messages": messages,
-                "temperature": 0.1,
-                "max_tokens": 1024,
-                "stream": False
-            }
-            
             start_time = time.time()
-            response = await self.http_client.post(
-                f"{self.base_url}/chat/completions",
-                json=payload
-            )
+            completion = await self.providers.send(payload, messages, lane or choice.route.lane)
+            if completion is None:
+                call.finish("rate_limited")
+                return self._get_fallback_response(messages)
+            call.completion(completion)
+            response = completion.response
             
             if response.status_code == 200:
                 result = response.json()
+                call.usage(result.get("usage"))
                 processing_time = (time.time() - start_time) * 1000
-                print(f"✅ Groq API response received in {processing_time:.2f}ms")
+                print(f"✅ Groq API response received in {processing_time:.2f}ms ({task} → {model} via {completion.provider.name})")
                 
                 if result.get("choices") and len(result["choices"]) > 0:
-                    return result["choices"][0]["message"]["content"]
+                    content = result["choices"][0]["message"]["content"]
+                    call.finish("ok", content)
+                    if cache:
+                        await llm_response_cache.set(model, temperature, messages, content)
+                    return content
                 else:
                     print("⚠️ No choices in Groq API response")
+                    call.finish("fallback")
                     return self._get_fallback_response(messages)
             
-            elif response.status_code == 429:
-                print("⚠️ Groq API rate limit exceeded, using fallback")
-                return self._get_fallback_response(messages)
-            
             elif response.status_code == 401:
                 print("❌ Groq API authentication failed")
+                call.finish("http_error")
                 return self._get_fallback_response(messages)
             
             else:
                 print(f"❌ Groq API error: {response.status_code} - {response.text}")
+                call.finish("http_error")
                 return self._get_fallback_response(messages)
                 
         except httpx.TimeoutException:
             print(f"⏰ Groq API timeout after {self.timeout}s, using fallback")
+            call.finish("timeout")
             return self._get_fallback_response(messages)
             
         except httpx.RequestError as e:
             print(f"🌐 Groq API network error: {str(e)}, using fallback")
+            call.finish("network_error")
             return self._get_fallback_response(messages)
             
         except Exception as e:
             print(f"❌ Unexpected Groq API error: {str(e)}, using fallback")
+            call.finish("fallback")
             return self._get_fallback_response(messages)
     
-    async def generate_response(self, prompt: str, system_prompt: Optional[str] = None) -> str:
+    async def stream_chat_completion(self, messages: List[Dict[str, str]], cache: bool = True, lane: Optional[str] = None, max_tokens: Optional[int] = None, task: str = "default") -> AsyncIterator[str]:
+        """
+        Stream a chat completion from the Groq API, yielding content deltas as they arrive.
+        
+        Falls back to a single fallback chunk if the request fails before any content
+        was produced; a failure mid-stream ends the stream with what was already sent.
+        A cached answer is replayed as one chunk; a completed stream is stored.
+        
+        Args:
+            messages: List of message dicts with 'role' and 'content' keys
+            cache: Serve/store the answer via the response cache; pass False for personalized prompts
+            lane: Rate governor priority, "interactive" or "batch" (default: the task's route)
+            max_tokens: Completion limit chosen by the context builder (capped by the route)
+            task: Call-site tag selecting model and parameters from LLM_ROUTES
+            
+        Yields:
+            Pieces of the generated response text
+        """
+        call = LLMCall(task, model_router.route(task).model, messages, stream=True)
+        quick = self._quick_reply(messages, task)
+        if quick is not None:
+            call.finish("short_circuit")
+            yield quick
+            return
+        
+        if not self.providers.providers:
+            call.finish("fallback")
+            yield self._get_fallback_response(messages)
+            return
+        
+        payload, choice = self._build_payload(messages, task, max_tokens, stream=True)
+        model, temperature = payload["model"], payload["temperature"]
+        call.model = model
+        
+        cache = cache and llm_response_cache is not None
+        if cache:
+            cached = await llm_response_cache.get(model, temperature, messages)
+            if cached is not None:
+                call.finish("cache_hit")
+                yield cached
+                return
+        
+        emitted = False
+        completed = False
+        pieces: List[str] = []
+        start_time = time.time()
+        outcome = "cancelled"  # Until the stream ends one way or another (the client may go away)
+        try:
+            completion = await self.providers.send(payload, messages, lane or choice.route.lane, stream=True)
+            if completion is None:
+                outcome = "rate_limited"
+                yield self._get_fallback_response(messages)
+                return
+            call.completion(completion)
+            response = completion.response
+            
+            try:
+                if response.status_code != 200:
+                    body = await response.aread()
+                    print(f"❌ Groq API stream error: {response.status_code} - {body[:200]!r}")
+                    outcome = "http_error"
+                    yield self._get_fallback_response(messages)
+                    return
+                
+                async for line in completion.aiter_lines():
+                    # Server-sent events: "data: {json}" lines, terminated by "data: [DONE]"
+                    if not line.startswith("data:"):
+                        continue
+                    data = line[5:].strip()
+                    if data == "[DONE]":
+                        completed = True
+                        break
+                    try:
+                        chunk = json.loads(data)
+                    except ValueError:
+                        continue
+                    # OpenAI sends usage in a final chunk (stream_options); Groq also under x_groq
+                    call.usage(chunk.get("usage") or (chunk.get("x_groq") or {}).get("usage"))
+                    choices = chunk.get("choices") or []
+                    content = (choices[0].get("delta") or {}).get("content") if choices else None
+                    if content:
+                        if not emitted:
+                            print(f"✅ Groq API first token in {(time.time() - start_time) * 1000:.2f}ms ({task} → {model} via {completion.provider.name})")
+                        emitted = True
+                        pieces.append(content)
+                        yield content
+            finally:
+                await response.aclose()
+            
+            outcome = "ok" if completed or pieces else "fallback"
+            if cache and completed and pieces:
+                await llm_response_cache.set(model, temperature, messages, "".join(pieces))
+                
+        except httpx.TimeoutException:
+            print(f"⏰ Groq API stream timeout after {self.timeout}s")
+            outcome = "timeout"
+            if not emitted:
+                yield self._get_fallback_response(messages)
+            
+        except httpx.RequestError as e:
+            print(f"🌐 Groq API stream network error: {str(e)}")
+            outcome = "network_error"
+            if not emitted:
+                yield self._get_fallback_response(messages)
+        
+        except Exception:
+            outcome = "fallback"  # LLMService serves the fallback message
+            raise
+        
+        finally:
+            call.finish(outcome, "".join(pieces))
+    
+    async def generate_response(self, prompt: str, system_prompt: Optional[str] = None, cache: bool = True, lane: Optional[str] = None, task: str = "default") -> str:
         """
         Generate a response for a single prompt with optional system message.
         
         Args:
             prompt: User input prompt
             system_prompt: Optional system instruction
+            cache: Allow the response cache (False for personalized prompts)
+            lane: Rate governor priority override, "interactive" or "batch"
+            task: Call-site tag selecting model and parameters from LLM_ROUTES
             
         Returns:
             Generated response text
@@ -118,7 +284,21 @@ class GroqService:
         
         messages.append({"role": "user", "content": prompt})
         
-        return await self.chat_completion(messages)
+        return await self.chat_completion(messages, cache=cache, lane=lane, task=task)
+    
+    async def stream_response(self, prompt: str, system_prompt: Optional[str] = None, cache: bool = True, lane: Optional[str] = None, task: str = "default") -> AsyncIterator[str]:
+        """
+        Streaming counterpart of generate_response.
+        """
+        messages = []
+        
+        if system_prompt:
+            messages.append({"role": "system", "content": system_prompt})
+        
+        messages.append({"role": "user", "content": prompt})
+        
+        async for piece in self.stream_chat_completion(messages, cache=cache, lane=lane, task=task):
+            yield piece
     
     async def health_check(self) -> bool:
         """
@@ -127,7 +307,7 @@ class GroqService:
         Returns:
             True if service is healthy, False otherwise
         """
-        if not self.api_key:
+        if not self.providers.providers:
             return False
         
         try:
@@ -135,7 +315,7 @@ class GroqService:
                 {"role": "user", "content": "Hello"}
             ]
             
-            response = await self.chat_completion(test_messages)
+            response = await self.chat_completion(test_messages, cache=False)
             # Check if we got a real response (not fallback)
             return len(response) > 0 and "technical difficulties" not in response.lower()
             
@@ -143,9 +323,8 @@ class GroqService:
             return False
     
     async def close(self):
-        """Close the HTTP client connection."""
-        if self.http_client:
-            await self.http_client.aclose()
+        """Close the upstream HTTP client connections."""
+        await self.providers.close()
     
     def _get_fallback_response(self, messages: List[Dict[str, str]]) -> str:
         """
@@ -155,31 +334,15 @@ class GroqService:
         if not messages:
             return "I'm currently experiencing technical difficulties. Please try again later."
         
-        # Get the last user message for analysis
-        last_message = ""
-        conversation_context = []
-        
-        for msg in messages:
-            if msg.get("role") == "user":
-                conversation_context.append(msg.get("content", ""))
-                last_message = msg.get("content", "").lower()
-            elif msg.get("role") == "system":
-                # Extract context from system messages
-                system_content = msg.get("content", "").lower()
-                if "application" in system_content:
-                    conversation_context.append("application_context")
-                elif "home" in system_content or "dashboard" in system_content:
-                    conversation_context.append("home_context")
-                elif "spaces" in system_content or "coworking" in system_content:
-                    conversation_context.append("spaces_context")
-        
-        # Analyze conversation history for better context
-        full_conversation = " ".join(conversation_context).lower()
+        # Classify the last user message in one pass with the precompiled intent router
+        user_messages = [msg.get("content", "") for msg in messages if msg.get("role") == "user"]
+        last_message = user_messages[-1].lower() if user_messages else ""
+        intent = intent_router.classify(last_message).intent
         
         # Enhanced context-aware fallback responses with business loan focus
         
         # Loan Application Context
-        if any(keyword in last_message for keyword in ["apply", "application", "loan", "financing", "sba", "borrow", "capital"]):
+        if intent == "loan_application":
             if "sba" in last_message or "504" in last_message:
                 return """I can help you with SBA 504 loans! These are excellent for real estate and equipment purchases:
 
@@ -224,8 +387,8 @@ What type of financing are you looking for?
 <<<ACTION:{"type":"navigate","target":"Apply"}>>>"""
 
         # Document Requirements Context
-        elif any(keyword in last_message for keyword in ["document", "documents", "paperwork", "requirements", "need", "upload"]):
-            if "sba" in full_conversation or "loan" in full_conversation:
+        elif intent == "documents":
+            if any(intent_router.mentions(content, ("sba", "loan")) for content in user_messages):
                 return """For SBA loan applications, you'll need these key documents:
 
 **Business Documents:**
@@ -254,7 +417,7 @@ I can help you organize these documents efficiently."""
 What type of financing are you considering? This will help me provide the exact document checklist."""
 
         # Rates and Terms Context
-        elif any(keyword in last_message for keyword in ["rate", "rates", "interest", "terms", "payment", "cost"]):
+        elif intent == "rates":
             return """Current SBA loan rates are very competitive:
 
 **SBA 504 Loans:**
@@ -276,7 +439,7 @@ What type of financing are you considering? This will help me provide the exact
 Want a personalized rate quote? I can connect you with our lending team."""
 
         # Eligibility and Qualification Context
-        elif any(keyword in last_message for keyword in ["eligibility", "qualify", "requirements", "eligible", "approval"]):
+        elif intent == "eligibility":
             return """SBA loan eligibility requirements:
 
 **Business Criteria:**
@@ -298,7 +461,7 @@ Want a personalized rate quote? I can connect you with our lending team."""
 Most businesses qualify! Let's review your specific situation."""
 
         # Spaces and Coworking Context
-        elif any(keyword in last_message for keyword in ["space", "spaces", "coworking", "office", "meeting", "room"]):
+        elif intent == "spaces":
             return """AmPac's coworking spaces are perfect for growing businesses:
 
 **Flexible Options:**
@@ -321,7 +484,7 @@ Most businesses qualify! Let's review your specific situation."""
 Perfect for client meetings, focused work, or networking!"""
 
         # Network and Community Context
-        elif any(keyword in last_message for keyword in ["network", "networking", "connect", "community", "events", "mentor"]):
+        elif intent == "network":
             return """Join AmPac's thriving business community:
 
 **Networking Opportunities:**
@@ -344,7 +507,7 @@ Perfect for client meetings, focused work, or networking!"""
 Building relationships is key to business success. What type of connections are you looking to make?"""
 
         # Status and Tracking Context
-        elif any(keyword in last_message for keyword in ["status", "track", "progress", "update", "application status"]):
+        elif intent == "status":
             return """I can help you track your application status:
 
 **Current Application Stages:**
@@ -362,7 +525,7 @@ Building relationships is key to business success. What type of connections are
 Need help with a specific application? I can connect you with your assigned loan officer for detailed updates."""
 
         # Payment and Financial Context
-        elif any(keyword in last_message for keyword in ["payment", "pay", "fee", "cost", "closing", "down payment"]):
+        elif intent == "payment":
             return """Understanding SBA loan costs and payments:
 
 **Typical Costs:**
@@ -383,7 +546,7 @@ Need help with a specific application? I can connect you with your assigned loan
 Want to estimate your monthly payment? I can help you run the numbers."""
 
         # General Business Guidance
-        elif any(keyword in last_message for keyword in ["business", "start", "grow", "expand", "help", "advice"]):
+        elif intent == "business_help":
             return """I'm here to help with all aspects of your business growth:
 
 **AmPac Services:**
@@ -407,7 +570,7 @@ Want to estimate your monthly payment? I can help you run the numbers."""
 What specific area of your business would you like to focus on?"""
 
         # Error or Technical Issues
-        elif any(keyword in last_message for keyword in ["error", "problem", "issue", "bug", "not working", "broken"]):
+        elif intent == "technical_issue":
             return """I apologize for any technical difficulties. Here's how I can help:
 
 **Common Solutions:**
@@ -0,0 +1,377 @@
+import json
+import math
+import mmap
+import os
+import shutil
+import time
+from collections.abc import Mapping
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+import numpy as np
+from app.services.search_index import InvertedIndex, index_terms
+from app.services.vector_index import VectorIndex
+
+# Bump when the file layout or the embedding changes; older snapshots are then ignored
+SNAPSHOT_FORMAT = 1
+CURRENT_FILE = "CURRENT"
+
+
+def _map(path: str):
+    """Read-only mapping of a whole file (b"" for an empty one, which mmap refuses)."""
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return b""
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+class StringTable:
+    """
+    Strings stored back to back in one UTF-8 blob with an offsets array, so a mapped file
+    can be read in place: table[i] decodes only string i. find() binary searches, either
+    the table itself (when sorted) or the table in the order given by `order`.
+    """
+
+    def __init__(self, blob, offsets: np.ndarray, order: Optional[np.ndarray] = None):
+        self.blob = blob
+        self.offsets = offsets
+        self.order = order
+
+    @staticmethod
+    def build(strings: Sequence[str]) -> Tuple[bytes, np.ndarray]:
+        encoded = [s.encode("utf-8") for s in strings]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        if encoded:
+            np.cumsum([len(e) for e in encoded], out=offsets[1:])
+        return b"".join(encoded), offsets
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, index: int) -> str:
+        start, end = int(self.offsets[index]), int(self.offsets[index + 1])
+        return bytes(self.blob[start:end]).decode("utf-8")
+
+    def __iter__(self) -> Iterator[str]:
+        for index in range(len(self)):
+            yield self[index]
+
+    def find(self, value: str) -> int:
+        """Index of `value` in the table, or -1."""
+        low, high = 0, len(self)
+        order = self.order
+        while low < high:
+            mid = (low + high) // 2
+            probe = self[int(order[mid]) if order is not None else mid]
+            if probe < value:
+                low = mid + 1
+            elif probe > value:
+                high = mid
+            else:
+                return int(order[mid]) if order is not None else mid
+        return -1
+
+
+class RowLookup(Mapping):
+    """Document key -> row over a snapshot's key table (what VectorIndex.rows is)."""
+
+    def __init__(self, keys: StringTable):
+        self.keys = keys
+
+    def __getitem__(self, key: str) -> int:
+        row = self.keys.find(key)
+        if row < 0:
+            raise KeyError(key)
+        return row
+
+    def __contains__(self, key) -> bool:
+        return isinstance(key, str) and self.keys.find(key) >= 0
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.keys)
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+
+class SnapshotDocuments(Mapping):
+    """Document key -> chunk dict, decoded from the mapped doc table on access."""
+
+    def __init__(self, rows: RowLookup, table: StringTable):
+        self.rows = rows
+        self.table = table
+
+    def __getitem__(self, key: str) -> Dict[str, Any]:
+        return json.loads(self.table[self.rows[key]])
+
+    def __contains__(self, key) -> bool:
+        return key in self.rows
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.rows)
+
+    def __len__(self) -> int:
+        return len(self.table)
+
+    def to_dict(self) -> Dict[str, Dict[str, Any]]:
+        """Every chunk, decoded in row order (no per-key lookups)."""
+        return {key: json.loads(doc) for key, doc in zip(self.rows.keys, self.table)}
+
+
+class FrozenIndex:
+    """
+    Read-only BM25 over InvertedIndex.export() arrays (usually memory-mapped). Scores
+    match InvertedIndex for the same documents; scoring is vectorized per query term
+    over the term's postings instead of looping over documents. Rows are the
+    snapshot's document rows, the same as its vector rows.
+    """
+
+    def __init__(self, terms: StringTable, offsets: np.ndarray, rows: np.ndarray, tfs: np.ndarray,
+                 doc_len: np.ndarray, fields: Dict[str, Tuple[StringTable, np.ndarray, np.ndarray]],
+                 keys: StringTable, k1: float = 1.2, b: float = 0.75):
+        self.terms = terms
+        self.offsets = offsets
+        self.rows = rows
+        self.tfs = tfs
+        self.doc_len = doc_len
+        self.fields = fields
+        self.keys = keys
+        self.k1 = k1
+        self.b = b
+        self._norms: Optional[np.ndarray] = None
+
+    def __len__(self) -> int:
+        return len(self.doc_len)
+
+    def __contains__(self, key: str) -> bool:
+        return self.keys.find(key) >= 0
+
+    def _postings(self, term: str) -> Tuple[np.ndarray, np.ndarray]:
+        index = self.terms.find(term)
+        if index < 0:
+            return self.rows[:0], self.tfs[:0]
+        start, end = int(self.offsets[index]), int(self.offsets[index + 1])
+        return self.rows[start:end], self.tfs[start:end]
+
+    def _length_norms(self) -> np.ndarray:
+        if self._norms is None:
+            lengths = np.asarray(self.doc_len, dtype=np.float64)
+            average = lengths.mean() if len(lengths) else 1.0
+            self._norms = self.k1 * (1 - self.b + self.b * lengths / average)
+        return self._norms
+
+    def allowed(self, filters: Optional[Mapping[str, Iterable[str]]]) -> Optional[np.ndarray]:
+        """Sorted rows passing `filters` (same rules as InvertedIndex.allowed), or None."""
+        allowed: Optional[np.ndarray] = None
+        for name, values in (filters or {}).items():
+            if values is None:
+                continue
+            if isinstance(values, str):
+                values = [values]
+            matching = np.zeros(0, dtype=np.int32)
+            if name in self.fields:
+                table, offsets, rows = self.fields[name]
+                for value in values:
+                    index = table.find(str(value).lower())
+                    if index >= 0:
+                        matching = np.union1d(matching, rows[int(offsets[index]):int(offsets[index + 1])])
+            allowed = matching if allowed is None else np.intersect1d(allowed, matching, assume_unique=True)
+            if not len(allowed):
+                return allowed
+        return allowed
+
+    def allowed_keys(self, filters: Optional[Mapping[str, Iterable[str]]]) -> Optional[List[str]]:
+        allowed = self.allowed(filters)
+        return None if allowed is None else [self.keys[int(row)] for row in allowed]
+
+    def idf(self, term: str) -> float:
+        df = len(self._postings(term)[0])
+        return math.log(1 + (len(self) - df + 0.5) / (df + 0.5))
+
+    def idf_weight(self, term: str) -> float:
+        if self.terms.find(term) < 0:
+            return 0.0
+        return self.idf(term) / math.log(1 + len(self) / 1.5 + 0.5 / 1.5)
+
+    def search(self, query: str, k: int = 10, filters: Optional[Mapping[str, Iterable[str]]] = None) -> List[Tuple[str, float]]:
+        terms = set(index_terms(query))
+        allowed = self.allowed(filters)
+        if not terms or k <= 0 or (allowed is not None and not len(allowed)):
+            return []
+        norms = self._length_norms()
+        scores = np.zeros(len(self), dtype=np.float64)
+        matched = np.zeros(len(self), dtype=bool)
+        for term in terms:
+            rows, tfs = self._postings(term)
+            if not len(rows):
+                continue
+            weight = self.idf(term) * (self.k1 + 1)
+            tfs = np.asarray(tfs, dtype=np.float64)
+            scores[rows] += weight * tfs / (tfs + norms[rows])
+            matched[rows] = True
+        if allowed is not None:
+            candidates = allowed[matched[allowed]]
+        else:
+            candidates = np.flatnonzero(matched)
+        if not len(candidates):
+            return []
+        if len(candidates) > k:
+            # Everything scoring at least the k-th best, ties included, so ties can go to
+            # the earlier row as they do in InvertedIndex
+            threshold = np.partition(scores[candidates], len(candidates) - k)[len(candidates) - k]
+            candidates = candidates[scores[candidates] >= threshold]
+        best = candidates[np.lexsort((candidates, -scores[candidates]))[:k]]
+        return [(self.keys[int(row)], float(scores[row])) for row in best]
+
+    def thaw(self) -> InvertedIndex:
+        """An editable InvertedIndex with the same documents, rebuilt from the postings."""
+        exported = {
+            "terms": list(self.terms), "offsets": self.offsets, "rows": self.rows, "tfs": self.tfs,
+            "doc_len": self.doc_len, "k1": self.k1, "b": self.b,
+            "fields": {name: {"values": list(table), "offsets": offsets, "rows": rows}
+                       for name, (table, offsets, rows) in self.fields.items()},
+        }
+        return InvertedIndex.from_export(exported, list(self.keys))
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "documents": len(self),
+            "terms": len(self.terms),
+            "postings": int(self.offsets[-1]) if len(self.offsets) else 0,
+            "avgLength": round(float(np.mean(self.doc_len)), 1) if len(self.doc_len) else 0,
+        }
+
+
+class IndexSnapshot:
+    """
+    One published version of the knowledge index, opened from its directory. Every file
+    is memory-mapped read-only: opening costs the same for 100 chunks or 100k, pages are
+    read on first use, and uvicorn workers mapping the same version share one copy in
+    the page cache.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(os.path.join(path, "meta.json"), "r", encoding="utf-8") as f:
+            self.meta = json.load(f)
+        if self.meta.get("format") != SNAPSHOT_FORMAT:
+            raise ValueError(f"snapshot format {self.meta.get('format')} (expected {SNAPSHOT_FORMAT})")
+        self.version: str = self.meta["version"]
+
+        def array(name: str) -> np.ndarray:
+            return np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r")
+
+        def strings(name: str, order: Optional[np.ndarray] = None) -> StringTable:
+            return StringTable(_map(os.path.join(path, f"{name}.bin")), array(f"{name}.offsets"), order)
+
+        keys = strings("keys", array("keys.order"))
+        self.index = FrozenIndex(
+            strings("terms"), array("postings.offsets"), array("postings.rows"), array("postings.tfs"),
+            array("doc_len"),
+            {name: (strings(f"field.{name}"), array(f"field.{name}.rows.offsets"), array(f"field.{name}.rows"))
+             for name in self.meta["fields"]},
+            keys, self.meta["k1"], self.meta["b"],
+        )
+        rows = RowLookup(keys)
+        self.vectors = VectorIndex.from_matrix(array("vectors"), keys, rows)
+        self.documents = SnapshotDocuments(rows, strings("docs"))
+        if len(self.documents) != self.meta["documents"] or len(self.vectors.matrix) != self.meta["documents"]:
+            raise ValueError("snapshot files disagree on the document count")
+
+    @property
+    def dim(self) -> int:
+        return int(self.meta["dim"])
+
+
+def current_version(directory: str) -> Optional[str]:
+    try:
+        with open(os.path.join(directory, CURRENT_FILE), "r", encoding="utf-8") as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def open_current(directory: str) -> Optional[IndexSnapshot]:
+    """The snapshot CURRENT points at, or None when there is none (or it can't be read)."""
+    version = current_version(directory)
+    if version is None:
+        return None
+    try:
+        return IndexSnapshot(os.path.join(directory, version))
+    except Exception as e:
+        print(f"[IndexSnapshot] Could not open {version} in {directory}: {e}")
+        return None
+
+
+def _fsync_write(path: str, data: bytes):
+    with open(path, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def publish(directory: str, documents: Mapping[str, Dict[str, Any]], index: InvertedIndex, vectors: VectorIndex,
+            keep: int = 2) -> str:
+    """
+    Writes `documents` with their postings and vectors as a new version directory and
+    then points CURRENT at it with an atomic rename, so readers see the old version or
+    the new one, never a partial write. Versions beyond the newest `keep` are removed;
+    readers still holding one keep their mappings (POSIX frees the files on unmap).
+    """
+    os.makedirs(directory, exist_ok=True)
+    version = f"v{time.time_ns() // 1_000_000}-{os.getpid()}"
+    staging = os.path.join(directory, f".{version}.tmp")
+    os.makedirs(staging)
+
+    def save_array(name: str, values: np.ndarray):
+        with open(os.path.join(staging, f"{name}.npy"), "wb") as f:
+            np.save(f, values)
+            f.flush()
+            os.fsync(f.fileno())
+
+    def save_strings(name: str, values: Sequence[str]):
+        blob, offsets = StringTable.build(values)
+        _fsync_write(os.path.join(staging, f"{name}.bin"), blob)
+        save_array(f"{name}.offsets", offsets)
+
+    keys = list(documents)
+    exported = index.export(keys)
+    save_strings("keys", keys)
+    save_array("keys.order", np.array(sorted(range(len(keys)), key=keys.__getitem__), dtype=np.int32))
+    save_strings("docs", [json.dumps(documents[key], ensure_ascii=False) for key in keys])
+    save_strings("terms", exported["terms"])
+    save_array("postings.offsets", exported["offsets"])
+    save_array("postings.rows", exported["rows"])
+    save_array("postings.tfs", exported["tfs"])
+    save_array("doc_len", exported["doc_len"])
+    for name, field in exported["fields"].items():
+        save_strings(f"field.{name}", field["values"])
+        save_array(f"field.{name}.rows.offsets", field["offsets"])
+        save_array(f"field.{name}.rows", field["rows"])
+    save_array("vectors", np.ascontiguousarray(vectors.matrix[vectors.rows_for(keys)], dtype=np.float32))
+    meta = {
+        "format": SNAPSHOT_FORMAT, "version": version, "createdAt": time.time(), "documents": len(keys),
+        "dim": vectors.dim, "fields": list(exported["fields"]), "k1": exported["k1"], "b": exported["b"],
+    }
+    _fsync_write(os.path.join(staging, "meta.json"), json.dumps(meta).encode("utf-8"))
+
+    os.rename(staging, os.path.join(directory, version))
+    pointer = os.path.join(directory, f".{CURRENT_FILE}.tmp")
+    _fsync_write(pointer, version.encode("utf-8"))
+    os.replace(pointer, os.path.join(directory, CURRENT_FILE))
+    _prune(directory, version, keep)
+    return version
+
+
+def _prune(directory: str, current: str, keep: int):
+    versions = sorted(
+        (name for name in os.listdir(directory)
+         if name.startswith("v") and os.path.isdir(os.path.join(directory, name))),
+        key=lambda name: int(name[1:].split("-")[0]),
+    )
+    for name in versions[:-max(keep, 1)]:
+        if name != current:
+            shutil.rmtree(os.path.join(directory, name), ignore_errors=True)
+    for name in os.listdir(directory):
+        # Staging directories of publishes that died midway, once clearly abandoned
+        full = os.path.join(directory, name)
+        if name.endswith(".tmp") and os.path.isdir(full) and time.time() - os.path.getmtime(full) > 3600:
+            shutil.rmtree(full, ignore_errors=True)
@@ -0,0 +1,154 @@
+import string
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Tuple
+from app.core import metrics
+
+# Intent keyword lists in priority order (ties go to the earlier intent).
+INTENT_KEYWORDS: Dict[str, List[str]] = {
+    "loan_application": ["apply", "application", "loan", "financing", "sba", "borrow", "capital"],
+    "documents": ["document", "documents", "paperwork", "requirements", "need", "upload"],
+    "rates": ["rate", "rates", "interest", "terms", "payment", "cost"],
+    "eligibility": ["eligibility", "qualify", "requirements", "eligible", "approval"],
+    "spaces": ["space", "spaces", "coworking", "office", "meeting", "room"],
+    "network": ["network", "networking", "connect", "community", "events", "mentor"],
+    "status": ["status", "track", "progress", "update", "application status"],
+    "payment": ["payment", "pay", "fee", "cost", "closing", "down payment"],
+    "business_help": ["business", "start", "grow", "expand", "help", "advice"],
+    "technical_issue": ["error", "problem", "issue", "bug", "not working", "broken"],
+}
+
+# Words a message can consist of entirely and still be small talk. The kind decides the
+# canned reply; None marks filler that doesn't change it.
+SMALLTALK_WORDS: Dict[str, Optional[str]] = {
+    "hi": "greeting", "hello": "greeting", "hey": "greeting", "morning": "greeting",
+    "afternoon": "greeting", "evening": "greeting",
+    "thanks": "thanks", "thank": "thanks", "thx": "thanks", "appreciate": "thanks",
+    "bye": "goodbye", "goodbye": "goodbye", "later": "goodbye",
+    "ok": "ack", "okay": "ack", "cool": "ack", "great": "ack", "got": "ack", "perfect": "ack",
+    "good": None, "you": None, "it": None, "there": None, "so": None, "much": None, "very": None,
+    "see": None, "ya": None, "a": None, "lot": None, "i": None, "all": None,
+}
+SMALLTALK_PRIORITY = ["thanks", "goodbye", "greeting", "ack"]
+SMALLTALK_REPLIES = {
+    "greeting": "Hello! I'm AmPac's assistant. I can help with SBA 504 and 7(a) loans, required documents, rates, and our coworking spaces. What can I help you with?",
+    "thanks": "You're welcome! Let me know if there's anything else I can help with.",
+    "goodbye": "Thanks for stopping by. Good luck with your business!",
+    "ack": "Great! Is there anything else you'd like to know about financing or AmPac's services?",
+}
+MAX_SMALLTALK_WORDS = 6
+
+# Punctuation splits words like whitespace does (one C pass, then str.split())
+_SEPARATORS = str.maketrans({char: " " for char in string.punctuation + "\u2018\u2019\u201c\u201d\u2013\u2014\u2026"})
+
+
+def tokenize(text: str) -> List[str]:
+    return text.lower().translate(_SEPARATORS).split()
+
+
+@dataclass
+class IntentMatch:
+    intent: Optional[str]
+    confidence: float  # Share of all keyword hits that went to `intent`
+    keywords: List[str] = field(default_factory=list)  # Keywords that matched, for any intent
+    scores: Dict[str, int] = field(default_factory=dict)
+
+
+class IntentRouter:
+    """
+    Keyword intent classifier backed by an index built once: a message is tokenized
+    once and each distinct word is looked up in a dict, instead of a substring search
+    per keyword per intent. Phrase keywords ("not working") are indexed as word pairs.
+    Keywords match at word starts, so "loan" matches "loans" but "pay" doesn't match
+    "display".
+    """
+
+    def __init__(self, intents: Dict[str, Iterable[str]]):
+        self.priority = {intent: rank for rank, intent in enumerate(intents)}
+        self._intents_for: Dict[str, List[str]] = {}
+        for intent, keywords in intents.items():
+            for keyword in keywords:
+                self._intents_for.setdefault(" ".join(tokenize(keyword)), []).append(intent)
+        self._words = {keyword for keyword in self._intents_for if " " not in keyword}
+        self._phrases: Dict[str, List[str]] = {}  # First word -> phrases starting with it
+        for keyword in self._intents_for:
+            if " " in keyword:
+                self._phrases.setdefault(keyword.split(" ", 1)[0], []).append(keyword)
+        self._longest = max((len(word) for word in self._words), default=0)
+        self._seen: set = set()  # Words worked out so far
+        self._prefixes: Dict[str, Tuple[str, ...]] = {}  # Word -> keywords it starts with, for words that have any
+        self._scored: Dict[frozenset, tuple] = {}  # Words and phrases found -> _score()
+
+    def _learn(self, words: Iterable[str]):
+        """Works out which keywords each new word starts with, so classify() only looks words up."""
+        unseen = set(words).difference(self._seen)
+        if len(self._seen) + len(unseen) > 50000:
+            self._seen.clear()
+            self._prefixes.clear()
+            unseen = set(words)
+        for word in unseen:
+            prefixes = tuple(word[:end] for end in range(1, min(len(word), self._longest) + 1) if word[:end] in self._words)
+            if prefixes:
+                self._prefixes[word] = prefixes
+        self._seen.update(unseen)
+
+    def _score(self, found: frozenset) -> tuple:
+        """(intent, confidence, keywords, scores) for the words and phrases in `found`."""
+        keywords = {keyword for item in found for keyword in self._prefixes.get(item, (item,))}
+        scores: Dict[str, int] = {}
+        for keyword in keywords:
+            for intent in self._intents_for[keyword]:
+                scores[intent] = scores.get(intent, 0) + 1
+        intent = min(scores, key=lambda name: (-scores[name], self.priority[name]))
+        return intent, scores[intent] / sum(scores.values()), sorted(keywords), scores
+
+    def classify(self, text: str) -> IntentMatch:
+        words = tokenize(text)
+        # Short messages are cheaper to look up word by word than to dedupe first
+        distinct = set(words) if len(words) > 32 else words
+        if not self._seen.issuperset(distinct):
+            self._learn(distinct)
+        found = self._prefixes.keys() & distinct  # Words that start with a keyword
+        starts = self._phrases.keys() & distinct
+        if starts:
+            joined = " " + " ".join(words)  # Word pairs as a substring search, in C
+            found.update(phrase for first in starts for phrase in self._phrases[first] if " " + phrase in joined)
+        if not found:
+            return IntentMatch(None, 0.0)
+        key = frozenset(found)
+        scored = self._scored.get(key)
+        if scored is None:
+            if len(self._scored) >= 4096:
+                self._scored.clear()
+            scored = self._scored[key] = self._score(key)
+        intent, confidence, keywords, scores = scored
+        return IntentMatch(intent, confidence, list(keywords), dict(scores))
+
+    def mentions(self, text: str, keywords: Tuple[str, ...]) -> bool:
+        """True if a word in `text` starts with one of `keywords` (single words)."""
+        return any(word.startswith(keywords) for word in set(tokenize(text)))
+
+    def smalltalk(self, text: str) -> Optional[str]:
+        """
+        The small-talk kind ("greeting", "thanks", ...) when `text` is nothing but
+        small talk, e.g. "hi there" or "ok thanks!". None for anything substantive.
+        """
+        words = tokenize(text)
+        if not words or len(words) > MAX_SMALLTALK_WORDS or any(word not in SMALLTALK_WORDS for word in words):
+            return None
+        kinds = {SMALLTALK_WORDS[word] for word in words}
+        return next((kind for kind in SMALLTALK_PRIORITY if kind in kinds), None)
+
+    def quick_reply(self, messages: List[Dict[str, str]]) -> Optional[str]:
+        """
+        Canned answer when the latest user message is small talk, so it never reaches
+        the LLM.
+        """
+        last = next((m.get("content", "") for m in reversed(messages) if m.get("role") == "user"), "")
+        kind = self.smalltalk(last)
+        if kind is None:
+            return None
+        metrics.counter("llm_short_circuit_total").inc(kind=kind)
+        return SMALLTALK_REPLIES[kind]
+
+
+intent_router = IntentRouter(INTENT_KEYWORDS)
@@ -0,0 +1,340 @@
+import asyncio
+import hashlib
+import json
+import os
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+from app.core.config import get_settings
+from app.core import metrics
+from app.services.doc_parser import parse_pool
+from app.services.knowledge_service import KnowledgeService, knowledge_service
+from app.services.sharefile_service import ShareFileService, sharefile_service
+
+settings = get_settings()
+
+SUPPORTED_EXTENSIONS = (".pdf", ".docx", ".txt", ".md")
+FOLDER_TYPE = "ShareFile.Api.Models.Folder"
+
+
+def chunk_text(text: str, words: int, overlap: int) -> List[str]:
+    """Splits text into windows of `words` words, each sharing `overlap` with the previous."""
+    tokens = text.split()
+    if not tokens:
+        return []
+    step = max(1, words - overlap)
+    chunks = []
+    for start in range(0, len(tokens), step):
+        chunks.append(" ".join(tokens[start:start + words]))
+        if start + words >= len(tokens):
+            break
+    return chunks
+
+
+@dataclass
+class StageStats:
+    name: str
+    items: int = 0
+    busy_seconds: float = 0.0
+    first_at: Optional[float] = None
+    last_at: Optional[float] = None
+
+    def track(self, started: float, items: int = 1):
+        now = time.perf_counter()
+        self.items += items
+        self.busy_seconds += now - started
+        self.first_at = started if self.first_at is None else min(self.first_at, started)
+        self.last_at = now
+
+    def to_dict(self) -> Dict[str, Any]:
+        wall = (self.last_at - self.first_at) if self.items else 0.0
+        return {
+            "items": self.items,
+            "busyMs": round(self.busy_seconds * 1000, 1),
+            "wallMs": round(wall * 1000, 1),
+            "docsPerSec": round(self.items / wall, 1) if wall > 0 else None,
+        }
+
+
+@dataclass
+class FileItem:
+    key: str  # StreamID: stable across versions of the same file
+    item_id: str  # Id of this version (what Download takes)
+    name: str
+    path: str
+    root: str  # Crawl root it was found under
+    version: str
+    content: Optional[bytes] = None
+    content_hash: Optional[str] = None
+    chunks: List[Dict[str, Any]] = field(default_factory=list)
+
+
+class IngestionManifest:
+    """
+    What has been indexed, per ShareFile file (by StreamID): version, content hash and
+    the chunks produced, written atomically after each run. Holding the chunks lets a
+    fresh process put unchanged files back in the index without downloading them.
+    Read on first use rather than at import, since a published index snapshot makes it
+    unnecessary for serving.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._entries: Optional[Dict[str, Dict[str, Any]]] = None
+        self._mtime: Optional[float] = None
+
+    @property
+    def entries(self) -> Dict[str, Dict[str, Any]]:
+        if self._entries is None:
+            self._load()
+        return self._entries
+
+    def _load(self):
+        self._entries = {}
+        self._mtime = None
+        if os.path.exists(self.path):
+            try:
+                self._mtime = os.path.getmtime(self.path)
+                with open(self.path, "r", encoding="utf-8") as f:
+                    self._entries = json.load(f).get("files", {})
+            except Exception as e:
+                print(f"[Ingestion] Could not read manifest {self.path}, starting over: {e}")
+
+    def reload_if_changed(self) -> bool:
+        """Re-reads the file if another worker saved it since this one last did."""
+        mtime = os.path.getmtime(self.path) if os.path.exists(self.path) else None
+        if self._entries is None or mtime == self._mtime:
+            return False
+        self._load()
+        return True
+
+    def save(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"version": 1, "savedAt": time.time(), "files": self.entries}, f)
+        os.replace(tmp_path, self.path)
+        self._mtime = os.path.getmtime(self.path)
+
+
+class KnowledgeIngestion:
+    """
+    Crawls ShareFile folders into the knowledge index as a pipeline of stages joined by
+    bounded queues: crawl (list_children) -> download -> parse -> index. Each stage has
+    its own worker count, so slow downloads don't stall listing and parsing never runs
+    more than a few documents at once. Files whose ShareFile version (or, after
+    download, content hash) matches the manifest are skipped; files gone from ShareFile
+    are dropped from the index once a crawl completes cleanly.
+    """
+
+    def __init__(self, sharefile: ShareFileService, knowledge: KnowledgeService, manifest_path: str):
+        self.sharefile = sharefile
+        self.knowledge = knowledge
+        self.manifest = IngestionManifest(manifest_path)
+        self._lock = asyncio.Lock()
+        self._restored = False
+
+    async def restore(self) -> int:
+        """Adds manifest chunks missing from the index (e.g. after a restart)."""
+        missing = await asyncio.to_thread(
+            lambda: [chunk for entry in self.manifest.entries.values() for chunk in entry.get("chunks", [])
+                     if chunk["id"] not in self.knowledge.documents])
+        await self._edit(missing)
+        self._restored = True
+        return len(missing)
+
+    async def _edit(self, docs: List[Dict[str, Any]], remove_ids: Optional[List[str]] = None) -> int:
+        """
+        One KnowledgeService.update() in a worker thread: thawing a snapshot and
+        embedding take seconds on a large index and mustn't block the event loop.
+        """
+        if not docs and not remove_ids:
+            return 0
+        if self.knowledge.snapshot is not None:
+            await asyncio.to_thread(self.knowledge.thaw)  # Once, without stalling searches
+        return await asyncio.to_thread(self.knowledge.update, docs, remove_ids)
+
+    @staticmethod
+    def _version(item: Dict[str, Any]) -> str:
+        return item.get("Hash") or f"{item.get('Id')}:{item.get('FileSizeBytes')}:{item.get('CreationDate')}"
+
+    def _chunks(self, file: FileItem, text: str) -> List[Dict[str, Any]]:
+        pieces = chunk_text(text, settings.KNOWLEDGE_CHUNK_WORDS, settings.KNOWLEDGE_CHUNK_OVERLAP_WORDS)
+        folders = [part.lower() for part in file.path.split("/")[:-1] if part]
+        return [
+            {
+                "id": f"sf:{file.key}:{index}",
+                "source": file.name,
+                "section": f"{file.path} (part {index + 1} of {len(pieces)})",
+                "text": piece,
+                "keywords": [],
+                "tags": folders,
+            }
+            for index, piece in enumerate(pieces)
+        ]
+
+    async def run(self, roots: Optional[List[str]] = None) -> Dict[str, Any]:
+        async with self._lock:
+            return await self._run(roots or settings.KNOWLEDGE_SHAREFILE_ROOTS)
+
+    async def _run(self, roots: List[str]) -> Dict[str, Any]:
+        started = time.perf_counter()
+        # Start from what other workers have published, not this worker's older view
+        await asyncio.to_thread(self.knowledge.refresh, True)
+        if self.manifest.reload_if_changed() or not self._restored:
+            await self.restore()
+        stages = {name: StageStats(name) for name in ("crawl", "download", "parse", "index")}
+        counts = {"seen": 0, "unchanged": 0, "sameContent": 0, "indexed": 0, "removed": 0, "failed": 0}
+        seen: set = set()
+        crawl_errors: List[str] = []
+
+        folders: asyncio.Queue = asyncio.Queue()
+        downloads: asyncio.Queue = asyncio.Queue(maxsize=settings.KNOWLEDGE_DOWNLOAD_CONCURRENCY * 2)
+        parses: asyncio.Queue = asyncio.Queue(maxsize=settings.KNOWLEDGE_PARSE_CONCURRENCY * 2)
+        indexing: asyncio.Queue = asyncio.Queue(maxsize=settings.KNOWLEDGE_PARSE_CONCURRENCY * 2)
+
+        async def crawl_worker():
+            while True:
+                folder_id, path, root = await folders.get()
+                begun = time.perf_counter()
+                try:
+                    children = await self.sharefile.list_children(folder_id, strict=True)
+                    files = 0
+                    for child in children:
+                        name = child.get("Name") or ""
+                        child_path = f"{path}/{name}" if path else name
+                        if child.get("odata.type") == FOLDER_TYPE:
+                            folders.put_nowait((child["Id"], child_path, root))
+                            continue
+                        if not name.lower().endswith(SUPPORTED_EXTENSIONS):
+                            continue
+                        key = child.get("StreamID") or child["Id"]
+                        seen.add(key)
+                        counts["seen"] += 1
+                        files += 1
+                        version = self._version(child)
+                        if self.manifest.entries.get(key, {}).get("version") == version:
+                            counts["unchanged"] += 1
+                            continue
+                        await downloads.put(FileItem(key=key, item_id=child["Id"], name=name,
+                                                     path=child_path, root=root, version=version))
+                    stages["crawl"].track(begun, files)  # Files discovered, not folders listed
+                except Exception as e:
+                    crawl_errors.append(f"{path or folder_id}: {e}")
+                finally:
+                    folders.task_done()
+
+        async def download_worker():
+            while True:
+                file = await downloads.get()
+                if file is None:
+                    return
+                begun = time.perf_counter()
+                content = await self.sharefile.download_file(file.item_id)
+                if content is None:
+                    counts["failed"] += 1  # The manifest keeps the old version, so the next run retries
+                    continue
+                file.content = content
+                file.content_hash = hashlib.sha256(content).hexdigest()
+                stages["download"].track(begun)
+                entry = self.manifest.entries.get(file.key)
+                if entry and entry.get("contentHash") == file.content_hash:
+                    # New ShareFile version, same bytes: nothing to re-parse
+                    entry["version"] = file.version
+                    counts["sameContent"] += 1
+                    continue
+                await parses.put(file)
+
+        async def parse_worker():
+            while True:
+                file = await parses.get()
+                if file is None:
+                    return
+                begun = time.perf_counter()
+                parsed = await parse_pool.parse(file.name, file.content)
+                file.content = None  # Don't hold the bytes while waiting to be indexed
+                if parsed.failed or parsed.timed_out:
+                    # Not recorded in the manifest, so the next run tries again
+                    counts["failed"] += 1
+                    continue
+                file.chunks = self._chunks(file, parsed.render())
+                stages["parse"].track(begun)
+                await indexing.put(file)
+
+        async def index_worker():
+            # One writer: the indexes aren't safe to mutate from several tasks at once
+            while True:
+                file = await indexing.get()
+                if file is None:
+                    return
+                begun = time.perf_counter()
+                new_ids = {chunk["id"] for chunk in file.chunks}
+                stale = [chunk["id"] for chunk in self.manifest.entries.get(file.key, {}).get("chunks", [])
+                         if chunk["id"] not in new_ids]
+                try:
+                    await self._edit(file.chunks, stale)
+                except Exception as e:
+                    print(f"[Ingestion] Failed to index {file.path}: {e}")
+                    counts["failed"] += 1
+                    continue
+                self.manifest.entries[file.key] = {
+                    "itemId": file.item_id, "name": file.name, "path": file.path, "root": file.root, "version": file.version,
+                    "contentHash": file.content_hash, "chunks": file.chunks,
+                }
+                counts["indexed"] += 1
+                stages["index"].track(begun)
+
+        async def drain(queue: asyncio.Queue, workers: List[asyncio.Task]):
+            for _ in workers:
+                await queue.put(None)
+            await asyncio.gather(*workers)
+
+        crawlers = [asyncio.create_task(crawl_worker()) for _ in range(settings.KNOWLEDGE_CRAWL_CONCURRENCY)]
+        downloaders = [asyncio.create_task(download_worker()) for _ in range(settings.KNOWLEDGE_DOWNLOAD_CONCURRENCY)]
+        parsers = [asyncio.create_task(parse_worker()) for _ in range(settings.KNOWLEDGE_PARSE_CONCURRENCY)]
+        indexer = [asyncio.create_task(index_worker())]
+        try:
+            for root in roots:
+                folders.put_nowait((root, "", root))
+            await folders.join()
+            for task in crawlers:
+                task.cancel()
+            await drain(downloads, downloaders)
+            await drain(parses, parsers)
+            await drain(indexing, indexer)
+        finally:
+            for task in crawlers + downloaders + parsers + indexer:
+                task.cancel()
+
+        if not crawl_errors:
+            # Only files under the roots just crawled can be known to be gone
+            gone = [key for key, entry in self.manifest.entries.items() if key not in seen and entry.get("root") in roots]
+            await self._edit([], [chunk["id"] for key in gone for chunk in self.manifest.entries.pop(key).get("chunks", [])])
+            counts["removed"] += len(gone)
+        self.manifest.save()
+        snapshot = None
+        if self.knowledge.dirty:
+            try:
+                snapshot = await asyncio.to_thread(self.knowledge.publish)
+            except Exception as e:
+                print(f"[Ingestion] Could not publish the index snapshot: {e}")
+
+        elapsed = time.perf_counter() - started
+        for name, count in counts.items():
+            metrics.counter("knowledge_ingestion_files_total").inc(count, outcome=name)
+        report = {
+            "files": counts,
+            "stages": {name: stats.to_dict() for name, stats in stages.items()},
+            "crawlErrors": crawl_errors,
+            "chunks": len(self.knowledge.documents),
+            "snapshot": snapshot,
+            "elapsedMs": round(elapsed * 1000, 1),
+        }
+        print(f"[Ingestion] {counts['indexed']} indexed, {counts['unchanged'] + counts['sameContent']} unchanged, "
+              f"{counts['removed']} removed, {counts['failed']} failed in {elapsed:.2f}s")
+        return report
+
+
+knowledge_ingestion = KnowledgeIngestion(sharefile_service, knowledge_service, settings.KNOWLEDGE_MANIFEST_PATH)
@@ -1,9 +1,22 @@
+import asyncio
+import threading
+import time
 from typing import List, Dict, Any, Optional
-import re
+from app.core.config import get_settings
+from app.core import metrics
+from app.services import index_snapshot
+from app.services.search_index import InvertedIndex
+from app.services.vector_index import HashingEmbedder, VectorIndex
+
+settings = get_settings()
+
+# Weight of a curated keyword hit relative to a hit in the policy text
+KEYWORD_WEIGHT = 3
+FILTER_FIELDS = ("source", "tags")
 
 class KnowledgeService:
-    def __init__(self):
-        # High-Fidelity Knowledge Base (Simulating Vector DB)
+    def __init__(self, snapshot_dir: Optional[str] = None):
+        # Seed policy chunks; more are added through add_documents()
         self.knowledge_base = [
             {
                 "id": "pol_001",
@@ -42,42 +55,232 @@ class KnowledgeService:
             }
         ]
 
-    async def query(self, query_text: str, filters: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        self.embedder = HashingEmbedder(settings.KNOWLEDGE_EMBEDDING_DIM)
+        # Searches and ingestion edits both run in worker threads (see retrieval.py and
+        # knowledge_ingestion.py); edits and searches take turns
+        self._lock = threading.RLock()
+        self.generation = 0  # Bumped on every change to the corpus, for caches of search results
+        self._filter_rows: Dict[str, Any] = {}  # Vector rows per filter, until the corpus changes
+        # A published snapshot is served straight from its mapped files until something
+        # changes the corpus here; then it's thawed into the in-memory indexes below.
+        self.snapshot_dir = snapshot_dir if snapshot_dir is not None else settings.KNOWLEDGE_SNAPSHOT_DIR
+        self.snapshot: Optional[index_snapshot.IndexSnapshot] = None
+        self.version: Optional[str] = None  # Published version this state matches
+        self.dirty = False  # Changes not yet in a published snapshot
+        self._checked_at = time.monotonic()
+        self._rejected: Optional[str] = None  # Version that couldn't be used; not retried
+        if self.snapshot_dir:
+            snapshot = index_snapshot.open_current(self.snapshot_dir)
+            if snapshot is not None and self._use_snapshot(snapshot):
+                return
+            self._rejected = index_snapshot.current_version(self.snapshot_dir)
+        self.documents: Dict[str, Dict[str, Any]] = {}
+        self.index = InvertedIndex(filter_fields=FILTER_FIELDS)
+        self.vectors = VectorIndex(settings.KNOWLEDGE_EMBEDDING_DIM)
+        self.add_documents(self.knowledge_base)
+        self.dirty = False  # The seed chunks are in every snapshot anyway
+
+    def _use_snapshot(self, snapshot: "index_snapshot.IndexSnapshot") -> bool:
+        if snapshot.dim != self.embedder.dim:
+            print(f"[KnowledgeService] Ignoring snapshot {snapshot.version}: built with {snapshot.dim}-dim vectors")
+            return False
+        with self._lock:
+            self.documents, self.index, self.vectors = snapshot.documents, snapshot.index, snapshot.vectors
+            self.snapshot, self.version, self.dirty = snapshot, snapshot.version, False
+            self.generation += 1
+            self._filter_rows.clear()
+        print(f"[KnowledgeService] Serving snapshot {snapshot.version} ({len(snapshot.documents)} chunks)")
+        return True
+
+    def refresh(self, force: bool = False) -> bool:
+        """
+        Swaps in a newer published snapshot (checked at most every
+        KNOWLEDGE_SNAPSHOT_POLL_SECONDS unless `force`). Unpublished local changes win.
+        """
+        if not self.snapshot_dir or self.dirty:
+            return False
+        now = time.monotonic()
+        if not force and now - self._checked_at < settings.KNOWLEDGE_SNAPSHOT_POLL_SECONDS:
+            return False
+        self._checked_at = now
+        version = index_snapshot.current_version(self.snapshot_dir)
+        if version is None or version in (self.version, self._rejected):
+            return False
+        snapshot = index_snapshot.open_current(self.snapshot_dir)
+        if snapshot is not None and self._use_snapshot(snapshot):
+            return True
+        self._rejected = version
+        return False
+
+    def publish(self) -> Optional[str]:
+        """Writes the current index as a new snapshot version for every worker to pick up."""
+        if not self.snapshot_dir or self.snapshot is not None:
+            return self.version  # Serving a snapshot means nothing changed since it was published
+        started = time.perf_counter()
+        self.version = index_snapshot.publish(self.snapshot_dir, self.documents, self.index, self.vectors,
+                                              keep=settings.KNOWLEDGE_SNAPSHOT_KEEP)
+        self.dirty = False
+        print(f"[KnowledgeService] Published snapshot {self.version} ({len(self.documents)} chunks) "
+              f"in {time.perf_counter() - started:.2f}s")
+        return self.version
+
+    @staticmethod
+    def _thawed(snapshot: "index_snapshot.IndexSnapshot"):
+        """In-memory copies of a snapshot's documents and indexes. Only reads the snapshot."""
+        started = time.perf_counter()
+        documents = snapshot.documents.to_dict()
+        index = snapshot.index.thaw()  # From the postings; nothing is re-tokenized
+        vectors = VectorIndex(snapshot.dim, capacity=max(1024, len(documents)))
+        vectors.add_many(list(documents), snapshot.vectors.matrix)  # Copied; no re-embedding
+        print(f"[KnowledgeService] Loaded snapshot {snapshot.version} for editing in {time.perf_counter() - started:.2f}s")
+        return documents, index, vectors
+
+    def _install(self, thawed):
+        self.documents, self.index, self.vectors = thawed
+        self.snapshot = None
+        self._filter_rows.clear()
+
+    def _thaw(self):
+        """Moves from the read-only snapshot to in-memory indexes, so they can change. Call with the lock held."""
+        if self.snapshot is not None:
+            self._install(self._thawed(self.snapshot))
+
+    def thaw(self):
+        """
+        Like _thaw(), but builds the copies without holding the lock, so searches keep
+        being served from the snapshot meanwhile. For callers about to edit.
+        """
+        snapshot = self.snapshot
+        if snapshot is None:
+            return
+        thawed = self._thawed(snapshot)
+        with self._lock:
+            if self.snapshot is snapshot:  # Not swapped by refresh() meanwhile
+                self._install(thawed)
+
+    @staticmethod
+    def _index_keywords(index: InvertedIndex, doc: Dict[str, Any]):
+        keywords = doc.get("keywords") or []
+        index.add(
+            doc["id"],
+            [(doc["text"], 1), (doc.get("section") or "", 1), (" ".join(keywords), KEYWORD_WEIGHT)],
+            fields={"source": [doc.get("source")], "tags": doc.get("tags") or keywords},
+        )
+
+    def add_documents(self, docs: List[Dict[str, Any]]):
+        """
+        Adds or replaces chunks ({"id", "source", "section", "text", optional "keywords"
+        and "tags"}) in the index. Only the given chunks are (re)indexed.
+        """
+        self.update(docs)
+
+    def update(self, docs: List[Dict[str, Any]], remove_ids: Optional[List[str]] = None) -> int:
+        """
+        Removes the chunks in `remove_ids`, then adds or replaces `docs` (see
+        add_documents()), as one edit. Returns how many chunks were removed.
+        """
+        vectors = self.embedder.embed_many(self._embedding_text(doc) for doc in docs) if docs else None
+        with self._lock:
+            remove_ids = [doc_id for doc_id in remove_ids or [] if doc_id in self.documents]
+            if not docs and not remove_ids:
+                return 0
+            self._thaw()
+            for doc_id in remove_ids:
+                self.documents.pop(doc_id)
+                self.vectors.remove(doc_id)
+                self.index.remove(doc_id)
+            for doc in docs:
+                self.documents[doc["id"]] = doc
+                self._index_keywords(self.index, doc)
+            if docs:
+                self.vectors.add_many([doc["id"] for doc in docs], vectors)
+            self.dirty = True
+            self.generation += 1
+            self._filter_rows.clear()
+        return len(remove_ids)
+
+    def _embedding_text(self, doc: Dict[str, Any]) -> str:
+        return " ".join([doc.get("section") or "", doc["text"], " ".join(doc.get("keywords") or [])])
+
+    def remove_document(self, doc_id: str) -> bool:
+        with self._lock:
+            if doc_id not in self.documents:
+                return False
+            self._thaw()
+            self.dirty = True
+            self.generation += 1
+            self.documents.pop(doc_id, None)
+            self._filter_rows.clear()
+            self.vectors.remove(doc_id)
+            return self.index.remove(doc_id)
+
+    def _hybrid(self, query_text: str, k: int, filters: Optional[Dict[str, Any]], mode: str):
+        """
+        (doc id, score) pairs by cosine similarity ("vector") or a blend of cosine and
+        max-normalized BM25 ("hybrid"). Hybrid rescoring looks at the top candidates from
+        each side, filling in the other side's score for documents only one side found.
+        """
+        query = self.embedder.embed(query_text, term_weight=self.index.idf_weight)
+        rows = None
+        if filters:
+            cache_key = repr(sorted(filters.items()))
+            rows = self._filter_rows.get(cache_key)
+            if rows is None:
+                if self.snapshot is not None:
+                    rows = self.index.allowed(filters)  # Snapshot rows are vector rows
+                else:
+                    allowed = self.index.allowed_keys(filters)
+                    rows = None if allowed is None else self.vectors.rows_for(allowed)
+                if len(self._filter_rows) >= 256:
+                    self._filter_rows.clear()
+                self._filter_rows[cache_key] = rows
+        floor = settings.KNOWLEDGE_MIN_SIMILARITY
+        if mode == "vector":
+            return [(doc_id, score) for doc_id, score in self.vectors.search(query, k=k, rows=rows) if score >= floor]
+
+        candidates = max(k, settings.KNOWLEDGE_HYBRID_CANDIDATES)
+        keyword = dict(self.index.search(query_text, k=candidates, filters=filters))
+        vector = dict(self.vectors.search(query, k=candidates, rows=rows))
+        top_keyword = max(keyword.values(), default=0.0) or 1.0
+        weight = settings.KNOWLEDGE_VECTOR_WEIGHT
+        scores = {}
+        for doc_id in keyword.keys() | vector.keys():
+            similarity = vector[doc_id] if doc_id in vector else self.vectors.score(doc_id, query)
+            if similarity < floor and doc_id not in keyword:
+                continue
+            scores[doc_id] = weight * max(similarity, 0.0) + (1 - weight) * keyword.get(doc_id, 0.0) / top_keyword
+        return sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+
+    def search(self, query_text: str, k: int = 3, filters: Optional[Any] = None, mode: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        Top `k` chunks for `query_text`, each with its "score". `filters` is a
+        KnowledgeFilters or a dict of field -> accepted values ("source", "tags").
+        `mode` is "keyword" (BM25), "vector" or "hybrid"; KNOWLEDGE_SEARCH_MODE by default.
+        """
+        if filters is not None and hasattr(filters, "model_dump"):
+            filters = filters.model_dump(exclude_none=True)
+        mode = mode or settings.KNOWLEDGE_SEARCH_MODE
+        with self._lock:
+            self.refresh()
+            started = time.perf_counter()
+            if mode == "keyword":
+                hits = self.index.search(query_text, k=k, filters=filters)
+            else:
+                hits = self._hybrid(query_text, k, filters, mode)
+            results = [{**self.documents[doc_id], "score": score} for doc_id, score in hits]
+        metrics.histogram("knowledge_search_ms").observe((time.perf_counter() - started) * 1000, mode=mode)
+        return results
+
+    async def query(self, query_text: str, filters: Optional[Any] = None) -> Dict[str, Any]:
         """
-        Performs a keyword-weighted search over the knowledge base.
+        Searches the knowledge base (see search()) and answers from the best chunk.
         """
         print(f"[KnowledgeService] Querying: {query_text}")
         
-        # 1. Tokenize Query
-        query_words = set(re.findall(r'\w+', query_text.lower()))
-        
-        # 2. Score Documents
-        scored_docs = []
-        for doc in self.knowledge_base:
-            score = 0
-            # Keyword match
-            for keyword in doc["keywords"]:
-                if keyword in query_text.lower():
-                    score += 3  # High weight for exact keyword match
-                
-                # Partial match in query words
-                for qw in query_words:
-                    if qw in keyword:
-                        score += 1
-            
-            # Text overlap
-            for qw in query_words:
-                if qw in doc["text"].lower():
-                    score += 0.5
-            
-            if score > 0:
-                scored_docs.append({**doc, "score": score})
-        
-        # 3. Sort and Filter
-        scored_docs.sort(key=lambda x: x["score"], reverse=True)
-        top_docs = scored_docs[:3]
+        # Search (and any snapshot refresh) blocks and takes the index lock: not on the event loop
+        top_docs = await asyncio.to_thread(self.search, query_text, k=3, filters=filters)
         
-        # 4. Generate "Answer" (Mock LLM Synthesis)
+        # Generate "Answer" (Mock LLM Synthesis)
         if not top_docs:
             return {
                 "answer": "I couldn't find any specific policies matching your query in the AmPac knowledge base.",
@@ -93,7 +296,7 @@ class KnowledgeService:
             "citations": [
                 {
                     "source": doc["source"],
-                    "section": doc["section"],
+                    "section": doc.get("section"),
                     "text": doc["text"],
                     "relevance": f"{doc['score']:.1f}"
                 } for doc in top_docs
@@ -0,0 +1,80 @@
+import hashlib
+import json
+import re
+from typing import Dict, List, Optional, Tuple
+from app.core.config import get_settings
+from app.core import metrics
+from app.services.cache import TieredCache, get_redis_tier
+
+settings = get_settings()
+
+_WHITESPACE = re.compile(r"\s+")
+_TRAILING_PUNCT = re.compile(r"[\s?!.]+$")
+
+
+def _digest(parts: List[Tuple[str, str]]) -> str:
+    return hashlib.sha256(json.dumps(parts, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+def normalize_content(text: str) -> str:
+    """Case, whitespace and trailing punctuation don't change the answer to an FAQ."""
+    return _TRAILING_PUNCT.sub("", _WHITESPACE.sub(" ", text).strip().lower())
+
+
+def cache_keys(model: str, temperature: float, messages: List[Dict[str, str]]) -> Tuple[str, str]:
+    """
+    Returns (exact_key, normalized_key) for a completion request.
+    """
+    exact = [(m.get("role", ""), m.get("content", "")) for m in messages]
+    normalized = [(role, normalize_content(content)) for role, content in exact]
+    prefix = f"llm:{model}:{temperature}"
+    return f"{prefix}:exact:{_digest(exact)}", f"{prefix}:norm:{_digest(normalized)}"
+
+
+class LLMResponseCache:
+    """
+    Completion cache in front of Groq. Looks up the exact prompt first, then the
+    normalized prompt, and stores answers under both keys.
+    Only successful model output should be stored; fallback text never is.
+    """
+
+    def __init__(self, cache: TieredCache, ttl_seconds: float):
+        self.cache = cache
+        self.ttl_seconds = ttl_seconds
+        self._counts = {"exact": 0, "normalized": 0, "miss": 0}
+
+    def _record(self, result: str):
+        self._counts[result] += 1
+        metrics.counter("llm_cache_lookups_total").inc(result=result)
+        total = sum(self._counts.values())
+        hits = self._counts["exact"] + self._counts["normalized"]
+        metrics.gauge("llm_cache_hit_ratio").set(round(hits / total, 4))
+
+    async def get(self, model: str, temperature: float, messages: List[Dict[str, str]]) -> Optional[str]:
+        exact_key, norm_key = cache_keys(model, temperature, messages)
+        for result, key in (("exact", exact_key), ("normalized", norm_key)):
+            entry = await self.cache.get(key)
+            if entry is not None and entry.fresh:
+                self._record(result)
+                return entry.value
+        self._record("miss")
+        return None
+
+    async def set(self, model: str, temperature: float, messages: List[Dict[str, str]], response: str):
+        for key in cache_keys(model, temperature, messages):
+            await self.cache.set(key, response, self.ttl_seconds)
+
+    def stats(self) -> Dict:
+        return {**self._counts, "tiers": self.cache.stats()}
+
+
+llm_response_cache: Optional[LLMResponseCache] = None
+if settings.LLM_CACHE_ENABLED:
+    llm_response_cache = LLMResponseCache(
+        TieredCache(
+            "llm",
+            max_entries=settings.LLM_CACHE_MAX_ENTRIES,
+            redis_tier=get_redis_tier() if settings.LLM_CACHE_REDIS else None,
+        ),
+        ttl_seconds=settings.LLM_CACHE_TTL_SECONDS,
+    )
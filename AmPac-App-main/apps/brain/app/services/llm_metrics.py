@@ -0,0 +1,144 @@
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional
+from app.core.config import get_settings
+from app.core import metrics
+from app.services.context_builder import estimate_tokens, message_tokens
+
+settings = get_settings()
+
+# Call outcomes: ok, cache_hit, short_circuit, rate_limited (no quota within the lane
+# budget), timeout, network_error, http_error, cancelled (client left mid-stream) and
+# fallback (canned answer for any other reason).
+
+
+def call_cost_usd(model: str, prompt_tokens: int, completion_tokens: int) -> float:
+    prices = settings.LLM_MODEL_PRICES_PER_MILLION.get(model)
+    if not prices:
+        return 0.0
+    return (prompt_tokens * prices.get("prompt", 0) + completion_tokens * prices.get("completion", 0)) / 1_000_000
+
+
+class LLMCall:
+    """
+    One GroqService call, from entry to the last byte. Filled in as the call goes and
+    recorded once by `finish()`: counters and rolling histograms per task (route) and
+    model, plus an entry in the recent-calls log.
+    """
+
+    def __init__(self, task: str, model: str, messages: List[Dict[str, str]], stream: bool = False):
+        self.task = task
+        self.model = model
+        self.messages = messages
+        self.stream = stream
+        self.started_at = time.perf_counter()
+        self.provider: Optional[str] = None
+        self.hedge: Optional[str] = None
+        self.queue_ms: Optional[float] = None
+        self.upstream_ms: Optional[float] = None
+        self.rate_limited = 0
+        self.prompt_tokens: Optional[int] = None
+        self.completion_tokens: Optional[int] = None
+        self.usage_estimated = False
+        self._finished = False
+
+    def completion(self, completion):
+        """Takes provider, queue wait and upstream latency from a provider pool Completion."""
+        self.provider = completion.provider.name
+        self.hedge = completion.reason
+        self.queue_ms = completion.queue_ms
+        self.upstream_ms = completion.upstream_ms
+        self.rate_limited = completion.rate_limited
+
+    def usage(self, usage: Optional[Dict[str, Any]]):
+        if usage:
+            self.prompt_tokens = usage.get("prompt_tokens")
+            self.completion_tokens = usage.get("completion_tokens")
+
+    def finish(self, outcome: str, answer: Optional[str] = None) -> Dict[str, Any]:
+        if self._finished:
+            return {}
+        self._finished = True
+        total_ms = (time.perf_counter() - self.started_at) * 1000
+        if outcome == "ok" and (self.prompt_tokens is None or self.completion_tokens is None):
+            # Usage missing (e.g. a stream without a usage chunk): count it ourselves
+            self.prompt_tokens = sum(message_tokens(m) for m in self.messages)
+            self.completion_tokens = estimate_tokens(answer or "")
+            self.usage_estimated = True
+        prompt_tokens = self.prompt_tokens or 0
+        completion_tokens = self.completion_tokens or 0
+        cost = call_cost_usd(self.model, prompt_tokens, completion_tokens)
+
+        labels = {"task": self.task, "model": self.model}
+        metrics.counter("llm_calls_total").inc(outcome=outcome, **labels)
+        metrics.histogram("llm_call_latency_ms").observe(total_ms, task=self.task)
+        if self.upstream_ms is not None:
+            metrics.histogram("llm_upstream_latency_ms").observe(self.upstream_ms, **labels)
+        if self.queue_ms is not None:
+            metrics.histogram("llm_call_queue_wait_ms").observe(self.queue_ms, task=self.task)
+        if self.rate_limited:
+            metrics.counter("llm_calls_rate_limited_total").inc(self.rate_limited, **labels)
+        if prompt_tokens or completion_tokens:
+            metrics.counter("llm_tokens_total").inc(prompt_tokens, kind="prompt", **labels)
+            metrics.counter("llm_tokens_total").inc(completion_tokens, kind="completion", **labels)
+            metrics.histogram("llm_completion_tokens").observe(completion_tokens, task=self.task)
+        if cost:
+            metrics.counter("llm_cost_usd_total").inc(cost, **labels)
+
+        record = {
+            "at": time.time(),
+            "task": self.task,
+            "model": self.model,
+            "provider": self.provider,
+            "hedge": self.hedge,
+            "stream": self.stream,
+            "outcome": outcome,
+            "totalMs": round(total_ms, 1),
+            "upstreamMs": round(self.upstream_ms, 1) if self.upstream_ms is not None else None,
+            "queueMs": round(self.queue_ms, 1) if self.queue_ms is not None else None,
+            "rateLimited": self.rate_limited,
+            "promptTokens": prompt_tokens,
+            "completionTokens": completion_tokens,
+            "usageEstimated": self.usage_estimated,
+            "costUsd": round(cost, 8),
+        }
+        llm_call_log.add(record)
+        return record
+
+
+class LLMCallLog:
+    """
+    Recent call records plus lifetime totals per task, for "which routes drive spend
+    and tail latency" at a glance.
+    """
+
+    def __init__(self, max_records: int):
+        self.recent: Deque[Dict[str, Any]] = deque(maxlen=max_records)
+        self.totals: Dict[str, Dict[str, Any]] = {}
+
+    def add(self, record: Dict[str, Any]):
+        self.recent.append(record)
+        totals = self.totals.setdefault(record["task"], {
+            "calls": 0, "promptTokens": 0, "completionTokens": 0, "costUsd": 0.0, "outcomes": {},
+        })
+        totals["calls"] += 1
+        totals["promptTokens"] += record["promptTokens"]
+        totals["completionTokens"] += record["completionTokens"]
+        totals["costUsd"] += record["costUsd"]
+        totals["outcomes"][record["outcome"]] = totals["outcomes"].get(record["outcome"], 0) + 1
+
+    def summary(self) -> Dict[str, Any]:
+        latency = metrics.histogram("llm_call_latency_ms")
+        routes = {}
+        for task, totals in sorted(self.totals.items(), key=lambda item: -item[1]["costUsd"]):
+            routes[task] = {
+                **totals,
+                "costUsd": round(totals["costUsd"], 6),
+                "p50Ms": latency.percentile(50, task=task),
+                "p95Ms": latency.percentile(95, task=task),
+                "p99Ms": latency.percentile(99, task=task),
+            }
+        return {"routes": routes, "recent": list(self.recent)[-20:]}
+
+
+llm_call_log = LLMCallLog(settings.LLM_CALL_LOG_SIZE)
@@ -0,0 +1,313 @@
+import asyncio
+import time
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+import httpx
+from app.core.config import get_settings
+from app.core import metrics
+from app.services.model_router import ModelStats, model_router, quantile
+from app.services.rate_governor import RateGovernor, estimate_tokens, groq_governor
+
+settings = get_settings()
+
+
+def _outcome_for(error: BaseException) -> str:
+    if isinstance(error, asyncio.CancelledError):
+        return "cancelled"
+    if isinstance(error, httpx.TimeoutException):
+        return "timeout"
+    if isinstance(error, httpx.RequestError):
+        return "network_error"
+    return "error"
+
+
+class Completion:
+    """
+    The upstream answer that won a race. For streams the response is still open and its
+    lines up to the first data event have already been read; `aiter_lines` replays them.
+    """
+
+    def __init__(self, provider: "LLMProvider", response: httpx.Response, first_lines: Optional[List[str]] = None,
+                 lines: Optional[AsyncIterator[str]] = None, queue_ms: float = 0.0, upstream_ms: float = 0.0,
+                 rate_limited: int = 0):
+        self.provider = provider
+        self.response = response
+        self.first_lines = first_lines or []
+        self._lines = lines
+        self.queue_ms = queue_ms  # Time spent waiting on the rate governor
+        self.upstream_ms = upstream_ms  # Time to the full response, or to the first event for streams
+        self.rate_limited = rate_limited  # 429s absorbed before this answer
+        self.reason = "primary"  # How the winning attempt was launched: primary, hedge or failover
+
+    @property
+    def status_code(self) -> int:
+        return self.response.status_code
+
+    async def aiter_lines(self) -> AsyncIterator[str]:
+        for line in self.first_lines:
+            yield line
+        async for line in self._lines or self.response.aiter_lines():
+            yield line
+
+    async def aclose(self):
+        await self.response.aclose()
+
+
+class LLMProvider:
+    """
+    One OpenAI-compatible chat completions endpoint with its own client, rate governor
+    and latency stats (time to full response, or to the first event for streams).
+    `models` maps our model names to the provider's when they differ.
+    """
+
+    def __init__(self, name: str, base_url: str, api_key: Optional[str], governor: RateGovernor,
+                 models: Optional[Dict[str, str]] = None, timeout_seconds: float = 10):
+        self.name = name
+        self.base_url = base_url.rstrip("/")
+        self.api_key = api_key
+        self.governor = governor
+        self.models = models or {}
+        self.timeout = timeout_seconds
+        self.client = httpx.AsyncClient(
+            timeout=httpx.Timeout(timeout_seconds),
+            headers={
+                "Authorization": f"Bearer {api_key}" if api_key else "",
+                "Content-Type": "application/json"
+            }
+        )
+        self.stats = {
+            "complete": ModelStats(settings.LLM_SLO_WINDOW_SECONDS),
+            "stream": ModelStats(settings.LLM_SLO_WINDOW_SECONDS),
+        }
+        self.consecutive_failures = 0
+        self.cooldown_until = 0.0
+
+    def cooling_down(self) -> bool:
+        return time.monotonic() < self.cooldown_until
+
+    def _record(self, model: str, kind: str, sent_at: float, outcome: str) -> float:
+        latency_ms = (time.perf_counter() - sent_at) * 1000
+        metrics.counter("llm_provider_requests_total").inc(provider=self.name, outcome=outcome)
+        if outcome == "cancelled":
+            return latency_ms  # A hedge loser's latency is only a lower bound; keep it out of the stats
+        self.stats[kind].add(latency_ms, outcome == "ok")
+        metrics.histogram("llm_provider_latency_ms").observe(latency_ms, provider=self.name, kind=kind)
+        model_router.record(model, latency_ms, outcome)
+        if outcome == "ok":
+            self.consecutive_failures = 0
+            return latency_ms
+        self.consecutive_failures += 1
+        if self.consecutive_failures >= settings.LLM_PROVIDER_FAILURE_THRESHOLD:
+            self.cooldown_until = time.monotonic() + settings.LLM_PROVIDER_COOLDOWN_SECONDS
+            print(f"⚠️ LLM provider {self.name} failing ({outcome}), deprioritized for {settings.LLM_PROVIDER_COOLDOWN_SECONDS}s")
+        return latency_ms
+
+    async def attempt(self, payload: Dict[str, Any], messages: List[Dict[str, str]], lane: str,
+                      stream: bool, deadline: float) -> Optional[Completion]:
+        """
+        Sends one completion request paced by this provider's governor. A 429 is not
+        final: the governor applies Retry-After and the request waits its turn again.
+        Returns None when the lane's wait budget runs out. Cancellation closes the
+        upstream connection.
+        """
+        body = {**payload, "model": self.models.get(payload["model"], payload["model"])}
+        kind = "stream" if stream else "complete"
+        cost = estimate_tokens(messages, payload["max_tokens"])
+        queue_ms = 0.0
+        rate_limited = 0
+        while True:
+            queued_at = time.perf_counter()
+            admitted = await self.governor.acquire(lane, cost, deadline)
+            queue_ms += (time.perf_counter() - queued_at) * 1000
+            if not admitted:
+                print(f"⚠️ {self.name} quota not available within the {lane} wait budget")
+                return None
+            request = self.client.build_request("POST", f"{self.base_url}/chat/completions", json=body)
+            sent_at = time.perf_counter()
+            response = None
+            first_lines: List[str] = []
+            lines = None
+            try:
+                response = await self.client.send(request, stream=stream)
+                self.governor.observe(response.headers, response.status_code)
+                if response.status_code == 429:
+                    rate_limited += 1
+                    await response.aclose()
+                    print(f"⚠️ {self.name} rate limit exceeded, waiting for quota")
+                    continue
+                if stream and response.status_code == 200:
+                    # Streams count as answered at the first event, not at the headers
+                    lines = response.aiter_lines()
+                    async for line in lines:
+                        first_lines.append(line)
+                        if line.startswith("data:"):
+                            break
+                elif stream:
+                    await response.aread()
+            except BaseException as e:
+                if response is not None:
+                    await response.aclose()
+                self._record(payload["model"], kind, sent_at, _outcome_for(e))
+                raise
+            outcome = "ok" if response.status_code == 200 else f"http_{response.status_code}"
+            upstream_ms = self._record(payload["model"], kind, sent_at, outcome)
+            return Completion(self, response, first_lines, lines, queue_ms=queue_ms, upstream_ms=upstream_ms,
+                              rate_limited=rate_limited)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "baseUrl": self.base_url,
+            "coolingDown": self.cooling_down(),
+            "consecutiveFailures": self.consecutive_failures,
+            **{kind: stats.to_dict() for kind, stats in self.stats.items()},
+        }
+
+    async def close(self):
+        await self.client.aclose()
+
+
+class ProviderPool:
+    """
+    Races a completion across providers. The first provider gets the request; if it
+    hasn't answered by its recent latency quantile, a hedged copy goes to the next one
+    and whichever answers first wins, the other being cancelled. Errors fail over to
+    the next provider immediately. At most two attempts are in flight at a time.
+    """
+
+    def __init__(self, providers: List[LLMProvider], hedge_enabled: bool = True, hedge_quantile: float = 0.9,
+                 hedge_min_ms: float = 300, hedge_max_ms: float = 4000, hedge_default_ms: float = 1500,
+                 min_samples: int = 10):
+        self.providers = providers
+        self.hedge_enabled = hedge_enabled
+        self.hedge_quantile = hedge_quantile
+        self.hedge_min_ms = hedge_min_ms
+        self.hedge_max_ms = hedge_max_ms
+        self.hedge_default_ms = hedge_default_ms
+        self.min_samples = min_samples
+
+    def ordered(self) -> List[LLMProvider]:
+        """Configured order, with providers in failure cooldown moved to the back."""
+        return sorted(self.providers, key=lambda p: p.cooling_down())
+
+    def hedge_delay(self, provider: LLMProvider, stream: bool) -> float:
+        """
+        Seconds to wait on `provider` before hedging. A provider without enough recent
+        samples of its own (e.g. a backup that only sees failover traffic) is judged by
+        the pool's samples.
+        """
+        kind = "stream" if stream else "complete"
+        samples = provider.stats[kind].latencies()
+        if len(samples) < self.min_samples:
+            samples = [latency for p in self.providers for latency in p.stats[kind].latencies()]
+        if len(samples) < self.min_samples:
+            delay_ms = self.hedge_default_ms
+        else:
+            delay_ms = min(self.hedge_max_ms, max(self.hedge_min_ms, quantile(samples, self.hedge_quantile)))
+        return delay_ms / 1000
+
+    async def send(self, payload: Dict[str, Any], messages: List[Dict[str, str]], lane: str,
+                   stream: bool = False) -> Optional[Completion]:
+        """
+        Returns the first successful completion. If every provider fails, returns the last
+        unsuccessful completion (or None if none got quota) or re-raises the last error,
+        so callers handle it exactly as a single-upstream failure. The caller closes the
+        returned completion.
+        """
+        queue = self.ordered()
+        if not queue:
+            return None
+        deadline = time.monotonic() + queue[0].governor.budget(lane)
+        pending: Dict[asyncio.Task, Tuple[LLMProvider, str]] = {}
+        hedge_at: Optional[float] = None
+        failure: Optional[Completion] = None
+        error: Optional[BaseException] = None
+
+        def launch(reason: str):
+            nonlocal hedge_at
+            provider = queue.pop(0)
+            metrics.counter("llm_provider_launches_total").inc(provider=provider.name, reason=reason)
+            task = asyncio.create_task(provider.attempt(payload, messages, lane, stream, deadline))
+            pending[task] = (provider, reason)
+            hedge_at = time.monotonic() + self.hedge_delay(provider, stream) if self.hedge_enabled else None
+
+        launch("primary")
+        try:
+            while pending:
+                timeout = None
+                if queue and len(pending) == 1 and hedge_at is not None:
+                    timeout = max(0.0, hedge_at - time.monotonic())
+                done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    print(f"⏱️ {next(iter(pending.values()))[0].name} slow, hedging to {queue[0].name}")
+                    launch("hedge")
+                    continue
+
+                for task in done:
+                    provider, reason = pending.pop(task)
+                    try:
+                        result = task.result()
+                    except Exception as e:
+                        error, result = e, None
+                    if result is not None and result.status_code == 200:
+                        metrics.counter("llm_provider_wins_total").inc(provider=provider.name, reason=reason)
+                        result.reason = reason
+                        for other in done:
+                            if other is not task and not other.exception() and other.result() is not None:
+                                await other.result().aclose()
+                        if failure is not None:
+                            await failure.aclose()
+                        return result
+                    if result is not None:
+                        if failure is not None:
+                            await failure.aclose()
+                        failure = result
+                    if queue and len(pending) < 2:
+                        print(f"🔁 {provider.name} failed, failing over to {queue[0].name}")
+                        launch("failover")
+        finally:
+            for task in pending:
+                task.cancel()
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+
+        if failure is None and error is not None:
+            raise error
+        return failure
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {provider.name: provider.to_dict() for provider in self.providers}
+
+    async def close(self):
+        for provider in self.providers:
+            await provider.close()
+
+
+def build_providers() -> ProviderPool:
+    """
+    Groq first (when it has a key), then each LLM_PROVIDERS entry in order.
+    """
+    providers: List[LLMProvider] = []
+    if settings.GROQ_API_KEY:
+        providers.append(LLMProvider("groq", settings.GROQ_BASE_URL, settings.GROQ_API_KEY, groq_governor,
+                                     timeout_seconds=settings.LLM_PROVIDER_TIMEOUT_SECONDS))
+    for config in settings.LLM_PROVIDERS:
+        name = config.get("name") or config["base_url"]
+        governor = RateGovernor(
+            name,
+            requests_per_minute=config.get("requests_per_minute", settings.GROQ_REQUESTS_PER_MINUTE),
+            tokens_per_minute=config.get("tokens_per_minute", settings.GROQ_TOKENS_PER_MINUTE),
+            budgets=settings.GROQ_QUEUE_BUDGET_SECONDS,
+        )
+        providers.append(LLMProvider(name, config["base_url"], config.get("api_key"), governor,
+                                     models=config.get("models"),
+                                     timeout_seconds=config.get("timeout_seconds", settings.LLM_PROVIDER_TIMEOUT_SECONDS)))
+    return ProviderPool(
+        providers,
+        hedge_enabled=settings.LLM_HEDGE_ENABLED,
+        hedge_quantile=settings.LLM_HEDGE_QUANTILE,
+        hedge_min_ms=settings.LLM_HEDGE_MIN_DELAY_MS,
+        hedge_max_ms=settings.LLM_HEDGE_MAX_DELAY_MS,
+        hedge_default_ms=settings.LLM_HEDGE_DEFAULT_DELAY_MS,
+    )
+
+
+llm_providers = build_providers()
@@ -1,33 +1,83 @@
+from typing import AsyncIterator, Dict, List, Optional
 from app.services.groq_service import groq_service
 from app.core.config import get_settings
 
 settings = get_settings()
 
+FALLBACK_MESSAGE = "I'm experiencing technical difficulties. Please try again in a moment, or contact our support team for immediate assistance."
+
 class LLMService:
+    """
+    Entry point for LLM calls. Callers tag each call with a task ("assistant", "chat",
+    "copilot", "deal_analysis", "email_draft") which selects model, parameters and
+    rate-governor lane from LLM_ROUTES.
+    """
+
     def __init__(self):
         # Use Groq service for all AI interactions
         self.groq = groq_service
         print("🚀 LLM Service initialized with Groq API")
 
-    async def generate_response(self, prompt: str, system_prompt: str = None) -> str:
+    async def generate_response(self, prompt: str, system_prompt: str = None, task: str = "default", cache: bool = True, lane: Optional[str] = None) -> str:
         """
         Generate AI response using Groq API with intelligent fallback.
-        
+
         Args:
             prompt: User input prompt
             system_prompt: Optional system instruction
-            
+            task: Call-site tag used for model routing
+            cache: Allow the response cache; routes with personalized prompts pass False
+            lane: Override the route's lane ("interactive" or "batch")
+
         Returns:
             Generated response text
         """
         try:
             # Use Groq service for response generation
-            response = await self.groq.generate_response(prompt, system_prompt)
+            response = await self.groq.generate_response(prompt, system_prompt, cache=cache, lane=lane, task=task)
             return response
-            
+
         except Exception as e:
             print(f"❌ LLM Service error: {str(e)}")
             # Return a generic fallback response
-            return "I'm experiencing technical difficulties. Please try again in a moment, or contact our support team for immediate assistance."
+            return FALLBACK_MESSAGE
+
+    async def stream_response(self, prompt: str, system_prompt: str = None, task: str = "default", cache: bool = True, lane: Optional[str] = None) -> AsyncIterator[str]:
+        """
+        Stream an AI response as text pieces. Same fallback behaviour as generate_response.
+        """
+        emitted = False
+        try:
+            async for piece in self.groq.stream_response(prompt, system_prompt, cache=cache, lane=lane, task=task):
+                emitted = True
+                yield piece
+        except Exception as e:
+            print(f"❌ LLM Service stream error: {str(e)}")
+            if not emitted:
+                yield FALLBACK_MESSAGE
+
+    async def chat(self, messages: List[Dict[str, str]], task: str = "chat", max_tokens: Optional[int] = None, cache: bool = True, lane: Optional[str] = None) -> str:
+        """
+        Multi-turn completion for a prepared message list (see context_builder.build_context).
+        """
+        try:
+            return await self.groq.chat_completion(messages, cache=cache, lane=lane, max_tokens=max_tokens, task=task)
+        except Exception as e:
+            print(f"❌ LLM Service error: {str(e)}")
+            return FALLBACK_MESSAGE
+
+    async def stream_chat(self, messages: List[Dict[str, str]], task: str = "chat", max_tokens: Optional[int] = None, cache: bool = True, lane: Optional[str] = None) -> AsyncIterator[str]:
+        """
+        Streaming counterpart of chat.
+        """
+        emitted = False
+        try:
+            async for piece in self.groq.stream_chat_completion(messages, cache=cache, lane=lane, max_tokens=max_tokens, task=task):
+                emitted = True
+                yield piece
+        except Exception as e:
+            print(f"❌ LLM Service stream error: {str(e)}")
+            if not emitted:
+                yield FALLBACK_MESSAGE
 
 llm_service = LLMService()
@@ -0,0 +1,162 @@
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Deque, Dict, List, Optional, Tuple
+from app.core.config import get_settings
+from app.core import metrics
+
+settings = get_settings()
+
+
+@dataclass
+class ModelRoute:
+    """
+    Model and generation parameters for one call site (task tag).
+    `fallback_model` is used while the primary's observed p95 exceeds `slo_p95_ms`.
+    """
+    task: str
+    model: str
+    temperature: float = 0.1
+    max_tokens: int = 1024
+    lane: str = "interactive"
+    slo_p95_ms: Optional[float] = None
+    fallback_model: Optional[str] = None
+    json_mode: bool = False
+
+
+@dataclass
+class RouteChoice:
+    route: ModelRoute
+    model: str
+    degraded: bool = False  # True when serving from fallback_model because of the SLO
+
+
+def quantile(values: List[float], q: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * (len(ordered) - 1) + 0.5))]
+
+
+class ModelStats:
+    """
+    Latency samples and outcomes for one model over the last `window_seconds`. Old
+    samples age out, so a recovered model is noticed from a few probes instead of
+    after its whole history has been overwritten.
+    """
+
+    def __init__(self, window_seconds: float, max_samples: int = 500):
+        self.window_seconds = window_seconds
+        self._samples: Deque[Tuple[float, float, bool]] = deque(maxlen=max_samples)
+
+    def add(self, latency_ms: float, ok: bool):
+        self._samples.append((time.monotonic(), latency_ms, ok))
+
+    def _recent(self) -> List[Tuple[float, float, bool]]:
+        cutoff = time.monotonic() - self.window_seconds
+        while self._samples and self._samples[0][0] < cutoff:
+            self._samples.popleft()
+        return list(self._samples)
+
+    def count(self) -> int:
+        return len(self._recent())
+
+    def latencies(self) -> List[float]:
+        return [latency for _, latency, _ in self._recent()]
+
+    def quantile(self, q: float) -> Optional[float]:
+        return quantile(self.latencies(), q)
+
+    def p95(self) -> Optional[float]:
+        return self.quantile(0.95)
+
+    def error_rate(self) -> float:
+        recent = self._recent()
+        return 1 - sum(ok for _, _, ok in recent) / len(recent) if recent else 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        p95 = self.p95()
+        return {
+            "samples": self.count(),
+            "p95Ms": round(p95, 1) if p95 is not None else None,
+            "errorRate": round(self.error_rate(), 4),
+        }
+
+
+class ModelRouter:
+    """
+    Maps task tags to model routes. While a primary model's recent p95 breaks the
+    route's SLO, calls go to the faster fallback model, with every `probe_every`-th
+    call still sent to the primary so recovery is noticed.
+    """
+
+    def __init__(self, routes: Dict[str, Dict[str, Any]], default_model: str, window_seconds: float = 120,
+                 min_samples: int = 20, probe_every: int = 10):
+        self.default_model = default_model
+        self.routes: Dict[str, ModelRoute] = {
+            task: ModelRoute(task=task, **{"model": default_model, **params}) for task, params in routes.items()
+        }
+        self.window_seconds = window_seconds
+        self.min_samples = min_samples
+        self.probe_every = probe_every
+        self._stats: Dict[str, ModelStats] = {}
+        self._degraded_calls: Dict[str, int] = {}
+
+    def stats(self, model: str) -> ModelStats:
+        if model not in self._stats:
+            self._stats[model] = ModelStats(self.window_seconds)
+        return self._stats[model]
+
+    def route(self, task: str) -> ModelRoute:
+        return self.routes.get(task) or self.routes.get("default") or ModelRoute(task=task, model=self.default_model)
+
+    def _breaches_slo(self, route: ModelRoute) -> bool:
+        if route.slo_p95_ms is None or not route.fallback_model:
+            return False
+        stats = self.stats(route.model)
+        if stats.count() < self.min_samples:
+            return False
+        return stats.p95() > route.slo_p95_ms
+
+    def select(self, task: str) -> RouteChoice:
+        route = self.route(task)
+        if not self._breaches_slo(route):
+            self._degraded_calls.pop(task, None)
+            return RouteChoice(route=route, model=route.model)
+
+        calls = self._degraded_calls.get(task, 0) + 1
+        self._degraded_calls[task] = calls
+        if calls % self.probe_every == 0:
+            return RouteChoice(route=route, model=route.model)
+        metrics.counter("llm_route_fallbacks_total").inc(task=task, model=route.fallback_model)
+        return RouteChoice(route=route, model=route.fallback_model, degraded=True)
+
+    def record(self, model: str, latency_ms: float, outcome: str):
+        """
+        `outcome` is "ok" or an error kind; errors count as SLO samples too, since a
+        timeout is the slowest kind of answer.
+        """
+        stats = self.stats(model)
+        stats.add(latency_ms, outcome == "ok")
+        metrics.histogram("llm_model_latency_ms").observe(latency_ms, model=model)
+        metrics.counter("llm_model_requests_total").inc(model=model, outcome=outcome)
+        p95 = stats.p95()
+        if p95 is not None:
+            metrics.gauge("llm_model_p95_ms").set(round(p95, 1), model=model)
+        metrics.gauge("llm_model_error_rate").set(round(stats.error_rate(), 4), model=model)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "routes": {task: {"model": r.model, "fallbackModel": r.fallback_model, "sloP95Ms": r.slo_p95_ms,
+                              "degraded": self._breaches_slo(r)} for task, r in self.routes.items()},
+            "models": {model: stats.to_dict() for model, stats in self._stats.items()},
+        }
+
+
+model_router = ModelRouter(
+    settings.LLM_ROUTES,
+    default_model=settings.GROQ_MODEL,
+    window_seconds=settings.LLM_SLO_WINDOW_SECONDS,
+    min_samples=settings.LLM_SLO_MIN_SAMPLES,
+    probe_every=settings.LLM_SLO_PROBE_EVERY,
+)
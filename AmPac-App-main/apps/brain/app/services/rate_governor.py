@@ -0,0 +1,199 @@
+import asyncio
+import heapq
+import itertools
+import re
+import time
+from typing import Dict, List, Mapping, Optional, Tuple
+from app.core.config import get_settings
+from app.core import metrics
+from app.services.context_builder import message_tokens
+
+settings = get_settings()
+
+# Lower value = served first. Interactive users shouldn't queue behind batch analysis.
+LANES = {"interactive": 0, "batch": 1}
+
+_DURATION_PART = re.compile(r"([\d.]+)(ms|h|m|s)")
+
+
+def parse_duration(value: Optional[str]) -> Optional[float]:
+    """
+    Parses Groq reset/Retry-After values ("7.66s", "2m59.56s", "120ms", "3") into seconds.
+    """
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parts = _DURATION_PART.findall(value)
+    if not parts:
+        return None
+    scale = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+    return sum(float(amount) * scale[unit] for amount, unit in parts)
+
+
+class TokenBucket:
+    """
+    Continuous-refill bucket. `level` may be pulled down by what the server reports.
+    """
+
+    def __init__(self, capacity: float, per_seconds: float = 60.0):
+        self.capacity = capacity
+        self.rate = capacity / per_seconds
+        self.level = capacity
+        self.updated = time.monotonic()
+
+    def refill(self, now: float):
+        if now <= self.updated:
+            return  # Held empty until a server-imposed reset
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, amount: float, now: float) -> float:
+        self.refill(now)
+        amount = min(amount, self.capacity)  # Oversized requests go through once the bucket is full
+        return 0.0 if self.level >= amount else (amount - self.level) / self.rate
+
+    def take(self, amount: float, now: float):
+        self.refill(now)
+        self.level -= min(amount, self.capacity)
+
+    def sync(self, remaining: float, now: float):
+        self.refill(now)
+        self.level = min(self.level, remaining)
+
+    def hold_empty(self, until: float):
+        """Empties the bucket and starts refilling at `until`, so traffic ramps back in instead of stampeding."""
+        self.level = 0.0
+        self.updated = max(self.updated, until)
+
+
+class RateGovernor:
+    """
+    Client-side pacing for Groq: request and token buckets, a server-imposed
+    block (Retry-After / exhausted quota), and a priority queue of waiters so
+    interactive lanes are admitted before batch lanes.
+    """
+
+    def __init__(self, name: str, requests_per_minute: int, tokens_per_minute: int, budgets: Dict[str, float]):
+        self.name = name
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.budgets = budgets
+        self.blocked_until = 0.0
+        self._queue: List[Tuple[int, int, float]] = []
+        self._seq = itertools.count()
+        self._changed: Optional[asyncio.Event] = None
+
+    def budget(self, lane: str) -> float:
+        return self.budgets.get(lane, self.budgets.get("interactive", 8.0))
+
+    def _notify(self):
+        if self._changed is not None:
+            self._changed.set()
+        self._changed = asyncio.Event()
+
+    def _delay(self, tokens: float, now: float) -> float:
+        return max(
+            self.blocked_until - now,
+            self.requests.delay(1, now),
+            self.tokens.delay(tokens, now),
+        )
+
+    def _leave(self, waiter: Tuple[int, int, float]):
+        self._queue.remove(waiter)
+        heapq.heapify(self._queue)
+        metrics.gauge("llm_queue_depth").set(len(self._queue), provider=self.name)
+        self._notify()
+
+    async def acquire(self, lane: str, tokens: float, deadline: float) -> bool:
+        """
+        Waits for a slot until the monotonic `deadline`. Returns False if the slot can't be
+        had in time, without waiting out a delay that is already known to be too long.
+        """
+        started = time.monotonic()
+        waiter = (LANES.get(lane, LANES["interactive"]), next(self._seq), tokens)
+        heapq.heappush(self._queue, waiter)
+        metrics.gauge("llm_queue_depth").set(len(self._queue), provider=self.name)
+        self._notify()
+
+        while True:
+            now = time.monotonic()
+            if self._queue[0] is waiter:
+                delay = self._delay(tokens, now)
+                if delay <= 0:
+                    self.requests.take(1, now)
+                    self.tokens.take(tokens, now)
+                    self._leave(waiter)
+                    metrics.histogram("llm_queue_wait_ms").observe((now - started) * 1000, lane=lane)
+                    return True
+                if now + delay > deadline:
+                    break
+                wait = delay
+            else:
+                wait = deadline - now
+                if wait <= 0:
+                    break
+
+            changed = self._changed
+            try:
+                await asyncio.wait_for(changed.wait(), timeout=wait)
+            except asyncio.TimeoutError:
+                pass
+            except asyncio.CancelledError:
+                self._leave(waiter)
+                raise
+
+        self._leave(waiter)
+        metrics.counter("llm_queue_rejections_total").inc(provider=self.name, lane=lane)
+        metrics.histogram("llm_queue_wait_ms").observe((time.monotonic() - started) * 1000, lane=lane)
+        return False
+
+    def observe(self, headers: Mapping[str, str], status_code: int):
+        """
+        Syncs the buckets with Groq's x-ratelimit-* headers and applies Retry-After on 429.
+        """
+        now = time.monotonic()
+        for bucket, kind in ((self.requests, "requests"), (self.tokens, "tokens")):
+            remaining = headers.get(f"x-ratelimit-remaining-{kind}")
+            if remaining is None:
+                continue
+            try:
+                remaining = float(remaining)
+            except ValueError:
+                continue
+            bucket.sync(remaining, now)
+            if remaining <= 0:
+                reset = parse_duration(headers.get(f"x-ratelimit-reset-{kind}"))
+                if reset:
+                    self.blocked_until = max(self.blocked_until, now + reset)
+                    bucket.hold_empty(now + reset)
+
+        if status_code == 429:
+            metrics.counter("llm_rate_limited_total").inc(provider=self.name)
+            retry_after = parse_duration(headers.get("retry-after")) or 1.0
+            self.blocked_until = max(self.blocked_until, now + retry_after)
+            self.requests.hold_empty(self.blocked_until)
+
+        metrics.gauge("llm_rate_bucket_level").set(round(self.requests.level, 2), provider=self.name, kind="requests")
+        metrics.gauge("llm_rate_bucket_level").set(round(self.tokens.level, 2), provider=self.name, kind="tokens")
+        self._notify()
+
+
+def estimate_tokens(messages: List[Dict[str, str]], max_tokens: int) -> float:
+    """
+    Rough TPM charge for a request: estimated prompt tokens plus the completion we
+    expect. The buckets are corrected from response headers afterwards.
+    """
+    prompt = sum(message_tokens(m) for m in messages)
+    return prompt + min(max_tokens, 256)
+
+
+groq_governor = RateGovernor(
+    "groq",
+    requests_per_minute=settings.GROQ_REQUESTS_PER_MINUTE,
+    tokens_per_minute=settings.GROQ_TOKENS_PER_MINUTE,
+    budgets=settings.GROQ_QUEUE_BUDGET_SECONDS,
+)
@@ -0,0 +1,102 @@
+import asyncio
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+from app.core.config import get_settings
+from app.core import metrics
+from app.services.cache import CacheEntry, LRUCache
+from app.services.intent_router import intent_router
+from app.services.knowledge_service import KnowledgeService, knowledge_service
+from app.services.llm_cache import normalize_content
+
+settings = get_settings()
+
+
+@dataclass
+class Retrieval:
+    query: str
+    chunks: List[Dict[str, Any]] = field(default_factory=list)
+    elapsed_ms: float = 0.0
+    cached: bool = False
+    error: Optional[str] = None
+
+    def snippets(self) -> List[str]:
+        """Chunks as build_context knowledge, best first, each naming where it came from."""
+        return [f"{chunk['text']} (Source: {chunk['source']}, {chunk.get('section') or 'n/a'})" for chunk in self.chunks]
+
+    def to_dict(self, used: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Response metadata. `used` is how many chunks made it into the prompt (the
+        context builder drops the tail past its budget); citations number them as the
+        prompt does.
+        """
+        used = len(self.chunks) if used is None else used
+        return {
+            "retrievalMs": round(self.elapsed_ms, 1),
+            "chunks": used,
+            "retrieved": len(self.chunks),
+            "cached": self.cached,
+            "citations": [
+                {
+                    "ref": number,
+                    "source": chunk["source"],
+                    "section": chunk.get("section"),
+                    "score": round(chunk["score"], 3),
+                }
+                for number, chunk in enumerate(self.chunks[:used], start=1)
+            ],
+        }
+
+
+class KnowledgeRetriever:
+    """
+    Retrieval stage for chat: top-k knowledge chunks for a user message, searched off
+    the event loop so it overlaps with the rest of prompt assembly. Results are cached
+    per normalized query and corpus generation, so a re-indexed or newly published
+    knowledge base is never answered from stale hits.
+    """
+
+    def __init__(self, knowledge: KnowledgeService, ttl_seconds: float, max_entries: int):
+        self.knowledge = knowledge
+        self.ttl_seconds = ttl_seconds
+        self.cache = LRUCache(max_entries)
+
+    def _key(self, query: str, k: int, filters: Optional[Dict[str, Any]]) -> str:
+        return f"{self.knowledge.generation}:{k}:{sorted((filters or {}).items())!r}:{normalize_content(query)}"
+
+    async def retrieve(self, query: str, k: Optional[int] = None, filters: Optional[Dict[str, Any]] = None) -> Retrieval:
+        """Never raises: a failed search is reported and the chat goes on without knowledge."""
+        if intent_router.smalltalk(query):
+            # "thanks!" has no policy to look up (and is answered without the LLM anyway)
+            metrics.counter("rag_cache_lookups_total").inc(result="smalltalk")
+            return Retrieval(query)
+        started = time.perf_counter()
+        k = k or settings.RAG_TOP_K
+        key = self._key(query, k, filters)
+        entry = self.cache.get(key)
+        if entry is not None and entry.fresh:
+            metrics.counter("rag_cache_lookups_total").inc(result="hit")
+            retrieval = Retrieval(query, entry.value, cached=True)
+        else:
+            metrics.counter("rag_cache_lookups_total").inc(result="miss")
+            try:
+                chunks = await asyncio.to_thread(self.knowledge.search, query, k, filters)
+                retrieval = Retrieval(query, chunks)
+                self.cache.set(key, CacheEntry(chunks, time.time() + self.ttl_seconds))
+            except Exception as e:
+                print(f"[Retrieval] Knowledge search failed, answering without it: {e}")
+                retrieval = Retrieval(query, error=str(e))
+        retrieval.elapsed_ms = (time.perf_counter() - started) * 1000
+        metrics.histogram("rag_retrieval_ms").observe(retrieval.elapsed_ms, cached=str(retrieval.cached).lower())
+        metrics.histogram("rag_chunks").observe(len(retrieval.chunks))
+        return retrieval
+
+    def stats(self) -> Dict[str, Any]:
+        return {"entries": len(self.cache), "generation": self.knowledge.generation}
+
+
+knowledge_retriever = KnowledgeRetriever(
+    knowledge_service,
+    ttl_seconds=settings.RAG_CACHE_TTL_SECONDS,
+    max_entries=settings.RAG_CACHE_MAX_ENTRIES,
+)
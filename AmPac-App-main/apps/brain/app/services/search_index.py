@@ -0,0 +1,261 @@
+import heapq
+import math
+import re
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Sequence, Set, Tuple
+import numpy as np
+
+# Decimals stay whole so "1.25x" and "1.15" are searchable as written
+_TOKEN = re.compile(r"[a-z0-9]+(?:\.[0-9]+)*")
+STOPWORDS = frozenset(
+    "a an and are as at be by can do does for from how i if in is it me my of on or our "
+    "the this to we what when where which who why will with you your".split()
+)
+
+
+def normalize_term(token: str) -> str:
+    # Plural folding only ("loans" -> "loan", not "business" -> "busines"); no stemmer dependency
+    if len(token) > 3 and token.endswith("s") and not token.endswith("ss") and not token[-2].isdigit():
+        return token[:-1]
+    return token
+
+
+def index_terms(text: str) -> List[str]:
+    return [normalize_term(token) for token in _TOKEN.findall(text.lower()) if token not in STOPWORDS]
+
+
+class InvertedIndex:
+    """
+    BM25 over a term -> {doc: term frequency} inverted index. Documents can be added and
+    removed at any time; document frequencies and the average length are kept up to date
+    as they change, so there is no rebuild step. Filterable fields get their own posting
+    lists (value -> docs), so a filter narrows candidates with set lookups instead of a
+    per-document check.
+    """
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75, filter_fields: Iterable[str] = ()):
+        self.k1 = k1
+        self.b = b
+        self.postings: Dict[str, Dict[int, int]] = {}
+        self.field_postings: Dict[str, Dict[str, Set[int]]] = {name: {} for name in filter_fields}
+        self.doc_len: Dict[int, int] = {}
+        self.total_len = 0
+        self._slots: Dict[str, int] = {}  # Document key -> internal id
+        self._keys: Dict[int, str] = {}
+        self._doc_terms: Dict[int, Tuple[str, ...]] = {}  # For removal
+        self._doc_fields: Dict[int, Dict[str, Tuple[str, ...]]] = {}
+        self._next_slot = 0
+        self._norms: Optional[Dict[int, float]] = None  # Length normalization, cached until the next change
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._slots
+
+    def add(self, key: str, weighted_text: Iterable[Tuple[str, int]], fields: Optional[Mapping[str, Iterable[str]]] = None):
+        """
+        Indexes (or re-indexes) document `key`. `weighted_text` is (text, weight) pairs,
+        where a term found in a text counts `weight` times, e.g. curated keywords above
+        body text. `fields` maps filter field -> values.
+        """
+        if key in self._slots:
+            self.remove(key)
+        slot = self._next_slot
+        self._next_slot += 1
+
+        frequencies: Dict[str, int] = {}
+        for text, weight in weighted_text:
+            for term in index_terms(text):
+                frequencies[term] = frequencies.get(term, 0) + weight
+        for term, frequency in frequencies.items():
+            self.postings.setdefault(term, {})[slot] = frequency
+        length = sum(frequencies.values())
+
+        doc_fields: Dict[str, Tuple[str, ...]] = {}
+        for name, values in (fields or {}).items():
+            if name not in self.field_postings:
+                continue
+            values = tuple({str(value).lower() for value in values if value is not None})
+            for value in values:
+                self.field_postings[name].setdefault(value, set()).add(slot)
+            doc_fields[name] = values
+
+        self._slots[key] = slot
+        self._keys[slot] = key
+        self._doc_terms[slot] = tuple(frequencies)
+        self._doc_fields[slot] = doc_fields
+        self.doc_len[slot] = length
+        self.total_len += length
+        self._norms = None
+
+    def remove(self, key: str) -> bool:
+        slot = self._slots.pop(key, None)
+        if slot is None:
+            return False
+        del self._keys[slot]
+        for term in self._doc_terms.pop(slot):
+            docs = self.postings[term]
+            del docs[slot]
+            if not docs:
+                del self.postings[term]
+        for name, values in self._doc_fields.pop(slot).items():
+            for value in values:
+                docs = self.field_postings[name][value]
+                docs.discard(slot)
+                if not docs:
+                    del self.field_postings[name][value]
+        self.total_len -= self.doc_len.pop(slot)
+        self._norms = None
+        return True
+
+    def _length_norms(self) -> Dict[int, float]:
+        if self._norms is None:
+            average = self.total_len / len(self.doc_len) if self.doc_len else 1.0
+            k1, b = self.k1, self.b
+            self._norms = {slot: k1 * (1 - b + b * length / average) for slot, length in self.doc_len.items()}
+        return self._norms
+
+    def allowed(self, filters: Optional[Mapping[str, Iterable[str]]]) -> Optional[Set[int]]:
+        """
+        Documents passing `filters` (field -> accepted values; any value matches, every
+        field must match), or None when nothing is filtered.
+        """
+        allowed: Optional[Set[int]] = None
+        for name, values in (filters or {}).items():
+            if values is None:
+                continue
+            if isinstance(values, str):
+                values = [values]
+            by_value = self.field_postings.get(name, {})
+            matching: Set[int] = set()
+            for value in values:
+                matching |= by_value.get(str(value).lower(), set())
+            allowed = matching if allowed is None else allowed & matching
+            if not allowed:
+                return set()
+        return allowed
+
+    def allowed_keys(self, filters: Optional[Mapping[str, Iterable[str]]]) -> Optional[List[str]]:
+        allowed = self.allowed(filters)
+        return None if allowed is None else [self._keys[slot] for slot in allowed]
+
+    def idf(self, term: str) -> float:
+        df = len(self.postings.get(term, ()))
+        return math.log(1 + (len(self._slots) - df + 0.5) / (df + 0.5))
+
+    def idf_weight(self, term: str) -> float:
+        """IDF scaled to 0..1 (a term in a single document is 1); 0 for unknown terms."""
+        if term not in self.postings:
+            return 0.0
+        return self.idf(term) / math.log(1 + len(self._slots) / 1.5 + 0.5 / 1.5)
+
+    def search(self, query: str, k: int = 10, filters: Optional[Mapping[str, Iterable[str]]] = None) -> List[Tuple[str, float]]:
+        """Top `k` (key, BM25 score) pairs for `query`, best first."""
+        terms = set(index_terms(query))
+        allowed = self.allowed(filters)
+        if not terms or allowed == set():
+            return []
+        norms = self._length_norms()
+        k1 = self.k1
+        scores: Dict[int, float] = {}
+        for term in terms:
+            docs = self.postings.get(term)
+            if not docs:
+                continue
+            weight = self.idf(term) * (k1 + 1)
+            if allowed is not None and len(allowed) < len(docs):
+                docs = {slot: docs[slot] for slot in allowed if slot in docs}
+            for slot, tf in docs.items():
+                if allowed is None or slot in allowed:
+                    scores[slot] = scores.get(slot, 0.0) + weight * tf / (tf + norms[slot])
+        # Ties go to the earlier document, so results don't depend on set iteration order
+        best = heapq.nlargest(k, scores.items(), key=lambda item: (item[1], -item[0]))
+        return [(self._keys[slot], score) for slot, score in best]
+
+    def export(self, keys: Sequence[str]) -> Dict[str, Any]:
+        """
+        The index as flat arrays, renumbered so document keys[i] is row i (see
+        index_snapshot.FrozenIndex): sorted terms with CSR postings (offsets into rows and
+        term frequencies, rows ascending per term), document lengths and, per filter
+        field, sorted values with their rows. `keys` must cover every indexed document.
+        """
+        slot_rows = np.full(self._next_slot, -1, dtype=np.int64)
+        for row, key in enumerate(keys):
+            slot_rows[self._slots[key]] = row
+
+        def csr(lists: Mapping[str, Iterable[int]], values: Optional[Mapping[str, Mapping[int, int]]] = None):
+            names = sorted(lists)
+            offsets = np.zeros(len(names) + 1, dtype=np.int64)
+            rows, tfs = [], []
+            for i, name in enumerate(names):
+                slots = np.fromiter(lists[name], dtype=np.int64)
+                term_rows = slot_rows[slots]
+                order = np.argsort(term_rows)
+                rows.append(term_rows[order])
+                if values is not None:
+                    tfs.append(np.fromiter(values[name].values(), dtype=np.int32)[order])
+                offsets[i + 1] = offsets[i] + len(slots)
+            empty = np.zeros(0, dtype=np.int64)
+            flat_rows = np.concatenate(rows).astype(np.int32) if rows else empty.astype(np.int32)
+            flat_tfs = np.concatenate(tfs) if tfs else empty.astype(np.int32)
+            return names, offsets, flat_rows, flat_tfs
+
+        terms, offsets, rows, tfs = csr(self.postings, self.postings)
+        fields = {}
+        for name, by_value in self.field_postings.items():
+            values, value_offsets, value_rows, _ = csr(by_value)
+            fields[name] = {"values": values, "offsets": value_offsets, "rows": value_rows}
+        return {
+            "terms": terms, "offsets": offsets, "rows": rows, "tfs": tfs,
+            "doc_len": np.array([self.doc_len[self._slots[key]] for key in keys], dtype=np.int32),
+            "fields": fields, "k1": self.k1, "b": self.b,
+        }
+
+    @classmethod
+    def from_export(cls, exported: Mapping[str, Any], keys: Sequence[str]) -> "InvertedIndex":
+        """The inverse of export(): an editable index holding the same documents as rows."""
+        index = cls(exported["k1"], exported["b"], filter_fields=exported["fields"])
+        offsets = np.asarray(exported["offsets"])
+        rows = np.asarray(exported["rows"])
+        tfs = np.asarray(exported["tfs"])
+        terms = list(exported["terms"])
+        for i, term in enumerate(terms):
+            start, end = int(offsets[i]), int(offsets[i + 1])
+            index.postings[term] = dict(zip(rows[start:end].tolist(), tfs[start:end].tolist()))
+
+        def by_row(names: List[str], name_offsets: np.ndarray, name_rows: np.ndarray) -> List[Tuple[str, ...]]:
+            # Per document, the names (terms or field values) whose lists contain it
+            owners = np.repeat(np.arange(len(names)), np.diff(name_offsets))
+            order = np.argsort(name_rows, kind="stable")
+            bounds = np.concatenate(([0], np.cumsum(np.bincount(name_rows, minlength=len(keys)))))
+            grouped = owners[order].tolist()
+            return [tuple(names[j] for j in grouped[bounds[row]:bounds[row + 1]]) for row in range(len(keys))]
+
+        doc_terms = by_row(terms, offsets, rows)
+        doc_fields: List[Dict[str, Tuple[str, ...]]] = [{} for _ in keys]
+        for name, field in exported["fields"].items():
+            values = list(field["values"])
+            value_offsets = np.asarray(field["offsets"])
+            value_rows = np.asarray(field["rows"])
+            for i, value in enumerate(values):
+                index.field_postings[name][value] = set(value_rows[int(value_offsets[i]):int(value_offsets[i + 1])].tolist())
+            for row, row_values in enumerate(by_row(values, value_offsets, value_rows)):
+                doc_fields[row][name] = row_values
+
+        for row, (key, length) in enumerate(zip(keys, np.asarray(exported["doc_len"]).tolist())):
+            index._slots[key] = row
+            index._keys[row] = key
+            index._doc_terms[row] = doc_terms[row]
+            index._doc_fields[row] = doc_fields[row]
+            index.doc_len[row] = length
+            index.total_len += length
+        index._next_slot = len(keys)
+        return index
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "documents": len(self._slots),
+            "terms": len(self.postings),
+            "postings": sum(len(docs) for docs in self.postings.values()),
+            "avgLength": round(self.total_len / len(self.doc_len), 1) if self.doc_len else 0,
+        }
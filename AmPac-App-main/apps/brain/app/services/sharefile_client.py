@@ -1,8 +1,51 @@
+import asyncio
+import hashlib
 import httpx
+from typing import Any, AsyncIterable, AsyncIterator, Dict, List, Optional, Sequence, Union
 from app.core.config import get_settings
+from app.core import metrics
+from app.services.sharefile_folders import MISSING, folder_cache
+from app.services.single_flight import SingleFlight
 
 settings = get_settings()
 
+# ensure_folder_structure walks the same parents for every upload; share the listings
+children_flights = SingleFlight("sharefile_children")
+# Concurrent uploads for a new loan all need its folders created once
+folder_flights = SingleFlight("sharefile_folders")
+
+ROOT_ID = "home"  # 'home' alias often works for the authenticated user's root
+
+
+class FolderNotFound(Exception):
+    """A folder id (usually a cached one) no longer exists in ShareFile."""
+
+
+class UploadFailed(Exception):
+    """A chunk kept failing after its retries, or ShareFile rejected the finished upload."""
+
+
+async def rechunk(source: Union[bytes, AsyncIterable[bytes]], size: int) -> AsyncIterator[bytes]:
+    """Re-slices `source` into `size`-byte chunks (the last may be shorter), holding at most one chunk."""
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        data = memoryview(source)
+        for start in range(0, len(data), size):
+            yield bytes(data[start:start + size])
+        return
+    parts, held = [], 0
+    async for piece in source:
+        view = memoryview(piece)
+        while view:
+            take = view[:size - held]
+            parts.append(take)
+            held += len(take)
+            view = view[len(take):]
+            if held == size:
+                yield b"".join(parts)  # The chunk's only copy
+                parts, held = [], 0
+    if parts:
+        yield b"".join(parts)
+
 class ShareFileClient:
     """
     Client for interacting with the ShareFile API.
@@ -15,6 +58,25 @@ class ShareFileClient:
         self.subdomain = settings.SHAREFILE_SUBDOMAIN
         self.base_url = f"https://{self.subdomain}.sharefile.com/sf/v3"
         self.token = None
+        self.chunk_bytes = settings.SHAREFILE_UPLOAD_CHUNK_BYTES
+        self.upload_threads = settings.SHAREFILE_UPLOAD_THREADS
+        self.chunk_retries = settings.SHAREFILE_UPLOAD_CHUNK_RETRIES
+        # Pooled HTTP client (keep-alive across calls), created lazily on first request
+        self._http: Optional[httpx.AsyncClient] = None
+
+    def _get_http(self) -> httpx.AsyncClient:
+        if self._http is None or self._http.is_closed:
+            self._http = httpx.AsyncClient(
+                timeout=httpx.Timeout(settings.SHAREFILE_TIMEOUT_SECONDS),
+                limits=httpx.Limits(max_connections=settings.SHAREFILE_UPLOAD_THREADS + 4),
+            )
+        return self._http
+
+    async def close(self):
+        """Close the pooled HTTP client."""
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
 
     async def authenticate(self):
         """
@@ -31,14 +93,13 @@ class ShareFileClient:
             "client_secret": self.client_secret
         }
         
-        async with httpx.AsyncClient() as client:
-            try:
-                response = await client.post(token_url, data=payload)
-                response.raise_for_status()
-                data = response.json()
-                self.token = data.get("access_token")
-            except Exception as e:
-                print(f"ShareFile authentication failed: {e}")
+        try:
+            response = await self._get_http().post(token_url, data=payload)
+            response.raise_for_status()
+            data = response.json()
+            self.token = data.get("access_token")
+        except Exception as e:
+            print(f"ShareFile authentication failed: {e}")
 
     async def _get_headers(self):
         if not self.token:
@@ -48,26 +109,91 @@ class ShareFileClient:
             "Content-Type": "application/json"
         }
 
-    async def _find_item_by_name(self, parent_id: str, name: str) -> str:
+    async def _list_children(self, parent_id: str) -> List[Dict[str, Any]]:
         """
-        Helper to find an item ID by name within a parent folder.
-        Returns None if not found.
+        Lists the children of a folder. Concurrent listings of the same parent share one request.
         """
-        headers = await self._get_headers()
-        url = f"{self.base_url}/Items({parent_id})/Children"
-        
-        async with httpx.AsyncClient() as client:
+        async def fetch():
+            headers = await self._get_headers()
+            url = f"{self.base_url}/Items({parent_id})/Children"
+            response = await self._get_http().get(url, headers=headers)
+            response.raise_for_status()
+            return response.json().get("value", [])
+
+        return await children_flights.do(parent_id, fetch)
+
+    async def _find_folder(self, parent_id: str, parent_path: str, name: str) -> Optional[str]:
+        """
+        Looks for folder `name` under `parent_id`, caching every sibling folder the
+        listing shows and a short negative entry if `name` isn't among them. Listing
+        errors propagate (a 404 means `parent_id` is stale).
+        """
+        metrics.counter("sharefile_folder_lookups_total").inc(op="list")
+        found = None
+        for item in await self._list_children(parent_id):
+            if not item.get("odata.type", "Folder").endswith("Folder") or not item.get("Id"):
+                continue
+            folder_cache.prefill(f"{parent_path}/{item.get('Name')}", item["Id"])
+            if item.get("Name") == name:
+                found = item["Id"]
+        if found is None:
+            folder_cache.mark_missing(f"{parent_path}/{name}")
+        return found
+
+    async def _ensure_child(self, parent_id: str, parent_path: str, name: str) -> str:
+        """The id of folder `name` under `parent_id`, created if it doesn't exist yet."""
+        path = f"{parent_path}/{name}"
+
+        async def resolve():
+            cached = await folder_cache.get(path)
+            if cached:
+                return cached
+            folder_id = None if cached == MISSING else await self._find_folder(parent_id, parent_path, name)
+            if folder_id is None:
+                try:
+                    metrics.counter("sharefile_folder_lookups_total").inc(op="create")
+                    folder_id = await self._create_folder(parent_id, name)
+                    folder_cache.mark_empty(path)
+                except httpx.HTTPStatusError as e:
+                    if e.response.status_code != 409:
+                        raise
+                    # Created elsewhere since our listing (a stale negative entry, or another instance)
+                    folder_id = await self._find_folder(parent_id, parent_path, name)
+                    if folder_id is None:
+                        raise
+            await folder_cache.put(path, folder_id)
+            return folder_id
+
+        return await folder_flights.do(path, resolve)
+
+    async def ensure_folder_path(self, names: Sequence[str]) -> str:
+        """
+        Ensures ROOT/names[0]/names[1]/... exists and returns the last folder's id.
+
+        Starts from the deepest folder already in the path cache, so an existing path
+        costs no ShareFile calls at all; only missing levels are listed or created. If
+        a cached id turns out to be gone (404), that part of the cache is dropped and
+        the path is resolved again from ShareFile; a second 404 raises FolderNotFound.
+        """
+        paths = ["/".join([ROOT_ID, *names[:depth]]) for depth in range(len(names) + 1)]
+        for attempt in range(2):
+            depth, folder_id = 0, ROOT_ID
+            for known in range(len(names), 0, -1):
+                cached = await folder_cache.get(paths[known])
+                if cached:
+                    depth, folder_id = known, cached
+                    break
             try:
-                response = await client.get(url, headers=headers)
-                response.raise_for_status()
-                data = response.json()
-                items = data.get("value", [])
-                for item in items:
-                    if item.get("Name") == name:
-                        return item.get("Id")
-            except Exception as e:
-                print(f"Error finding item {name}: {e}")
-        return None
+                for level in range(depth, len(names)):
+                    folder_id = await self._ensure_child(folder_id, paths[level], names[level])
+                return folder_id
+            except httpx.HTTPStatusError as e:
+                if e.response.status_code != 404 or not depth:
+                    raise
+                if attempt:
+                    raise FolderNotFound(paths[depth]) from e
+                print(f"[ShareFile] Cached folder {paths[depth]} is gone; resolving the path again")
+                await folder_cache.invalidate(paths[depth])
 
     async def _create_folder(self, parent_id: str, name: str) -> str:
         """
@@ -77,98 +203,112 @@ class ShareFileClient:
         url = f"{self.base_url}/Items({parent_id})/Folder"
         payload = {"Name": name, "Description": "Created by AmPac Brain"}
         
-        async with httpx.AsyncClient() as client:
-            try:
-                response = await client.post(url, json=payload, headers=headers)
-                response.raise_for_status()
-                return response.json().get("Id")
-            except Exception as e:
-                print(f"Error creating folder {name}: {e}")
-                raise
+        try:
+            response = await self._get_http().post(url, json=payload, headers=headers)
+            response.raise_for_status()
+            return response.json().get("Id")
+        except Exception as e:
+            print(f"Error creating folder {name}: {e}")
+            raise
 
     async def ensure_folder_structure(self, borrower_name: str, loan_id: str) -> str:
         """
         Ensures the folder structure Clients/{BorrowerName}/{LoanID}/Conditions exists.
         Returns the Folder ID for the 'Conditions' folder.
         """
-        if not self.token:
-            await self.authenticate()
-            
-        # 1. Get Root (usually "allshared" or specific root, we'll assume default root)
-        # For simplicity, let's assume we start at the user's root or a specific known root ID if configured
-        # If not configured, we query for the default root
-        root_id = "home" # 'home' alias often works for the authenticated user's root
-        
-        # 2. Ensure "Clients"
-        clients_id = await self._find_item_by_name(root_id, "Clients")
-        if not clients_id:
-            clients_id = await self._create_folder(root_id, "Clients")
-            
-        # 3. Ensure Borrower Name
-        borrower_id = await self._find_item_by_name(clients_id, borrower_name)
-        if not borrower_id:
-            borrower_id = await self._create_folder(clients_id, borrower_name)
-            
-        # 4. Ensure Loan ID
-        loan_folder_id = await self._find_item_by_name(borrower_id, loan_id)
-        if not loan_folder_id:
-            loan_folder_id = await self._create_folder(borrower_id, loan_id)
-            
-        # 5. Ensure Conditions
-        conditions_id = await self._find_item_by_name(loan_folder_id, "Conditions")
-        if not conditions_id:
-            conditions_id = await self._create_folder(loan_folder_id, "Conditions")
-            
-        return conditions_id
-
-    async def upload_file(self, file_content: bytes, file_name: str, folder_id: str) -> str:
-        """
-        Uploads a file to the specified ShareFile folder.
-        Returns the ID of the uploaded file.
+        return await self.ensure_folder_path(["Clients", borrower_name, loan_id, "Conditions"])
+
+    async def upload_file(self, file_content: Union[bytes, AsyncIterable[bytes]], file_name: str, folder_id: str,
+                          file_size: Optional[int] = None) -> str:
+        """
+        Uploads a file to the specified ShareFile folder with the threaded upload
+        protocol: `file_content` (bytes, or an async iterator of byte pieces of any
+        size) is re-sliced into `chunk_bytes` chunks, up to `upload_threads` of which
+        are in flight at once, so memory is bounded by chunk size times threads rather
+        than file size. A failed chunk is re-sent from its buffer, with backoff, up to
+        `chunk_retries` times; chunks already accepted aren't sent again.
+        Returns the ID of the uploaded file, read from the finish response.
+
+        Raises FolderNotFound before reading any of `file_content` if the folder is
+        gone, so the caller can re-resolve it and retry with the same source.
         """
         headers = await self._get_headers()
-        
-        # 1. Get Upload URL
-        # Standard upload method: POST /Items(id)/Upload
-        url = f"{self.base_url}/Items({folder_id})/Upload"
-        # Standard upload usually requires method=standard query param or similar, 
-        # but the default POST often returns the ChunkUri
-        
-        async with httpx.AsyncClient() as client:
-            # Get the ChunkUri
-            response = await client.get(url, headers=headers) # GET to get the upload config/link
-            response.raise_for_status()
-            upload_config = response.json()
-            chunk_uri = upload_config.get("ChunkUri")
-            
-            if not chunk_uri:
-                raise Exception("Failed to get upload ChunkUri from ShareFile")
-                
-            # 2. Upload the file content to the ChunkUri
-            # The ChunkUri is a direct link, often doesn't need auth headers if it contains a token, 
-            # but usually we post multipart/form-data
-            files = {'File1': (file_name, file_content)}
-            upload_response = await client.post(chunk_uri, files=files)
-            upload_response.raise_for_status()
-            
-            # ShareFile returns "OK" string usually, not JSON, on success of raw upload
-            # But we might need to verify. 
-            # For this implementation, we'll assume success if 200 OK.
-            # To get the ID, we might need to query the folder again or check response if it's JSON.
-            # Some endpoints return the ID. Let's check if it's JSON.
-            try:
-                res_json = upload_response.json()
-                # If it returns a list of uploaded items
-                if isinstance(res_json, list) and len(res_json) > 0:
-                    return res_json[0].get("Id")
-                if res_json.get("Id"):
-                    return res_json.get("Id")
-            except:
-                pass
-                
-            # Fallback: Find the file we just uploaded
-            file_id = await self._find_item_by_name(folder_id, file_name)
-            return file_id or "unknown_id"
+        http = self._get_http()
+
+        # 1. Ask for a threaded upload; the spec carries the chunk and finish URIs
+        params = {"Method": "Threaded", "Raw": True, "FileName": file_name, "ThreadCount": self.upload_threads,
+                  "Tool": "AmPac Brain"}
+        if file_size is not None:
+            params["FileLength"] = file_size
+        response = await http.post(f"{self.base_url}/Items({folder_id})/Upload2", json=params, headers=headers)
+        if response.status_code == 404:
+            # Usually a cached folder id that was deleted; the next ensure_folder_structure re-resolves it
+            await folder_cache.invalidate_id(folder_id)
+            raise FolderNotFound(folder_id)
+        response.raise_for_status()
+        spec = response.json()
+        chunk_uri, finish_uri = spec.get("ChunkUri"), spec.get("FinishUri")
+        if not chunk_uri or not finish_uri:
+            raise UploadFailed("ShareFile returned no ChunkUri/FinishUri for the upload")
+        threads = max(1, min(self.upload_threads, spec.get("MaxNumberOfThreads") or self.upload_threads))
+
+        # 2. Send the chunks, a bounded number at a time
+        async def body(chunk: bytes):
+            yield chunk
+
+        async def send(index: int, offset: int, chunk: bytes):
+            chunk_params = {"index": index, "byteOffset": offset, "hash": hashlib.md5(chunk).hexdigest()}
+            length = {"Content-Length": str(len(chunk))}
+            for attempt in range(self.chunk_retries + 1):
+                try:
+                    # A one-shot generator rather than the bytes: httpx keeps finished requests in reference
+                    # cycles, and a request holding its body would keep the chunk alive until the next GC
+                    result = await http.post(chunk_uri, params=chunk_params, content=body(chunk), headers=length)
+                    result.raise_for_status()
+                    metrics.counter("sharefile_upload_chunks_total").inc(result="ok")
+                    return
+                except httpx.HTTPError as e:
+                    if isinstance(e, httpx.HTTPStatusError) and e.response.status_code < 500 \
+                            and e.response.status_code != 429:
+                        raise UploadFailed(f"Chunk {index} of {file_name} rejected: {e}") from e
+                    if attempt == self.chunk_retries:
+                        raise UploadFailed(f"Chunk {index} of {file_name} failed {attempt + 1} times: {e}") from e
+                    metrics.counter("sharefile_upload_chunks_total").inc(result="retry")
+                    print(f"[ShareFile] Chunk {index} of {file_name} failed ({e}); resending")
+                    await asyncio.sleep(min(0.25 * 2 ** attempt, 5))
+
+        file_hash, size, index = hashlib.md5(), 0, 0
+        pending = set()
+        try:
+            async for chunk in rechunk(file_content, self.chunk_bytes):
+                if len(pending) >= threads:
+                    done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    for task in done:
+                        task.result()
+                file_hash.update(chunk)
+                pending.add(asyncio.create_task(send(index, size, chunk)))
+                size += len(chunk)
+                index += 1
+            if pending:
+                await asyncio.gather(*pending)
+        except BaseException:
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+            raise
+        metrics.counter("sharefile_upload_bytes_total").inc(size)
+
+        # 3. Finish: ShareFile assembles the chunks and checks size and hash
+        response = await http.post(finish_uri, params={"fmt": "json", "fileSize": size, "fileHash": file_hash.hexdigest()})
+        response.raise_for_status()
+        result = response.json()
+        if result.get("error"):
+            raise UploadFailed(f"ShareFile rejected {file_name}: {result.get('errorMessage')}")
+        items = result.get("value") or []
+        file_id = items[0].get("id") or items[0].get("Id") if items else None
+        if not file_id:
+            raise UploadFailed(f"ShareFile returned no item id for {file_name}")
+        return file_id
 
     async def get_file_preview_link(self, file_id: str) -> str:
         """
@@ -0,0 +1,161 @@
+import asyncio
+import hashlib
+import time
+from typing import Any, Callable, Dict, Optional
+from app.core.config import get_settings
+from app.core import metrics
+from app.core.firebase import get_db
+from app.services.cache import CacheEntry, LRUCache
+
+settings = get_settings()
+
+MISSING = ""  # Negative entry: a listing just showed there is no such folder
+
+
+class FolderIdCache:
+    """
+    ShareFile folder path -> item id ("home/Clients/Jane Doe/1001/Conditions" -> "fo123"),
+    so ensuring a folder that exists costs no ShareFile calls.
+
+    Two tiers: an in-memory LRU, and Firestore (one document per path, shared by every
+    instance and kept across restarts). Ids are cached for `ttl_seconds`; a rename keeps
+    the id but changes the path, so entries are not kept forever. A 404 on a cached id
+    drops that path and everything under it from both tiers.
+
+    Negative entries ("listed the parent, not there", or "created the parent just now")
+    are memory-only and short-lived: they let a resolver create right away instead of
+    listing, and a stale one only costs a create that answers "already exists".
+    """
+
+    def __init__(self, max_entries: int, ttl_seconds: float, negative_ttl_seconds: float, use_firestore: bool = True,
+                 collection: str = "sharefile_folders", db_factory: Callable = get_db):
+        self.memory = LRUCache(max_entries)
+        self.ttl_seconds = ttl_seconds
+        self.negative_ttl_seconds = negative_ttl_seconds
+        self.use_firestore = use_firestore
+        self.collection = collection
+        self.db_factory = db_factory
+        self._paths = LRUCache(max_entries)  # item id -> path, for invalidating by id; bounded like `memory`
+
+    @staticmethod
+    def _doc_id(path: str) -> str:
+        return hashlib.sha1(path.encode("utf-8")).hexdigest()  # Paths contain "/", which doc ids can't
+
+    def _record(self, result: str, tier: str):
+        metrics.counter("sharefile_folder_cache_total").inc(result=result, tier=tier)
+
+    def _remember(self, path: str, item_id: str, expires_at: float):
+        self.memory.set(path, CacheEntry(item_id, expires_at))
+        if item_id:
+            self._paths.set(item_id, CacheEntry(path, expires_at))
+
+    def _read(self, path: str) -> Optional[Dict[str, Any]]:
+        snapshot = self.db_factory().collection(self.collection).document(self._doc_id(path)).get()
+        data = snapshot.to_dict() if snapshot.exists else None
+        return data if isinstance(data, dict) and data.get("path") == path else None
+
+    def _write(self, path: str, item_id: str, expires_at: float):
+        self.db_factory().collection(self.collection).document(self._doc_id(path)).set(
+            {"path": path, "itemId": item_id, "expiresAt": expires_at, "updatedAt": time.time()})
+
+    def _delete_subtree(self, path: str):
+        collection = self.db_factory().collection(self.collection)
+        collection.document(self._doc_id(path)).delete()
+        # ["path/", "path0") is everything below it ("0" sorts right after "/"): one range query on one field
+        for doc in collection.where("path", ">=", path + "/").where("path", "<", path + "0").stream():
+            doc.reference.delete()
+
+    def _path_for_id(self, item_id: str) -> Optional[str]:
+        docs = self.db_factory().collection(self.collection).where("itemId", "==", item_id).limit(1).stream()
+        for doc in docs:
+            data = doc.to_dict()
+            if isinstance(data, dict):
+                return data.get("path")
+        return None
+
+    async def get(self, path: str) -> Optional[str]:
+        """
+        The cached id for `path`; MISSING if a listing just showed it doesn't exist;
+        None if unknown. Never raises.
+        """
+        entry = self.memory.get(path)
+        if entry is None or not entry.fresh:
+            entry = self.memory.get(path.rsplit("/", 1)[0] + "/*")  # Parent created moments ago: still empty
+        if entry is not None and entry.fresh:
+            self._record("negative" if entry.value == MISSING else "hit", "memory")
+            return entry.value
+        if self.use_firestore:
+            try:
+                data = await asyncio.to_thread(self._read, path)
+            except Exception as e:
+                print(f"[ShareFileFolders] Lookup of {path} failed: {e}")
+                data = None
+            if data and data.get("itemId") and (data.get("expiresAt") or 0) > time.time():
+                self._remember(path, data["itemId"], data["expiresAt"])
+                self._record("hit", "firestore")
+                return data["itemId"]
+        self._record("miss", "firestore" if self.use_firestore else "memory")
+        return None
+
+    async def put(self, path: str, item_id: str):
+        """Caches a folder this instance resolved or created, in both tiers."""
+        expires_at = time.time() + self.ttl_seconds
+        self._remember(path, item_id, expires_at)
+        if self.use_firestore:
+            try:
+                await asyncio.to_thread(self._write, path, item_id, expires_at)
+            except Exception as e:
+                print(f"[ShareFileFolders] Storing {path} failed: {e}")
+
+    def prefill(self, path: str, item_id: str):
+        """Memory-only: sibling folders seen in a listing (one listing of Clients covers every borrower)."""
+        existing = self.memory.get(path)
+        if existing is None or not existing.fresh or existing.value == MISSING:
+            self._remember(path, item_id, time.time() + self.ttl_seconds)
+
+    def mark_missing(self, path: str):
+        self.memory.set(path, CacheEntry(MISSING, time.time() + self.negative_ttl_seconds))
+
+    def mark_empty(self, path: str):
+        """A folder this instance just created: its children are known missing without a listing."""
+        self.memory.set(path + "/*", CacheEntry(MISSING, time.time() + self.negative_ttl_seconds))
+
+    async def invalidate(self, path: str):
+        """Drops `path` and everything below it (its id 404ed, so theirs are gone too)."""
+        # Ids under `path` may stay in _paths; invalidate_id checks a mapping against `memory` before using it
+        self.memory.delete(path)
+        self.memory.delete_prefix(path + "/")
+        metrics.counter("sharefile_folder_invalidations_total").inc()
+        if self.use_firestore:
+            try:
+                await asyncio.to_thread(self._delete_subtree, path)
+            except Exception as e:
+                print(f"[ShareFileFolders] Invalidating {path} failed: {e}")
+
+    async def invalidate_id(self, item_id: str):
+        known = self._paths.get(item_id)
+        self._paths.delete(item_id)
+        path = known.value if known is not None else None
+        current = self.memory.get(path) if path else None
+        if current is None or current.value != item_id:
+            path = None  # Evicted, invalidated or re-resolved since: Firestore knows which path has this id
+        if path is None and self.use_firestore:
+            try:
+                path = await asyncio.to_thread(self._path_for_id, item_id)
+            except Exception as e:
+                print(f"[ShareFileFolders] Finding the path of {item_id} failed: {e}")
+        if path:
+            print(f"[ShareFileFolders] {path} ({item_id}) is gone; dropping it from the cache")
+            await self.invalidate(path)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"entries": len(self.memory), "ids": len(self._paths), "maxEntries": self.memory.max_entries, "firestore": self.use_firestore}
+
+
+folder_cache = FolderIdCache(
+    max_entries=settings.SHAREFILE_FOLDER_CACHE_SIZE,
+    ttl_seconds=settings.SHAREFILE_FOLDER_CACHE_TTL_SECONDS,
+    negative_ttl_seconds=settings.SHAREFILE_FOLDER_NEGATIVE_TTL_SECONDS,
+    use_firestore=settings.SHAREFILE_FOLDER_CACHE_FIRESTORE,
+    collection=settings.SHAREFILE_FOLDER_CACHE_COLLECTION,
+)
@@ -11,13 +11,16 @@ class ShareFileService:
     """
 
     def __init__(self):
-        self.subdomain = "ampacbusinesscapital" # User provided
-        self.base_url = f"https://{self.subdomain}.sf-api.com/sf/v3"
+        self.subdomain = settings.SHAREFILE_KB_SUBDOMAIN
+        self.account_url = (settings.SHAREFILE_KB_BASE_URL or f"https://{self.subdomain}.sharefile.com").rstrip("/")
+        self.base_url = f"{self.account_url}/sf/v3" if settings.SHAREFILE_KB_BASE_URL else f"https://{self.subdomain}.sf-api.com/sf/v3"
         self.client_id = settings.SHAREFILE_CLIENT_ID
         self.client_secret = settings.SHAREFILE_CLIENT_SECRET
         self.username = settings.SHAREFILE_USERNAME
         self.password = settings.SHAREFILE_PASSWORD
         self.token = None
+        # One pooled client: a crawl issues many listings and downloads concurrently
+        self.http_client = httpx.AsyncClient(timeout=30.0, limits=httpx.Limits(max_connections=20))
 
     async def authenticate(self):
         """
@@ -26,7 +29,7 @@ class ShareFileService:
         if self.token:
             return self.token
 
-        token_url = f"https://{self.subdomain}.sharefile.com/oauth/token"
+        token_url = f"{self.account_url}/oauth/token"
         
         # Using Password Grant for simplicity in this scaffold
         # In production, consider standard OAuth flow
@@ -38,35 +41,38 @@ class ShareFileService:
             "password": self.password
         }
 
-        async with httpx.AsyncClient() as client:
-            try:
-                response = await client.post(token_url, data=data)
-                response.raise_for_status()
-                self.token = response.json().get("access_token")
-                print("✅ ShareFile Authenticated")
-            except Exception as e:
-                print(f"❌ ShareFile Auth Failed: {e}")
+        try:
+            response = await self.http_client.post(token_url, data=data)
+            response.raise_for_status()
+            self.token = response.json().get("access_token")
+            print("✅ ShareFile Authenticated")
+        except Exception as e:
+            print(f"❌ ShareFile Auth Failed: {e}")
 
-    async def list_children(self, folder_id: str = "root") -> List[Dict]:
+    async def list_children(self, folder_id: str = "root", strict: bool = False) -> List[Dict]:
         """
-        Lists files and folders within a specific folder.
+        Lists files and folders within a specific folder. With `strict`, failures raise
+        instead of looking like an empty folder (the crawler must tell them apart).
         """
         await self.authenticate()
         if not self.token:
+            if strict:
+                raise RuntimeError("ShareFile authentication failed")
             return []
 
         url = f"{self.base_url}/Items({folder_id})/Children"
         headers = {"Authorization": f"Bearer {self.token}"}
 
-        async with httpx.AsyncClient() as client:
-            try:
-                response = await client.get(url, headers=headers)
-                response.raise_for_status()
-                data = response.json()
-                return data.get("value", [])
-            except Exception as e:
-                print(f"Error listing children for {folder_id}: {e}")
-                return []
+        try:
+            response = await self.http_client.get(url, headers=headers)
+            response.raise_for_status()
+            data = response.json()
+            return data.get("value", [])
+        except Exception as e:
+            print(f"Error listing children for {folder_id}: {e}")
+            if strict:
+                raise
+            return []
 
     async def download_file(self, file_id: str) -> Optional[bytes]:
         """
@@ -79,25 +85,25 @@ class ShareFileService:
         url = f"{self.base_url}/Items({file_id})/Download"
         headers = {"Authorization": f"Bearer {self.token}"}
 
-        async with httpx.AsyncClient() as client:
-            try:
-                # 1. Get Download Link
-                response = await client.get(url, headers=headers, follow_redirects=False)
-                
-                download_url = response.headers.get("Location")
-                if not download_url:
-                    # Sometimes it redirects immediately, sometimes returns link
-                    download_url = response.json().get("DownloadUrl")
-
-                if download_url:
-                    # 2. Download Content
-                    file_response = await client.get(download_url)
-                    return file_response.content
-                
-                return None
-            except Exception as e:
-                print(f"Error downloading file {file_id}: {e}")
-                return None
+        try:
+            # 1. Get Download Link
+            response = await self.http_client.get(url, headers=headers, follow_redirects=False)
+            
+            download_url = response.headers.get("Location")
+            if not download_url:
+                # Sometimes it redirects immediately, sometimes returns link
+                download_url = response.json().get("DownloadUrl")
+
+            if download_url:
+                # 2. Download Content
+                file_response = await self.http_client.get(download_url)
+                file_response.raise_for_status()
+                return file_response.content
+            
+            return None
+        except Exception as e:
+            print(f"Error downloading file {file_id}: {e}")
+            return None
 
     async def search(self, query: str) -> List[Dict]:
         """
@@ -111,11 +117,16 @@ class ShareFileService:
         headers = {"Authorization": f"Bearer {self.token}"}
         params = {"query": query}
 
-        async with httpx.AsyncClient() as client:
-            try:
-                response = await client.get(url, headers=headers, params=params)
-                response.raise_for_status()
-                return response.json().get("value", [])
-            except Exception as e:
-                print(f"Error searching ShareFile: {e}")
-                return []
+        try:
+            response = await self.http_client.get(url, headers=headers, params=params)
+            response.raise_for_status()
+            return response.json().get("value", [])
+        except Exception as e:
+            print(f"Error searching ShareFile: {e}")
+            return []
+
+    async def close(self):
+        await self.http_client.aclose()
+
+
+sharefile_service = ShareFileService()
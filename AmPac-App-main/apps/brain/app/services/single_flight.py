@@ -0,0 +1,49 @@
+import asyncio
+from typing import Awaitable, Callable, Dict, Hashable, TypeVar
+from app.core import metrics
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    """
+    Collapses identical concurrent calls into one upstream call.
+
+    The first caller for a key starts the work as a task; callers arriving while it
+    is in flight await the same task and receive the same result (or exception).
+    Results are shared objects, so callers must not mutate them.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+        self._leaders = 0
+        self._followers = 0
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> T:
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda _t, k=key: self._inflight.pop(k, None))
+            self._record("leader")
+        else:
+            self._record("follower")
+        # Shield so one caller being cancelled doesn't cancel the shared call for the others
+        return await asyncio.shield(task)
+
+    def _record(self, role: str):
+        if role == "leader":
+            self._leaders += 1
+        else:
+            self._followers += 1
+        metrics.counter("singleflight_calls_total").inc(group=self.name, role=role)
+        metrics.gauge("singleflight_coalescing_ratio").set(round(self.coalescing_ratio(), 4), group=self.name)
+
+    def coalescing_ratio(self) -> float:
+        """Share of calls that were served by another caller's in-flight request."""
+        total = self._leaders + self._followers
+        return self._followers / total if total else 0.0
+
+    def in_flight(self) -> int:
+        return len(self._inflight)
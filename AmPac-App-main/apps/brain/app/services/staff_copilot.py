@@ -41,7 +41,8 @@ class StaffCopilotAgent:
         """
 
         try:
-            response = await llm_service.generate_response(prompt)
+            # Prompt carries the staff member's name and page; not shareable across users
+            response = await llm_service.generate_response(prompt, task="copilot", cache=False)
             return response
         except Exception as e:
             return f"Error processing request: {str(e)}"
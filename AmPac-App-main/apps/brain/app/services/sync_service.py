@@ -3,7 +3,7 @@ from datetime import datetime
 from app.core.config import get_settings
 from app.services.ventures.base import AbstractVenturesClient
 from app.services.ventures.mock import MockVenturesClient
-# from app.services.ventures.real import RealVenturesClient # Future
+from app.services.ventures.real import RealVenturesClient
 from app.services.sharefile_client import ShareFileClient
 from app.core.firebase import get_db
 from app.core.constants import VENTURES_STATUS_MAP, ApplicationStatus
@@ -35,9 +35,8 @@ class SyncService:
             self.ventures_client: AbstractVenturesClient = MockVenturesClient()
             self.ventures_enabled = settings.VENTURES_ENABLED
         else:
-            # self.ventures_client = RealVenturesClient()
-            print("SyncService: Real client not implemented, falling back to Mock")
-            self.ventures_client = MockVenturesClient()
+            print("SyncService: Using RealVenturesClient")
+            self.ventures_client = RealVenturesClient()
             self.ventures_enabled = True
             
         self.sharefile_client = ShareFileClient()
@@ -344,21 +343,21 @@ class SyncService:
             return
         try:
             apps_ref = self.db.collection("applications")
-            docs = apps_ref.where("venturesLoanId", "!=", "").stream()
+            docs = [d for d in apps_ref.where("venturesLoanId", "!=", "").stream() if d.to_dict().get("venturesLoanId")]
+
+            # 1. Get Conditions from Ventures for every active loan (batched where supported)
+            ventures_ids = list({d.to_dict().get("venturesLoanId") for d in docs})
+            conditions_by_loan = await self._with_retry(
+                lambda: self.ventures_client.get_conditions_batch(ventures_ids),
+                f"ventures.get_conditions_batch[{len(ventures_ids)}]",
+                breaker=self.breaker_ventures
+            ) or {}
 
             for doc in docs:
                 app_data = doc.to_dict()
                 ventures_id = app_data.get("venturesLoanId")
-                
-                if not ventures_id:
-                    continue
 
-                # 1. Get Conditions from Ventures
-                conditions = await self._with_retry(
-                    lambda: self.ventures_client.get_conditions(ventures_id),
-                    f"ventures.get_conditions[{ventures_id}]",
-                    breaker=self.breaker_ventures
-                )
+                conditions = conditions_by_loan.get(ventures_id)
                 if not conditions:
                     continue
                 
@@ -439,43 +438,52 @@ class SyncService:
             
             apps_ref = self.db.collection("applications")
             docs = apps_ref.where("venturesLoanId", "!=", "").stream()
-            
+
+            # Collect completed tasks first so Ventures is queried once per batch, not once per task
+            pending = []
             for app_doc in docs:
                 app_data = app_doc.to_dict()
                 ventures_id = app_data.get("venturesLoanId")
-                
+                if not ventures_id:
+                    continue
                 tasks = tasks_ref.where("loanApplicationId", "==", app_doc.id).where("status", "==", "completed").stream()
-                
                 for task_doc in tasks:
-                    task_data = task_doc.to_dict()
-                    cond_id = task_data.get("venturesConditionId")
-                    
-                    if not cond_id:
-                        continue
-                        
-                    # Check current status in Ventures
-                    conditions = await self._with_retry(
-                        lambda: self.ventures_client.get_conditions(ventures_id),
-                        f"ventures.get_conditions[{ventures_id}]",
-                        breaker=self.breaker_ventures
+                    if task_doc.to_dict().get("venturesConditionId"):
+                        pending.append((app_doc, ventures_id, task_doc))
+
+            if not pending:
+                return
+
+            ventures_ids = list({ventures_id for _, ventures_id, _ in pending})
+            conditions_by_loan = await self._with_retry(
+                lambda: self.ventures_client.get_conditions_batch(ventures_ids),
+                f"ventures.get_conditions_batch[{len(ventures_ids)}]",
+                breaker=self.breaker_ventures
+            ) or {}
+
+            for app_doc, ventures_id, task_doc in pending:
+                task_data = task_doc.to_dict()
+                cond_id = task_data.get("venturesConditionId")
+
+                # Check current status in Ventures
+                conditions = conditions_by_loan.get(ventures_id, [])
+                matching_cond = next((c for c in conditions if c.id == cond_id), None)
+                
+                if matching_cond and matching_cond.status == "Open":
+                    print(f"Pushing Upload Status to Ventures: {cond_id} -> Received")
+                    # Use the specific upload_document semantic method
+                    file_url = task_data.get("fileUrl", "unknown_url") # Expect fileUrl in task
+                    await self._with_retry(
+                        lambda: self.ventures_client.upload_document(ventures_id, cond_id, file_url),
+                        f"ventures.upload_document[{ventures_id}:{cond_id}]",
+                        breaker=self.breaker_sharefile
                     )
-                    matching_cond = next((c for c in conditions if c.id == cond_id), None)
-                    
-                    if matching_cond and matching_cond.status == "Open":
-                        print(f"Pushing Upload Status to Ventures: {cond_id} -> Received")
-                        # Use the specific upload_document semantic method
-                        file_url = task_data.get("fileUrl", "unknown_url") # Expect fileUrl in task
-                        await self._with_retry(
-                            lambda: self.ventures_client.upload_document(ventures_id, cond_id, file_url),
-                            f"ventures.upload_document[{ventures_id}:{cond_id}]",
-                            breaker=self.breaker_sharefile
-                        )
-                        msg = f"Marked condition {cond_id} as Received in Ventures"
-                        self.log_event("success", msg)
-                        self._record_sync_event("upload", "success", msg, {
-                            "venturesConditionId": cond_id,
-                            "loanApplicationId": app_doc.id
-                        })
+                    msg = f"Marked condition {cond_id} as Received in Ventures"
+                    self.log_event("success", msg)
+                    self._record_sync_event("upload", "success", msg, {
+                        "venturesConditionId": cond_id,
+                        "loanApplicationId": app_doc.id
+                    })
 
         except Exception as e:
             print(f"Error syncing uploads: {e}")
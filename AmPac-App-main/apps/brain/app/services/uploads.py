@@ -0,0 +1,183 @@
+import asyncio
+import hashlib
+import os
+import tempfile
+import time
+from dataclasses import dataclass
+from typing import List, Optional
+import httpx
+from fastapi import UploadFile
+from app.core.config import get_settings
+from app.core import metrics
+from app.core.firebase import get_bucket
+
+settings = get_settings()
+
+
+class UploadTooLarge(ValueError):
+    pass
+
+
+@dataclass
+class SpooledUpload:
+    """An upload copied to a temp file on disk, hashed on the way. Parse it by `path`."""
+    filename: str
+    content_type: Optional[str]
+    path: str
+    size: int
+    sha256: str
+
+    def cleanup(self):
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
+def _write_chunk(out, digest, chunk: bytes):
+    out.write(chunk)
+    digest.update(chunk)
+
+
+async def spool_upload(file: UploadFile, max_bytes: Optional[int] = None) -> SpooledUpload:
+    """
+    Streams an upload to a temp file in UPLOAD_CHUNK_BYTES pieces, so only one chunk
+    per upload is ever in memory. Raises UploadTooLarge (and keeps nothing) past
+    `max_bytes`.
+    """
+    started = time.perf_counter()
+    max_bytes = max_bytes or settings.UPLOAD_MAX_BYTES
+    suffix = os.path.splitext(file.filename or "")[1].lower()
+    out = tempfile.NamedTemporaryFile(prefix="upload-", suffix=suffix, dir=settings.UPLOAD_SPOOL_DIR, delete=False)
+    digest, size = hashlib.sha256(), 0
+    try:
+        with out:
+            while True:
+                chunk = await file.read(settings.UPLOAD_CHUNK_BYTES)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > max_bytes:
+                    raise UploadTooLarge(f"{file.filename} is larger than the {max_bytes // (1024 * 1024)}MB upload limit")
+                await asyncio.to_thread(_write_chunk, out, digest, chunk)
+    except BaseException:
+        os.remove(out.name)
+        raise
+    finally:
+        await file.close()  # Starlette's own spool (disk past 1MB) can go now
+    metrics.histogram("upload_spool_ms").observe((time.perf_counter() - started) * 1000)
+    metrics.histogram("upload_bytes").observe(size)
+    return SpooledUpload(file.filename or "", file.content_type, out.name, size, digest.hexdigest())
+
+
+def _upload_to_storage(upload: SpooledUpload, blob_path: str) -> str:
+    blob = get_bucket().blob(blob_path)
+    # Setting a chunk size makes the client use a resumable session: a dropped
+    # connection resends the current chunk, not the whole file
+    blob.chunk_size = settings.UPLOAD_STORAGE_CHUNK_BYTES
+    blob.metadata = {"sha256": upload.sha256, "originalName": upload.filename}
+    blob.upload_from_filename(upload.path, content_type=upload.content_type)
+    return blob_path
+
+
+async def store_upload(upload: SpooledUpload, blob_path: str) -> Optional[str]:
+    """Copies the spooled file to Firebase Storage from disk. Returns the blob path, or None if it failed."""
+    started = time.perf_counter()
+    try:
+        await asyncio.to_thread(_upload_to_storage, upload, blob_path)
+    except Exception as e:
+        print(f"[Uploads] Storing {upload.filename} at {blob_path} failed: {e}")
+        metrics.counter("upload_storage_total").inc(outcome="error")
+        return None
+    metrics.counter("upload_storage_total").inc(outcome="ok")
+    metrics.histogram("upload_storage_ms").observe((time.perf_counter() - started) * 1000)
+    return blob_path
+
+
+def _download_from_storage(blob_path: str, path: str):
+    get_bucket().blob(blob_path).download_to_filename(path)
+
+
+async def fetch_stored(blob_path: str) -> Optional[str]:
+    """
+    Downloads a stored upload back to a temp file (streamed to disk, like spooling).
+    Returns its path, or None if it couldn't be fetched. The caller removes the file.
+    """
+    suffix = os.path.splitext(blob_path)[1].lower()
+    fd, path = tempfile.mkstemp(prefix="upload-", suffix=suffix, dir=settings.UPLOAD_SPOOL_DIR)
+    os.close(fd)
+    try:
+        await asyncio.to_thread(_download_from_storage, blob_path, path)
+    except Exception as e:
+        print(f"[Uploads] Fetching {blob_path} from storage failed: {e}")
+        os.remove(path)
+        return None
+    return path
+
+
+def _upload_text(text: str, blob_path: str):
+    get_bucket().blob(blob_path).upload_from_string(text, content_type="text/plain; charset=utf-8")
+
+
+async def store_text(text: str, blob_path: str) -> Optional[str]:
+    """Writes text to Firebase Storage. Returns the blob path, or None if it failed."""
+    try:
+        await asyncio.to_thread(_upload_text, text, blob_path)
+    except Exception as e:
+        print(f"[Uploads] Storing text at {blob_path} failed: {e}")
+        metrics.counter("upload_storage_total").inc(outcome="error")
+        return None
+    metrics.counter("upload_storage_total").inc(outcome="ok")
+    return blob_path
+
+
+async def fetch_text(blob_path: str) -> Optional[str]:
+    """Reads text written by store_text(), or None if it couldn't be fetched."""
+    try:
+        return await asyncio.to_thread(lambda: get_bucket().blob(blob_path).download_as_text())
+    except Exception as e:
+        print(f"[Uploads] Fetching {blob_path} from storage failed: {e}")
+        return None
+
+
+def url_allowed(url: str, hosts: List[str]) -> bool:
+    """http(s) URL on one of `hosts` or a subdomain of one, so callers can't point us at internal addresses."""
+    try:
+        parsed = httpx.URL(url)
+    except Exception:
+        return False
+    host = (parsed.host or "").lower().rstrip(".")
+    return parsed.scheme in ("http", "https") and any(
+        host == allowed.lower() or host.endswith("." + allowed.lower()) for allowed in hosts)
+
+
+async def download_url(url: str, max_bytes: Optional[int] = None) -> Optional[str]:
+    """
+    Streams a document at an http(s) URL to a temp file, chunk by chunk like spool_upload.
+    Only hosts in DOCUMENT_URL_ALLOWED_HOSTS are fetched, and redirects aren't followed
+    (they could lead anywhere). Returns its path, or None if it isn't allowed, couldn't
+    be fetched or is past `max_bytes`. The caller removes the file.
+    """
+    if not url_allowed(url, settings.DOCUMENT_URL_ALLOWED_HOSTS):
+        print(f"[Uploads] Refusing to download {url}: host not in DOCUMENT_URL_ALLOWED_HOSTS")
+        metrics.counter("upload_download_refused_total").inc()
+        return None
+    max_bytes = max_bytes or settings.UPLOAD_MAX_BYTES
+    suffix = os.path.splitext(httpx.URL(url).path)[1].lower()
+    out = tempfile.NamedTemporaryFile(prefix="upload-", suffix=suffix, dir=settings.UPLOAD_SPOOL_DIR, delete=False)
+    size = 0
+    try:
+        with out:
+            async with httpx.AsyncClient(timeout=60.0, follow_redirects=False) as client:
+                async with client.stream("GET", url) as response:
+                    response.raise_for_status()
+                    async for chunk in response.aiter_bytes(settings.UPLOAD_CHUNK_BYTES):
+                        size += len(chunk)
+                        if size > max_bytes:
+                            raise UploadTooLarge(f"{url} is larger than the {max_bytes // (1024 * 1024)}MB limit")
+                        await asyncio.to_thread(out.write, chunk)
+    except Exception as e:
+        print(f"[Uploads] Downloading {url} failed: {e}")
+        os.remove(out.name)
+        return None
+    return out.name
@@ -0,0 +1,197 @@
+import math
+import zlib
+from collections import Counter
+from functools import lru_cache
+from typing import Callable, Dict, Iterable, List, Mapping, Optional, Sequence, Tuple
+import numpy as np
+from app.services.search_index import index_terms
+
+# Feature weights: whole terms carry meaning, bigrams keep "cash flow" apart from "cash"
+# and "flow", character trigrams let "guarantor" and "guarantee" land near each other.
+UNIGRAM_WEIGHT = 1.0
+BIGRAM_WEIGHT = 0.7
+TRIGRAM_WEIGHT = 0.1
+HASH_PROBES = 2
+
+
+def _add_feature(vector: np.ndarray, feature: str, weight: float):
+    # crc32 rather than hash(): vectors must mean the same thing in every process and
+    # across restarts (str hashing is salted per process). Each feature lands in
+    # HASH_PROBES buckets, so a single unlucky collision only costs part of its weight.
+    data = feature.encode("utf-8")
+    for seed in range(HASH_PROBES):
+        h = zlib.crc32(data, seed)
+        vector[h % len(vector)] += weight if (h >> 31) & 1 else -weight
+
+
+@lru_cache(maxsize=65536)
+def _term_vector(term: str, dim: int) -> np.ndarray:
+    """A term's own contribution: its unigram plus its character trigrams."""
+    vector = np.zeros(dim, dtype=np.float32)
+    _add_feature(vector, "w:" + term, UNIGRAM_WEIGHT)
+    padded = f"<{term}>"
+    for i in range(len(padded) - 2):
+        _add_feature(vector, "c:" + padded[i:i + 3], TRIGRAM_WEIGHT)
+    return vector
+
+
+@lru_cache(maxsize=65536)
+def _bigram_vector(first: str, second: str, dim: int) -> np.ndarray:
+    vector = np.zeros(dim, dtype=np.float32)
+    _add_feature(vector, f"b:{first} {second}", BIGRAM_WEIGHT)
+    return vector
+
+
+class HashingEmbedder:
+    """
+    Local text embedding by feature hashing: each term (with its character trigrams) and
+    each adjacent term pair is hashed into `dim` signed buckets, weighted by 1 + log(count)
+    so repetition doesn't dominate, then L2-normalized, so a dot product is a cosine
+    similarity. Nothing to train or download, and the same text always maps to the same
+    vector. Per-term vectors are cached, so embedding is mostly array additions.
+    """
+
+    def __init__(self, dim: int = 160):
+        self.dim = dim
+
+    def embed(self, text: str, term_weight: Optional[Callable[[str], float]] = None) -> np.ndarray:
+        """
+        `term_weight` scales each term (and bigrams by the lesser of their two terms); for
+        queries, corpus IDF keeps common words and words no document has from adding
+        only hash-collision noise.
+        """
+        terms = index_terms(text)
+        weights = {term: term_weight(term) for term in set(terms)} if term_weight else None
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for term, count in Counter(terms).items():
+            weight = weights[term] if weights else 1.0
+            if weight:
+                vector += _term_vector(term, self.dim) * (weight * (1.0 + math.log(count)))
+        for (first, second), count in Counter(zip(terms, terms[1:])).items():
+            weight = min(weights[first], weights[second]) if weights else 1.0
+            if weight:
+                vector += _bigram_vector(first, second, self.dim) * (weight * (1.0 + math.log(count)))
+        norm = float(np.linalg.norm(vector))
+        if norm > 0:
+            vector /= norm
+        return vector
+
+    def embed_many(self, texts: Iterable[str]) -> np.ndarray:
+        texts = list(texts)
+        matrix = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            matrix[row] = self.embed(text)
+        return matrix
+
+
+class VectorIndex:
+    """
+    Dense vectors in one contiguous float32 matrix (row per document), searched with a
+    single matrix-vector product and argpartition top-k. The matrix grows by doubling;
+    removed rows are masked out and reclaimed by compact(). Being a plain ndarray, the
+    matrix can equally be a read-only np.memmap.
+    """
+
+    def __init__(self, dim: int, capacity: int = 1024):
+        self.dim = dim
+        self.matrix = np.zeros((capacity, dim), dtype=np.float32)
+        self.live = np.zeros(capacity, dtype=bool)
+        self.keys: List[Optional[str]] = []
+        self.rows: Dict[str, int] = {}
+
+    @classmethod
+    def from_matrix(cls, matrix: np.ndarray, keys: Sequence[str], rows: Mapping[str, int]) -> "VectorIndex":
+        """
+        Wraps an existing matrix (e.g. a read-only np.memmap) where keys[row] names each row
+        and rows maps key -> row. Only searches work; a read-only matrix can't take add().
+        """
+        index = cls(matrix.shape[1], capacity=0)
+        index.matrix = matrix
+        index.live = np.ones(len(matrix), dtype=bool)
+        index.keys = keys
+        index.rows = rows
+        return index
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def _reserve(self, rows: int):
+        if rows <= len(self.matrix):
+            return
+        capacity = max(rows, 2 * len(self.matrix))
+        matrix = np.zeros((capacity, self.dim), dtype=np.float32)
+        matrix[:len(self.keys)] = self.matrix[:len(self.keys)]
+        live = np.zeros(capacity, dtype=bool)
+        live[:len(self.keys)] = self.live[:len(self.keys)]
+        self.matrix, self.live = matrix, live
+
+    def add(self, key: str, vector: np.ndarray):
+        self.add_many([key], vector[None, :])
+
+    def add_many(self, keys: Sequence[str], vectors: np.ndarray):
+        """Adds rows, overwriting the vectors of keys already present."""
+        new = [key for key in dict.fromkeys(keys) if key not in self.rows]
+        self._reserve(len(self.keys) + len(new))
+        for key in new:
+            self.rows[key] = len(self.keys)
+            self.keys.append(key)
+        rows = np.fromiter((self.rows[key] for key in keys), dtype=np.int64, count=len(keys))
+        self.matrix[rows] = vectors
+        self.live[rows] = True
+
+    def remove(self, key: str) -> bool:
+        row = self.rows.pop(key, None)
+        if row is None:
+            return False
+        self.keys[row] = None
+        self.live[row] = False
+        if len(self.keys) > 1024 and len(self.rows) < len(self.keys) // 2:
+            self.compact()
+        return True
+
+    def compact(self):
+        keep = np.flatnonzero(self.live[:len(self.keys)])
+        self.matrix = np.ascontiguousarray(self.matrix[keep])
+        self.live = np.ones(len(keep), dtype=bool)
+        self.keys = [self.keys[row] for row in keep]
+        self.rows = {key: row for row, key in enumerate(self.keys)}
+
+    def rows_for(self, keys: Iterable[str]) -> np.ndarray:
+        return np.fromiter((self.rows[key] for key in keys if key in self.rows), dtype=np.int64)
+
+    def score(self, key: str, query: np.ndarray) -> float:
+        row = self.rows.get(key)
+        return float(self.matrix[row] @ query) if row is not None else 0.0
+
+    def search(self, query: np.ndarray, k: int = 10, rows: Optional[np.ndarray] = None) -> List[Tuple[str, float]]:
+        """
+        Top `k` (key, cosine) pairs for a normalized `query`, best first. `rows`
+        restricts the search to those rows (e.g. the ones passing a filter).
+        """
+        used = len(self.keys)
+        if rows is None:
+            scores = self.matrix[:used] @ query
+            scores[~self.live[:used]] = -np.inf
+            candidates = None
+        else:
+            if not len(rows):
+                return []
+            scores = self.matrix[rows] @ query
+            candidates = rows
+        k = min(k, len(scores))
+        if k <= 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        results = []
+        for index in top:
+            score = float(scores[index])
+            if score == -np.inf:
+                break
+            row = int(candidates[index]) if candidates is not None else int(index)
+            results.append((self.keys[row], score))
+        return results
+
+    def stats(self):
+        return {"vectors": len(self.rows), "rows": len(self.keys), "dim": self.dim,
+                "bytes": int(self.matrix.nbytes)}
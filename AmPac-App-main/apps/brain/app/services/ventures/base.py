@@ -1,5 +1,5 @@
 from abc import ABC, abstractmethod
-from typing import List, Optional
+from typing import Dict, List, Optional
 from pydantic import BaseModel
 from datetime import datetime
 
@@ -31,6 +31,12 @@ class AbstractVenturesClient(ABC):
     async def get_conditions(self, loan_id: str) -> List[VenturesCondition]:
         pass
 
+    async def get_conditions_batch(self, loan_ids: List[str]) -> Dict[str, List[VenturesCondition]]:
+        """
+        Conditions for many loans at once. Clients whose API supports batching override this.
+        """
+        return {loan_id: await self.get_conditions(loan_id) for loan_id in loan_ids}
+
     @abstractmethod
     async def update_condition_status(self, condition_id: str, status: str, note: Optional[str] = None) -> bool:
         pass
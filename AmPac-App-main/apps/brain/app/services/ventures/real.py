@@ -0,0 +1,207 @@
+import asyncio
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+from app.core.config import get_settings
+from app.services.ventures_client import VenturesClient
+from .base import AbstractVenturesClient, VenturesLoan, VenturesCondition
+
+settings = get_settings()
+
+
+def _pick(data: Dict[str, Any], *keys: str, default: Any = None) -> Any:
+    """
+    First non-empty value among `keys`. Ventures object payloads are not consistent
+    about casing between endpoints (statusName vs StatusName vs status.name).
+    """
+    for key in keys:
+        value = data.get(key)
+        if value not in (None, ""):
+            return value
+    return default
+
+
+def _items(payload: Any) -> List[Dict[str, Any]]:
+    if isinstance(payload, list):
+        return payload
+    if isinstance(payload, dict):
+        for key in ("items", "data", "value", "results"):
+            if isinstance(payload.get(key), list):
+                return payload[key]
+    return []
+
+
+def map_loan(data: Dict[str, Any]) -> VenturesLoan:
+    status = _pick(data, "statusName", "StatusName", "status", "Status", default="Unknown")
+    if isinstance(status, dict):
+        status = _pick(status, "name", "Name", default="Unknown")
+
+    balance = _pick(data, "balance", "Balance", "loanAmount", "LoanAmount", "amount", default=0.0)
+    try:
+        balance = float(balance)
+    except (TypeError, ValueError):
+        balance = 0.0
+
+    return VenturesLoan(
+        id=str(_pick(data, "id", "Id", "loanId", "LoanId")),
+        status_name=str(status),
+        balance=balance,
+        officer_name=_pick(data, "officerName", "OfficerName", "loanOfficer", "LoanOfficer"),
+        borrower_name=_pick(data, "borrowerName", "BorrowerName", "borrower", "businessName"),
+    )
+
+
+def map_condition(data: Dict[str, Any]) -> VenturesCondition:
+    due_date = _pick(data, "dueDate", "DueDate")
+    if isinstance(due_date, str):
+        try:
+            due_date = datetime.fromisoformat(due_date.replace("Z", "+00:00"))
+        except ValueError:
+            due_date = None
+
+    return VenturesCondition(
+        id=str(_pick(data, "id", "Id", "conditionId", "ConditionId")),
+        description=_pick(data, "description", "Description", "name", "Name", "title", default=""),
+        status=_pick(data, "status", "Status", default="Open"),
+        category=_pick(data, "category", "Category", default="General"),
+        due_date=due_date,
+    )
+
+
+class RealVenturesClient(AbstractVenturesClient):
+    """
+    Ventures LOS client backed by the v4 REST API.
+    Uses the pooled VenturesClient transport for auth, keep-alive and 401 refresh.
+    """
+
+    # Status codes meaning "this server has no batched conditions endpoint"
+    _BATCH_UNSUPPORTED = {400, 404, 405, 501}
+
+    def __init__(self, transport: Optional[VenturesClient] = None):
+        self.transport = transport or VenturesClient(
+            username=settings.VENTURES_USERNAME,
+            password=settings.VENTURES_PASSWORD,
+        )
+        self.page_size = settings.VENTURES_PAGE_SIZE
+        self.batch_size = settings.VENTURES_BATCH_SIZE
+        self._batch_supported: Optional[bool] = None  # Learned on first batch call
+        self._fanout = asyncio.Semaphore(settings.VENTURES_MAX_CONNECTIONS)
+
+    async def get_loan_detail(self, loan_id: str) -> Optional[VenturesLoan]:
+        data = await self.transport.get_cached("loan", loan_id, f"/objects/loan/{loan_id}", missing_ok=True)
+        return map_loan(data) if data else None
+
+    async def get_all_loans(self) -> List[VenturesLoan]:
+        loans: List[VenturesLoan] = []
+        page = 1
+        while True:
+            response = await self.transport.request(
+                "GET", "/objects/loan", params={"page": page, "pageSize": self.page_size}
+            )
+            response.raise_for_status()
+            payload = response.json()
+            items = _items(payload)
+            for item in items:
+                loan = map_loan(item)
+                # The list payload is the full loan object; reuse it for get_loan_detail
+                await self.transport.prime_cache("loan", loan.id, item)
+                loans.append(loan)
+
+            total = payload.get("total") if isinstance(payload, dict) else None
+            if len(items) < self.page_size or (total is not None and len(loans) >= total):
+                break
+            page += 1
+        return loans
+
+    async def get_conditions(self, loan_id: str) -> List[VenturesCondition]:
+        data = await self.transport.get_cached("conditions", loan_id, f"/objects/loan/{loan_id}/conditions", missing_ok=True)
+        return [map_condition(item) for item in _items(data)]
+
+    async def get_conditions_batch(self, loan_ids: List[str]) -> Dict[str, List[VenturesCondition]]:
+        """
+        Fetches conditions for many loans with one request per `batch_size` ids.
+        Falls back to bounded per-loan fan-out if the server rejects the batch query.
+        """
+        result: Dict[str, List[VenturesCondition]] = {}
+        missing: List[str] = []
+        for loan_id in loan_ids:
+            cached = await self.transport.peek_cache("conditions", loan_id)
+            if cached is not None:
+                result[loan_id] = [map_condition(item) for item in _items(cached)]
+            else:
+                missing.append(loan_id)
+        if not missing:
+            return result
+
+        if self._batch_supported is not False:
+            for start in range(0, len(missing), self.batch_size):
+                chunk = missing[start:start + self.batch_size]
+                response = await self.transport.request(
+                    "GET", "/objects/condition", params={"loanIds": ",".join(chunk)}
+                )
+                if response.status_code in self._BATCH_UNSUPPORTED and self._batch_supported is None:
+                    print("[RealVentures] Batched conditions not supported; using per-loan requests")
+                    self._batch_supported = False
+                    break
+                response.raise_for_status()
+                self._batch_supported = True
+                raw_by_loan: Dict[str, List[Dict[str, Any]]] = {loan_id: [] for loan_id in chunk}
+                for item in _items(response.json()):
+                    loan_id = str(_pick(item, "loanId", "LoanId", default=""))
+                    if loan_id in raw_by_loan:
+                        raw_by_loan[loan_id].append(item)
+                for loan_id, items in raw_by_loan.items():
+                    await self.transport.prime_cache("conditions", loan_id, items)
+                    result[loan_id] = [map_condition(item) for item in items]
+            else:
+                return result
+
+        async def fetch(loan_id: str):
+            async with self._fanout:
+                result[loan_id] = await self.get_conditions(loan_id)
+
+        await asyncio.gather(*(fetch(loan_id) for loan_id in missing))
+        return result
+
+    async def update_condition_status(self, condition_id: str, status: str, note: Optional[str] = None) -> bool:
+        body = {"status": status}
+        if note:
+            body["note"] = note
+        response = await self.transport.request("PATCH", f"/objects/condition/{condition_id}", json=body)
+        if response.status_code == 404:
+            return False
+        response.raise_for_status()
+
+        # Drop the cached condition list for the owning loan (or all lists if we can't tell which)
+        try:
+            payload = response.json()
+        except ValueError:
+            payload = None
+        loan_id = _pick(payload, "loanId", "LoanId") if isinstance(payload, dict) else None
+        await self.transport.invalidate("conditions", str(loan_id) if loan_id else None)
+        return True
+
+    async def create_loan(self, loan_data: dict) -> VenturesLoan:
+        body = {
+            "borrowerName": loan_data.get("businessName", "New Borrower"),
+            "loanAmount": float(loan_data.get("loanAmount") or loan_data.get("amount") or 0.0),
+            "productType": loan_data.get("type"),
+            "contactEmail": loan_data.get("contactEmail"),
+        }
+        response = await self.transport.request("POST", "/objects/loan", json=body)
+        response.raise_for_status()
+        return map_loan(response.json())
+
+    async def upload_document(self, loan_id: str, condition_id: str, file_url: str) -> bool:
+        response = await self.transport.request(
+            "POST",
+            f"/objects/loan/{loan_id}/conditions/{condition_id}/documents",
+            json={"url": file_url},
+        )
+        if response.status_code == 404:
+            return False
+        response.raise_for_status()
+        await self.transport.invalidate("conditions", loan_id)
+        return True
+
+    async def close(self):
+        await self.transport.close()
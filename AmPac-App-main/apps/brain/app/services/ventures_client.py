@@ -1,38 +1,153 @@
+import asyncio
+import hashlib
+import time
 import httpx
+from datetime import datetime, timezone
 from typing import Optional, Dict, Any, List
 from app.core.firebase import get_db
 from app.core.config import get_settings
+from app.core import metrics
 from app.services.encryption_service import encryption_service
+from app.services.cache import CacheEntry, TieredCache, get_redis_tier
+from app.services.single_flight import SingleFlight
 
 settings = get_settings()
 
+# Read-through cache for Ventures GETs, shared by all clients in this worker
+response_cache = TieredCache(
+    "ventures",
+    max_entries=settings.VENTURES_CACHE_MAX_ENTRIES,
+    redis_tier=get_redis_tier() if settings.VENTURES_CACHE_REDIS else None,
+    keep_stale_seconds=300,  # Keep ETags around past expiry for If-None-Match
+)
+ventures_flights = SingleFlight("ventures")
+
+# Decrypted system credentials shared by every client instance.
+# Avoids a Firestore read + Fernet decrypt each time a client needs to (re)login.
+_credential_cache: Dict[str, Any] = {"data": None, "loaded_at": 0.0}
+
+
+def _read_system_credentials() -> Optional[Dict[str, Any]]:
+    """
+    Returns decrypted system_secrets/ventures_config, cached for VENTURES_CREDENTIAL_CACHE_SECONDS.
+    A missing config is cached as well; read errors are not, so the next call retries.
+    """
+    now = time.monotonic()
+    loaded_at = _credential_cache["loaded_at"]
+    if loaded_at and now - loaded_at < settings.VENTURES_CREDENTIAL_CACHE_SECONDS:
+        return _credential_cache["data"]
+
+    try:
+        db = get_db()
+        doc = db.collection("system_secrets").document("ventures_config").get()
+        data = None
+        if doc.exists:
+            raw = doc.to_dict() or {}
+            encrypted_pw = raw.get("encrypted_password")
+            data = {
+                "username": raw.get("username"),
+                "site_name": raw.get("site_name", "test_integration"),
+                "password": encryption_service.decrypt(encrypted_pw) if encrypted_pw else None,
+            }
+    except Exception as e:
+        print(f"Failed to load Ventures config: {e}")
+        metrics.counter("ventures_credential_loads_total").inc(outcome="error")
+        return None
+
+    metrics.counter("ventures_credential_loads_total").inc(outcome="found" if data else "missing")
+    _credential_cache["data"] = data
+    _credential_cache["loaded_at"] = now
+    return data
+
+
+def invalidate_credential_cache():
+    _credential_cache["data"] = None
+    _credential_cache["loaded_at"] = 0.0
+
+
 class VenturesClient:
-    def __init__(self, username=None, password=None, site_name=None):
-        self.base_url = "https://api.venturesgo.com/api/v4"
+    def __init__(self, username=None, password=None, site_name=None, base_url=None, transport: Optional[httpx.AsyncBaseTransport] = None, cache: Optional[TieredCache] = None):
+        self.base_url = (base_url or settings.VENTURES_BASE_URL).rstrip("/")
         self.client_name = site_name or "test_integration"
         self.username = username
         self.password = password
         self.token: Optional[str] = None
-        
+        self.token_expires_at: float = 0.0  # time.monotonic() deadline
+        self.token_refresh_at: float = 0.0  # time.monotonic() point from which a proactive refresh is due
+        self.token_generation = 0  # Bumped on every successful login
+        self._uses_system_config = not username
+        # Single-flight guard: concurrent refreshes collapse into one login()
+        self._refresh_lock = asyncio.Lock()
+        # Pooled HTTP client (keep-alive across calls), created lazily on first request
+        self._transport = transport
+        self._http: Optional[httpx.AsyncClient] = None
+        self.cache = cache if cache is not None else (response_cache if settings.VENTURES_CACHE_ENABLED else None)
+
         # If creds not provided, try to load from Firestore
         if not self.username:
             self._load_config()
 
+    def _get_http(self) -> httpx.AsyncClient:
+        if self._http is None or self._http.is_closed:
+            self._http = httpx.AsyncClient(
+                timeout=httpx.Timeout(settings.VENTURES_TIMEOUT_SECONDS),
+                limits=httpx.Limits(
+                    max_connections=settings.VENTURES_MAX_CONNECTIONS,
+                    max_keepalive_connections=settings.VENTURES_MAX_CONNECTIONS,
+                ),
+                transport=self._transport,
+            )
+        return self._http
+
+    async def close(self):
+        """Close the pooled HTTP client."""
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+
     def _load_config(self):
-        try:
-            db = get_db()
-            doc = db.collection("system_secrets").document("ventures_config").get()
-            if doc.exists:
-                data = doc.to_dict()
-                self.username = data.get("username")
-                self.client_name = data.get("site_name", "test_integration")
-                encrypted_pw = data.get("encrypted_password")
-                if encrypted_pw:
-                    self.password = encryption_service.decrypt(encrypted_pw)
-        except Exception as e:
-            print(f"Failed to load Ventures config: {e}")
-
-    async def login(self) -> str:
+        creds = _read_system_credentials()
+        if creds:
+            self.username = creds.get("username")
+            self.client_name = creds.get("site_name") or self.client_name
+            self.password = creds.get("password")
+
+    def _token_is_valid(self) -> bool:
+        return bool(self.token) and time.monotonic() < self.token_expires_at
+
+    def _token_is_fresh(self) -> bool:
+        """
+        Valid and not inside the proactive refresh window.
+        """
+        return bool(self.token) and time.monotonic() < self.token_refresh_at
+
+    def _set_expiry(self, data: Any):
+        """
+        Records when the new token expires and when to start refreshing it. The skew is
+        capped at half the lifetime, so a short-lived token (expires_in <= the skew) is
+        still reused for a while instead of triggering a login on every request.
+        """
+        expires_at = self._expiry_from_response(data)
+        ttl = max(expires_at - time.monotonic(), 0.0)
+        self.token_expires_at = expires_at
+        self.token_refresh_at = expires_at - min(float(settings.VENTURES_TOKEN_REFRESH_SKEW_SECONDS), ttl / 2)
+
+    def _expiry_from_response(self, data: Any) -> float:
+        ttl = float(settings.VENTURES_TOKEN_TTL_SECONDS)
+        if isinstance(data, dict):
+            try:
+                if data.get("expires_in"):
+                    ttl = float(data["expires_in"])
+                elif data.get("expires") or data.get("expiration"):
+                    expires = datetime.fromisoformat(str(data.get("expires") or data.get("expiration")).replace("Z", "+00:00"))
+                    if expires.tzinfo is None:
+                        expires = expires.replace(tzinfo=timezone.utc)
+                    ttl = (expires - datetime.now(timezone.utc)).total_seconds()
+            except (TypeError, ValueError):
+                pass
+        return time.monotonic() + max(ttl, 0.0)
+
+    async def login(self, reason: str = "manual") -> str:
         """
         Authenticates with Ventures and returns a Bearer token.
         """
@@ -40,6 +155,7 @@ class VenturesClient:
             # Try loading again just in case
             self._load_config()
             if not self.username or not self.password:
+                metrics.counter("ventures_logins_total").inc(reason=reason, outcome="unconfigured")
                 raise ValueError("Ventures credentials not configured")
 
         url = f"{self.base_url}/token"
@@ -48,64 +164,190 @@ class VenturesClient:
             "username": self.username,
             "password": self.password
         }
-        
+
         if settings.VENTURES_MOCK_MODE:
             self.token = f"mock_token_{self.username}"
+            self._set_expiry(None)
+            self.token_generation += 1
+            metrics.counter("ventures_logins_total").inc(reason=reason, outcome="success")
             return self.token
 
-        async with httpx.AsyncClient() as client:
-            response = await client.post(url, json=payload)
+        try:
+            response = await self._get_http().post(url, json=payload)
             response.raise_for_status()
-            try:
-                data = response.json()
-                self.token = data.get("token", response.text)
-            except:
-                self.token = response.text.strip('"')
-            
+        except httpx.HTTPStatusError as e:
+            metrics.counter("ventures_logins_total").inc(reason=reason, outcome="failure")
+            if e.response.status_code in (400, 401, 403) and self._uses_system_config:
+                # Credentials may have been rotated; re-read them next time
+                invalidate_credential_cache()
+            raise
+        except Exception:
+            metrics.counter("ventures_logins_total").inc(reason=reason, outcome="failure")
+            raise
+
+        data = None
+        try:
+            data = response.json()
+            self.token = data.get("token", response.text) if isinstance(data, dict) else str(data)
+        except:
+            self.token = response.text.strip('"')
+
+        self._set_expiry(data)
+        self.token_generation += 1
+        metrics.counter("ventures_logins_total").inc(reason=reason, outcome="success")
+        return self.token
+
+    async def _ensure_token(self, stale_generation: Optional[int] = None) -> str:
+        """
+        Returns a usable token, logging in at most once across concurrent callers.
+        `stale_generation` identifies a token the caller just saw rejected with 401; it
+        forces a refresh unless another caller has already replaced that token.
+        """
+        def reusable() -> bool:
+            return self._token_is_fresh() and (stale_generation is None or self.token_generation != stale_generation)
+
+        if reusable():
             return self.token
 
-    async def _get_headers(self) -> Dict[str, str]:
-        if not self.token:
-            await self.login()
+        # A proactive refresh is already in flight and the current token still works: don't wait
+        if stale_generation is None and self._refresh_lock.locked() and self._token_is_valid():
+            return self.token
+
+        async with self._refresh_lock:
+            if reusable():
+                metrics.counter("ventures_login_coalesced_total").inc()
+                return self.token
+            if stale_generation is not None:
+                reason = "unauthorized"
+            elif self.token:
+                reason = "expiring"
+            else:
+                reason = "initial"
+            return await self.login(reason=reason)
+
+    def _auth_headers(self, token: str) -> Dict[str, str]:
         return {
-            "Authorization": f"Bearer {self.token}",
+            "Authorization": f"Bearer {token}",
             "Accept": "application/json"
         }
 
+    async def _get_headers(self) -> Dict[str, str]:
+        return self._auth_headers(await self._ensure_token())
+
+    async def request(self, method: str, path: str, **kwargs) -> httpx.Response:
+        """
+        Sends an authenticated request over the pooled client, refreshing the token once on 401.
+        `path` is relative to base_url, e.g. "/objects/loan/123".
+        """
+        token = await self._ensure_token()
+        generation = self.token_generation
+        url = f"{self.base_url}{path}"
+        client = self._get_http()
+
+        extra_headers = kwargs.pop("headers", None) or {}
+
+        response = await client.request(method, url, headers={**self._auth_headers(token), **extra_headers}, **kwargs)
+        if response.status_code == 401:
+            # Token rejected; refresh (coalesced with any concurrent refresh) and retry once
+            token = await self._ensure_token(stale_generation=generation)
+            response = await client.request(method, url, headers={**self._auth_headers(token), **extra_headers}, **kwargs)
+        return response
+
+    # --- Read-through cache ---
+
+    def _cache_key(self, kind: str, object_id: str) -> str:
+        return f"ventures:{self.client_name}:{kind}:{object_id}"
+
+    async def get_cached(self, kind: str, object_id: str, path: str, params: Optional[Dict[str, Any]] = None, missing_ok: bool = False) -> Any:
+        """
+        GETs `path` through the response cache. Fresh entries are served locally; stale
+        entries with an ETag are revalidated with If-None-Match. Identical concurrent
+        misses share one upstream request. Returns None on 404 if `missing_ok`,
+        otherwise raises like raise_for_status().
+        """
+        key = self._cache_key(kind, object_id)
+        entry = await self.cache.get(key) if self.cache is not None else None
+        if entry is not None and entry.fresh:
+            return entry.value
+
+        return await ventures_flights.do(
+            (key, missing_ok),
+            lambda: self._fetch(kind, key, path, params, missing_ok, entry),
+        )
+
+    async def _fetch(self, kind: str, key: str, path: str, params: Optional[Dict[str, Any]], missing_ok: bool, entry: Optional[CacheEntry]) -> Any:
+        headers = {"If-None-Match": entry.etag} if entry is not None and entry.etag else None
+        response = await self.request("GET", path, params=params, headers=headers)
+        ttl = settings.VENTURES_CACHE_TTL_SECONDS.get(kind, 15)
+
+        if response.status_code == 304 and entry is not None:
+            metrics.counter("cache_revalidations_total").inc(cache=self.cache.name, kind=kind, outcome="not_modified")
+            await self.cache.set(key, entry.value, ttl, etag=entry.etag)
+            return entry.value
+        if missing_ok and response.status_code == 404:
+            if self.cache is not None:
+                await self.cache.delete(key)
+            return None
+        response.raise_for_status()
+
+        data = response.json()
+        if self.cache is not None:
+            if headers:
+                metrics.counter("cache_revalidations_total").inc(cache=self.cache.name, kind=kind, outcome="changed")
+            await self.cache.set(key, data, ttl, etag=response.headers.get("ETag"))
+        return data
+
+    async def prime_cache(self, kind: str, object_id: str, value: Any):
+        """Stores a value fetched by some other route (e.g. a batch query)."""
+        if self.cache is not None:
+            await self.cache.set(self._cache_key(kind, object_id), value, settings.VENTURES_CACHE_TTL_SECONDS.get(kind, 15))
+
+    async def peek_cache(self, kind: str, object_id: str) -> Any:
+        """Returns a fresh cached value without touching the network, else None."""
+        if self.cache is None:
+            return None
+        entry = await self.cache.get(self._cache_key(kind, object_id))
+        return entry.value if entry is not None and entry.fresh else None
+
+    async def invalidate(self, kind: str, object_id: Optional[str] = None):
+        """Drops one cached object, or every object of `kind` when no id is given."""
+        if self.cache is None:
+            return
+        if object_id is None:
+            await self.cache.delete_prefix(self._cache_key(kind, ""))
+        else:
+            await self.cache.delete(self._cache_key(kind, object_id))
+
+    @staticmethod
+    def _entity_key(tax_id: str) -> str:
+        # Tax ids are SSN/EIN; never put them in cache keys (Redis) in the clear
+        return hashlib.sha256(tax_id.encode()).hexdigest()[:32]
+
     async def get_loan_status(self, loan_id: str) -> Dict[str, Any]:
         """
         Fetches loan details from Ventures.
         Note: 'loan_id' here is the Ventures ID, not AmPac ID.
         """
-        headers = await self._get_headers()
         # Assuming 'loan' is the object type. Docs say call /objects to find out.
         # We'll assume 'loan' or 'application' for now.
-        url = f"{self.base_url}/objects/loan/{loan_id}"
-        
-        async with httpx.AsyncClient() as client:
-            response = await client.get(url, headers=headers)
-            if response.status_code == 401:
-                # Token expired, retry once
-                await self.login()
-                headers = await self._get_headers()
-                response = await client.get(url, headers=headers)
-            
-            response.raise_for_status()
-            return response.json()
+        return await self.get_cached("loan", loan_id, f"/objects/loan/{loan_id}")
 
     async def sync_loan(self, loan_data: Dict[str, Any]) -> Dict[str, Any]:
         """
         Creates or updates a loan in Ventures.
         """
-        headers = await self._get_headers()
         # Logic to determine if create or update would go here
         # For now, let's assume we are creating a new record for simplicity
-        url = f"{self.base_url}/objects/loan"
-        
-        async with httpx.AsyncClient() as client:
-            response = await client.post(url, json=loan_data, headers=headers)
-            response.raise_for_status()
-            return response.json()
+        response = await self.request("POST", "/objects/loan", json=loan_data)
+        response.raise_for_status()
+        result = response.json()
+
+        for loan_id in {loan_data.get("id"), result.get("id") if isinstance(result, dict) else None} - {None}:
+            await self.invalidate("loan", str(loan_id))
+            await self.invalidate("conditions", str(loan_id))
+        if loan_data.get("taxId"):
+            await self.invalidate("entities", self._entity_key(str(loan_data["taxId"])))
+        return result
 
     async def get_loan_detail(self, loan_id: str) -> Dict[str, Any]:
         """
@@ -118,33 +360,21 @@ class VenturesClient:
         """
         Fetches underwriting conditions (tasks) for a loan.
         """
-        headers = await self._get_headers()
         # Assuming a sub-resource or query
-        url = f"{self.base_url}/objects/loan/{loan_id}/conditions"
-        
-        async with httpx.AsyncClient() as client:
-            # Mock response for now if 404
-            try:
-                response = await client.get(url, headers=headers)
-                response.raise_for_status()
-                return response.json()
-            except Exception:
-                return []
+        # Mock response for now if 404
+        try:
+            return await self.get_cached("conditions", loan_id, f"/objects/loan/{loan_id}/conditions")
+        except Exception:
+            return []
 
     async def get_entities(self, tax_id: str) -> List[Dict[str, Any]]:
         """
         Search for existing borrower records by Tax ID (EIN/SSN).
         """
-        headers = await self._get_headers()
-        url = f"{self.base_url}/search/entities"
         params = {"taxId": tax_id}
-        
-        async with httpx.AsyncClient() as client:
-            try:
-                response = await client.get(url, headers=headers, params=params)
-                response.raise_for_status()
-                return response.json()
-            except Exception:
-                return []
+        try:
+            return await self.get_cached("entities", self._entity_key(tax_id), "/search/entities", params=params)
+        except Exception:
+            return []
 
 ventures_client = VenturesClient()
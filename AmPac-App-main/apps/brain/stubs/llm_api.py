@@ -0,0 +1,157 @@
+"""
+Local stub of an OpenAI-compatible chat completions API (Groq's /openai/v1 surface).
+
+    uvicorn stubs.llm_api:app --port 8082
+    groq_service.base_url = "http://127.0.0.1:8082/openai/v1"
+
+Knobs (env, or make_app() arguments for several providers in one process):
+    STUB_LLM_TTFT_MS      delay before the first token / the full response (default 50)
+    STUB_LLM_TOKEN_MS     delay between streamed tokens (default 5)
+    STUB_LLM_ERROR_RATE   fraction of requests answered with a 500 (default 0)
+    STUB_LLM_RATE_LIMIT   requests allowed per STUB_LLM_RATE_WINDOW_S (default 0 = unlimited);
+                          beyond it the stub answers 429 with Retry-After like Groq does
+"""
+import asyncio
+import json
+import os
+import random
+import time
+import uuid
+from typing import Dict, List, Optional
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+
+def _reply_for(messages: List[Dict]) -> str:
+    last = next((m.get("content", "") for m in reversed(messages) if m.get("role") == "user"), "")
+    reply = f"Stub answer about: {last[:80]}. SBA 504 loans finance real estate and equipment."
+    if "apply" in last.lower():
+        reply += '\n\n<<<ACTION:{"type":"navigate","target":"Apply"}>>>'
+    return reply
+
+
+def _tokens(text: str) -> List[str]:
+    # Roughly word-sized pieces, keeping whitespace attached like real tokenizers do
+    pieces, current = [], ""
+    for ch in text:
+        current += ch
+        if ch in " \n" or len(current) >= 4:
+            pieces.append(current)
+            current = ""
+    if current:
+        pieces.append(current)
+    return pieces
+
+
+def make_app(name: str = "stub", ttft_ms: float = 50, token_ms: float = 5, error_rate: float = 0.0,
+             rate_limit: int = 0, rate_window_s: float = 60.0, model_ttft_ms: Optional[Dict[str, float]] = None) -> FastAPI:
+    app = FastAPI(title=f"LLM stub ({name})")
+    app.state.stats = {"requests": 0, "errors": 0, "streams": 0, "cancelled": 0, "rate_limited": 0}
+    app.state.config = {"ttft_ms": ttft_ms, "token_ms": token_ms, "error_rate": error_rate,
+                        "rate_limit": rate_limit, "rate_window_s": rate_window_s,
+                        "model_ttft_ms": dict(model_ttft_ms or {})}  # Per-model override of ttft_ms
+    window = {"started": time.monotonic(), "used": 0}
+
+    def rate_headers() -> Dict[str, str]:
+        config = app.state.config
+        if not config["rate_limit"]:
+            return {}
+        now = time.monotonic()
+        if now - window["started"] >= config["rate_window_s"]:
+            window["started"], window["used"] = now, 0
+        reset = config["rate_window_s"] - (now - window["started"])
+        return {
+            "x-ratelimit-limit-requests": str(config["rate_limit"]),
+            "x-ratelimit-remaining-requests": str(max(0, config["rate_limit"] - window["used"])),
+            "x-ratelimit-reset-requests": f"{reset:.2f}s",
+        }
+
+    @app.post("/openai/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        app.state.last_request = body  # For checking what was sent (e.g. retrieved context)
+        stats, config = app.state.stats, app.state.config
+        stats["requests"] += 1
+        headers = rate_headers()
+        if headers and window["used"] >= config["rate_limit"]:
+            stats["rate_limited"] += 1
+            retry_after = headers["x-ratelimit-reset-requests"].rstrip("s")
+            return JSONResponse({"error": {"message": "Rate limit reached"}}, status_code=429,
+                                headers={**headers, "retry-after": retry_after})
+        if headers:
+            window["used"] += 1
+            headers = rate_headers()
+        if random.random() < config["error_rate"]:
+            stats["errors"] += 1
+            return JSONResponse({"error": {"message": f"{name} upstream error"}}, status_code=500)
+
+        messages = body.get("messages", [])
+        reply = _reply_for(messages)
+        prompt_tokens = sum(len(str(m.get("content", ""))) for m in messages) // 4
+        usage = {"prompt_tokens": prompt_tokens, "completion_tokens": len(reply) // 4,
+                 "total_tokens": prompt_tokens + len(reply) // 4}
+        completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+        model = body.get("model", name)
+        headers = {**headers, "x-stub-provider": name}
+        stats.setdefault("models", {})[model] = stats.get("models", {}).get(model, 0) + 1
+        ttft_s = config["model_ttft_ms"].get(model, config["ttft_ms"]) / 1000
+
+        if not body.get("stream"):
+            await asyncio.sleep(ttft_s + len(_tokens(reply)) * config["token_ms"] / 1000)
+            return JSONResponse({
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": reply}, "finish_reason": "stop"}],
+                "usage": usage,
+            }, headers=headers)
+
+        stats["streams"] += 1
+
+        async def events():
+            try:
+                await asyncio.sleep(ttft_s)
+                for token in _tokens(reply):
+                    chunk = {
+                        "id": completion_id,
+                        "object": "chat.completion.chunk",
+                        "created": int(time.time()),
+                        "model": model,
+                        "choices": [{"index": 0, "delta": {"content": token}, "finish_reason": None}],
+                    }
+                    yield f"data: {json.dumps(chunk)}\n\n"
+                    await asyncio.sleep(config["token_ms"] / 1000)
+                if (body.get("stream_options") or {}).get("include_usage"):
+                    # Final chunk with no choices, only usage (OpenAI stream_options behaviour)
+                    chunk = {"id": completion_id, "object": "chat.completion.chunk", "created": int(time.time()),
+                             "model": model, "choices": [], "usage": usage}
+                    yield f"data: {json.dumps(chunk)}\n\n"
+                yield "data: [DONE]\n\n"
+            except asyncio.CancelledError:
+                stats["cancelled"] += 1
+                raise
+
+        return StreamingResponse(events(), media_type="text/event-stream", headers=headers)
+
+    @app.post("/_stub/reset")
+    async def reset():
+        app.state.stats.pop("models", None)
+        for key in app.state.stats:
+            app.state.stats[key] = 0
+        return {"ok": True}
+
+    @app.get("/_stub/stats")
+    async def get_stats():
+        return app.state.stats
+
+    return app
+
+
+app = make_app(
+    ttft_ms=float(os.getenv("STUB_LLM_TTFT_MS", "50")),
+    token_ms=float(os.getenv("STUB_LLM_TOKEN_MS", "5")),
+    error_rate=float(os.getenv("STUB_LLM_ERROR_RATE", "0")),
+    rate_limit=int(os.getenv("STUB_LLM_RATE_LIMIT", "0")),
+    rate_window_s=float(os.getenv("STUB_LLM_RATE_WINDOW_S", "60")),
+)
@@ -0,0 +1,26 @@
+"""
+Helper for running a stub FastAPI app on a background thread from verify/bench scripts.
+"""
+import contextlib
+import threading
+import time
+import uvicorn
+
+
+@contextlib.contextmanager
+def serve_in_thread(app, port: int, host: str = "127.0.0.1"):
+    """
+    Starts `app` with uvicorn on host:port, yields the base URL, and shuts it down on exit.
+    """
+    config = uvicorn.Config(app, host=host, port=port, log_level="warning", lifespan="off")
+    server = uvicorn.Server(config)
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    deadline = time.time() + 10
+    while not server.started and time.time() < deadline:
+        time.sleep(0.02)
+    try:
+        yield f"http://{host}:{port}"
+    finally:
+        server.should_exit = True
+        thread.join(timeout=5)
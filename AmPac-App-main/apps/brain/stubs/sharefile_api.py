@@ -0,0 +1,234 @@
+"""
+Local stub of the ShareFile v3 API surface the knowledge crawler and ShareFileClient use:
+OAuth token, folder children, download specifications and content, folder creation,
+deletes and threaded (chunked) uploads. A "home" folder stands in for the authenticated user's root.
+
+    SHAREFILE_KB_BASE_URL=http://127.0.0.1:8088 ...
+
+make_app() takes {"Folder/Sub/file.txt": bytes}; app.state.put_file / delete_file change
+the tree between crawls (a re-upload keeps the StreamID and gets a new Id and Hash, as
+ShareFile versions do). app.state.config["download_ms"] / ["create_ms"] / ["chunk_ms"] add latency,
+app.state.config["fail_chunks"] ({chunk index: times}) makes chunk posts answer 503, and
+app.state.stats counts listings, downloads, folder creates, uploads and chunk posts
+(with the most chunks in flight at once).
+"""
+import asyncio
+import hashlib
+import itertools
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Union
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import JSONResponse, Response
+
+ROOT_ID = "kb-root"
+FOLDER_TYPE = "ShareFile.Api.Models.Folder"
+FILE_TYPE = "ShareFile.Api.Models.File"
+
+
+def pdf_bytes(text: Union[str, List[str]]) -> bytes:
+    """A minimal PDF showing `text` line by line, one page per string if given a list (enough for pdfplumber)."""
+    pages = [text] if isinstance(text, str) else text
+    objects = ["<< /Type /Catalog /Pages 2 0 R >>", "", "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids = []
+    for page in pages:
+        lines = page.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)").splitlines() or [""]
+        stream = "BT /F1 10 Tf 12 TL 40 760 Td " + " ".join(f"({line}) '" for line in lines) + " ET"
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream")
+        objects.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents {len(objects)} 0 R "
+                       "/Resources << /Font << /F1 3 0 R >> >> >>")
+        kids.append(f"{len(objects)} 0 R")
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {len(kids)} >>"
+    out = b"%PDF-1.4\n"
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += f"{number} 0 obj\n{body}\nendobj\n".encode("latin-1")
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    out += "".join(f"{offset:010d} 00000 n \n" for offset in offsets).encode()
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+    return out
+
+
+def make_app(files: Optional[Dict[str, bytes]] = None, download_ms: float = 0) -> FastAPI:
+    app = FastAPI(title="ShareFile stub")
+    app.state.config = {"download_ms": download_ms, "create_ms": 0, "chunk_ms": 0, "fail_chunks": {}}
+    app.state.stats = {"token": 0, "listings": 0, "downloads": 0, "creates": 0, "uploads": 0,
+                       "chunk_posts": 0, "in_flight": 0, "max_in_flight": 0}
+    uploads: Dict[str, Dict] = {}  # upload id -> {"folder", "name", "chunks": {byte offset: bytes}}
+    ids = itertools.count(1)
+    # id -> item; folders carry "children" (ids), files carry "content"
+    items: Dict[str, Dict] = {ROOT_ID: {"Id": ROOT_ID, "Name": "Knowledge Base", "type": FOLDER_TYPE, "children": []},
+                              "home": {"Id": "home", "Name": "Home", "type": FOLDER_TYPE, "children": []}}
+    streams: Dict[str, str] = {}  # path -> StreamID
+
+    def folder_for(parts) -> Dict:
+        folder = items[ROOT_ID]
+        for name in parts:
+            child = next((items[i] for i in folder["children"] if items[i]["Name"] == name), None)
+            if child is None:
+                child = {"Id": f"fo{next(ids)}", "Name": name, "type": FOLDER_TYPE, "children": []}
+                items[child["Id"]] = child
+                folder["children"].append(child["Id"])
+            folder = child
+        return folder
+
+    def put_file(path: str, content: bytes):
+        *parts, name = path.split("/")
+        folder = folder_for(parts)
+        for item_id in list(folder["children"]):
+            if items[item_id]["Name"] == name:
+                folder["children"].remove(item_id)
+                del items[item_id]
+        item = {
+            "Id": f"fi{next(ids)}", "Name": name, "type": FILE_TYPE, "content": content,
+            "StreamID": streams.setdefault(path, f"st{next(ids)}"),
+            "Hash": hashlib.md5(content).hexdigest(),
+            "CreationDate": datetime.now(timezone.utc).isoformat(),
+        }
+        items[item["Id"]] = item
+        folder["children"].append(item["Id"])
+
+    def delete_file(path: str):
+        *parts, name = path.split("/")
+        folder = folder_for(parts)
+        for item_id in list(folder["children"]):
+            if items[item_id]["Name"] == name:
+                folder["children"].remove(item_id)
+                del items[item_id]
+
+    def find_path(path: str) -> Optional[Dict]:
+        """The item at "home/Clients/..." (first segment is the root folder id), or None."""
+        root, *parts = path.split("/")
+        item = items.get(root)
+        for name in parts:
+            item = next((items[i] for i in (item or {}).get("children", []) if items[i]["Name"] == name), None)
+        return item
+
+    def remove(item_id: str):
+        item = items.pop(item_id)
+        for child in item.get("children", []):
+            remove(child)
+        for folder in items.values():
+            if item_id in folder.get("children", []):
+                folder["children"].remove(item_id)
+
+    app.state.put_file = put_file
+    app.state.delete_file = delete_file
+    app.state.items = items
+    app.state.find_path = find_path
+    for path, content in (files or {}).items():
+        put_file(path, content)
+
+    def public(item: Dict) -> Dict:
+        body = {"odata.type": item["type"], "Id": item["Id"], "Name": item["Name"]}
+        if item["type"] == FILE_TYPE:
+            body.update(StreamID=item["StreamID"], Hash=item["Hash"], FileSizeBytes=len(item["content"]),
+                        CreationDate=item["CreationDate"])
+        return body
+
+    def item_or_404(item_id: str) -> Dict:
+        item = items.get(item_id)
+        if item is None:
+            raise HTTPException(status_code=404, detail="Item not found")
+        return item
+
+    @app.post("/oauth/token")
+    async def token():
+        app.state.stats["token"] += 1
+        return {"access_token": "stub-token", "token_type": "bearer", "expires_in": 28800}
+
+    @app.get("/sf/v3/Items({item_id})/Children")
+    async def children(item_id: str):
+        app.state.stats["listings"] += 1
+        folder = item_or_404(item_id)
+        return {"value": [public(items[i]) for i in folder.get("children", [])]}
+
+    @app.get("/sf/v3/Items({item_id})/Download")
+    async def download(item_id: str, request: Request):
+        item_or_404(item_id)
+        return JSONResponse({"DownloadUrl": str(request.base_url) + f"_stub/content/{item_id}"})
+
+    @app.get("/_stub/content/{item_id}")
+    async def content(item_id: str):
+        item = item_or_404(item_id)
+        app.state.stats["downloads"] += 1
+        if app.state.config["download_ms"]:
+            await asyncio.sleep(app.state.config["download_ms"] / 1000)
+        return Response(item["content"], media_type="application/octet-stream")
+
+    @app.post("/sf/v3/Items({item_id})/Folder")
+    async def create_folder(item_id: str, request: Request):
+        parent = item_or_404(item_id)
+        name = (await request.json())["Name"]
+        if app.state.config["create_ms"]:
+            await asyncio.sleep(app.state.config["create_ms"] / 1000)
+        app.state.stats["creates"] += 1
+        if any(items[i]["Name"] == name for i in parent["children"]):
+            raise HTTPException(status_code=409, detail="An item with this name already exists")
+        folder = {"Id": f"fo{next(ids)}", "Name": name, "type": FOLDER_TYPE, "children": []}
+        items[folder["Id"]] = folder
+        parent["children"].append(folder["Id"])
+        return public(folder)
+
+    @app.delete("/sf/v3/Items({item_id})")
+    async def delete_item(item_id: str):
+        item_or_404(item_id)
+        remove(item_id)
+        return Response(status_code=204)
+
+    @app.post("/sf/v3/Items({item_id})/Upload2")
+    async def upload_spec(item_id: str, request: Request):
+        item_or_404(item_id)
+        params = await request.json()
+        upload_id = f"up{next(ids)}"
+        uploads[upload_id] = {"folder": item_id, "name": params["FileName"], "chunks": {}}
+        base = str(request.base_url)
+        return {"Method": "Threaded", "ChunkUri": f"{base}_stub/chunk?uploadid={upload_id}",
+                "FinishUri": f"{base}_stub/finish?uploadid={upload_id}", "MaxNumberOfThreads": 8, "IsResume": False}
+
+    @app.post("/_stub/chunk")
+    async def chunk(uploadid: str, index: int, byteOffset: int, hash: str, request: Request):
+        upload = uploads.get(uploadid)
+        if upload is None:
+            raise HTTPException(status_code=404, detail="Upload not found")
+        app.state.stats["chunk_posts"] += 1
+        app.state.stats["in_flight"] += 1
+        app.state.stats["max_in_flight"] = max(app.state.stats["max_in_flight"], app.state.stats["in_flight"])
+        try:
+            body = await request.body()
+            if app.state.config["chunk_ms"]:
+                await asyncio.sleep(app.state.config["chunk_ms"] / 1000)
+            failures = app.state.config["fail_chunks"]
+            if failures.get(index):
+                failures[index] -= 1
+                raise HTTPException(status_code=503, detail="Chunk storage unavailable")
+            if hashlib.md5(body).hexdigest() != hash:
+                raise HTTPException(status_code=400, detail="Chunk hash mismatch")
+            upload["chunks"][byteOffset] = body
+            return Response("OK", media_type="text/plain")
+        finally:
+            app.state.stats["in_flight"] -= 1
+
+    @app.post("/_stub/finish")
+    async def finish(uploadid: str, fileSize: int, fileHash: str):
+        upload = uploads.pop(uploadid, None)
+        if upload is None:
+            raise HTTPException(status_code=404, detail="Upload not found")
+        content, expected = b"", 0
+        for offset in sorted(upload["chunks"]):
+            if offset != expected:
+                return {"error": True, "errorMessage": f"Missing bytes at offset {expected}"}
+            content += upload["chunks"][offset]
+            expected += len(upload["chunks"][offset])
+        if len(content) != fileSize or hashlib.md5(content).hexdigest() != fileHash:
+            return {"error": True, "errorMessage": "File size or hash mismatch"}
+        folder = item_or_404(upload["folder"])
+        item = {"Id": f"fi{next(ids)}", "Name": upload["name"], "type": FILE_TYPE, "content": content,
+                "StreamID": f"st{next(ids)}", "Hash": fileHash, "CreationDate": datetime.now(timezone.utc).isoformat()}
+        items[item["Id"]] = item
+        folder["children"].append(item["Id"])
+        app.state.stats["uploads"] += 1
+        return {"error": False, "value": [{"id": item["Id"], "filename": item["Name"], "size": fileSize, "md5": fileHash}]}
+
+    return app
@@ -0,0 +1,180 @@
+"""
+Local stub of the Ventures v4 API for integration tests and load benchmarks.
+
+    uvicorn stubs.ventures_api:app --port 8081
+    VENTURES_BASE_URL=http://127.0.0.1:8081/api/v4 VENTURES_MOCK_MODE=False ...
+
+Knobs (env):
+    STUB_LOAN_COUNT          synthetic loans to seed (default 250)
+    STUB_TOKEN_TTL_SECONDS   expires_in reported by /token (default 3600)
+    STUB_LATENCY_MS          artificial per-request latency (default 0)
+    STUB_DISABLE_BATCH       "1" to make /objects/condition return 404
+"""
+import asyncio
+import hashlib
+import json
+import os
+import uuid
+from typing import Any, Dict, Optional
+from fastapi import FastAPI, Header, HTTPException, Request
+from fastapi.responses import JSONResponse, Response
+
+LOAN_COUNT = int(os.getenv("STUB_LOAN_COUNT", "250"))
+TOKEN_TTL_SECONDS = int(os.getenv("STUB_TOKEN_TTL_SECONDS", "3600"))
+LATENCY_MS = float(os.getenv("STUB_LATENCY_MS", "0"))
+DISABLE_BATCH = os.getenv("STUB_DISABLE_BATCH") == "1"
+
+STATUSES = ["New Application", "Underwriting", "Approved w/ Conditions", "Closing", "Funded"]
+CONDITIONS = [("2023 Tax Returns", "Financials"), ("Business License", "Legal"), ("Insurance Proof", "Insurance")]
+
+app = FastAPI(title="Ventures v4 stub")
+
+# In-memory state; `stats` lets tests assert on request counts
+state: Dict[str, Dict] = {"loans": {}, "conditions": {}, "tokens": set()}
+stats: Dict[str, int] = {"token": 0, "requests": 0, "unauthorized": 0, "not_modified": 0}
+
+
+def _with_etag(payload: Any, if_none_match: Optional[str]):
+    """Returns 304 when the client's ETag still matches, else the payload with an ETag header."""
+    etag = '"' + hashlib.sha1(json.dumps(payload, sort_keys=True).encode()).hexdigest() + '"'
+    if if_none_match == etag:
+        stats["not_modified"] += 1
+        return Response(status_code=304, headers={"ETag": etag})
+    return JSONResponse(payload, headers={"ETag": etag})
+
+
+def _seed():
+    state["loans"].clear()
+    state["conditions"].clear()
+    for i in range(LOAN_COUNT):
+        loan_id = str(1000 + i)
+        state["loans"][loan_id] = {
+            "id": loan_id,
+            "statusName": STATUSES[i % len(STATUSES)],
+            "loanAmount": 50000.0 + i * 1000,
+            "officerName": "Sarah Smith" if i % 2 else "John Doe",
+            "borrowerName": f"Borrower {i}",
+        }
+        for j, (description, category) in enumerate(CONDITIONS):
+            cond_id = f"c{loan_id}-{j}"
+            state["conditions"][cond_id] = {
+                "id": cond_id,
+                "loanId": loan_id,
+                "description": description,
+                "status": "Open" if (i + j) % 2 else "Satisfied",
+                "category": category,
+            }
+
+
+_seed()
+
+
+@app.middleware("http")
+async def _latency_and_auth(request: Request, call_next):
+    if LATENCY_MS:
+        await asyncio.sleep(LATENCY_MS / 1000)
+    path = request.url.path
+    if path.startswith("/api/v4/") and not path.endswith("/token") and not path.startswith("/api/v4/_stub"):
+        stats["requests"] += 1
+        auth = request.headers.get("authorization", "")
+        if not auth.startswith("Bearer ") or auth[7:] not in state["tokens"]:
+            stats["unauthorized"] += 1
+            return JSONResponse({"detail": "Unauthorized"}, status_code=401)
+    return await call_next(request)
+
+
+@app.post("/api/v4/token")
+async def token(body: Dict):
+    if not body.get("username") or not body.get("password"):
+        raise HTTPException(status_code=401, detail="Invalid credentials")
+    stats["token"] += 1
+    value = uuid.uuid4().hex
+    state["tokens"].add(value)
+    return {"token": value, "expires_in": TOKEN_TTL_SECONDS}
+
+
+@app.get("/api/v4/objects/loan")
+async def list_loans(page: int = 1, pageSize: int = 100):
+    loans = list(state["loans"].values())
+    start = (page - 1) * pageSize
+    return {"items": loans[start:start + pageSize], "page": page, "pageSize": pageSize, "total": len(loans)}
+
+
+@app.post("/api/v4/objects/loan", status_code=201)
+async def create_loan(body: Dict):
+    loan_id = str(1000 + len(state["loans"]))
+    loan = {
+        "id": loan_id,
+        "statusName": "Underwriting",
+        "loanAmount": body.get("loanAmount", 0.0),
+        "officerName": "Unassigned",
+        "borrowerName": body.get("borrowerName"),
+    }
+    state["loans"][loan_id] = loan
+    for j, (description, category) in enumerate(CONDITIONS[:2]):
+        cond_id = f"c{loan_id}-{j}"
+        state["conditions"][cond_id] = {
+            "id": cond_id, "loanId": loan_id, "description": description, "status": "Open", "category": category,
+        }
+    return loan
+
+
+@app.get("/api/v4/objects/loan/{loan_id}")
+async def get_loan(loan_id: str, if_none_match: Optional[str] = Header(None)):
+    loan = state["loans"].get(loan_id)
+    if not loan:
+        raise HTTPException(status_code=404, detail="Loan not found")
+    return _with_etag(loan, if_none_match)
+
+
+@app.get("/api/v4/objects/loan/{loan_id}/conditions")
+async def get_loan_conditions(loan_id: str, if_none_match: Optional[str] = Header(None)):
+    if loan_id not in state["loans"]:
+        raise HTTPException(status_code=404, detail="Loan not found")
+    return _with_etag([c for c in state["conditions"].values() if c["loanId"] == loan_id], if_none_match)
+
+
+@app.get("/api/v4/objects/condition")
+async def batch_conditions(loanIds: str = ""):
+    if DISABLE_BATCH:
+        raise HTTPException(status_code=404, detail="Not found")
+    wanted = set(filter(None, loanIds.split(",")))
+    return {"items": [c for c in state["conditions"].values() if c["loanId"] in wanted]}
+
+
+@app.patch("/api/v4/objects/condition/{condition_id}")
+async def update_condition(condition_id: str, body: Dict):
+    condition = state["conditions"].get(condition_id)
+    if not condition:
+        raise HTTPException(status_code=404, detail="Condition not found")
+    condition["status"] = body.get("status", condition["status"])
+    return condition
+
+
+@app.post("/api/v4/objects/loan/{loan_id}/conditions/{condition_id}/documents", status_code=201)
+async def attach_document(loan_id: str, condition_id: str, body: Dict):
+    condition = state["conditions"].get(condition_id)
+    if not condition or condition["loanId"] != loan_id:
+        raise HTTPException(status_code=404, detail="Condition not found")
+    condition["status"] = "Received"
+    return {"id": uuid.uuid4().hex, "url": body.get("url")}
+
+
+@app.get("/api/v4/search/entities")
+async def search_entities(taxId: str = ""):
+    return [{"id": f"ent-{taxId}", "taxId": taxId, "name": "Stub Entity"}] if taxId else []
+
+
+@app.post("/api/v4/_stub/reset")
+async def reset():
+    """Test hook: reseed data, revoke tokens and zero counters."""
+    _seed()
+    state["tokens"].clear()
+    for key in stats:
+        stats[key] = 0
+    return {"ok": True}
+
+
+@app.get("/api/v4/_stub/stats")
+async def get_stats():
+    return stats
@@ -0,0 +1,358 @@
+import asyncio
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+PORT = int(os.getenv("BRAIN_PORT", "8092"))
+SPOOL_DIR = tempfile.mkdtemp(prefix="upload-spool-")
+os.environ.setdefault("AUTH_DISABLED", "True")
+os.environ.setdefault("UPLOAD_SPOOL_DIR", SPOOL_DIR)
+os.environ.setdefault("DOC_PARSE_WORKERS", "1")
+os.environ.setdefault("DOCUMENT_CACHE_DIR", "")
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import httpx
+from fastapi import FastAPI
+import uvicorn
+from app.api.routers import documents
+from app.core import metrics
+from app.services import uploads
+from app.services.analysis_jobs import (AnalysisJob, AnalysisJobQueue, JobNotPersisted, JobOwnedByAnotherUser, analysis_jobs,
+                                         doc_key, job_id_for)
+from app.services.doc_parser import parse_pool
+from app.services.document_analysis import document_analysis_agent
+from verify_doc_parser import tax_return
+
+
+def check(label: str, ok: bool, detail: str = ""):
+    print(f"{'✅' if ok else '❌'} {label}{': ' + detail if detail else ''}")
+    return ok
+
+
+class FakeFirestore:
+    """Dict-backed stand-in for the Firestore client: document get/set and where("status", "in", ...).stream()."""
+    def __init__(self):
+        self.docs = {}
+
+    def collection(self, name):
+        return self
+
+    def document(self, doc_id):
+        store = self
+
+        class Ref:
+            def get(self):
+                data = store.docs.get(doc_id)
+                return type("Snapshot", (), {"exists": data is not None, "to_dict": lambda _: dict(data)})()
+
+            def set(self, fields, merge=False):
+                store.docs[doc_id] = dict(fields)
+
+        return Ref()
+
+    def where(self, field, op, values):
+        store = self
+
+        class Query:
+            def stream(self):
+                return [type("Doc", (), {"to_dict": lambda _, d=data: dict(d)})()
+                        for data in store.docs.values() if data.get(field) in values]
+
+        return Query()
+
+
+class FakeBlob:
+    def __init__(self, bucket, path):
+        self.bucket, self.path, self.chunk_size, self.metadata = bucket, path, None, None
+
+    def upload_from_filename(self, filename, content_type=None):
+        shutil.copyfile(filename, self.bucket.path(self.path))
+
+    def download_to_filename(self, filename):
+        shutil.copyfile(self.bucket.path(self.path), filename)
+
+    def upload_from_string(self, text, content_type=None):
+        with open(self.bucket.path(self.path), "w", encoding="utf-8") as f:
+            f.write(text)
+
+    def download_as_text(self):
+        with open(self.bucket.path(self.path), encoding="utf-8") as f:
+            return f.read()
+
+
+class FakeBucket:
+    """Stands in for Firebase Storage with a scratch directory."""
+    def __init__(self):
+        self.root = tempfile.mkdtemp(prefix="bucket-")
+
+    def path(self, blob_path):
+        return os.path.join(self.root, blob_path.replace("/", "__"))
+
+    def blob(self, path):
+        return FakeBlob(self, path)
+
+
+class DownFirestore:
+    """Every write fails, as when Firestore is unreachable."""
+    def collection(self, name):
+        return self
+
+    def document(self, doc_id):
+        raise RuntimeError("Firestore unavailable")
+
+
+class SlowAgent:
+    """Records start order and concurrency; fails the first `failures` attempts per document."""
+    def __init__(self, seconds=0.05, failures=0):
+        self.seconds, self.failures = seconds, failures
+        self.order, self.active, self.peak, self.calls = [], 0, 0, {}
+
+    async def analyze_document(self, document_id, file_name, file_content="", sha256=None, source=None):
+        self.order.append(document_id)
+        self.calls[document_id] = self.calls.get(document_id, 0) + 1
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        try:
+            await asyncio.sleep(self.seconds)
+            if self.calls[document_id] <= self.failures:
+                raise RuntimeError("model unavailable")
+            return {"document_id": document_id, "document_type": "Tax Return"}
+        finally:
+            self.active -= 1
+
+
+def spooled_files() -> list:
+    return [name for name in os.listdir(SPOOL_DIR) if name.startswith("upload-")]
+
+
+async def settle(queue: AnalysisJobQueue, timeout: float = 30.0):
+    deadline = time.time() + timeout
+    while (queue.running or queue._queue.qsize()) and time.time() < deadline:
+        await asyncio.sleep(0.02)
+
+
+def brain_app() -> FastAPI:
+    app = FastAPI()
+    app.include_router(documents.router, prefix="/api/v1/documents")
+    return app
+
+
+async def verify_queue(firestore: FakeFirestore, bucket: FakeBucket):
+    print("\n--- Priorities and the worker bound ---")
+    agent = SlowAgent()
+    queue = AnalysisJobQueue(agent, workers=2, max_queued=100, timeout_seconds=5, max_attempts=3,
+                             lease_seconds=60, keep=100, db_factory=lambda: firestore)
+    queue.start()
+    blocker = [await queue.submit(AnalysisJob(id=f"busy-{n}", file_name="a.pdf")) for n in range(2)]
+    await asyncio.sleep(0.01)  # Both workers busy; everything below waits
+    for n in range(4):
+        await queue.submit(AnalysisJob(id=f"low-{n}", file_name="a.pdf", priority="low"))
+    for n in range(4):
+        await queue.submit(AnalysisJob(id=f"high-{n}", file_name="a.pdf", priority="high"))
+    again = await queue.submit(AnalysisJob(id="high-0", file_name="a.pdf", priority="high"))
+    check("resubmitting an active job returns it", again is queue.jobs["high-0"] and queue._queue.qsize() == 8)
+    await settle(queue)
+    waiting = [job_id for job_id in agent.order if not job_id.startswith("busy")]
+    check("high priority runs first", waiting[:4] == [f"high-{n}" for n in range(4)], str(waiting))
+    check("never more than `workers` at once", agent.peak == 2, f"peak {agent.peak}")
+    check("all done and persisted", all(firestore.docs[job.id]["status"] == "done" for job in blocker)
+          and firestore.docs["low-3"]["result"]["document_type"] == "Tax Return")
+    histograms = metrics.get_metrics_snapshot()["histograms"]
+    check("wait and run latency recorded", any(name.startswith("analysis_job_wait_ms") for name in histograms)
+          and any(name.startswith("analysis_job_run_ms") for name in histograms), ", ".join(sorted(histograms))[:120])
+
+    print("\n--- Retries ---")
+    flaky = AnalysisJobQueue(SlowAgent(0.01, failures=1), workers=1, max_queued=10, timeout_seconds=5,
+                             max_attempts=3, lease_seconds=60, keep=100, db_factory=lambda: firestore)
+    job = await flaky.submit(AnalysisJob(id="flaky", file_name="a.pdf"))
+    await settle(flaky)
+    check("a failed attempt is retried", job.status == "done" and job.attempts == 2 and job.error is None)
+    broken = AnalysisJobQueue(SlowAgent(0.01, failures=99), workers=1, max_queued=10, timeout_seconds=5,
+                              max_attempts=3, lease_seconds=60, keep=100, db_factory=lambda: firestore)
+    job = await broken.submit(AnalysisJob(id="broken", file_name="a.pdf"))
+    await settle(broken)
+    check("gives up after max_attempts", job.status == "failed" and job.attempts == 3 and "unavailable" in job.error,
+          f"{job.status} after {job.attempts}")
+    hung = AnalysisJobQueue(SlowAgent(5), workers=1, max_queued=10, timeout_seconds=0.1,
+                            max_attempts=1, lease_seconds=60, keep=100, db_factory=lambda: firestore)
+    job = await hung.submit(AnalysisJob(id="hung", file_name="a.pdf"))
+    await settle(hung)
+    check("a hung analysis times out", job.status == "failed", job.error or "")
+
+    print("\n--- Full queue ---")
+    tiny = AnalysisJobQueue(SlowAgent(0.2), workers=1, max_queued=2, timeout_seconds=5, max_attempts=1,
+                            lease_seconds=60, keep=100, db_factory=lambda: firestore)
+    await tiny.submit(AnalysisJob(id="tiny-0", file_name="a.pdf"))
+    await asyncio.sleep(0.01)
+    for n in range(1, 3):
+        await tiny.submit(AnalysisJob(id=f"tiny-{n}", file_name="a.pdf"))
+    try:
+        await tiny.submit(AnalysisJob(id="tiny-3", file_name="a.pdf"))
+        check("past max_queued is refused", False)
+    except asyncio.QueueFull:
+        check("past max_queued is refused", True)
+    await settle(tiny)
+    for q in (queue, flaky, broken, hung, tiny):
+        await q.stop()
+
+    print("\n--- Ids and text Firestore can't hold as is ---")
+    text = "Form 1120 U.S. Corporation Income Tax Return\nTaxable income 410,000\nTotal tax 86,100\n" * 4000
+    accepting = AnalysisJobQueue(SlowAgent(5), workers=1, max_queued=10, timeout_seconds=5, max_attempts=1,
+                                 lease_seconds=60, keep=100, db_factory=lambda: firestore)
+    nested = await accepting.submit(AnalysisJob(id=job_id_for("u1", "folder/../return.txt"), document_id="folder/../return.txt",
+                                                file_name="return.txt", user_id="u1", content=text))
+    await accepting.stop()  # Its instance goes away before running it
+    stored = firestore.docs.get(doc_key(nested.id), {})
+    check("an id with '/' gets a flat hashed key", "/" not in doc_key(nested.id) and stored.get("id") == nested.id)
+    check("long text kept in Storage, not the job document", stored.get("content") is None
+          and os.path.exists(bucket.path(stored.get("contentPath") or "")), f"{len(text)} chars")
+    restarted = AnalysisJobQueue(document_analysis_agent, workers=1, max_queued=10, timeout_seconds=30,
+                                 max_attempts=1, lease_seconds=60, keep=100, db_factory=lambda: firestore)
+    check("recovered like any other job", await restarted.recover() == 1)
+    await settle(restarted)
+    done = await restarted.get(nested.id)
+    check("analyzed from the stored text", done.status == "done" and done.result["document_type"] == "Tax Return"
+          and done.result["text_chars"] == len(text), str(done.error))
+    await restarted.stop()
+    offline = AnalysisJobQueue(SlowAgent(0.01), workers=1, max_queued=10, timeout_seconds=5, max_attempts=1,
+                               lease_seconds=60, keep=100, db_factory=lambda: DownFirestore())
+    try:
+        await offline.submit(AnalysisJob(id="unsaved", file_name="a.pdf"))
+        check("a job that can't be persisted is refused", False)
+    except JobNotPersisted:
+        check("a job that can't be persisted is refused", "unsaved" not in offline.jobs and offline._queue.qsize() == 0)
+    await offline.stop()
+
+    print("\n--- Recovery after a restart ---")
+    pdf_path = os.path.join(bucket.root, "return.pdf")
+    with open(pdf_path, "wb") as f:
+        f.write(tax_return(3))
+    storage_path = "uploads/u1/lost/return.pdf"
+    shutil.copyfile(pdf_path, bucket.path(storage_path))
+    now = time.time()
+    firestore.docs.clear()
+    for job in (
+        AnalysisJob(id="waiting", file_name="notes.txt", content="Form 1120 U.S. Corporation Income Tax Return\nTaxable income 410,000\nTotal tax 86,100"),
+        AnalysisJob(id="lost", file_name="scan.pdf", status="running", attempts=1, started_at=now - 600,
+                    lease_until=now - 300, storage_path=storage_path, stored=True,
+                    source_path="/gone/on/the/old/instance.pdf"),
+        AnalysisJob(id="elsewhere", file_name="a.pdf", status="running", attempts=1, lease_until=now + 300),
+        AnalysisJob(id="finished", file_name="a.pdf", status="done", result={"document_type": "Tax Return"}),
+    ):
+        firestore.docs[job.id] = job.to_dict()
+    check("persisted in camelCase", "fileName" in firestore.docs["lost"] and "leaseUntil" in firestore.docs["lost"])
+    restarted = AnalysisJobQueue(document_analysis_agent, workers=1, max_queued=10, timeout_seconds=30,
+                                 max_attempts=3, lease_seconds=60, keep=100, db_factory=lambda: firestore)
+    recovered = await restarted.recover()
+    await settle(restarted)
+    check("queued and lease-expired jobs re-queued, live lease left alone", recovered == 2
+          and firestore.docs["elsewhere"]["status"] == "running", f"{recovered} recovered")
+    lost = firestore.docs["lost"]
+    check("lost job re-analyzed from its Storage copy", lost["status"] == "done" and lost["attempts"] == 2
+          and lost["result"]["document_type"] == "Tax Return" and lost["result"]["pages"] == 3, str(lost.get("error")))
+    check("text jobs use their content", firestore.docs["waiting"]["result"]["document_type"] == "Tax Return")
+    check("jobs from before the restart are readable", (await restarted.get("finished")).result["document_type"] == "Tax Return")
+    check("unknown ids are None", await restarted.get("never-submitted") is None)
+    check("recovery counted", metrics.counter("analysis_jobs_recovered_total").total() >= 2)
+    await restarted.stop()
+
+
+async def verify_api(base_url: str, firestore: FakeFirestore):
+    print("\n--- Status polling over HTTP ---")
+    async with httpx.AsyncClient(timeout=60.0) as client:
+        pdf = tax_return(2)
+        accepted = (await client.post(f"{base_url}/api/v1/documents/upload", data={"priority": "high"},
+                                      files={"file": ("scan.pdf", pdf, "application/pdf")})).json()
+        check("upload returns a job to poll", accepted["status"] == "queued" and accepted["priority"] == "high"
+              and accepted["statusUrl"] == f"/api/v1/documents/{accepted['documentId']}/analysis", str(accepted))
+        started, status = time.perf_counter(), {}
+        while time.perf_counter() - started < 30:
+            status = (await client.get(f"{base_url}{accepted['statusUrl']}")).json()
+            if status["status"] not in ("queued", "running"):
+                break
+            await asyncio.sleep(0.05)
+        elapsed = time.perf_counter() - started
+        check("result fetched by polling", status["status"] == "done" and status["result"]["document_type"] == "Tax Return",
+              str(status)[:120])
+        check("classified from the PDF text, not the name", status["result"]["pages"] == 2)
+        check("no fixed sleep: done when the work is", elapsed < 2.0 and status["runMs"] < 2000, f"{elapsed * 1000:.0f}ms")
+        check("spool removed once analyzed", not spooled_files(), str(spooled_files()))
+        check("stored to Storage by the job", firestore.docs[accepted["documentId"]]["stored"] is True)
+
+        queued = (await client.post(f"{base_url}/api/v1/documents/analyze",
+                                    json={"documentId": "doc-text", "fileName": "stmt.txt", "content": "Ending balance 10"})).json()
+        check("/analyze queues too", queued["documentId"] == "doc-text" and queued["jobId"].endswith(":doc-text")
+              and queued["priority"] == "normal", str(queued))
+        by_document = await client.get(f"{base_url}/api/v1/documents/doc-text/analysis")
+        check("owner polls by their own document id", by_document.status_code == 200
+              and by_document.json()["jobId"] == queued["jobId"])
+
+        odd = (await client.post(f"{base_url}/api/v1/documents/analyze",
+                                 json={"documentId": "2024/returns/1120 #2?.txt", "fileName": "r.txt", "content": "Form 1120"})).json()
+        await settle(analysis_jobs)
+        polled = await client.get(f"{base_url}{odd['statusUrl']}")
+        check("ids with '/', '#' and '?' can be polled", polled.status_code == 200
+              and polled.json()["documentId"] == "2024/returns/1120 #2?.txt", odd["statusUrl"])
+
+        print("\n--- Jobs belong to their submitter ---")
+        other = AnalysisJob(id=queued["jobId"], document_id="doc-text", file_name="mine.txt", user_id="mallory",
+                            content="Ending balance 0")
+        try:
+            await analysis_jobs.submit(other)
+            check("another user's job id is refused", False)
+        except JobOwnedByAnotherUser:
+            check("another user's job id is refused", True)
+        await settle(analysis_jobs)
+        check("the owner's result is untouched", firestore.docs[queued["jobId"]]["userId"] != "mallory"
+              and (await analysis_jobs.get(queued["jobId"])).file_name == "stmt.txt")
+        analysis_jobs.jobs.pop(queued["jobId"], None)  # Finished and evicted: only in Firestore now
+        try:
+            await analysis_jobs.submit(other)
+            check("finished jobs in Firestore are protected too", False)
+        except JobOwnedByAnotherUser:
+            check("finished jobs in Firestore are protected too", True)
+        missing = await client.get(f"{base_url}/api/v1/documents/no-such-doc/analysis")
+        check("unknown document is a 404", missing.status_code == 404)
+
+        limit = analysis_jobs.max_queued
+        analysis_jobs.max_queued = 0
+        try:
+            full = await client.post(f"{base_url}/api/v1/documents/upload", files={"file": ("x.pdf", pdf, "application/pdf")})
+        finally:
+            analysis_jobs.max_queued = limit
+        check("full queue is a 503 with Retry-After", full.status_code == 503 and "retry-after" in full.headers)
+        analysis_jobs.db_factory = DownFirestore
+        try:
+            unsaved = await client.post(f"{base_url}/api/v1/documents/upload", files={"file": ("x.pdf", pdf, "application/pdf")})
+        finally:
+            analysis_jobs.db_factory = lambda: firestore
+        check("Firestore down is a 503, not an unsaved job", unsaved.status_code == 503 and "retry-after" in unsaved.headers)
+        check("refused upload leaves nothing on disk", not spooled_files())
+        await asyncio.sleep(0.5)
+    print(analysis_jobs.stats())
+
+
+async def main():
+    firestore, bucket = FakeFirestore(), FakeBucket()
+    uploads.get_bucket = lambda: bucket
+    analysis_jobs.db_factory = lambda: firestore
+    await verify_queue(firestore, bucket)
+    # Served on this loop rather than serve_in_thread's: the jobs and the parse pool
+    # they use belong to one event loop, as in the app
+    server = uvicorn.Server(uvicorn.Config(brain_app(), host="127.0.0.1", port=PORT, log_level="warning", lifespan="off"))
+    serving = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.02)
+    try:
+        await verify_api(f"http://127.0.0.1:{PORT}", firestore)
+    finally:
+        await analysis_jobs.stop()
+        server.should_exit = True
+        await serving
+    parse_pool.shutdown()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,73 @@
+import os
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app.services.context_builder import build_context, estimate_tokens
+
+
+def check(label: str, ok: bool, detail: str = ""):
+    print(f"{'✅' if ok else '❌'} {label}{': ' + detail if detail else ''}")
+    return ok
+
+
+def conversation(turns: int):
+    history = []
+    for i in range(turns):
+        history.append({"role": "user", "content": f"Question {i}: how does the SBA 504 down payment work for a building costing ${i},000,000? " * 3})
+        history.append({"role": "assistant", "content": f"Answer {i}. The SBA 504 program typically needs 10% down. " * 8})
+    return history
+
+
+def verify():
+    print("\n--- Token-budgeted context builder ---")
+    system = "You are the AmPac Smart Assistant."
+    sizes = []
+    for turns in (0, 5, 50, 500):
+        built = build_context("And what about equipment?", system_prompt=system, history=conversation(turns), prompt_budget=2048)
+        sizes.append(built.prompt_tokens)
+        print(f"{turns:>4} turns -> {built.prompt_tokens} prompt tokens, kept {built.kept_turns}, dropped {built.dropped_turns}, "
+              f"summarized={built.summarized}, max_tokens={built.max_tokens}")
+        ok = built.messages[0]["content"] == system and built.messages[-1]["content"] == "And what about equipment?"
+        check(f"system prompt and user message kept ({turns} turns)", ok)
+    check("prompt size bounded as history grows", max(sizes) <= 2048, str(sizes))
+
+    built = build_context("Tell me more", history=conversation(50), prompt_budget=2048)
+    kept = [m["content"] for m in built.messages if m["role"] != "system"][:-1]
+    check("most recent turns are the ones kept", kept[-1].startswith("Answer 49"))
+    summary = next(m["content"] for m in built.messages if m["content"].startswith("Summary of earlier"))
+    check("summary covers the newest dropped turns", "Question 42" in summary and "Question 0:" not in summary)
+
+    built = build_context("x " * 20000, system_prompt=system, prompt_budget=2048)
+    check("oversized user message truncated to fit", built.prompt_tokens <= 2048, f"{built.prompt_tokens} tokens")
+
+    built = build_context("What is the DSCR requirement?", system_prompt="x " * 20000)
+    user = built.messages[-1]["content"]
+    check("oversized system prompt truncated, question kept", user == "What is the DSCR requirement?"
+          and built.prompt_tokens <= 6144 and "system prompt truncated" in built.notes, f"{built.prompt_tokens} tokens")
+    built = build_context("y " * 20000, system_prompt="x " * 20000, prompt_budget=2048)
+    check("both oversized: within budget, user message keeps its share", built.prompt_tokens <= 2048
+          and estimate_tokens(built.messages[-1]["content"]) >= 512, f"{built.prompt_tokens} tokens")
+
+    built = build_context("hi", knowledge=["SBA 504 requires 10% down."] * 200, prompt_budget=2048)
+    check("knowledge capped at half the remaining budget", 0 < built.knowledge_used < 200 and built.prompt_tokens <= 2048 // 2 + 50,
+          f"{built.knowledge_used} snippets")
+
+    window = build_context("hi", history=conversation(500), prompt_budget=7900)
+    check("max_tokens shrinks to fit the context window", window.max_tokens == 8192 - window.prompt_tokens or window.max_tokens == 256, str(window.max_tokens))
+
+    text = " ".join(m["content"] for m in conversation(500))
+    start = time.perf_counter()
+    for _ in range(10):
+        estimate_tokens(text)
+    per_call = (time.perf_counter() - start) / 10
+    print(f"estimator: {estimate_tokens(text)} tokens for {len(text)} chars in {per_call * 1000:.1f}ms")
+    start = time.perf_counter()
+    for _ in range(100):
+        build_context("And what about equipment?", system_prompt=system, history=conversation(50))
+    print(f"build_context with 100 turns: {(time.perf_counter() - start) * 10:.2f}ms per call")
+
+
+if __name__ == "__main__":
+    verify()
@@ -0,0 +1,192 @@
+import asyncio
+import contextlib
+import os
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from firebase_admin import firestore
+from app.services.cache import CacheEntry, RedisTier, TieredCache
+from app.services.context_builder import build_context
+from app.services.conversation_store import ConversationStore
+
+
+class FakeSnapshot:
+    def __init__(self, doc_id, data):
+        self.id, self._data = doc_id, data
+        self.exists = data is not None
+
+    def to_dict(self):
+        return dict(self._data) if self._data is not None else None
+
+
+class FakeQuery:
+    def __init__(self, collection, field=None, descending=False, limit=None):
+        self.collection, self.field, self.descending, self._limit = collection, field, descending, limit
+
+    def order_by(self, field, direction=None):
+        return FakeQuery(self.collection, field, direction == firestore.Query.DESCENDING, self._limit)
+
+    def limit(self, n):
+        return FakeQuery(self.collection, self.field, self.descending, n)
+
+    def stream(self):
+        docs = [(doc_id, doc.data) for doc_id, doc in self.collection.docs.items() if doc.data is not None]
+        if self.field:
+            docs.sort(key=lambda item: item[1][self.field], reverse=self.descending)
+        for doc_id, data in docs[:self._limit]:
+            self.collection.db.reads += 1
+            yield FakeSnapshot(doc_id, data)
+
+
+class FakeDocument:
+    def __init__(self, db):
+        self.db, self.data, self.collections = db, None, {}
+
+    def get(self):
+        self.db.reads += 1
+        self.db.threads.add(threading.current_thread().name)
+        return FakeSnapshot(None, self.data)
+
+    def set(self, data):
+        self.db.threads.add(threading.current_thread().name)
+        self.data = dict(data)
+
+    def update(self, data):
+        self.data = {**(self.data or {}), **data}
+
+    def collection(self, name):
+        return self.collections.setdefault(name, FakeCollection(self.db))
+
+
+class FakeCollection(FakeQuery):
+    def __init__(self, db):
+        super().__init__(self)
+        self.db, self.docs = db, {}
+
+    def document(self, doc_id):
+        return self.docs.setdefault(doc_id, FakeDocument(self.db))
+
+
+class FakeDb:
+    """Just enough of the Firestore client for threads/messages, counting document reads."""
+
+    def __init__(self):
+        self.reads, self.root, self.threads = 0, {}, set()
+
+    def collection(self, name):
+        return self.root.setdefault(name, FakeCollection(self))
+
+
+def check(label: str, ok: bool, detail: str = ""):
+    print(f"{'✅' if ok else '❌'} {label}{': ' + detail if detail else ''}")
+    return ok
+
+
+class FakeRedisTier(RedisTier):
+    """In-memory stand-in for the Redis tier two workers share: get/set and per-key locks."""
+
+    def __init__(self):
+        super().__init__("redis://fake")
+        self.entries, self.locks = {}, {}
+
+    async def get(self, key):
+        await asyncio.sleep(0)  # A network round trip: other tasks run meanwhile
+        entry = self.entries.get(key)
+        return CacheEntry(**entry) if entry else None
+
+    async def set(self, key, entry, ttl_seconds):
+        await asyncio.sleep(0)
+        self.entries[key] = {"value": entry.value, "expires_at": entry.expires_at, "etag": entry.etag}
+
+    @contextlib.asynccontextmanager
+    async def lock(self, key, timeout=10.0, wait=5.0):
+        async with self.locks.setdefault(key, asyncio.Lock()):
+            yield True
+
+
+def make_store(db):
+    return ConversationStore(TieredCache("conversations-verify", max_entries=100), ttl_seconds=600,
+                             tail_turns=12, summarize_after=24, summary_tokens=256, db_factory=lambda: db)
+
+
+async def verify():
+    db = FakeDb()
+    thread = db.collection("threads").document("t1")
+    thread.set({"id": "t1", "borrowerId": "u1"})
+    start = datetime(2024, 1, 1)
+    for i in range(200):
+        role = "borrower" if i % 2 == 0 else "staff"
+        thread.collection("messages").document(f"m{i:03d}").set({
+            "id": f"m{i:03d}", "threadId": "t1", "senderRole": role,
+            "text": f"Message {i} about the SBA 504 loan. More detail follows here.",
+            "createdAt": start + timedelta(minutes=i),
+        })
+
+    db.threads.clear()  # Setup above ran on the loop; from here on only the store touches Firestore
+    print("\n--- Hydration reads only the tail ---")
+    store = make_store(db)
+    state = await store.get("t1")
+    check("hydrate reads at most summarize_after messages", db.reads <= 1 + store.summarize_after, f"{db.reads} reads")
+    check("tail is the newest messages in order", state.turns[-1]["content"].startswith("Message 199")
+          and state.turns[0]["content"].startswith("Message 176"))
+
+    print("\n--- Turns are appended and summarized without re-reading ---")
+    reads = db.reads
+    started = time.perf_counter()
+    for i in range(40):
+        await store.append("t1", [
+            {"senderRole": "borrower", "text": f"Question {i}? Please explain."},
+            {"senderRole": "assistant", "text": f"Answer {i}. Longer explanation."},
+        ], persist=True)
+        state = await store.get("t1")
+        build_context(f"Question {i}?", "You are the AmPac assistant.", history=state.turns, summary=state.summary)
+    per_turn_ms = (time.perf_counter() - started) * 1000 / 40
+    check("no Firestore reads per turn", db.reads == reads, f"{db.reads - reads} reads, {per_turn_ms:.2f}ms per turn")
+    check("tail bounded", len(state.turns) <= store.summarize_after, f"{len(state.turns)} turns")
+    check("summary rolled forward", state.summary and "Answer 29" in state.summary, state.summary.splitlines()[-1] if state.summary else "")
+    saved = thread.data
+    check("summary saved on the thread", saved.get("summary") == state.summary and saved.get("summarizedThrough") == state.summarized_through)
+    check("assistant turns persisted", sum(1 for d in thread.collection("messages").docs.values()
+                                           if d.data["senderRole"] == "assistant") == 40)
+
+    print("\n--- Cold start rebuilds the same state ---")
+    reads = db.reads
+    cold = await make_store(db).get("t1")
+    check("summary + tail match after rehydrate", cold.summary == state.summary and cold.turns == state.turns,
+          f"{db.reads - reads} reads")
+
+    print("\n--- Messages written elsewhere (send_message) aren't duplicated ---")
+    thread.collection("messages").document("ext1").set({"id": "ext1", "senderRole": "staff", "text": "Staff note.",
+                                                        "createdAt": datetime(2030, 1, 1)})
+    db.threads.discard(threading.main_thread().name)  # That write was the test's own
+    fresh = make_store(db)
+    state = await fresh.append("t1", [{"id": "ext1", "senderRole": "staff", "text": "Staff note."}])
+    check("message already hydrated is not appended twice", [t["id"] for t in state.turns].count("ext1") == 1)
+
+    built = build_context("And the 7(a)?", "You are the AmPac assistant.", history=state.turns, summary=state.summary)
+    check("prompt built from summary + tail", built.summarized and built.kept_turns == len(state.turns),
+          f"{built.prompt_tokens} prompt tokens")
+    check("Firestore calls run off the event loop", threading.main_thread().name not in db.threads, str(db.threads))
+
+    print("\n--- Two workers appending to one thread ---")
+    redis = FakeRedisTier()
+    workers = [ConversationStore(TieredCache(f"conversations-worker-{n}", max_entries=100, redis_tier=redis, local_tier=False),
+                                 ttl_seconds=600, tail_turns=12, summarize_after=24, summary_tokens=256,
+                                 db_factory=lambda: db) for n in range(2)]
+    db.collection("threads").document("t2").set({"id": "t2"})
+    await workers[0].get("t2")
+    await asyncio.gather(*(workers[i % 2].append("t2", [{"senderRole": "borrower", "text": f"Worker question {i}"}], persist=True)
+                           for i in range(10)))
+    shared = [await worker.get("t2") for worker in workers]
+    texts = sorted(turn["content"] for turn in shared[0].turns)
+    check("no turn lost to a concurrent write", texts == sorted(f"Worker question {i}" for i in range(10)), f"{len(texts)} of 10")
+    check("both workers see the same state", shared[0].turns == shared[1].turns)
+    check("no per-worker copy to go stale", all(len(worker.cache.local) == 0 for worker in workers))
+
+
+if __name__ == "__main__":
+    asyncio.run(verify())
@@ -0,0 +1,118 @@
+import asyncio
+import io
+import os
+import sys
+import time
+
+os.environ.setdefault("DOC_PARSE_WORKERS", "2")
+os.environ.setdefault("DOC_PARSE_PAGES_PER_TASK", "20")
+os.environ.setdefault("DOCUMENT_CACHE_DIR", "")  # Every parse here should reach the pool
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from starlette.datastructures import UploadFile
+from stubs.sharefile_api import pdf_bytes
+from app.core.metrics import get_metrics_snapshot
+from app.services.doc_parser import DocumentParser, parse_pool
+
+PAGES = int(os.environ.get("BENCH_PAGES", "100"))
+
+
+def check(label: str, ok: bool, detail: str = ""):
+    print(f"{'✅' if ok else '❌'} {label}{': ' + detail if detail else ''}")
+    return ok
+
+
+def tax_return(pages: int, form: str = "1120-S") -> bytes:
+    line = f"Form {form} line {{n}}: gross receipts 1,250,000 cost of goods 610,000 officer compensation 145,000"
+    return pdf_bytes([f"Page {p + 1}\n" + "\n".join(line.format(n=n) for n in range(50)) for p in range(pages)])
+
+
+async def max_loop_lag(work) -> tuple:
+    """Run `work` while a 10ms heartbeat measures how long the event loop goes unanswered."""
+    lags, done = [0.0], asyncio.Event()
+
+    async def heartbeat():
+        while not done.is_set():
+            before = time.perf_counter()
+            await asyncio.sleep(0.01)
+            lags.append((time.perf_counter() - before - 0.01) * 1000)
+
+    beat = asyncio.create_task(heartbeat())
+    await asyncio.sleep(0.02)
+    started = time.perf_counter()
+    try:
+        result = await work()
+    finally:
+        done.set()
+        await beat
+    return result, (time.perf_counter() - started) * 1000, max(lags)
+
+
+async def verify():
+    big = tax_return(PAGES)
+    print(f"\n--- {PAGES}-page PDF ({len(big) / 1e6:.1f}MB) ---")
+
+    async def in_loop():
+        return DocumentParser.parse_bytes("return.pdf", big)
+
+    serial, serial_ms, serial_lag = await max_loop_lag(in_loop)
+    print(f"parsed on the event loop: {serial_ms:.0f}ms, loop blocked up to {serial_lag:.0f}ms")
+    await parse_pool.parse("warmup.pdf", tax_return(1))  # Spawn the workers
+    doc, pool_ms, pool_lag = await max_loop_lag(lambda: parse_pool.parse("return.pdf", big))
+    print(f"parsed in the pool: {pool_ms:.0f}ms, loop blocked up to {pool_lag:.0f}ms ({os.cpu_count()} CPUs)")
+    check("same text as the in-process parser", doc.text == serial and doc.pages == PAGES and not doc.notes)
+    check("event loop stays responsive", pool_lag < 100, f"{pool_lag:.0f}ms vs {serial_lag:.0f}ms")
+
+    print("\n--- Attachments in parallel ---")
+    uploads = [UploadFile(io.BytesIO(tax_return(60, form)), filename=f"{form}.pdf") for form in ("1040", "1065", "1120")]
+    seen = {"queued": 0, "active": 0}
+
+    async def watch():
+        while True:
+            seen["queued"] = max(seen["queued"], parse_pool.queued)
+            seen["active"] = max(seen["active"], parse_pool.active)
+            await asyncio.sleep(0.005)
+
+    watcher = asyncio.create_task(watch())
+    texts = await asyncio.gather(*(DocumentParser.parse_file(upload) for upload in uploads))
+    watcher.cancel()
+    check("each attachment parsed", all(f"Form {form}" in text and "Page 60" in text for form, text in zip(("1040", "1065", "1120"), texts)))
+    check("pool never exceeds its workers; the rest queue", seen["active"] <= parse_pool.workers and seen["queued"] > 0, str(seen))
+    check("pool idle afterwards", parse_pool.active == 0 and parse_pool.queued == 0)
+
+    print("\n--- Limits ---")
+    cap = PAGES // 3
+    limited = await parse_pool.parse("return.pdf", big, max_pages=cap)
+    check("page limit respected and noted", limited.pages == cap and limited.total_pages == PAGES
+          and f"first {cap} of {PAGES}" in limited.render(), limited.notes[-1] if limited.notes else "")
+    started = time.perf_counter()
+    late = await parse_pool.parse("return.pdf", big, timeout=0.3)
+    elapsed = (time.perf_counter() - started) * 1000
+    check("timeout returns promptly with what was parsed", late.timed_out and elapsed < 600 and "timed out" in late.render(),
+          f"{elapsed:.0f}ms, {late.pages} of {late.total_pages} pages")
+    waited = time.perf_counter()
+    while (parse_pool.active or parse_pool.queued) and time.perf_counter() - waited < 30:
+        await asyncio.sleep(0.05)  # Ranges already running finish, then their slots free up
+    check("timed-out ranges give their slots back", parse_pool.active == 0 and parse_pool.queued == 0,
+          f"after {time.perf_counter() - waited:.1f}s")
+    check("pool still parses after a timeout", (await parse_pool.parse("return.pdf", tax_return(3))).pages == 3)
+
+    print("\n--- Bad input ---")
+    broken = await parse_pool.parse("scan.pdf", b"%PDF-1.4 not really")
+    check("corrupt PDF keeps the legacy error text", broken.failed and broken.render().startswith("[Error parsing file:"), broken.render()[:60])
+    other = await parse_pool.parse("model.xlsx", b"...")
+    check("unsupported type", other.failed and other.render() == "[Unsupported file type: model.xlsx]")
+    check("text files skip the pool", (await parse_pool.parse("notes.md", b"DSCR 1.25x")).text == "DSCR 1.25x")
+
+    print("\n--- Exported ---")
+    snapshot = get_metrics_snapshot()
+    print(parse_pool.stats())
+    check("concurrency and queue gauges exported", all(name in snapshot["gauges"] for name in
+                                                       ("doc_parse_workers", "doc_parse_active", "doc_parse_queue_depth")))
+    check("parse outcomes counted", "doc_parse_total" in snapshot["counters"], str(snapshot["counters"].get("doc_parse_total")))
+    parse_pool.shutdown()
+
+
+if __name__ == "__main__":
+    # Guarded: the pool's spawned workers re-import this module
+    asyncio.run(verify())
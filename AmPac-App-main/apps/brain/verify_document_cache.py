@@ -0,0 +1,129 @@
+import asyncio
+import io
+import os
+import sys
+import tempfile
+import time
+
+CACHE_DIR = tempfile.mkdtemp(prefix="doc-cache-")
+os.environ.setdefault("DOCUMENT_CACHE_DIR", os.path.join(CACHE_DIR, "main"))
+os.environ.setdefault("UPLOAD_SPOOL_DIR", tempfile.mkdtemp(prefix="upload-spool-"))
+os.environ.setdefault("DOC_PARSE_WORKERS", "1")
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from starlette.datastructures import UploadFile
+from stubs.sharefile_api import pdf_bytes
+from app.core import metrics
+from app.services.doc_parser import DocumentParser, parse_pool
+from app.services.document_analysis import document_analysis_agent
+from app.services.document_cache import DocumentCache, document_cache, sha256_source
+from verify_doc_parser import tax_return
+
+
+def check(label: str, ok: bool, detail: str = ""):
+    print(f"{'✅' if ok else '❌'} {label}{': ' + detail if detail else ''}")
+    return ok
+
+
+class FakeFirestore:
+    """Dict-backed stand-in for the Firestore client: collection(name).document(id).get()/set(merge=True)."""
+    def __init__(self):
+        self.docs = {}
+
+    def collection(self, name):
+        return self
+
+    def document(self, doc_id):
+        store = self
+
+        class Ref:
+            def get(self):
+                data = store.docs.get(doc_id)
+                return type("Snapshot", (), {"exists": data is not None, "to_dict": lambda _: dict(data)})()
+
+            def set(self, fields, merge=False):
+                store.docs[doc_id] = {**store.docs.get(doc_id, {}), **fields} if merge else dict(fields)
+
+        return Ref()
+
+
+def pool_parses() -> float:
+    return metrics.counter("doc_parse_total").total()
+
+
+async def timed(coro):
+    started = time.perf_counter()
+    result = await coro
+    return result, (time.perf_counter() - started) * 1000
+
+
+async def verify():
+    pdf = tax_return(40)
+    await parse_pool.parse("warmup.pdf", tax_return(1))
+
+    print("\n--- Same bytes, parsed once ---")
+    first, first_ms = await timed(DocumentParser.parse_source("2023-1120S.pdf", pdf))
+    parses = pool_parses()
+    again, again_ms = await timed(DocumentParser.parse_source("last-years-return.pdf", pdf))
+    print(f"first parse {first_ms:.0f}ms, duplicate {again_ms:.1f}ms")
+    check("duplicate served from the cache", again.cached and not first.cached and pool_parses() == parses)
+    check("same text and page count", again.text == first.text and again.pages == first.pages == 40)
+    check("duplicate costs a hash, not a parse", again_ms < first_ms / 10, f"{first_ms / again_ms:.0f}x faster")
+    check("different parser, different entry", not (await DocumentParser.parse_source("return.txt", b"Form 1120-S")).cached)
+
+    parses = pool_parses()
+    text = await DocumentParser.parse_file(UploadFile(io.BytesIO(pdf), filename="attachment.pdf"))
+    check("uploads reuse the hash computed while spooling", text == first.text and pool_parses() == parses)
+
+    broken = await DocumentParser.parse_source("scan.pdf", b"%PDF-1.4 broken")
+    broken_again = await DocumentParser.parse_source("scan.pdf", b"%PDF-1.4 broken")
+    check("failed parses aren't cached", broken.failed and broken_again.failed and not broken_again.cached)
+
+    print("\n--- Analysis results ---")
+    sha = sha256_source(pdf)
+    result, first_ms = await timed(document_analysis_agent.analyze_document("doc-1", "tax_return_2023.pdf", sha256=sha))
+    cached, again_ms = await timed(document_analysis_agent.analyze_document("doc-2", "renamed.pdf", sha256=sha))
+    print(f"first analysis {first_ms:.0f}ms, duplicate {again_ms:.1f}ms")
+    check("duplicate analysis from the cache", cached.get("cached") and cached["document_type"] == result["document_type"] == "Tax Return")
+    check("cached result carries the new document id", cached["document_id"] == "doc-2")
+    entry = await document_cache.get(sha)
+    check("text and analysis share one entry", set(entry["parsed"]) == {"pdf"} and entry["analysis"]["document_type"] == "Tax Return")
+
+    print("\n--- LRU size cap ---")
+    directory = os.path.join(CACHE_DIR, "small")
+    parsed = {"text": "page text " * 120, "pages": 1, "totalPages": 1, "notes": []}  # Same size for every entry
+    small = DocumentCache(directory, max_bytes=1 << 20)
+    await small.put_parsed(f"{0:064x}", "pdf", parsed, "a.pdf")
+    small.max_bytes = int(small.stats()["bytes"] * 4.5)  # Room for four entries
+    for n in range(1, 4):
+        await asyncio.sleep(0.01)
+        await small.put_parsed(f"{n:064x}", "pdf", parsed, "a.pdf")
+    oldest = f"{0:064x}"
+    await small.get_parsed(oldest, "pdf")  # Touch it: now the most recently used
+    await small.put_parsed(f"{9:064x}", "pdf", parsed, "b.pdf")
+    on_disk = {name[:-5] for _, _, names in os.walk(directory) for name in names}
+    check("stays under the cap", small.stats()["bytes"] <= small.max_bytes, str(small.stats()))
+    check("least recently used evicted, touched entry kept", oldest in on_disk and f"{1:064x}" not in on_disk
+          and len(on_disk) == 4, f"{len(on_disk)} entries")
+    reopened = DocumentCache(directory, max_bytes=small.max_bytes)
+    check("restart rebuilds the index from disk", (await reopened.get_parsed(oldest, "pdf")) is not None
+          and reopened.stats()["entries"] == len(on_disk))
+
+    print("\n--- Shared through Firestore ---")
+    firestore = FakeFirestore()
+    a = DocumentCache(os.path.join(CACHE_DIR, "instance-a"), max_bytes=1 << 20, use_firestore=True, db_factory=lambda: firestore)
+    b = DocumentCache(os.path.join(CACHE_DIR, "instance-b"), max_bytes=1 << 20, use_firestore=True, db_factory=lambda: firestore)
+    await a.put_parsed(sha, "pdf", {"text": first.text, "pages": 40, "totalPages": 40, "notes": []}, "return.pdf")
+    await a.put_analysis(sha, result)
+    check("another instance finds it", (await b.get_parsed(sha, "pdf"))["text"] == first.text
+          and (await b.get_analysis(sha))["document_type"] == "Tax Return")
+    check("and keeps a local copy", os.path.exists(b._path(sha)))
+    firestore_only = DocumentCache(None, max_bytes=0, use_firestore=True, db_factory=lambda: {}["down"])
+    check("Firestore errors are a miss, not a failure", await firestore_only.get_parsed(sha, "pdf") is None)
+
+    print(document_cache.stats())
+    parse_pool.shutdown()
+
+
+if __name__ == "__main__":
+    asyncio.run(verify())
@@ -0,0 +1,293 @@
+import asyncio
+import os
+import random
+import sys
+import time
+
+PORT = int(os.getenv("BRAIN_PORT", "8093"))
+os.environ.setdefault("AUTH_DISABLED", "True")
+os.environ.setdefault("DOCUMENT_CACHE_DIR", "")
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+DOCS = int(os.environ.get("BENCH_DOCS", "600"))
+
+import httpx
+from fastapi import FastAPI
+from stubs.server import serve_in_thread
+from app.api.routers import documents
+from app.services.document_analysis import document_analysis_agent
+from app.services.document_classifier import UNKNOWN, DocumentClassifier, document_classifier, extract_fields
+from app.services.document_service import document_service
+from app.services.uploads import url_allowed
+from app.core import metrics
+
+
+def check(label: str, ok: bool, detail: str = ""):
+    print(f"{'✅' if ok else '❌'} {label}{': ' + detail if detail else ''}")
+    return ok
+
+
+# --- Synthetic corpus: phrasings, layouts and noise the seed examples don't contain ----
+
+BANKS = ["Chase Bank, N.A.", "Wells Fargo Bank", "Citizens Business Bank", "Golden State Credit Union", "Pacific Premier Bank"]
+BUSINESSES = ["Riverside Bakery LLC", "Inland Auto Repair Inc", "Sunrise Dental Group", "Mesa Logistics Co", "Cedar Street Cafe"]
+CITIES = ["Riverside", "Ontario", "Fresno", "Temecula", "San Bernardino"]
+MONTHS = ["January", "February", "March", "April", "May", "June", "July", "August", "September", "October", "November", "December"]
+
+
+def money(rng: random.Random, low: int, high: int, cents: bool = False) -> float:
+    return round(rng.uniform(low, high), 2) if cents else float(rng.randint(low, high))
+
+
+def fmt(value: float, cents: bool = False, dollar: bool = False) -> str:
+    text = f"{abs(value):,.2f}" if cents else f"{abs(value):,.0f}"
+    text = ("$" if dollar else "") + text
+    return f"({text})" if value < 0 else text
+
+
+def tax_return(rng: random.Random):
+    year = rng.randint(2019, 2024)
+    if rng.random() < 0.5:
+        agi, wages = money(rng, 40_000, 400_000), money(rng, 20_000, 300_000)
+        total_income, taxable, tax = agi + money(rng, 0, 5_000), agi - 14_600, money(rng, 2_000, 90_000)
+        lines = [
+            f"Form 1040 Department of the Treasury—Internal Revenue Service U.S. Individual Income Tax Return {year}",
+            "Filing Status  [X] Married filing jointly",
+            f"Your first name and middle initial  {rng.choice(['Alex', 'Maria', 'Sam'])} {rng.choice(['Rivera', 'Chen', 'Patel'])}",
+            f"1a Total amount from Form(s) W-2, box 1 (see instructions) . . . . 1a {fmt(wages)}",
+            f"9 Add lines 1z, 2b, 3b, 4b, 5b, 6b, 7, and 8. This is your total income . . . 9 {fmt(total_income)}",
+            f"11 Subtract line 10 from line 9. This is your adjusted gross income . . . . 11 {fmt(agi)}",
+            f"15 Subtract line 14 from line 11. If zero or less, enter -0-. This is your taxable income . . 15 {fmt(taxable)}",
+            f"24 Add lines 22 and 23. This is your total tax . . . . 24 {fmt(tax)}",
+            "Sign Here  Under penalties of perjury, I declare that I have examined this return",
+        ]
+        truth = {"form_type": "1040", "tax_year": year, "adjusted_gross_income": agi, "total_income": total_income,
+                 "taxable_income": taxable, "total_tax": tax}
+    else:
+        form = rng.choice(["1120-S", "1065", "1120"])
+        receipts, cogs = money(rng, 300_000, 5_000_000), money(rng, 50_000, 250_000)
+        business = money(rng, -50_000, 600_000)
+        title = {"1120-S": "U.S. Income Tax Return for an S Corporation", "1065": "U.S. Return of Partnership Income",
+                 "1120": "U.S. Corporation Income Tax Return"}[form]
+        lines = [
+            f"Form {form} {title}",
+            f"For calendar year {year} or tax year beginning , {year}, ending",
+            f"Name {rng.choice(BUSINESSES)}    Employer identification number 95-{rng.randint(1000000, 9999999)}",
+            f"1a Gross receipts or sales . . . . . . 1a {fmt(receipts)}",
+            f"2 Cost of goods sold (attach Form 1125-A) . . . . 2 {fmt(cogs)}",
+            f"21 Ordinary business income (loss). Subtract line 20 from line 8 . . . 21 {fmt(business)}",
+            "Schedule K-1 shareholder's share of income, deductions, credits",
+        ]
+        truth = {"form_type": form, "tax_year": year, "gross_receipts": receipts, "cost_of_goods_sold": cogs,
+                 "business_income": business}
+    return lines, truth
+
+
+def bank_statement(rng: random.Random):
+    bank, month, year = rng.choice(BANKS), rng.randint(1, 12), rng.randint(2022, 2025)
+    begin = money(rng, 1_000, 250_000, cents=True)
+    deposits, withdrawals = money(rng, 5_000, 120_000, cents=True), money(rng, 5_000, 120_000, cents=True)
+    end = round(begin + deposits - withdrawals, 2)
+    last4, nsf = f"{rng.randint(0, 9999):04d}", rng.choice([0, 0, 0, 1, 2])
+    start, stop = f"{month:02d}/01/{year}", f"{month:02d}/28/{year}"
+    summary = [
+        f"Beginning Balance {fmt(begin, True, True)}",
+        f"Deposits and Other Credits {fmt(deposits, True)}",
+        f"Withdrawals and Other Debits {fmt(-withdrawals, True)}",
+        f"Ending Balance {fmt(end, True, True)}",
+    ]
+    if rng.random() < 0.4:  # Table layout: labels on one line, values on the next
+        summary = ["Beginning balance", fmt(begin, True, True), "Total deposits", fmt(deposits, True),
+                   "Total withdrawals", fmt(withdrawals, True), "Ending balance", fmt(end, True, True)]
+    transactions = [f"{month:02d}/{rng.randint(1, 28):02d} {rng.choice(['ACH DEBIT PAYROLL', 'CARD PURCHASE COSTCO', 'DEPOSIT', 'ONLINE TRANSFER', 'CHECK 10' + str(rng.randint(10, 99))])} "
+                    f"{fmt(money(rng, 20, 9_000, True), True)}" for _ in range(rng.randint(5, 40))]
+    transactions += [f"{month:02d}/{rng.randint(1, 28):02d} NSF FEE - INSUFFICIENT FUNDS 35.00" for _ in range(nsf)]
+    lines = [bank, "Business Checking", f"Account Number: XXXXXX{last4}",
+             f"Statement Period: {start} through {stop}", "Account Summary"] + summary + ["Transaction Detail"] + transactions
+    truth = {"bank_name": bank, "account_last4": last4, "beginning_balance": begin, "ending_balance": end,
+             "total_deposits": deposits, "period_start": f"{year}-{month:02d}-01", "period_end": f"{year}-{month:02d}-28",
+             "nsf_count": nsf}
+    return lines, truth
+
+
+def profit_and_loss(rng: random.Random):
+    revenue = money(rng, 100_000, 3_000_000)
+    cogs = money(rng, 10_000, int(revenue * 0.6))
+    expenses = money(rng, 10_000, int((revenue - cogs) * 0.9))
+    gross, net = revenue - cogs, revenue - cogs - expenses
+    month, year = rng.randint(1, 12), rng.randint(2021, 2025)
+    heading = rng.choice(["Profit and Loss", "Income Statement", "Statement of Operations", "Profit & Loss"])
+    ended = f"{MONTHS[month - 1]} 30, {year}" if month != 2 else f"February 28, {year}"
+    lines = [rng.choice(BUSINESSES), heading, f"For the {rng.choice(['period', 'year', 'quarter'])} ended {ended}",
+             "Accrual Basis", "Income", f"Total Revenue {fmt(revenue)}", f"Cost of Goods Sold {fmt(cogs)}",
+             f"Gross Profit {fmt(gross)}", "Expenses"]
+    lines += [f"{name} {fmt(money(rng, 500, 40_000))}" for name in rng.sample(
+        ["Payroll Expenses", "Rent Expense", "Utilities", "Advertising & Marketing", "Insurance", "Repairs", "Bank Charges"], 5)]
+    lines += [f"Total Operating Expenses {fmt(expenses)}", f"Net Income {fmt(net)}"]
+    truth = {"total_revenue": revenue, "cogs": cogs, "gross_profit": gross, "total_expenses": expenses, "net_income": net,
+             "period": f"ended {year}-{month:02d}-{28 if month == 2 else 30}"}
+    return lines, truth
+
+
+def business_license(rng: random.Random):
+    city, name, year = rng.choice(CITIES), rng.choice(BUSINESSES), rng.randint(2022, 2025)
+    number = f"{rng.choice(['BL', 'BUS', 'LIC'])}-{year}-{rng.randint(100000, 999999)}"
+    lines = [f"City of {city}", rng.choice(["Business License", "Business Tax Certificate", "License to Conduct Business"]),
+             f"License No: {number}", f"Business Name: {name}", f"Business Location: {rng.randint(100, 9999)} Main Street",
+             f"Issue Date: January 1, {year}", f"Expiration Date: 12/31/{year}",
+             "This license must be posted in a conspicuous place at the business location. Non-transferable."]
+    truth = {"license_number": number, "business_name": name, "jurisdiction": f"City of {city}",
+             "issue_date": f"{year}-01-01", "expiration_date": f"{year}-12-31"}
+    return lines, truth
+
+
+def other(rng: random.Random):
+    lines = rng.choice([
+        ["Commercial Lease Agreement", "This lease is made between the landlord and the tenant for the premises.",
+         "The term of this lease shall be five years. Tenant shall maintain the premises in good repair."],
+        ["Articles of Organization", "The name of the limited liability company is", "The purpose of the company is to engage in any lawful act.",
+         "The company will be managed by its members. Registered agent for service of process."],
+        ["Resume", "Professional experience: operations manager, 10 years in restaurant management.",
+         "Education: bachelor of science, hospitality. Skills: scheduling, vendor relations, team leadership."],
+    ])
+    return lines, {}
+
+
+GENERATORS = {"Tax Return": tax_return, "Bank Statement": bank_statement, "P&L Statement": profit_and_loss,
+              "Business License": business_license, UNKNOWN: other}
+
+
+def corpus(n: int, seed: int = 7):
+    rng = random.Random(seed)
+    docs = []
+    for i in range(n):
+        label = rng.choice(list(GENERATORS))
+        lines, truth = GENERATORS[label](rng)
+        # OCR drops the odd line of text (never the figures being checked)
+        lines = [line for line in lines if rng.random() > 0.05 or any(char.isdigit() for char in line)]
+        docs.append((f"scan_{i:04d}.pdf", "\n".join(lines), label, truth))
+    return docs
+
+
+def field_accuracy(results, docs):
+    checked = matched = 0
+    misses = []
+    for result, (_, text, label, truth) in zip(results, docs):
+        for name, expected in truth.items():
+            checked += 1
+            got = result.fields.get(name)
+            if got == expected or (isinstance(expected, float) and isinstance(got, float) and abs(got - expected) < 0.01):
+                matched += 1
+            elif len(misses) < 5:
+                misses.append(f"{label}.{name}: {got!r} != {expected!r}")
+    return matched / max(checked, 1), misses
+
+
+async def verify(base_url: str):
+    docs = corpus(DOCS)
+    pairs = [(name, text) for name, text, _, _ in docs]
+
+    print(f"\n--- Classification on {DOCS} synthetic documents (named scan_NNNN.pdf: the text decides) ---")
+    results = document_classifier.classify_many(pairs)
+    per_type = {}
+    for result, (_, _, label, _) in zip(results, docs):
+        hits, total = per_type.get(label, (0, 0))
+        per_type[label] = (hits + (result.document_type == label), total + 1)
+    accuracy = sum(hits for hits, _ in per_type.values()) / len(docs)
+    print("  " + ", ".join(f"{label}: {hits}/{total}" for label, (hits, total) in per_type.items()))
+    check("overall accuracy >= 97%", accuracy >= 0.97, f"{accuracy:.1%}")
+    check("every type >= 93%", all(hits / total >= 0.93 for hits, total in per_type.values()))
+
+    print("\n--- Field extraction ---")
+    known = [(r, d) for r, d in zip(results, docs) if d[2] != UNKNOWN and r.document_type == d[2]]
+    field_acc, misses = field_accuracy([r for r, _ in known], [d for _, d in known])
+    for miss in misses:
+        print("  miss:", miss)
+    check("fields extracted correctly >= 95%", field_acc >= 0.95, f"{field_acc:.1%}")
+    sample = next(r for r, d in known if d[2] == "Bank Statement")
+    check("bank balances and period", {"beginning_balance", "ending_balance", "period_start"} <= set(sample.fields), str(sample.fields))
+    check("negative amounts in parentheses", extract_fields("P&L Statement", "Net Income (12,500)")["net_income"] == -12500)
+    check("value wrapped onto the next line", extract_fields("Bank Statement", "Ending balance\n$1,204.17")["ending_balance"] == 1204.17)
+    check("form line numbers aren't amounts",
+          extract_fields("Tax Return", "11 This is your adjusted gross income . . 11 87,650")["adjusted_gross_income"] == 87650)
+    check("dates next to a label aren't amounts",
+          extract_fields("Bank Statement", "Ending balance on 01/31/2024 $5,000.00")["ending_balance"] == 5000
+          and extract_fields("Bank Statement", "Beginning balance as of January 1, 2024 12,480.33")["beginning_balance"] == 12480.33
+          and extract_fields("Bank Statement", "Ending balance 2024-01-31\n$7,310.02")["ending_balance"] == 7310.02)
+    costs = extract_fields("P&L Statement", "Cost of sales 1,000\nNet income 500.00")
+    check("cost of sales isn't revenue", "total_revenue" not in costs and costs["cogs"] == 1000, str(costs))
+    check("bare revenue line still read", extract_fields("P&L Statement", "Sales 48,200\nCost of sales 20,000")["total_revenue"] == 48200)
+    check("hyphens aren't minus signs", extract_fields("Bank Statement", "Ending balance 1,250.00 - see page 2")["ending_balance"] == 1250
+          and extract_fields("P&L Statement", "Net income -2,500")["net_income"] == -2500)
+
+    print("\n--- Throughput ---")
+    classifier = DocumentClassifier()
+    classifier.classify_many(pairs[:20])  # Warm the feature cache like a running service
+    started = time.perf_counter()
+    classifier.classify_many(pairs)
+    batch_s = time.perf_counter() - started
+    started = time.perf_counter()
+    for name, text in pairs:
+        classifier.classify(name, text)
+    single_s = time.perf_counter() - started
+    started = time.perf_counter()
+    classifier.classify_many(pairs, extract=False)
+    classify_only_s = time.perf_counter() - started
+    print(f"  batch {DOCS / batch_s:,.0f} docs/s ({batch_s * 1000:.0f}ms), one at a time {DOCS / single_s:,.0f} docs/s, "
+          f"classification only {DOCS / classify_only_s:,.0f} docs/s")
+    check("hundreds of documents per second in a batch", DOCS / batch_s >= 300, f"{DOCS / batch_s:,.0f} docs/s")
+    check("batching is no slower than one at a time", batch_s <= single_s * 1.1)
+
+    print("\n--- Batch API and the analysis agent ---")
+    async with httpx.AsyncClient(timeout=120.0) as client:
+        body = {"documents": [{"documentId": f"d{i}", "fileName": name, "text": text} for i, (name, text) in enumerate(pairs[:500])]}
+        started = time.perf_counter()
+        response = await client.post(f"{base_url}/api/v1/documents/classify", json=body)
+        elapsed = (time.perf_counter() - started) * 1000
+        payload = response.json()
+        check("500 documents in one call", response.status_code == 200 and len(payload["results"]) == 500, f"{elapsed:.0f}ms")
+        check("results keep request order", [r["documentId"] for r in payload["results"][:3]] == ["d0", "d1", "d2"]
+              and payload["results"][0]["documentType"] == results[0].document_type)
+        too_many = await client.post(f"{base_url}/api/v1/documents/classify",
+                                     json={"documents": [{"documentId": "x", "text": "x"}] * 1001})
+        check("oversized batch refused", too_many.status_code == 413)
+
+    name, text, label, truth = next(d for d in docs if d[2] == "Tax Return" and "adjusted_gross_income" in d[3])
+    analysis = await document_analysis_agent.analyze_document("doc-1", name, text)
+    check("agent classifies from text, no canned data", analysis["document_type"] == "Tax Return"
+          and analysis["extracted_data"]["adjusted_gross_income"] == truth["adjusted_gross_income"]
+          and analysis["classification_method"] == "model")
+    by_name = await document_analysis_agent.analyze_document("doc-2", "bank_statement_oct.pdf")
+    check("no text: falls back to the file name, without invented fields",
+          by_name["document_type"] == "Bank Statement" and by_name["extracted_data"] == {})
+
+    bank = next(d for d in docs if d[2] == "Bank Statement")
+    from app.services import document_service as service_module
+
+    async def local_copy(url):
+        path = os.path.join(os.environ.get("TMPDIR", "/tmp"), "extract-test.txt")
+        with open(path, "w") as f:
+            f.write(bank[1])
+        return path
+
+    service_module.fetch_stored = local_copy
+    extraction = await document_service.extract("bank_statement", "uploads/u1/doc/statement.txt", user_id="u1")
+    check("DocumentService.extract reads the document", extraction.status == "completed"
+          and extraction.data.ending_balance == bank[3]["ending_balance"], str(extraction.data.raw_data)[:100])
+    refused = [await document_service.extract("bank_statement", path, user_id="u1")
+               for path in ("uploads/u2/doc/statement.txt", "uploads/u1/../u2/doc/statement.txt", "secrets/config.json")]
+    check("other users' and non-upload Storage paths refused", all(r.status == "failed" for r in refused))
+    check("no Storage path without a user", (await document_service.extract("bank_statement", "uploads/u1/doc/s.txt")).status == "failed")
+    metadata = await document_service.extract("bank_statement", "http://169.254.169.254/computeMetadata/v1/")
+    check("URLs off the allowlist aren't fetched", metadata.status == "failed"
+          and metrics.counter("upload_download_refused_total").total() >= 1)
+    check("allowlist matches hosts and subdomains only",
+          url_allowed("https://firebasestorage.googleapis.com/v0/b/x", ["googleapis.com"])
+          and not url_allowed("https://googleapis.com.evil.example/x", ["googleapis.com"])
+          and not url_allowed("file:///etc/passwd", ["googleapis.com"]))
+
+
+if __name__ == "__main__":
+    app = FastAPI()
+    app.include_router(documents.router, prefix="/api/v1/documents")
+    with serve_in_thread(app, PORT) as url:
+        asyncio.run(verify(url))
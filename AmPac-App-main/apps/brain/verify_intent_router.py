@@ -0,0 +1,109 @@
+import os
+import random
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app.services.intent_router import INTENT_KEYWORDS, intent_router
+from app.services.groq_service import groq_service
+
+
+def check(label: str, ok: bool, detail: str = ""):
+    print(f"{'✅' if ok else '❌'} {label}{': ' + detail if detail else ''}")
+    return ok
+
+
+def legacy_intent(message: str):
+    """The previous fallback chain: first list with any substring hit wins."""
+    message = message.lower()
+    for intent, keywords in INTENT_KEYWORDS.items():
+        if any(keyword in message for keyword in keywords):
+            return intent
+    return None
+
+
+def verify_classification():
+    print("\n--- Classification ---")
+    cases = {
+        "How do I apply for an SBA 504 loan?": "loan_application",
+        "What documents do I need to upload?": "documents",
+        "What are your current interest rates?": "rates",
+        "Do I qualify? What's the eligibility?": "eligibility",
+        "Can I book a meeting room in the coworking space?": "spaces",
+        "Any networking events or a mentor program?": "network",
+        "What's my application status?": "status",
+        "How much is the down payment and closing fee?": "payment",
+        "I want to grow my business": "business_help",
+        "The upload page is broken, not working": "technical_issue",
+        "Tell me a joke": None,
+    }
+    ok = True
+    for message, expected in cases.items():
+        match = intent_router.classify(message)
+        if match.intent != expected:
+            ok = check(f"{message!r}", False, f"{match.intent} ({match.scores})")
+    check("intents for sample messages", ok)
+    match = intent_router.classify("What are the loan application requirements?")
+    check("confidence reflects competing intents", 0 < match.confidence < 1, f"{match.intent} {match.confidence:.2f} {match.scores}")
+    check("keywords match word prefixes, not substrings", intent_router.classify("please display it").intent is None
+          and intent_router.classify("payments").intent is not None)
+    check("phrases match as word pairs", intent_router.classify("the portal is not working").keywords == ["not working"]
+          and "not working" not in intent_router.classify("working, not today").keywords)
+    check("punctuation splits words", intent_router.classify("(loans)/leases?").intent == "loan_application"
+          and intent_router.mentions("Re: SBA-504", ("sba",)))
+
+    print("\n--- Small talk short-circuit ---")
+    check("greetings and thanks recognized", [intent_router.smalltalk(t) for t in ["hi", "Hello there!", "ok thanks so much", "bye"]]
+          == ["greeting", "greeting", "thanks", "goodbye"])
+    check("substantive messages are not small talk", intent_router.smalltalk("hi, what rates do you offer?") is None
+          and intent_router.smalltalk("") is None)
+    reply = groq_service._quick_reply([{"role": "user", "content": "thanks!"}], "assistant")
+    check("assistant task answers small talk without the LLM", reply is not None and "welcome" in reply)
+    check("other tasks never short-circuit", groq_service._quick_reply([{"role": "user", "content": "thanks!"}], "copilot") is None)
+    fallback = groq_service._get_fallback_response([{"role": "user", "content": "What documents are needed for a loan?"}])
+    check("fallback still picks the loan answer", "SBA" in fallback)
+
+
+def per_message_us(classify, messages, rounds: int, repeats: int = 3) -> float:
+    """Best of `repeats` timings, so a scheduling hiccup doesn't decide a comparison."""
+    best = float("inf")
+    for _ in range(repeats):
+        started = time.perf_counter()
+        for _ in range(rounds):
+            for message in messages:
+                classify(message)
+        best = min(best, time.perf_counter() - started)
+    return best * 1e6 / max(1, rounds * len(messages))
+
+
+def verify_benchmark():
+    print("\n--- Microbenchmark: legacy substring chain vs compiled router ---")
+    random.seed(7)
+    vocabulary = ("the a our we my to of for and with about please could you tell me more small "
+                  "company plans owner month year team product customers market local").split()
+    keywords = [k for ks in INTENT_KEYWORDS.values() for k in ks]
+    slower = []
+    for words in (5, 20, 100, 500, 2000):
+        messages = []
+        for _ in range(200):
+            text = [random.choice(vocabulary) for _ in range(words)]
+            if random.random() < 0.5:
+                text[random.randrange(words)] = random.choice(keywords)
+            messages.append(" ".join(text))
+        rounds = max(1, 2000 // words)
+        no_hit = [m for m in messages if legacy_intent(m) is None]
+        legacy_us = per_message_us(legacy_intent, messages, rounds)
+        router_us = per_message_us(intent_router.classify, messages, rounds)
+        miss_legacy = per_message_us(legacy_intent, no_hit, rounds)
+        miss_router = per_message_us(intent_router.classify, no_hit, rounds)
+        print(f"{words:>5} words: legacy {legacy_us:8.1f}µs  router {router_us:8.1f}µs  "
+              f"| no intent: legacy {miss_legacy:8.1f}µs  router {miss_router:8.1f}µs")
+        if router_us > legacy_us or miss_router > miss_legacy:
+            slower.append(words)
+    check("router no slower than the substring chain at any length", not slower, f"slower at {slower} words" if slower else "")
+
+
+if __name__ == "__main__":
+    verify_classification()
+    verify_benchmark()
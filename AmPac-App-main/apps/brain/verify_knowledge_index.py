@@ -0,0 +1,173 @@
+import asyncio
+import os
+import random
+import re
+import statistics
+import sys
+import threading
+import time
+
+os.environ.setdefault("KNOWLEDGE_SNAPSHOT_DIR", "")  # Always the in-memory indexes here
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app.services.knowledge_service import KnowledgeService
+from app.services.search_index import InvertedIndex
+from app.services.vector_index import VectorIndex
+
+CHUNKS = int(os.environ.get("BENCH_CHUNKS", "100000"))
+
+TOPICS = [
+    ("dscr debt service coverage ratio", ["dscr", "coverage"]),
+    ("loan to value ltv goodwill appraisal", ["ltv", "appraisal"]),
+    ("occupancy owner occupied rentable construction", ["occupancy", "construction"]),
+    ("prohibited industries gambling cannabis speculative", ["prohibited", "cannabis"]),
+    ("global cash flow guarantor income tax returns", ["guarantor", "cash flow"]),
+    ("equity injection down payment seller note", ["equity", "down payment"]),
+    ("collateral lien position personal guarantee", ["collateral", "guarantee"]),
+    ("franchise directory affiliation size standards", ["franchise", "size"]),
+]
+FILLER = ("borrower lender program eligible business property project financing application review "
+          "approval credit memo underwriting analysis requirement policy section chapter period").split()
+SOURCES = ["SBA SOP 50 10 7", "AmPac Credit Policy v2024", "SBA 504 Program Guide", "Underwriting Guidelines"]
+QUERIES = [
+    "What DSCR is required for a hotel?", "maximum LTV for gas stations", "owner occupancy for new construction",
+    "can we lend to cannabis businesses", "guarantor income in global cash flow", "seller note as equity injection",
+    "personal guarantee collateral lien", "franchise size standards eligibility",
+]
+
+
+def check(label: str, ok: bool, detail: str = ""):
+    print(f"{'✅' if ok else '❌'} {label}{': ' + detail if detail else ''}")
+    return ok
+
+
+def synthetic_corpus(count: int, seed: int = 7):
+    rng = random.Random(seed)
+    for i in range(count):
+        topic, keywords = TOPICS[i % len(TOPICS)]
+        words = topic.split() * 2 + rng.choices(FILLER, k=40) + [f"ref{rng.randrange(5000)}"]
+        rng.shuffle(words)
+        yield {
+            "id": f"chunk_{i}",
+            "source": SOURCES[i % len(SOURCES)],
+            "section": f"Section {i % 97}",
+            "text": " ".join(words),
+            "keywords": keywords,
+        }
+
+
+def legacy_scan(knowledge_base, query_text):
+    """The scoring loop KnowledgeService.query used before the index, for comparison."""
+    query_words = set(re.findall(r'\w+', query_text.lower()))
+    scored_docs = []
+    for doc in knowledge_base:
+        score = 0
+        for keyword in doc["keywords"]:
+            if keyword in query_text.lower():
+                score += 3
+            for qw in query_words:
+                if qw in keyword:
+                    score += 1
+        for qw in query_words:
+            if qw in doc["text"].lower():
+                score += 0.5
+        if score > 0:
+            scored_docs.append({**doc, "score": score})
+    scored_docs.sort(key=lambda x: x["score"], reverse=True)
+    return scored_docs[:3]
+
+
+async def verify_relevance():
+    print("\n--- Policy corpus ---")
+    service = KnowledgeService()
+    expected = {
+        "What DSCR do we need for a hotel deal?": "pol_001",
+        "Max loan to value for a gas station": "pol_002",
+        "occupancy rules for new construction under 504": "pol_003",
+        "Do we finance cannabis businesses?": "pol_004",
+        "guarantor income in global cash flow": "pol_005",
+    }
+    for mode in ("keyword", "vector", "hybrid"):
+        for query, doc_id in expected.items():
+            hits = service.search(query, mode=mode)
+            check(f"{mode}: '{query}' -> {doc_id}", bool(hits) and hits[0]["id"] == doc_id,
+                  str([(h["id"], round(h["score"], 2)) for h in hits]))
+    hits = service.search("guarantee requirements for guarantors", mode="vector")
+    check("vector match without exact terms", bool(hits) and hits[0]["id"] == "pol_005")
+    check("vector filter narrows results", [h["id"] for h in service.search(
+        "dscr", mode="vector", filters={"source": ["Underwriting Guidelines"]})] == ["pol_005"])
+
+    hits = service.search("dscr", filters={"source": ["Underwriting Guidelines"]})
+    check("source filter narrows results", [h["id"] for h in hits] == ["pol_005"], str([h["id"] for h in hits]))
+    hits = service.search("dscr", filters={"tags": ["hospitality"]})
+    check("tags filter narrows results", [h["id"] for h in hits] == ["pol_001"], str([h["id"] for h in hits]))
+    check("unmatched filter returns nothing", service.search("dscr", filters={"source": ["Nope"]}) == [])
+    response = await service.query("What is the weather on Mars?")
+    check("no match keeps the empty answer", response["citations"] == [])
+    searched_on, search = [], service.search
+    service.search = lambda *args, **kwargs: searched_on.append(threading.current_thread()) or search(*args, **kwargs)
+    try:
+        await service.query("DSCR for hotels")
+    finally:
+        del service.search
+    check("query searches off the event loop", searched_on and searched_on[0] is not threading.main_thread())
+
+    print("\n--- Incremental updates ---")
+    service.add_documents([{"id": "pol_006", "source": "AmPac Credit Policy v2024", "section": "Section 7.1",
+                            "text": "Equipment appraisals are required for any single asset above $250,000.",
+                            "keywords": ["equipment", "appraisal"]}])
+    check("added chunk is searchable", service.search("equipment appraisal")[0]["id"] == "pol_006")
+    service.add_documents([{"id": "pol_006", "source": "AmPac Credit Policy v2024", "section": "Section 7.1",
+                            "text": "Vehicle titles must list AmPac as lienholder.", "keywords": ["vehicle", "title"]}])
+    check("replaced chunk drops its old terms", all(h["id"] != "pol_006" for h in service.search("equipment appraisal")))
+    check("removed chunk is gone", service.remove_document("pol_006") and service.search("vehicle title") == []
+          and "vehicle" not in service.index.postings and "pol_006" not in service.vectors.rows)
+
+
+def verify_benchmark():
+    print(f"\n--- Benchmark: {CHUNKS:,} synthetic chunks ---")
+    corpus = list(synthetic_corpus(CHUNKS))
+    service = KnowledgeService()
+    service.index = InvertedIndex(filter_fields=("source", "tags"))
+    service.vectors = VectorIndex(service.embedder.dim)
+    service.documents = {}
+    started = time.perf_counter()
+    service.add_documents(corpus)
+    print(f"build: {time.perf_counter() - started:.1f}s, {service.index.stats()}, {service.vectors.stats()}")
+
+    percentiles = {}
+    for mode in ("keyword", "vector", "hybrid"):
+        latencies = []
+        for _ in range(5):
+            for query in QUERIES:
+                started = time.perf_counter()
+                service.search(query, mode=mode)
+                latencies.append((time.perf_counter() - started) * 1000)
+        latencies.sort()
+        percentiles[mode] = statistics.median(latencies), latencies[int(len(latencies) * 0.95) - 1]
+        print(f"{mode} query: p50 {percentiles[mode][0]:.1f}ms, p95 {percentiles[mode][1]:.1f}ms")
+    p50 = percentiles["keyword"][0]
+    check("vector query in single-digit ms", percentiles["vector"][0] < 10, f"p50 {percentiles['vector'][0]:.1f}ms")
+
+    for mode in ("keyword", "vector", "vector"):  # The second vector query reuses the filter's rows
+        started = time.perf_counter()
+        service.search("DSCR for a hotel", filters={"source": ["SBA SOP 50 10 7"]}, mode=mode)
+        print(f"filtered {mode} query: {(time.perf_counter() - started) * 1000:.1f}ms")
+
+    started = time.perf_counter()
+    for query in QUERIES[:2]:
+        legacy_scan(corpus, query)
+    legacy_ms = (time.perf_counter() - started) * 1000 / 2
+    print(f"legacy scan: {legacy_ms:.0f}ms per query")
+    check("index beats the linear scan by 10x+", legacy_ms > 10 * p50, f"{legacy_ms / p50:.0f}x")
+
+    started = time.perf_counter()
+    service.add_documents([{"id": "chunk_0", "source": "SBA SOP 50 10 7", "text": "updated dscr text", "keywords": ["dscr"]}])
+    service.remove_document("chunk_1")
+    update_ms = (time.perf_counter() - started) * 1000
+    check("incremental update without rebuild", update_ms < 50, f"{update_ms:.2f}ms")
+
+
+if __name__ == "__main__":
+    asyncio.run(verify_relevance())
+    verify_benchmark()
@@ -0,0 +1,150 @@
+import asyncio
+import io
+import json
+import os
+import sys
+import tempfile
+import threading
+
+PORT = 8088
+MANIFEST = os.path.join(tempfile.mkdtemp(prefix="kb-manifest-"), "manifest.json")
+os.environ.setdefault("SHAREFILE_KB_BASE_URL", f"http://127.0.0.1:{PORT}")
+os.environ.setdefault("SHAREFILE_CLIENT_ID", "stub")
+os.environ.setdefault("KNOWLEDGE_MANIFEST_PATH", MANIFEST)
+os.environ.setdefault("KNOWLEDGE_SHAREFILE_ROOTS", '["kb-root"]')
+os.environ.setdefault("KNOWLEDGE_SNAPSHOT_DIR", os.path.join(os.path.dirname(MANIFEST), "index"))
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from docx import Document
+from stubs import sharefile_api
+from stubs.server import serve_in_thread
+from app.services.knowledge_ingestion import KnowledgeIngestion, knowledge_ingestion
+from app.services.knowledge_service import knowledge_service
+
+TOPICS = ["debt service coverage", "loan to value", "owner occupancy", "prohibited industries",
+          "guarantor cash flow", "equity injection", "collateral liens", "franchise eligibility"]
+FILES_PER_FOLDER = 40
+
+
+def check(label: str, ok: bool, detail: str = ""):
+    print(f"{'✅' if ok else '❌'} {label}{': ' + detail if detail else ''}")
+    return ok
+
+
+def policy_text(topic: str, number: int, words: int = 400) -> str:
+    sentence = f"Policy {number} on {topic}: underwriters must document {topic} for every SBA 504 and 7(a) request. "
+    return (sentence * (words // len(sentence.split()) + 1)).strip()
+
+
+def docx_bytes(text: str) -> bytes:
+    document = Document()
+    for paragraph in text.split(". "):
+        document.add_paragraph(paragraph)
+    buffer = io.BytesIO()
+    document.save(buffer)
+    return buffer.getvalue()
+
+
+def corpus():
+    files = {}
+    for t, topic in enumerate(TOPICS):
+        folder = f"Credit Policy/{topic.title()}"
+        for i in range(FILES_PER_FOLDER):
+            number = t * 100 + i
+            text = policy_text(topic, number)
+            if i % 10 == 0:
+                words = text.split()[:240]
+                lines = "\n".join(" ".join(words[j:j + 12]) for j in range(0, len(words), 12))
+                files[f"{folder}/policy-{number}.pdf"] = sharefile_api.pdf_bytes(lines)
+            elif i % 10 == 1:
+                files[f"{folder}/policy-{number}.docx"] = docx_bytes(text)
+            else:
+                files[f"{folder}/policy-{number}.txt"] = text.encode()
+    files["Credit Policy/Hospitality/hotel-dscr.md"] = b"Hotels and motels require a DSCR of 1.35x under the AmPac hospitality overlay."
+    files["Credit Policy/readme.xlsx"] = b"not a document we index"
+    return files
+
+
+async def verify(stub):
+    total = len(corpus()) - 1  # The .xlsx is skipped
+
+    print("\n--- First crawl ---")
+    report = await knowledge_ingestion.run()
+    print(json.dumps(report["stages"], indent=1))
+    check("every supported file indexed", report["files"]["indexed"] == total, json.dumps(report["files"]))
+    check("docs/sec reported per stage", all(stage["docsPerSec"] for stage in report["stages"].values()))
+    check("index snapshot published", bool(report["snapshot"]), str(report["snapshot"]))
+    hits = knowledge_service.search("DSCR for hotels and motels")
+    check("crawled document is searchable", bool(hits) and hits[0]["source"] == "hotel-dscr.md",
+          str([(h["source"], round(h["score"], 2)) for h in hits]))
+    hits = knowledge_service.search("policy 300 prohibited industries", mode="keyword")
+    check("pdf text extracted", bool(hits) and hits[0]["source"] == "policy-300.pdf", hits[0]["source"] if hits else "")
+    hits = knowledge_service.search("equity injection", filters={"tags": ["equity injection"]}, k=50)
+    check("folder names become filter tags", hits and all("Equity Injection" in h["section"] for h in hits), str(len(hits)))
+
+    print("\n--- Re-crawl with nothing changed ---")
+    downloads = stub.state.stats["downloads"]
+    report = await knowledge_ingestion.run()
+    check("no downloads for unchanged files", stub.state.stats["downloads"] == downloads
+          and report["files"]["unchanged"] == total, json.dumps(report["files"]))
+    check("nothing changed, nothing published", report["snapshot"] is None)
+
+    print("\n--- Edit, re-upload identical bytes, delete ---")
+    # Identical bytes keep ShareFile's Hash, so the version matches and nothing is fetched
+    stub.state.put_file("Credit Policy/Hospitality/hotel-dscr.md", b"Hotels and motels now require a DSCR of 1.40x and a 35% equity injection.")
+    same = corpus()["Credit Policy/Owner Occupancy/policy-205.txt"]
+    stub.state.put_file("Credit Policy/Owner Occupancy/policy-205.txt", same)
+    stub.state.delete_file("Credit Policy/Franchise Eligibility/policy-707.txt")
+    downloads = stub.state.stats["downloads"]
+    report = await knowledge_ingestion.run()
+    files = report["files"]
+    check("only the edited file downloaded", stub.state.stats["downloads"] - downloads == 1
+          and files["indexed"] == 1, json.dumps(files))
+    check("deleted file removed from the index", files["removed"] == 1 and not any(
+        h["source"] == "policy-707.txt" for h in knowledge_service.search("policy 707 franchise eligibility", k=20)))
+    hits = knowledge_service.search("hotel DSCR")
+    check("edited file re-indexed", hits and "1.40x" in hits[0]["text"], hits[0]["text"][:80] if hits else "")
+
+    print("\n--- Fresh process: manifest restores the index without downloads ---")
+    for chunk_id in [key for key in list(knowledge_service.documents) if key.startswith("sf:")]:
+        knowledge_service.remove_document(chunk_id)
+    fresh = KnowledgeIngestion(knowledge_ingestion.sharefile, knowledge_service, MANIFEST)
+    downloads = stub.state.stats["downloads"]
+    edits, update = [], knowledge_service.update
+    knowledge_service.update = lambda *args: edits.append(threading.current_thread()) or update(*args)
+    try:
+        report = await fresh.run()
+    finally:
+        del knowledge_service.update
+    check("restore runs as one edit off the event loop", len(edits) == 1 and edits[0] is not threading.main_thread())
+    check("restart touches no unchanged file", stub.state.stats["downloads"] == downloads
+          and report["files"]["indexed"] == 0, json.dumps(report["files"]))
+    hits = knowledge_service.search("hotel DSCR")
+    check("restored chunks searchable", hits and "1.40x" in hits[0]["text"])
+
+    print("\n--- New version without a Hash: content hash decides ---")
+    entry = next(e for e in fresh.manifest.entries.values() if e["name"] == "policy-206.txt")
+    entry["version"] = "stale"  # As if ShareFile reported a new version of the same bytes
+    downloads = stub.state.stats["downloads"]
+    report = await fresh.run()
+    check("same bytes downloaded once, not re-parsed", stub.state.stats["downloads"] - downloads == 1
+          and report["files"]["sameContent"] == 1 and report["files"]["indexed"] == 0, json.dumps(report["files"]))
+
+    print("\n--- Crawling one subfolder leaves the rest alone ---")
+    policy = (await knowledge_ingestion.sharefile.list_children("kb-root"))[0]["Id"]
+    hospitality = next(c["Id"] for c in await knowledge_ingestion.sharefile.list_children(policy) if c["Name"] == "Hospitality")
+    report = await knowledge_ingestion.run([hospitality])
+    check("files outside the crawled folder kept", report["files"]["removed"] == 0 and report["files"]["seen"] == 1,
+          json.dumps(report["files"]))
+
+    print("\n--- Crawl errors don't delete ---")
+    report = await knowledge_ingestion.run(["missing-folder"])
+    check("failed listing reported, nothing removed", report["crawlErrors"] and report["files"]["removed"] == 0,
+          str(report["crawlErrors"])[:120])
+
+
+if __name__ == "__main__":
+    stub = sharefile_api.make_app(corpus(), download_ms=20)
+    with serve_in_thread(stub, PORT):
+        asyncio.run(verify(stub))
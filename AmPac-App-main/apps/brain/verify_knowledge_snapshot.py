@@ -0,0 +1,224 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+SNAPSHOT_DIR = os.path.join(tempfile.mkdtemp(prefix="kb-snapshot-"), "index")
+os.environ["KNOWLEDGE_SNAPSHOT_DIR"] = SNAPSHOT_DIR
+os.environ["KNOWLEDGE_SNAPSHOT_POLL_SECONDS"] = "0"
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(HERE)
+
+import numpy as np
+from app.services import index_snapshot
+from app.services.knowledge_service import KnowledgeService
+from verify_knowledge_index import QUERIES, synthetic_corpus
+
+CHUNKS = int(os.environ.get("BENCH_CHUNKS", "100000"))
+
+# Run in a fresh interpreter: how long a worker takes to open the index and answer
+WORKER = """
+import json, os, sys, time
+started = time.perf_counter()
+from app.services.knowledge_service import KnowledgeService
+imported = time.perf_counter()
+service = KnowledgeService()
+opened = time.perf_counter()
+hits = service.search(sys.argv[1], mode="hybrid")
+searched = time.perf_counter()
+print(json.dumps({"importMs": (imported - started) * 1000, "openMs": (opened - imported) * 1000,
+                  "firstSearchMs": (searched - opened) * 1000, "chunks": len(service.documents),
+                  "version": service.version, "top": hits[0]["id"] if hits else None}), flush=True)
+if len(sys.argv) > 2:
+    service.search("anything", mode="vector")  # Touch every vector page
+    print("ready", flush=True)
+    sys.stdin.readline()
+"""
+
+
+def check(label: str, ok: bool, detail: str = ""):
+    print(f"{'✅' if ok else '❌'} {label}{': ' + detail if detail else ''}")
+    return ok
+
+
+def worker(snapshot_dir: str, query: str = "DSCR for a hotel", hold: bool = False) -> subprocess.Popen:
+    env = {**os.environ, "KNOWLEDGE_SNAPSHOT_DIR": snapshot_dir, "PYTHONPATH": HERE}
+    args = [sys.executable, "-c", WORKER, query] + (["hold"] if hold else [])
+    return subprocess.Popen(args, cwd=HERE, env=env, stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True)
+
+
+def cold_start(snapshot_dir: str) -> dict:
+    process = worker(snapshot_dir)
+    out, _ = process.communicate(timeout=120)
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def mapped_kb(pid: int, filename: str) -> dict:
+    """Rss / Shared_Clean / Private of one mapped file in a process, from /proc/<pid>/smaps."""
+    totals, inside = {"Rss": 0, "Shared_Clean": 0, "Private_Clean": 0, "Private_Dirty": 0}, False
+    with open(f"/proc/{pid}/smaps") as f:
+        for line in f:
+            fields = line.split()
+            if "-" in fields[0] and len(fields) >= 5:
+                inside = len(fields) >= 6 and fields[5].endswith(filename)
+            elif inside and fields[0].rstrip(":") in totals:
+                totals[fields[0].rstrip(":")] += int(fields[1])
+    return totals
+
+
+def directory_mb(path: str) -> float:
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(path) for name in names) / 1e6
+
+
+def build(chunks: int) -> KnowledgeService:
+    service = KnowledgeService()
+    service.add_documents(list(synthetic_corpus(chunks)))
+    return service
+
+
+def verify_cold_start(writer: KnowledgeService, build_s: float):
+    print(f"\n--- Cold start: {CHUNKS:,} chunks ---")
+    started = time.perf_counter()
+    version = writer.publish()
+    print(f"publish: {time.perf_counter() - started:.2f}s, {directory_mb(SNAPSHOT_DIR):.0f}MB on disk ({version})")
+
+    small_dir = os.path.join(os.path.dirname(SNAPSHOT_DIR), "small")
+    small = KnowledgeService(snapshot_dir=small_dir)
+    small.add_documents(list(synthetic_corpus(1000)))
+    small.publish()
+
+    big = cold_start(SNAPSHOT_DIR)
+    little = cold_start(small_dir)
+    print(f"worker open, {big['chunks']:,} chunks: {big['openMs']:.1f}ms (first search {big['firstSearchMs']:.1f}ms)")
+    print(f"worker open, {little['chunks']:,} chunks: {little['openMs']:.1f}ms (first search {little['firstSearchMs']:.1f}ms)")
+    print(f"rebuilding from chunks instead: {build_s * 1000:.0f}ms")
+    check("worker serves the published version", big["version"] == version and big["chunks"] == len(writer.documents))
+    check("open time doesn't grow with the corpus", big["openMs"] < max(5 * little["openMs"], 50),
+          f"{big['openMs']:.1f}ms vs {little['openMs']:.1f}ms")
+    check("opening beats rebuilding by 100x+", build_s * 1000 > 100 * big["openMs"], f"{build_s * 1000 / big['openMs']:.0f}x")
+
+
+def verify_parity(writer: KnowledgeService, reader: KnowledgeService):
+    print("\n--- Snapshot answers like the in-memory index ---")
+    check("reader is on the mapped snapshot", reader.snapshot is not None and isinstance(reader.vectors.matrix, np.memmap)
+          and not reader.vectors.matrix.flags.writeable)
+    queries = QUERIES + ["What DSCR do we need for a hotel deal?", "Do we finance cannabis businesses?"]
+    for mode in ("keyword", "vector", "hybrid"):
+        same = True
+        for query in queries:
+            for filters in (None, {"source": ["SBA SOP 50 10 7"]}, {"tags": ["hospitality", "ltv"], "source": ["AmPac Credit Policy v2024"]}):
+                mine = writer.search(query, k=10, filters=filters, mode=mode)
+                theirs = reader.search(query, k=10, filters=filters, mode=mode)
+                if not np.allclose([h["score"] for h in mine], [h["score"] for h in theirs], rtol=1e-5) \
+                        or (mine and mine[0]["score"] != mine[min(1, len(mine) - 1)]["score"] and mine[0]["id"] != theirs[0]["id"]):
+                    same = False
+                    print(f"   {mode} {query!r} {filters}: {[(h['id'], round(h['score'], 4)) for h in mine[:3]]} "
+                          f"vs {[(h['id'], round(h['score'], 4)) for h in theirs[:3]]}")
+        check(f"{mode}: same scores with and without filters", same)
+    check("documents read from the doc table", reader.documents["pol_001"] == writer.documents["pol_001"]
+          and "chunk_5" in reader.documents and "nope" not in reader.documents)
+
+    latencies = []
+    for query in QUERIES * 3:
+        started = time.perf_counter()
+        reader.search(query, mode="keyword")
+        latencies.append((time.perf_counter() - started) * 1000)
+    print(f"snapshot keyword query p50: {sorted(latencies)[len(latencies) // 2]:.1f}ms")
+
+
+def verify_sharing():
+    print("\n--- Workers share the mapped pages ---")
+    workers = [worker(SNAPSHOT_DIR, hold=True) for _ in range(2)]
+    try:
+        for process in workers:
+            while process.stdout.readline().strip() != "ready":
+                pass
+        usage = [mapped_kb(process.pid, "vectors.npy") for process in workers]
+        print(f"vectors.npy per worker: {usage[0]}")
+        check("vector pages are shared clean, not private copies",
+              all(u["Shared_Clean"] > 0.9 * u["Rss"] and u["Private_Dirty"] == 0 for u in usage),
+              f"{usage[0]['Shared_Clean'] / 1024:.0f}MB shared")
+    finally:
+        for process in workers:
+            process.stdin.write("\n")
+            process.stdin.flush()
+            process.wait(timeout=30)
+
+
+def verify_swap(writer: KnowledgeService, reader: KnowledgeService):
+    print("\n--- Publishing swaps readers over atomically ---")
+    old_snapshot = reader.snapshot
+    errors, versions, stop = [], set(), threading.Event()
+
+    def read_loop():
+        while not stop.is_set():
+            try:
+                reader.search("policy update dscr", mode="hybrid")
+                versions.add(reader.version)
+            except Exception as e:
+                errors.append(repr(e))
+
+    thread = threading.Thread(target=read_loop)
+    thread.start()
+    published = []
+    for n in range(3):
+        writer.add_documents([{"id": f"update_{n}", "source": "AmPac Credit Policy v2024", "section": "Bulletin",
+                               "text": f"Policy update {n}: hotels now need a DSCR of 1.{30 + n}x.", "keywords": ["dscr"]}])
+        published.append(writer.publish())
+        time.sleep(0.2)
+    stop.set()
+    thread.join()
+    check("readers never saw an error mid-publish", not errors, str(errors[:2]))
+    check("reader moved to the newest version", reader.version == published[-1], f"saw {len(versions)} versions")
+    check("new chunks visible after the swap", "update_2" in reader.documents)
+    on_disk = sorted(name for name in os.listdir(SNAPSHOT_DIR) if name.startswith("v"))
+    check("old versions pruned", len(on_disk) == 2 and old_snapshot.version not in on_disk, str(on_disk))
+    check("a reader holding a pruned version still searches it",
+          bool(old_snapshot.index.search("dscr", k=3)) and "update_0" not in old_snapshot.documents)
+
+    print("\n--- Editing a mapped index thaws it ---")
+    latencies = []
+    thaw = threading.Thread(target=reader.thaw)
+    started = time.perf_counter()
+    thaw.start()
+    while thaw.is_alive():
+        begun = time.perf_counter()
+        reader.search("policy update dscr", mode="hybrid")
+        latencies.append(time.perf_counter() - begun)
+    thawed_ms = (time.perf_counter() - started) * 1000
+    print(f"thaw: {thawed_ms:.0f}ms, {len(latencies)} searches meanwhile")
+    check("searches keep being served while thawing", len(latencies) > 1 and max(latencies) * 1000 < thawed_ms / 2,
+          f"slowest {max(latencies) * 1000:.0f}ms")
+    started = time.perf_counter()
+    reader.add_documents([{"id": "local_1", "source": "Underwriting Guidelines", "section": "Memo",
+                           "text": "Franchise resale deals need the franchisor's consent letter.", "keywords": ["franchise"]}])
+    print(f"add after thawing: {(time.perf_counter() - started) * 1000:.0f}ms")
+    check("edited reader is in memory and keeps every chunk", reader.snapshot is None and reader.dirty
+          and isinstance(reader.documents, dict) and len(reader.documents) == len(writer.documents) + 1)
+    check("edit is searchable", reader.search("franchisor consent letter", mode="keyword")[0]["id"] == "local_1")
+    check("unpublished edits aren't swapped away", not reader.refresh(force=True))
+
+
+def verify_bad_snapshots():
+    print("\n--- Broken or partial snapshots fall back ---")
+    broken = os.path.join(os.path.dirname(SNAPSHOT_DIR), "broken")
+    os.makedirs(os.path.join(broken, ".v1-1.tmp"))
+    with open(os.path.join(broken, "CURRENT"), "w") as f:
+        f.write("v2-1")
+    check("missing version ignored", index_snapshot.open_current(broken) is None)
+    service = KnowledgeService(snapshot_dir=broken)
+    check("service falls back to the seed chunks", service.snapshot is None and service.search("hotel dscr")[0]["id"] == "pol_001")
+
+
+if __name__ == "__main__":
+    started = time.perf_counter()
+    writer = build(CHUNKS)
+    verify_cold_start(writer, time.perf_counter() - started)
+    reader = KnowledgeService()
+    verify_parity(writer, reader)
+    verify_sharing()
+    verify_swap(writer, reader)
+    verify_bad_snapshots()
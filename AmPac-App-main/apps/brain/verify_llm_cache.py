@@ -0,0 +1,63 @@
+import asyncio
+import os
+import sys
+import time
+
+# Point Groq at the local LLM stub before app settings are loaded
+LLM_PORT = int(os.getenv("STUB_LLM_PORT", "8082"))
+os.environ.setdefault("GROQ_API_KEY", "stub")
+os.environ.setdefault("GROQ_BASE_URL", f"http://127.0.0.1:{LLM_PORT}/openai/v1")
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import httpx
+from stubs import llm_api
+from stubs.server import serve_in_thread
+from app.services.llm_service import llm_service
+from app.services.llm_cache import llm_response_cache
+
+
+def check(label: str, ok: bool, detail: str = ""):
+    print(f"{'✅' if ok else '❌'} {label}{': ' + detail if detail else ''}")
+    return ok
+
+
+async def upstream_requests(admin: httpx.AsyncClient, base_url: str) -> int:
+    return (await admin.get(f"{base_url}/_stub/stats")).json()["requests"]
+
+
+async def verify_cache(base_url: str, stub):
+    print("\n--- LLM response cache against LLM stub ---")
+    system = "You are the AmPac Smart Assistant."
+    async with httpx.AsyncClient() as admin:
+        first = await llm_service.generate_response("What documents do I need for a 504?", system)
+        start = time.perf_counter()
+        again = await llm_service.generate_response("What documents do I need for a 504?", system)
+        hit_us = (time.perf_counter() - start) * 1e6
+        check("exact repeat served from cache", again == first and await upstream_requests(admin, base_url) == 1, f"{hit_us:.0f}µs")
+
+        await llm_service.generate_response("  what documents do I need for a 504 ", system)
+        check("normalized prompt hits", await upstream_requests(admin, base_url) == 1)
+
+        await llm_service.generate_response("What documents do I need for a 504?", "Different system prompt")
+        check("different system prompt misses", await upstream_requests(admin, base_url) == 2)
+
+        await llm_service.generate_response("What documents do I need for a 504?", system, cache=False)
+        check("cache=False bypasses the cache", await upstream_requests(admin, base_url) == 3)
+
+        pieces = [p async for p in llm_service.stream_response("Streamed question", system)]
+        replay = [p async for p in llm_service.stream_response("Streamed question", system)]
+        check("completed stream stored and replayed", replay == ["".join(pieces)] and await upstream_requests(admin, base_url) == 4)
+
+        stub.state.config["error_rate"] = 1.0
+        await llm_service.generate_response("Will this fail?", system)
+        stub.state.config["error_rate"] = 0.0
+        answer = await llm_service.generate_response("Will this fail?", system)
+        check("fallback answers are not cached", answer.startswith("Stub answer"), answer[:40])
+        print(f"cache stats: {llm_response_cache.stats()}")
+
+
+if __name__ == "__main__":
+    stub = llm_api.make_app(ttft_ms=200, token_ms=2)
+    with serve_in_thread(stub, LLM_PORT) as url:
+        asyncio.run(verify_cache(url, stub))
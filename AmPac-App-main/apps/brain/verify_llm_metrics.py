@@ -0,0 +1,92 @@
+import asyncio
+import json
+import os
+import sys
+
+PORT = 8087
+os.environ.setdefault("GROQ_API_KEY", "stub")
+os.environ.setdefault("GROQ_BASE_URL", f"http://127.0.0.1:{PORT}/openai/v1")
+os.environ.setdefault("GROQ_REQUESTS_PER_MINUTE", "100000")
+os.environ.setdefault("LLM_PROVIDER_TIMEOUT_SECONDS", "1")
+os.environ.setdefault("LLM_HEDGE_ENABLED", "False")
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from stubs import llm_api
+from stubs.server import serve_in_thread
+from app.core import metrics
+from app.services.llm_service import llm_service
+from app.services.llm_metrics import llm_call_log, call_cost_usd
+
+
+def check(label: str, ok: bool, detail: str = ""):
+    print(f"{'✅' if ok else '❌'} {label}{': ' + detail if detail else ''}")
+    return ok
+
+
+def calls(outcome: str, task: str) -> float:
+    return sum(value for key, value in metrics.counter("llm_calls_total").to_dict().items()
+               if f"outcome={outcome}" in key and f"task={task}" in key)
+
+
+def last() -> dict:
+    return llm_call_log.recent[-1]
+
+
+async def verify(stub):
+    question = [{"role": "user", "content": "What documents do I need for an SBA 504 loan?"}]
+
+    print("\n--- Successful calls: usage, cost and latency per route ---")
+    await llm_service.chat(question, task="assistant")
+    record = last()
+    check("usage taken from the response", record["outcome"] == "ok" and not record["usageEstimated"]
+          and record["promptTokens"] > 0 and record["completionTokens"] > 0, json.dumps(record))
+    check("cost priced from the model table", record["costUsd"] == round(call_cost_usd(
+        record["model"], record["promptTokens"], record["completionTokens"]), 8) and record["costUsd"] > 0)
+    check("queue wait and upstream latency recorded", record["queueMs"] is not None and record["upstreamMs"] > 0)
+
+    await llm_service.chat(question, task="copilot", cache=False)
+    check("copilot priced as the 70b model", last()["model"] == "llama3-70b-8192"
+          and last()["costUsd"] > record["costUsd"], json.dumps(last()))
+
+    pieces = [piece async for piece in llm_service.stream_chat(question, task="chat", cache=False)]
+    check("stream usage read from the final chunk", last()["stream"] and last()["outcome"] == "ok"
+          and not last()["usageEstimated"] and last()["completionTokens"] > 0, f"{len(pieces)} pieces")
+
+    print("\n--- Calls that never reach the model ---")
+    await llm_service.chat(question, task="assistant")
+    check("cache hit recorded without tokens", last()["outcome"] == "cache_hit" and last()["costUsd"] == 0)
+    await llm_service.chat([{"role": "user", "content": "thanks!"}], task="assistant")
+    check("small talk recorded as short_circuit", last()["outcome"] == "short_circuit")
+
+    print("\n--- Failures ---")
+    stub.state.config.update(ttft_ms=2000)
+    await llm_service.chat([{"role": "user", "content": "slow question"}], task="assistant", cache=False)
+    check("upstream timeout recorded", calls("timeout", "assistant") == 1, json.dumps(last()))
+    stub.state.config.update(ttft_ms=50, error_rate=1.0)
+    await llm_service.chat([{"role": "user", "content": "broken question"}], task="assistant", cache=False)
+    check("upstream error recorded", last()["outcome"] in ("http_error", "fallback"), json.dumps(last()))
+    stub.state.config.update(error_rate=0.0, rate_limit=1, rate_window_s=30)
+    await llm_service.chat([{"role": "user", "content": "first in window"}], task="deal_analysis", cache=False)
+    await llm_service.chat([{"role": "user", "content": "second in window"}], task="email_draft", cache=False, lane="interactive")
+    check("429 counted against the call", last()["rateLimited"] >= 1 or last()["outcome"] == "rate_limited",
+          json.dumps(last()))
+    stub.state.config.update(rate_limit=0)
+
+    print("\n--- Metrics endpoint data ---")
+    snapshot = metrics.get_metrics_snapshot()
+    check("latency histograms exposed", "llm_call_latency_ms" in json.dumps(snapshot)
+          and "llm_upstream_latency_ms" in json.dumps(snapshot))
+    check("tokens and cost counters exposed", "llm_tokens_total" in json.dumps(snapshot)
+          and "llm_cost_usd_total" in json.dumps(snapshot))
+    summary = llm_call_log.summary()
+    routes = summary["routes"]
+    check("routes ordered by spend", list(routes)[0] == "copilot", str(list(routes)))
+    check("per-route percentiles", all(route["p95Ms"] is not None for route in routes.values()))
+    print(json.dumps(routes, indent=1))
+
+
+if __name__ == "__main__":
+    stub = llm_api.make_app(name="groq", ttft_ms=50, token_ms=2)
+    with serve_in_thread(stub, PORT):
+        asyncio.run(verify(stub))
@@ -0,0 +1,110 @@
+import asyncio
+import json
+import os
+import sys
+import time
+
+# Three local OpenAI-compatible stubs: Groq first, then two extra providers
+PORTS = {"groq": 8084, "backup": 8085, "spare": 8086}
+os.environ.setdefault("GROQ_API_KEY", "stub")
+os.environ.setdefault("GROQ_BASE_URL", f"http://127.0.0.1:{PORTS['groq']}/openai/v1")
+os.environ.setdefault("LLM_PROVIDERS", json.dumps([
+    {"name": name, "base_url": f"http://127.0.0.1:{port}/openai/v1", "api_key": "stub"}
+    for name, port in PORTS.items() if name != "groq"
+]))
+os.environ.setdefault("LLM_CACHE_ENABLED", "False")
+os.environ.setdefault("GROQ_REQUESTS_PER_MINUTE", "100000")
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import contextlib
+from stubs import llm_api
+from stubs.server import serve_in_thread
+from app.core import metrics
+from app.services.llm_service import llm_service, FALLBACK_MESSAGE
+from app.services.llm_providers import llm_providers
+
+
+def check(label: str, ok: bool, detail: str = ""):
+    print(f"{'✅' if ok else '❌'} {label}{': ' + detail if detail else ''}")
+    return ok
+
+
+def configure(stubs, **ttft_and_errors):
+    """configure(stubs, groq=(ttft_ms, error_rate), ...); unnamed stubs are healthy."""
+    for name, stub in stubs.items():
+        ttft_ms, error_rate = ttft_and_errors.get(name, (100, 0.0))
+        stub.state.config.update(ttft_ms=ttft_ms, error_rate=error_rate)
+        stub.state.stats.pop("models", None)
+        for key in stub.state.stats:
+            stub.state.stats[key] = 0
+    for provider in llm_providers.providers:
+        provider.consecutive_failures, provider.cooldown_until = 0, 0.0
+
+
+def launches(reason: str) -> float:
+    return sum(metrics.counter("llm_provider_launches_total").value(provider=p.name, reason=reason)
+               for p in llm_providers.providers)
+
+
+async def timed(prompt: str, stream: bool = False):
+    started = time.perf_counter()
+    if stream:
+        text = "".join([piece async for piece in llm_service.stream_response(prompt, task="assistant", cache=False)])
+    else:
+        text = await llm_service.generate_response(prompt, task="assistant", cache=False)
+    return text, (time.perf_counter() - started) * 1000
+
+
+async def verify(stubs):
+    print("\n--- Healthy primary: no hedging once latency is known ---")
+    configure(stubs)
+    for i in range(12):
+        await timed(f"warm {i}")
+        await timed(f"warm stream {i}", stream=True)
+    hedges = launches("hedge")
+    for i in range(10):
+        await timed(f"healthy {i}")
+    check("healthy primary answers alone", launches("hedge") == hedges and stubs["backup"].state.stats["requests"] == 0,
+          f"hedge delay {llm_providers.hedge_delay(llm_providers.providers[0], False) * 1000:.0f}ms")
+
+    print("\n--- Slow primary: hedged request wins ---")
+    configure(stubs, groq=(3000, 0.0))
+    text, elapsed = await timed("slow primary")
+    check("hedge answers well before the slow primary", elapsed < 1000 and text != FALLBACK_MESSAGE, f"{elapsed:.0f}ms")
+    text, elapsed = await timed("slow primary stream", stream=True)
+    check("streamed hedge answers well before the slow primary", elapsed < 1500 and "Stub answer" in text, f"{elapsed:.0f}ms")
+    await asyncio.sleep(0.2)
+    check("losing stream cancelled upstream", stubs["groq"].state.stats["cancelled"] >= 1, str(stubs["groq"].state.stats))
+
+    print("\n--- Erroring primary: failover ---")
+    configure(stubs, groq=(100, 1.0))
+    text, elapsed = await timed("erroring primary")
+    check("fails over without waiting for a hedge", "Stub answer" in text and elapsed < 500, f"{elapsed:.0f}ms")
+    for i in range(3):
+        await timed(f"erroring {i}")
+    before = stubs["groq"].state.stats["requests"]
+    await timed("after cooldown")
+    check("repeatedly failing provider is tried last", stubs["groq"].state.stats["requests"] == before,
+          f"order {[p.name for p in llm_providers.ordered()]}")
+
+    print("\n--- Erroring primary, slow backup: hedge to the third ---")
+    configure(stubs, groq=(100, 1.0), backup=(3000, 0.0))
+    text, elapsed = await timed("cascading")
+    check("spare answers after failover + hedge", "Stub answer" in text and elapsed < 1500
+          and stubs["spare"].state.stats["requests"] == 1, f"{elapsed:.0f}ms")
+
+    print("\n--- All providers failing: fallback ---")
+    configure(stubs, groq=(100, 1.0), backup=(100, 1.0), spare=(100, 1.0))
+    text, _ = await timed("everyone down")
+    check("falls back to canned answer", "Stub answer" not in text)
+
+    print(f"\nproviders: {json.dumps(llm_providers.to_dict(), indent=1)}")
+
+
+if __name__ == "__main__":
+    stubs = {name: llm_api.make_app(name=name, ttft_ms=100, token_ms=2) for name in PORTS}
+    with contextlib.ExitStack() as stack:
+        for name, stub in stubs.items():
+            stack.enter_context(serve_in_thread(stub, PORTS[name]))
+        asyncio.run(verify(stubs))
@@ -0,0 +1,67 @@
+import asyncio
+import os
+import sys
+
+# Point Groq at the local LLM stub before app settings are loaded
+LLM_PORT = int(os.getenv("STUB_LLM_PORT", "8082"))
+os.environ.setdefault("GROQ_API_KEY", "stub")
+os.environ.setdefault("GROQ_BASE_URL", f"http://127.0.0.1:{LLM_PORT}/openai/v1")
+os.environ.setdefault("LLM_CACHE_ENABLED", "False")
+os.environ.setdefault("GROQ_REQUESTS_PER_MINUTE", "100000")
+os.environ.setdefault("LLM_SLO_WINDOW_SECONDS", "5")  # Short window so recovery shows quickly
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import httpx
+from stubs import llm_api
+from stubs.server import serve_in_thread
+from app.services.llm_service import llm_service
+from app.services.model_router import model_router
+
+
+def check(label: str, ok: bool, detail: str = ""):
+    print(f"{'✅' if ok else '❌'} {label}{': ' + detail if detail else ''}")
+    return ok
+
+
+async def model_counts(admin: httpx.AsyncClient, base_url: str):
+    stats = (await admin.get(f"{base_url}/_stub/stats")).json()
+    await admin.post(f"{base_url}/_stub/reset")
+    return stats.get("models", {})
+
+
+async def verify(base_url: str, stub):
+    print("\n--- Task routing and p95 SLO fallback ---")
+    copilot = model_router.route("copilot")
+    copilot.slo_p95_ms = 300  # Stub's 70b answers in ~400ms; 8b in ~50ms
+    async with httpx.AsyncClient() as admin:
+        await llm_service.generate_response("Summarize this loan", task="copilot")
+        await llm_service.generate_response("What is a 504 loan?", task="assistant")
+        await llm_service.generate_response('{"deal": 1}', task="deal_analysis")
+        counts = await model_counts(admin, base_url)
+        check("tasks routed to their models", counts == {"llama3-70b-8192": 2, "llama3-8b-8192": 1}, str(counts))
+
+        await asyncio.gather(*(llm_service.generate_response(f"warm {i}", task="copilot")
+                               for i in range(model_router.min_samples)))
+        await model_counts(admin, base_url)
+        print(f"copilot primary p95: {model_router.stats(copilot.model).p95():.0f}ms (SLO {copilot.slo_p95_ms:.0f}ms)")
+
+        for i in range(30):
+            await llm_service.generate_response(f"degraded {i}", task="copilot")
+        counts = await model_counts(admin, base_url)
+        check("slow primary → faster fallback, with probes", counts.get("llama3-8b-8192") == 27 and counts.get("llama3-70b-8192") == 3, str(counts))
+
+        stub.state.config["model_ttft_ms"]["llama3-70b-8192"] = 50  # Primary recovers; slow samples age out
+        for i in range(400):
+            await llm_service.generate_response(f"recovering {i}", task="copilot")
+            if not model_router._breaches_slo(copilot):
+                break
+        check("probes bring traffic back once p95 recovers", not model_router._breaches_slo(copilot), f"after {i + 1} calls")
+
+    print(f"router: {model_router.to_dict()['models']}")
+
+
+if __name__ == "__main__":
+    stub = llm_api.make_app(ttft_ms=50, token_ms=0, model_ttft_ms={"llama3-70b-8192": 400})
+    with serve_in_thread(stub, LLM_PORT) as url:
+        asyncio.run(verify(url, stub))
@@ -0,0 +1,149 @@
+import asyncio
+import json
+import os
+import sys
+import time
+
+# Point Groq at the local LLM stub, skip Firebase auth and keep the knowledge base in memory
+LLM_PORT = int(os.getenv("STUB_LLM_PORT", "8089"))
+BRAIN_PORT = int(os.getenv("BRAIN_PORT", "8090"))
+os.environ.setdefault("GROQ_API_KEY", "stub")
+os.environ.setdefault("GROQ_BASE_URL", f"http://127.0.0.1:{LLM_PORT}/openai/v1")
+os.environ.setdefault("AUTH_DISABLED", "True")
+os.environ.setdefault("LLM_CACHE_REDIS", "False")
+os.environ.setdefault("KNOWLEDGE_SNAPSHOT_DIR", "")
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import httpx
+from fastapi import FastAPI
+from stubs import llm_api
+from stubs.server import serve_in_thread
+from app.api.routers import assistant, chat
+from app.core.config import get_settings
+from app.services.conversation_store import ConversationState, conversation_store
+from app.services.knowledge_service import knowledge_service
+from app.services.llm_cache import llm_response_cache
+from verify_streaming import read_sse
+
+settings = get_settings()
+QUESTION = "What DSCR do we need for a hotel deal?"
+
+
+def check(label: str, ok: bool, detail: str = ""):
+    print(f"{'✅' if ok else '❌'} {label}{': ' + detail if detail else ''}")
+    return ok
+
+
+def knowledge_message(body: dict) -> str:
+    return next((m["content"] for m in body["messages"]
+                 if m["role"] == "system" and m["content"].startswith("Relevant AmPac knowledge")), "")
+
+
+def fresh_answers():
+    # Each check should reach the LLM stub rather than the response cache
+    if llm_response_cache:
+        llm_response_cache.cache.local.clear()
+
+
+async def verify(base_url: str, stub: FastAPI):
+    async with httpx.AsyncClient(timeout=30.0) as client:
+        completions = f"{base_url}/api/v1/chat/completions"
+
+        print("\n--- /chat/completions ---")
+        fresh_answers()
+        body = (await client.post(completions, json={"messages": [{"role": "user", "content": QUESTION}]})).json()
+        retrieval = body["retrieval"]
+        print(json.dumps(retrieval, indent=1))
+        sent = knowledge_message(stub.state.last_request)
+        check("policy chunk injected into the prompt", "[1]" in sent and "1.25x for all hospitality deals" in sent, sent[:120])
+        check("citations in response metadata", retrieval["chunks"] > 0 and retrieval["citations"][0]["source"] == "SBA SOP 50 10 7"
+              and retrieval["citations"][0]["ref"] == 1)
+        check("retrieval time reported", retrieval["retrievalMs"] > 0 and retrieval["cached"] is False)
+        check("context counts the chunks", body["context"]["knowledgeUsed"] == retrieval["chunks"])
+
+        fresh_answers()
+        again = (await client.post(completions, json={"messages": [{"role": "user", "content": "what DSCR do we need for a   HOTEL deal"}]})).json()
+        check("normalized repeat served from the retrieval cache", again["retrieval"]["cached"]
+              and again["retrieval"]["citations"] == retrieval["citations"], f"{again['retrieval']['retrievalMs']}ms")
+
+        _, content, _, final, _, _ = await read_sse(client, completions, {"messages": [{"role": "user", "content": QUESTION}], "stream": True})
+        check("streamed final chunk carries retrieval", final and final["retrieval"]["chunks"] == retrieval["chunks"])
+
+        fresh_answers()
+        body = (await client.post(completions, json={"messages": [{"role": "user", "content": QUESTION}], "useKnowledge": False})).json()
+        check("useKnowledge=false skips retrieval", body["retrieval"] is None and not knowledge_message(stub.state.last_request))
+
+        body = (await client.post(completions, json={"messages": [{"role": "user", "content": "thanks!"}]})).json()
+        check("small talk isn't searched", body["retrieval"]["retrieved"] == 0)
+
+        print("\n--- Token budget ---")
+        budget = settings.RAG_MAX_TOKENS
+        settings.RAG_MAX_TOKENS = 90
+        try:
+            fresh_answers()
+            body = (await client.post(completions, json={"messages": [{"role": "user", "content": "dscr ltv occupancy guarantor"}]})).json()
+        finally:
+            settings.RAG_MAX_TOKENS = budget
+        info = body["retrieval"]
+        check("chunks past the budget are left out", 0 < info["chunks"] < info["retrieved"] and len(info["citations"]) == info["chunks"],
+              f"{info['chunks']} of {info['retrieved']}")
+
+        print("\n--- Corpus changes invalidate cached retrievals ---")
+        knowledge_service.add_documents([{
+            "id": "pol_bulletin", "source": "Credit Bulletin 2025-01", "section": "Hospitality",
+            "text": "Effective immediately, hotel deals need a DSCR of 1.35x.", "keywords": ["dscr", "hotel"],
+        }])
+        fresh_answers()
+        body = (await client.post(completions, json={"messages": [{"role": "user", "content": QUESTION}]})).json()
+        check("new chunk retrieved, not the cached list", not body["retrieval"]["cached"]
+              and any(c["source"] == "Credit Bulletin 2025-01" for c in body["retrieval"]["citations"]))
+        knowledge_service.remove_document("pol_bulletin")
+
+        print("\n--- Retrieval overlaps prompt assembly ---")
+        search, get, check_access, record = knowledge_service.search, conversation_store.get, chat._check_thread_access, chat._record_turn
+
+        def slow_search(*args, **kwargs):
+            time.sleep(0.2)
+            return search(*args, **kwargs)
+
+        async def slow_get(thread_id):
+            await asyncio.sleep(0.2)
+            return ConversationState(thread_id, turns=[{"role": "user", "content": "Hi, I run a hotel."}])
+
+        knowledge_service.search, conversation_store.get = slow_search, slow_get
+        chat._check_thread_access = lambda thread_id, user: None
+        chat._record_turn = lambda *args, **kwargs: asyncio.sleep(0)
+        try:
+            fresh_answers()
+            started = time.perf_counter()
+            body = (await client.post(completions, json={"messages": [{"role": "user", "content": "hotel DSCR minimum"}], "threadId": "t1"})).json()
+            elapsed = (time.perf_counter() - started) * 1000
+        finally:
+            knowledge_service.search, conversation_store.get = search, get
+            chat._check_thread_access, chat._record_turn = check_access, record
+        check("200ms search + 200ms history load take ~200ms, not 400", elapsed < 350 and body["retrieval"]["chunks"] > 0,
+              f"{elapsed:.0f}ms (retrieval {body['retrieval']['retrievalMs']}ms)")
+
+        print("\n--- /assistant/chat ---")
+        fresh_answers()
+        body = (await client.post(f"{base_url}/api/v1/assistant/chat", json={"context": "application", "query": "Can you lend to a cannabis dispensary?"})).json()
+        check("assistant answer carries retrieval", body["retrieval"]["citations"][0]["source"] == "AmPac Risk Framework",
+              str(body["retrieval"]["citations"][:1]))
+        check("assistant prompt grounded", "Cannabis-related businesses" in knowledge_message(stub.state.last_request))
+        _, content, actions, final, _, _ = await read_sse(client, f"{base_url}/api/v1/assistant/chat",
+                                                          {"context": "application", "query": "How do I apply for a 504?", "stream": True})
+        check("assistant stream keeps actions and adds retrieval", actions and final and "retrieval" in final, str(actions))
+
+
+def brain_app() -> FastAPI:
+    app = FastAPI()
+    app.include_router(assistant.router, prefix="/api/v1/assistant")
+    app.include_router(chat.router, prefix="/api/v1/chat")
+    return app
+
+
+if __name__ == "__main__":
+    stub = llm_api.make_app(ttft_ms=20, token_ms=1)
+    with serve_in_thread(stub, LLM_PORT), serve_in_thread(brain_app(), BRAIN_PORT) as url:
+        asyncio.run(verify(url, stub))
@@ -0,0 +1,75 @@
+import asyncio
+import os
+import sys
+import time
+
+# Point Groq at a rate-limited LLM stub before app settings are loaded.
+# The stub allows 10 requests per 1s window; the governor starts out believing 600 RPM, i.e. a
+# 600-request burst, so the first wave draws 429s until x-ratelimit-* headers and Retry-After
+# teach it the real window. After that it paces requests instead of falling back.
+LLM_PORT = int(os.getenv("STUB_LLM_PORT", "8082"))
+os.environ.setdefault("GROQ_API_KEY", "stub")
+os.environ.setdefault("GROQ_BASE_URL", f"http://127.0.0.1:{LLM_PORT}/openai/v1")
+os.environ.setdefault("GROQ_REQUESTS_PER_MINUTE", "600")
+os.environ.setdefault("LLM_CACHE_ENABLED", "False")
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import httpx
+from stubs import llm_api
+from stubs.server import serve_in_thread
+from app.core import metrics
+from app.services.llm_service import llm_service
+from app.services.rate_governor import parse_duration
+
+
+def check(label: str, ok: bool, detail: str = ""):
+    print(f"{'✅' if ok else '❌'} {label}{': ' + detail if detail else ''}")
+    return ok
+
+
+async def burst(base_url: str, batch: int = 30, interactive: int = 10):
+    print(f"\n--- Burst: {batch} batch + {interactive} interactive against 10 req/s stub ---")
+    results = {"batch": [], "interactive": []}
+
+    async def one(lane: str, i: int):
+        start = time.perf_counter()
+        answer = await llm_service.generate_response(f"{lane} question {i}", lane=lane)
+        results[lane].append((time.perf_counter() - start, answer.startswith("Stub answer")))
+
+    tasks = [asyncio.create_task(one("batch", i)) for i in range(batch)]
+    await asyncio.sleep(0.05)  # Batch work is already queued when users show up
+    tasks += [asyncio.create_task(one("interactive", i)) for i in range(interactive)]
+    await asyncio.gather(*tasks)
+
+    async with httpx.AsyncClient() as admin:
+        stats = (await admin.get(f"{base_url}/_stub/stats")).json()
+
+    for lane, rows in results.items():
+        latencies = sorted(t for t, _ in rows)
+        served = sum(ok for _, ok in rows)
+        print(f"{lane:>11}: {served}/{len(rows)} model answers, p50 {latencies[len(latencies) // 2]:.2f}s, max {latencies[-1]:.2f}s")
+    check("no interactive fallbacks under burst", all(ok for _, ok in results["interactive"]))
+    check("no batch fallbacks within batch budget", all(ok for _, ok in results["batch"]))
+    check("interactive served ahead of queued batch",
+          max(t for t, _ in results["interactive"]) < max(t for t, _ in results["batch"]))
+    print(f"upstream: {stats['requests']} requests, {stats['rate_limited']} rate limited")
+    print(f"queue wait: {metrics.histogram('llm_queue_wait_ms').to_dict()}")
+
+
+async def budget_exceeded():
+    print("\n--- Wait budget exceeded ---")
+    from app.services.rate_governor import groq_governor
+    groq_governor.blocked_until = time.monotonic() + 30  # e.g. Retry-After: 30
+    start = time.perf_counter()
+    answer = await llm_service.generate_response("rates?", lane="interactive")
+    elapsed = time.perf_counter() - start
+    check("falls back immediately when Retry-After exceeds the budget", not answer.startswith("Stub answer") and elapsed < 0.5, f"{elapsed * 1000:.0f}ms")
+    groq_governor.blocked_until = 0
+
+
+if __name__ == "__main__":
+    check("parse_duration", parse_duration("2m59.56s") == 179.56 and parse_duration("120ms") == 0.12 and parse_duration("3") == 3)
+    with serve_in_thread(llm_api.make_app(ttft_ms=100, token_ms=1, rate_limit=10, rate_window_s=1.0), LLM_PORT) as url:
+        asyncio.run(burst(url))
+        asyncio.run(budget_exceeded())
@@ -0,0 +1,223 @@
+import asyncio
+import os
+import sys
+import time
+import httpx
+
+os.environ.setdefault("SHAREFILE_FOLDER_NEGATIVE_TTL_SECONDS", "30")
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from stubs import sharefile_api
+from stubs.server import serve_in_thread
+from app.core import metrics
+from app.services.sharefile_client import FolderNotFound, ShareFileClient
+from app.services.sharefile_folders import FolderIdCache, folder_cache
+
+PORT = 8094
+
+
+def check(label: str, ok: bool, detail: str = ""):
+    print(f"{'✅' if ok else '❌'} {label}{': ' + detail if detail else ''}")
+    return ok
+
+
+class FakeFirestore:
+    """
+    Dict-backed stand-in for the Firestore client: document(id).get()/set()/delete() and
+    where(field, op, value)...limit(n).stream() with ==, >= and <.
+    """
+    OPS = {"==": lambda a, b: a == b, ">=": lambda a, b: a >= b, "<": lambda a, b: a < b}
+
+    def __init__(self):
+        self.docs = {}
+
+    def collection(self, name):
+        return Query(self, [])
+
+    def document(self, doc_id):
+        store = self
+
+        class Ref:
+            def get(self):
+                data = store.docs.get(doc_id)
+                return type("Snapshot", (), {"exists": data is not None, "to_dict": lambda _: dict(data)})()
+
+            def set(self, fields, merge=False):
+                store.docs[doc_id] = {**store.docs.get(doc_id, {}), **fields} if merge else dict(fields)
+
+            def delete(self):
+                store.docs.pop(doc_id, None)
+
+        return Ref()
+
+
+class Query:
+    def __init__(self, store, filters, limit=None):
+        self.store, self.filters, self._limit = store, filters, limit
+
+    def document(self, doc_id):
+        return self.store.document(doc_id)
+
+    def where(self, field, op, value):
+        return Query(self.store, self.filters + [(field, FakeFirestore.OPS[op], value)], self._limit)
+
+    def limit(self, n):
+        return Query(self.store, self.filters, n)
+
+    def stream(self):
+        matches = [doc_id for doc_id, data in list(self.store.docs.items())
+                   if all(field in data and op(data[field], value) for field, op, value in self.filters)]
+        for doc_id in matches[:self._limit]:
+            data = self.store.docs[doc_id]
+            yield type("Doc", (), {"id": doc_id, "reference": self.store.document(doc_id), "to_dict": lambda _, d=data: dict(d)})()
+
+
+def calls(stub) -> int:
+    return stub.state.stats["listings"] + stub.state.stats["creates"]
+
+
+def fresh_instance(firestore) -> FolderIdCache:
+    """What a second replica (or this one after a restart) starts with: empty memory, shared Firestore."""
+    return FolderIdCache(max_entries=1000, ttl_seconds=3600, negative_ttl_seconds=30, db_factory=lambda: firestore)
+
+
+async def verify(stub, url: str):
+    import app.services.sharefile_client as sharefile_module
+    firestore = FakeFirestore()
+    folder_cache.db_factory = lambda: firestore
+    folder_cache.use_firestore = True
+    client = ShareFileClient()
+    client.base_url, client.token = f"{url}/sf/v3", "stub"
+
+    print("\n--- Cold path ---")
+    before = dict(stub.state.stats)
+    conditions = await client.ensure_folder_structure("Jane Doe", "1001")
+    cold = {key: stub.state.stats[key] - before[key] for key in ("listings", "creates")}
+    check("folders created in ShareFile", stub.state.find_path("home/Clients/Jane Doe/1001/Conditions")["Id"] == conditions)
+    # Listing home shows Clients is missing; everything below a folder we just created is known empty
+    check("one listing, four creates", cold == {"listings": 1, "creates": 4}, str(cold))
+    check("paths stored in Firestore", len(firestore.docs) == 4, f"{len(firestore.docs)} documents")
+
+    print("\n--- Warm path ---")
+    before = calls(stub)
+    started = time.perf_counter()
+    for _ in range(100):
+        assert await client.ensure_folder_structure("Jane Doe", "1001") == conditions
+    elapsed_ms = (time.perf_counter() - started) * 1000 / 100
+    check("zero ShareFile calls", calls(stub) == before, f"{elapsed_ms:.2f}ms per ensure")
+
+    print("\n--- New loan for a known borrower ---")
+    before = dict(stub.state.stats)
+    await client.ensure_folder_structure("Jane Doe", "1002")
+    delta = {key: stub.state.stats[key] - before[key] for key in ("listings", "creates")}
+    # This instance created Jane Doe moments ago, so its other loans are known missing without a listing
+    check("starts from the cached borrower folder", delta == {"listings": 0, "creates": 2}, str(delta))
+
+    print("\n--- Restart: served from Firestore ---")
+    sharefile_module.folder_cache = fresh_instance(firestore)
+    try:
+        before = calls(stub)
+        same = await client.ensure_folder_structure("Jane Doe", "1001")
+        check("same id, zero ShareFile calls", same == conditions and calls(stub) == before)
+        check("deepest level found first", metrics.counter("sharefile_folder_cache_total").value(result="hit", tier="firestore") >= 1)
+    finally:
+        sharefile_module.folder_cache = folder_cache
+
+    print("\n--- Concurrent creators coalesce ---")
+    stub.state.config["create_ms"] = 30
+    before = dict(stub.state.stats)
+    ids = await asyncio.gather(*(client.ensure_folder_structure("Acme Corp", "2001") for _ in range(20)))
+    delta = {key: stub.state.stats[key] - before[key] for key in ("listings", "creates")}
+    stub.state.config["create_ms"] = 0
+    check("every caller gets the same folder", len(set(ids)) == 1 and ids[0] == stub.state.find_path("home/Clients/Acme Corp/2001/Conditions")["Id"])
+    check("each level created once", delta["creates"] == 3 and len([c for c in stub.state.items[stub.state.find_path("home/Clients")["Id"]]["children"]
+                                                                       if stub.state.items[c]["Name"] == "Acme Corp"]) == 1, str(delta))
+
+    print("\n--- One listing covers the siblings ---")
+    clients_id = stub.state.find_path("home/Clients")["Id"]
+    for name in ("Borrower A", "Borrower B", "Borrower C"):
+        stub.state.items[f"pre-{name}"] = {"Id": f"pre-{name}", "Name": name, "type": sharefile_api.FOLDER_TYPE, "children": []}
+        stub.state.items[clients_id]["children"].append(f"pre-{name}")
+    folder_cache.memory.delete("home/Clients/Borrower A")
+    folder_cache.memory.delete("home/Clients/*")
+    before = stub.state.stats["listings"]
+    await client.ensure_folder_path(["Clients", "Borrower A"])
+    listed = stub.state.stats["listings"] - before
+    await client.ensure_folder_path(["Clients", "Borrower B"])
+    await client.ensure_folder_path(["Clients", "Borrower C"])
+    check("three existing borrowers, one listing", listed == 1 and stub.state.stats["listings"] - before == 1,
+          f"{stub.state.stats['listings'] - before} listings")
+
+    print("\n--- Deleted folder ---")
+    loan = stub.state.find_path("home/Clients/Jane Doe/1001")
+    async with httpx.AsyncClient() as http:
+        (await http.delete(f"{url}/sf/v3/Items({loan['Id']})")).raise_for_status()
+    try:
+        await client.upload_file(b"statement", "bank.pdf", conditions)
+        check("upload to the stale id raises FolderNotFound", False)
+    except FolderNotFound:
+        check("upload to the stale id raises FolderNotFound", True)
+    # Only the 404ed id is known gone; its deleted parent is dropped when the next ensure walks into it
+    stale = [data["path"] for data in firestore.docs.values() if data["path"].startswith("home/Clients/Jane Doe/1001/")]
+    check("stale folder dropped from both tiers",
+          folder_cache.memory.get("home/Clients/Jane Doe/1001/Conditions") is None and not stale, str(stale))
+    check("siblings kept", folder_cache.memory.get("home/Clients/Jane Doe/1002") is not None)
+    recreated = await client.ensure_folder_structure("Jane Doe", "1001")
+    file_id = await client.upload_file(b"statement", "bank.pdf", recreated)
+    check("ensure recreates the folders and the upload lands", recreated != conditions and file_id.startswith("fi")
+          and stub.state.find_path("home/Clients/Jane Doe/1001/Conditions/bank.pdf") is not None)
+
+    print("\n--- Stale cached id found while walking ---")
+    await client.ensure_folder_structure("Acme Corp", "2002")
+    acme_loan = stub.state.find_path("home/Clients/Acme Corp/2002")["Id"]
+    async with httpx.AsyncClient() as http:
+        (await http.delete(f"{url}/sf/v3/Items({acme_loan})")).raise_for_status()
+    # Conditions is cached too, so drop just the leaf from memory: the walk starts at the deleted loan folder
+    folder_cache.memory.delete("home/Clients/Acme Corp/2002/Conditions")
+    firestore.docs.pop(FolderIdCache._doc_id("home/Clients/Acme Corp/2002/Conditions"), None)
+    invalidations = metrics.counter("sharefile_folder_invalidations_total").total()
+    again = await client.ensure_folder_structure("Acme Corp", "2002")
+    check("404 drops the cached parent and the path resolves again",
+          again == stub.state.find_path("home/Clients/Acme Corp/2002/Conditions")["Id"]
+          and metrics.counter("sharefile_folder_invalidations_total").total() == invalidations + 1)
+
+    print("\n--- Stale negative entry ---")
+    folder_cache.mark_missing("home/Clients/Borrower D")
+    stub.state.items["pre-D"] = {"Id": "pre-D", "Name": "Borrower D", "type": sharefile_api.FOLDER_TYPE, "children": []}
+    stub.state.items[clients_id]["children"].append("pre-D")
+    found = await client.ensure_folder_path(["Clients", "Borrower D"])
+    check("create answers 409, the re-listing finds the folder", found == "pre-D",
+          f"{stub.state.stats['creates']} creates")
+    check("no duplicate folder", len([c for c in stub.state.items[clients_id]["children"]
+                                      if stub.state.items[c]["Name"] == "Borrower D"]) == 1)
+
+    print("\n--- A folder that 404s again after resolving ---")
+    resolve = client._ensure_child
+
+    async def gone(parent_id, path, name):
+        raise httpx.HTTPStatusError("gone", request=httpx.Request("GET", url), response=httpx.Response(404))
+
+    client._ensure_child = gone
+    try:
+        await client.ensure_folder_path(["Clients", "Jane Doe", "1003"])
+        check("second 404 raises FolderNotFound", False)
+    except FolderNotFound as e:
+        check("second 404 raises FolderNotFound", True, str(e))
+    finally:
+        client._ensure_child = resolve
+
+    print("\n--- Id map stays bounded ---")
+    small = FolderIdCache(max_entries=10, ttl_seconds=3600, negative_ttl_seconds=30, use_firestore=False)
+    for n in range(1000):
+        small._remember(f"home/Clients/Borrower {n}", f"fo-{n}", time.time() + 3600)
+    check("ids evicted with their paths", len(small._paths) == len(small.memory) == 10, str(small.stats()))
+    small._remember("home/Clients/Borrower 999", "fo-new", time.time() + 3600)
+    await small.invalidate_id("fo-999")
+    check("an id re-resolved since doesn't drop the new entry", small.memory.get("home/Clients/Borrower 999").value == "fo-new")
+    print(f"\ncache: {folder_cache.stats()}")
+
+
+if __name__ == "__main__":
+    stub = sharefile_api.make_app()
+    with serve_in_thread(stub, PORT) as url:
+        asyncio.run(verify(stub, url))
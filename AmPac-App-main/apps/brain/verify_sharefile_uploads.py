@@ -0,0 +1,147 @@
+import asyncio
+import hashlib
+import os
+import subprocess
+import sys
+import time
+import tracemalloc
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from stubs import sharefile_api
+from stubs.server import serve_in_thread
+from app.core import metrics
+from app.services.sharefile_client import FolderNotFound, ShareFileClient, UploadFailed
+from app.services.sharefile_folders import folder_cache
+
+PORT = 8095
+SEPARATE_PORT = 8096  # Stub in its own process, so the memory it uses to store files isn't traced here
+MB = 1024 * 1024
+
+
+def check(label: str, ok: bool, detail: str = ""):
+    print(f"{'✅' if ok else '❌'} {label}{': ' + detail if detail else ''}")
+    return ok
+
+
+async def pieces(total: int, piece: int = 64 * 1024, seed: int = 1):
+    """`total` pseudo-random bytes in `piece`-sized pieces, generated as they're read (nothing held)."""
+    block = hashlib.sha256(str(seed).encode()).digest() * (piece // 32)
+    for start in range(0, total, piece):
+        yield block[:min(piece, total - start)]
+        await asyncio.sleep(0)
+
+
+def expected_md5(total: int, piece: int = 64 * 1024, seed: int = 1) -> str:
+    block = hashlib.sha256(str(seed).encode()).digest() * (piece // 32)
+    digest = hashlib.md5()
+    for start in range(0, total, piece):
+        digest.update(block[:min(piece, total - start)])
+    return digest.hexdigest()
+
+
+def stored(stub, file_id: str) -> bytes:
+    return stub.state.items[file_id]["content"]
+
+
+async def verify(stub, url: str):
+    client = ShareFileClient()
+    client.base_url, client.token = f"{url}/sf/v3", "stub"
+    client.chunk_bytes, client.upload_threads, client.chunk_retries = 1 * MB, 4, 3
+    folder = "home"
+
+    print("\n--- Streamed upload ---")
+    size = 24 * MB + 12345
+    before = dict(stub.state.stats)
+    file_id = await client.upload_file(pieces(size), "statements.pdf", folder)
+    posts = stub.state.stats["chunk_posts"] - before["chunk_posts"]
+    content = stored(stub, file_id)
+    check("id read from the finish response, no listing", file_id.startswith("fi") and stub.state.stats["listings"] == before["listings"])
+    check("bytes arrive intact", len(content) == size and hashlib.md5(content).hexdigest() == expected_md5(size))
+    check("one post per chunk", posts == 25, f"{posts} chunks")
+
+    print("\n--- Memory follows chunk size, not file size ---")
+    separate = ShareFileClient()
+    separate.base_url, separate.token = f"http://127.0.0.1:{SEPARATE_PORT}/sf/v3", "stub"
+    separate.upload_threads = 4
+    peaks = {}
+    for chunk_bytes, size in ((256 * 1024, 64 * MB), (1 * MB, 16 * MB), (1 * MB, 64 * MB)):
+        separate.chunk_bytes = chunk_bytes
+        tracemalloc.start()
+        await separate.upload_file(pieces(size), f"large-{size // MB}.pdf", folder)  # The finish checks size and hash
+        peaks[chunk_bytes, size] = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        print(f"{chunk_bytes // 1024}KB chunks, {size // MB}MB file: peak {peaks[chunk_bytes, size] / MB:.1f}MB traced")
+    await separate.close()
+    check("about the chunks in flight", peaks[MB, 64 * MB] < 2 * 4 * MB, f"{peaks[MB, 64 * MB] / MB:.1f}MB for a 64MB file")
+    check("4x the file doesn't mean more memory", peaks[MB, 64 * MB] < peaks[MB, 16 * MB] * 1.5)
+    check("smaller chunks, less memory", peaks[256 * 1024, 64 * MB] < peaks[MB, 64 * MB])
+
+    print("\n--- Parallel chunks ---")
+    stub.state.config["chunk_ms"] = 40
+    timings = {}
+    for threads in (1, 4):
+        client.upload_threads = threads
+        stub.state.stats["max_in_flight"] = 0
+        started = time.perf_counter()
+        await client.upload_file(pieces(8 * MB), f"parallel-{threads}.pdf", folder)
+        timings[threads] = time.perf_counter() - started
+        print(f"{threads} thread(s): {timings[threads] * 1000:.0f}ms, up to {stub.state.stats['max_in_flight']} chunks in flight")
+    check("chunks sent in parallel", stub.state.stats["max_in_flight"] == 4)
+    check("faster with 4 threads", timings[4] < timings[1] / 2, f"{timings[1] / timings[4]:.1f}x")
+    stub.state.config["chunk_ms"] = 0
+
+    print("\n--- Failed chunks are resent ---")
+    stub.state.config["fail_chunks"] = {2: 1, 5: 2}
+    before = stub.state.stats["chunk_posts"]
+    retries = metrics.counter("sharefile_upload_chunks_total").value(result="retry")
+    file_id = await client.upload_file(pieces(8 * MB), "flaky.pdf", folder)
+    posts = stub.state.stats["chunk_posts"] - before
+    check("upload completes", hashlib.md5(stored(stub, file_id)).hexdigest() == expected_md5(8 * MB))
+    check("only the failed chunks resent", posts == 8 + 3, f"{posts} posts for 8 chunks")
+    check("retries counted", metrics.counter("sharefile_upload_chunks_total").value(result="retry") - retries == 3)
+
+    print("\n--- A chunk that keeps failing ---")
+    stub.state.config["fail_chunks"] = {1: 10}
+    uploads = stub.state.stats["uploads"]
+    try:
+        await client.upload_file(pieces(4 * MB), "broken.pdf", folder)
+        check("raises UploadFailed", False)
+    except UploadFailed as e:
+        check("raises UploadFailed", True, str(e)[:80])
+    check("nothing stored", stub.state.stats["uploads"] == uploads)
+    stub.state.config["fail_chunks"] = {}
+
+    print("\n--- Bytes, odd sizes and empty files ---")
+    for name, data in (("note.txt", b"Please find the signed forms attached."), ("exact.bin", b"x" * (2 * MB)),
+                       ("empty.txt", b"")):
+        file_id = await client.upload_file(data, name, folder)
+        check(f"{name} ({len(data)} bytes)", stored(stub, file_id) == data)
+
+    print("\n--- Missing folder ---")
+    consumed = []
+
+    async def tracked():
+        consumed.append(True)
+        yield b"never read"
+
+    try:
+        await client.upload_file(tracked(), "lost.pdf", "fo-deleted")
+        check("raises FolderNotFound", False)
+    except FolderNotFound:
+        check("raises FolderNotFound before reading the source", not consumed)
+    await client.close()
+
+
+if __name__ == "__main__":
+    folder_cache.use_firestore = False
+    separate = subprocess.Popen([sys.executable, "-c", "import uvicorn; from stubs.sharefile_api import make_app; "
+                                 f"uvicorn.run(make_app(), port={SEPARATE_PORT}, log_level='warning')"],
+                                cwd=os.path.dirname(os.path.abspath(__file__)))
+    try:
+        stub = sharefile_api.make_app()
+        with serve_in_thread(stub, PORT) as url:
+            time.sleep(2)  # Give the separate stub time to start too
+            asyncio.run(verify(stub, url))
+    finally:
+        separate.terminate()
@@ -0,0 +1,112 @@
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+
+# Point Groq at the local LLM stub and skip Firebase auth before app settings are loaded
+LLM_PORT = int(os.getenv("STUB_LLM_PORT", "8082"))
+BRAIN_PORT = int(os.getenv("BRAIN_PORT", "8083"))
+os.environ.setdefault("GROQ_API_KEY", "stub")
+os.environ.setdefault("GROQ_BASE_URL", f"http://127.0.0.1:{LLM_PORT}/openai/v1")
+os.environ.setdefault("AUTH_DISABLED", "True")
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import httpx
+from fastapi import FastAPI
+from stubs import llm_api
+from stubs.server import serve_in_thread
+from app.api.routers import assistant, chat
+from app.services.chat_stream import ActionTagParser
+
+
+def check(label: str, ok: bool, detail: str = ""):
+    print(f"{'✅' if ok else '❌'} {label}{': ' + detail if detail else ''}")
+    return ok
+
+
+def verify_parser(rounds: int = 500):
+    print("\n--- ActionTagParser across random chunk boundaries ---")
+    text = 'Sure, let us <<< not a tag. Apply here:\n\n<<<ACTION:{"type":"navigate","target":"Apply"}>>> done <<<ACTION:{"bad json}>>>!'
+    expected_text = 'Sure, let us <<< not a tag. Apply here:\n\n done !'
+    ok = True
+    for _ in range(rounds):
+        cuts = sorted(random.sample(range(1, len(text)), random.randint(1, 20)))
+        pieces = [text[i:j] for i, j in zip([0] + cuts, cuts + [len(text)])]
+        parser = ActionTagParser()
+        visible, actions = "", []
+        for piece in pieces:
+            shown, found = parser.feed(piece)
+            visible += shown
+            actions += found
+        visible += parser.flush()
+        ok &= visible == expected_text and actions == [{"type": "navigate", "target": "Apply"}]
+    check("tags split anywhere are extracted, text preserved", ok, f"{rounds} random splits")
+
+    parser = ActionTagParser()
+    shown, _ = parser.feed("hello <<<ACT")
+    check("partial marker held back", shown == "hello ", repr(shown))
+    check("unterminated tag released on flush", parser.flush() == "<<<ACT")
+
+
+async def read_sse(client: httpx.AsyncClient, url: str, payload: dict):
+    start = time.perf_counter()
+    first = None
+    content, actions, final = "", [], None
+    async with client.stream("POST", url, json=payload) as response:
+        media_type = response.headers.get("content-type", "")
+        async for line in response.aiter_lines():
+            if not line.startswith("data: "):
+                continue
+            data = line[6:]
+            if data == "[DONE]":
+                break
+            chunk = json.loads(data)
+            delta = chunk["choices"][0]["delta"]
+            if delta.get("content") and first is None:
+                first = time.perf_counter() - start
+            content += delta.get("content", "")
+            if "action" in chunk:
+                actions.append(chunk["action"])
+            if chunk["choices"][0]["finish_reason"]:
+                final = chunk
+    return media_type, content, actions, final, first, time.perf_counter() - start
+
+
+async def verify_endpoints(base_url: str):
+    print("\n--- SSE endpoints against LLM stub ---")
+    async with httpx.AsyncClient(timeout=30.0) as client:
+        media_type, content, actions, final, first, total = await read_sse(
+            client, f"{base_url}/api/v1/assistant/chat",
+            {"context": "application", "query": "How do I apply for a 504?", "stream": True},
+        )
+        check("assistant/chat streams text/event-stream", media_type.startswith("text/event-stream"), media_type)
+        check("content streamed without the action tag", "Stub answer" in content and "<<<" not in content)
+        check("action delivered as structured chunk", actions == [{"type": "navigate", "target": "Apply"}], str(actions))
+        check("final chunk reports ttft and total", final and final["timing"]["ttftMs"] < final["timing"]["totalMs"], str(final and final["timing"]))
+        print(f"client-side first token {first * 1000:.0f}ms, total {total * 1000:.0f}ms")
+
+        media_type, content, _, final, _, _ = await read_sse(
+            client, f"{base_url}/api/v1/chat/completions",
+            {"messages": [{"role": "user", "content": "What are the rates?"}], "stream": True},
+        )
+        check("chat/completions streams", media_type.startswith("text/event-stream") and "rates" in content)
+
+        response = await client.post(f"{base_url}/api/v1/chat/completions", json={"messages": [{"role": "user", "content": "What is a 504 loan?"}]})
+        check("non-stream requests unchanged", response.json()["choices"][0]["message"]["content"].startswith("Stub answer"))
+
+
+def brain_app() -> FastAPI:
+    app = FastAPI()
+    app.include_router(assistant.router, prefix="/api/v1/assistant")
+    app.include_router(chat.router, prefix="/api/v1/chat")
+    return app
+
+
+if __name__ == "__main__":
+    verify_parser()
+    with serve_in_thread(llm_api.make_app(ttft_ms=300, token_ms=20), LLM_PORT), \
+            serve_in_thread(brain_app(), BRAIN_PORT) as url:
+        asyncio.run(verify_endpoints(url))
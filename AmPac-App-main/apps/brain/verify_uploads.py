@@ -0,0 +1,181 @@
+import asyncio
+import hashlib
+import io
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+PORT = int(os.getenv("BRAIN_PORT", "8091"))
+SPOOL_DIR = tempfile.mkdtemp(prefix="upload-spool-")
+os.environ.setdefault("AUTH_DISABLED", "True")
+os.environ.setdefault("UPLOAD_SPOOL_DIR", SPOOL_DIR)
+UPLOADS = int(os.environ.get("BENCH_UPLOADS", "10"))
+UPLOAD_MB = int(os.environ.get("BENCH_UPLOAD_MB", "20"))
+os.environ.setdefault("UPLOAD_MAX_REQUEST_BYTES", str(3 * UPLOAD_MB * 1024 * 1024))  # One file fits, four don't
+os.environ.setdefault("DOC_PARSE_WORKERS", "1")
+os.environ.setdefault("DOCUMENT_CACHE_DIR", "")
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import httpx
+from fastapi import FastAPI, File, UploadFile
+from stubs.server import serve_in_thread
+from stubs.sharefile_api import pdf_bytes
+from app.api.routers import documents
+from app.core.config import get_settings
+from app.core.middleware import UploadSizeLimitMiddleware
+from app.services import uploads
+from app.services.analysis_jobs import analysis_jobs
+from app.services.doc_parser import DocumentParser, parse_pool
+from verify_document_cache import FakeFirestore
+
+settings = get_settings()
+
+
+def check(label: str, ok: bool, detail: str = ""):
+    print(f"{'✅' if ok else '❌'} {label}{': ' + detail if detail else ''}")
+    return ok
+
+
+class FakeBlob:
+    def __init__(self, bucket, path):
+        self.bucket, self.path, self.chunk_size, self.metadata = bucket, path, None, None
+
+    def upload_from_filename(self, filename, content_type=None):
+        digest = hashlib.sha256()
+        with open(filename, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(chunk)
+        self.bucket.stored[self.path] = {"sha256": digest.hexdigest(), "chunkSize": self.chunk_size,
+                                         "metadata": self.metadata, "contentType": content_type}
+
+
+class FakeBucket:
+    """Stands in for Firebase Storage; records what each blob was given."""
+    def __init__(self):
+        self.stored = {}
+
+    def blob(self, path):
+        return FakeBlob(self, path)
+
+
+def brain_app() -> FastAPI:
+    app = FastAPI()
+    app.add_middleware(UploadSizeLimitMiddleware, max_bytes=settings.UPLOAD_MAX_REQUEST_BYTES)
+    app.include_router(documents.router, prefix="/api/v1/documents")
+
+    @app.post("/legacy")
+    async def legacy(file: UploadFile = File(...)):
+        # What parse_file used to do: the whole upload in memory, then a BytesIO copy
+        content = await file.read()
+        buffer = io.BytesIO(content)
+        return {"size": len(buffer.getvalue())}
+
+    @app.post("/parse")
+    async def parse(file: UploadFile = File(...)):
+        return {"text": await DocumentParser.parse_file(file)}
+
+    return app
+
+
+def sample_file(directory: str, mb: int, seed: int) -> str:
+    path = os.path.join(directory, f"return-{seed}.bin")  # Not a parseable type: the jobs only classify by name
+    block = hashlib.sha256(str(seed).encode()).digest() * (1024 * 1024 // 32)
+    with open(path, "wb") as f:
+        for _ in range(mb):
+            f.write(block)
+    return path
+
+
+def sha256_of(path: str) -> str:
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def spooled_files() -> list:
+    return [name for name in os.listdir(SPOOL_DIR) if name.startswith("upload-")]
+
+
+async def peak_memory(client: httpx.AsyncClient, url: str, paths: list) -> tuple:
+    """Uploads every file at once (streamed from disk by the client); returns responses and the traced peak."""
+    handles = [open(path, "rb") for path in paths]
+    tracemalloc.start()
+    try:
+        responses = await asyncio.gather(*(client.post(url, files={"file": (os.path.basename(h.name), h, "application/pdf")})
+                                           for h in handles))
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+        for handle in handles:
+            handle.close()
+    return responses, peak / 1e6
+
+
+async def verify(base_url: str):
+    bucket = FakeBucket()
+    uploads.get_bucket = lambda: bucket
+    firestore = FakeFirestore()
+    analysis_jobs.db_factory = lambda: firestore
+    scratch = tempfile.mkdtemp(prefix="upload-src-")
+    paths = [sample_file(scratch, UPLOAD_MB, seed) for seed in range(UPLOADS)]
+
+    async with httpx.AsyncClient(timeout=300.0) as client:
+        print(f"\n--- {UPLOADS} concurrent {UPLOAD_MB}MB uploads ---")
+        responses, legacy_mb = await peak_memory(client, f"{base_url}/legacy", paths)
+        check("legacy handler accepted them", all(r.status_code == 200 for r in responses))
+        started = time.perf_counter()
+        responses, spooled_mb = await peak_memory(client, f"{base_url}/api/v1/documents/upload", paths)
+        elapsed = time.perf_counter() - started
+        print(f"peak traced memory: whole-file reads {legacy_mb:.0f}MB, streamed to disk {spooled_mb:.0f}MB ({elapsed:.1f}s)")
+        bodies = [r.json() for r in responses]
+        check("every upload accepted", all(r.status_code == 200 for r in responses), str([r.status_code for r in responses]))
+        check("memory no longer grows with file size", spooled_mb < UPLOADS * UPLOAD_MB / 2 and spooled_mb < legacy_mb / 2,
+              f"{spooled_mb:.0f}MB vs {legacy_mb:.0f}MB")
+        check("size and sha256 computed while streaming", all(b["size"] == UPLOAD_MB * 1024 * 1024 and b["sha256"] == sha256_of(p)
+                                                                for b, p in zip(bodies, paths)))
+
+        await asyncio.sleep(0.5)  # Analysis jobs: copy to Storage, analyze, clean up
+        deadline = time.time() + 10
+        while len(bucket.stored) < UPLOADS and time.time() < deadline:
+            await asyncio.sleep(0.1)
+        stored = [bucket.stored.get(b["storagePath"]) for b in bodies]
+        check("stored in Storage with matching bytes", all(s and s["sha256"] == b["sha256"] for s, b in zip(stored, bodies)))
+        check("resumable chunked upload, hash kept as metadata", all(s and s["chunkSize"] == settings.UPLOAD_STORAGE_CHUNK_BYTES
+                                                                     and s["metadata"]["sha256"] == s["sha256"] for s in stored))
+        while spooled_files() and time.time() < deadline + 30:  # Removed once each job finishes
+            await asyncio.sleep(0.1)
+        check("spooled temp files removed", not spooled_files(), str(spooled_files()))
+
+        print("\n--- Limits ---")
+        limit = settings.UPLOAD_MAX_BYTES
+        settings.UPLOAD_MAX_BYTES = 5 * 1024 * 1024
+        try:
+            with open(paths[0], "rb") as handle:
+                # Under the request limit, so only the per-file cap in the route catches it
+                too_big = await client.post(f"{base_url}/api/v1/documents/upload",
+                                            files={"file": ("huge.pdf", handle, "application/pdf")})
+        finally:
+            settings.UPLOAD_MAX_BYTES = limit
+        check("file past the per-file limit refused", too_big.status_code == 413, too_big.text[:80])
+        check("nothing left on disk for it", not spooled_files())
+
+        handles = [open(path, "rb") for path in paths[:4]]
+        try:
+            declared = await client.post(f"{base_url}/api/v1/documents/upload", files=[("file", h) for h in handles])
+        finally:
+            for handle in handles:
+                handle.close()
+        check("request over UPLOAD_MAX_REQUEST_BYTES refused up front", declared.status_code == 413, declared.text[:80])
+
+        print("\n--- Parsing from the spooled file ---")
+        pdf = pdf_bytes(["Form 1120-S page one", "Gross receipts 1,250,000"])
+        parsed = (await client.post(f"{base_url}/parse", files={"file": ("return.pdf", pdf, "application/pdf")})).json()
+        check("PDF parsed by path in the pool", "Gross receipts 1,250,000" in parsed["text"], parsed["text"][:60])
+        check("parse spool removed", not spooled_files())
+    parse_pool.shutdown()
+
+
+if __name__ == "__main__":
+    with serve_in_thread(brain_app(), PORT) as url:
+        asyncio.run(verify(url))
@@ -0,0 +1,119 @@
+import asyncio
+import os
+import sys
+import time
+
+# Point the real client at the local stub before app settings are loaded
+STUB_PORT = int(os.getenv("STUB_PORT", "8081"))
+os.environ.setdefault("VENTURES_MOCK_MODE", "False")
+os.environ.setdefault("VENTURES_BASE_URL", f"http://127.0.0.1:{STUB_PORT}/api/v4")
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import httpx
+from stubs import ventures_api
+from stubs.server import serve_in_thread
+from app.services.ventures_client import VenturesClient, ventures_flights
+from app.services.ventures.real import RealVenturesClient
+
+
+def check(label: str, ok: bool, detail: str = ""):
+    print(f"{'✅' if ok else '❌'} {label}{': ' + detail if detail else ''}")
+    return ok
+
+
+async def verify_integration(base_url: str):
+    print("\n--- RealVenturesClient against Ventures stub ---")
+    client = RealVenturesClient(VenturesClient(username="stub", password="stub"))
+    async with httpx.AsyncClient() as admin:
+        await admin.post(f"{base_url}/api/v4/_stub/reset")
+
+        loans = await client.get_all_loans()
+        check("get_all_loans paginates", len(loans) == ventures_api.LOAN_COUNT, f"{len(loans)} loans")
+
+        loan = await client.get_loan_detail("1001")
+        check("get_loan_detail maps VenturesLoan", loan is not None and loan.status_name == "Underwriting", str(loan))
+        check("missing loan returns None", await client.get_loan_detail("nope") is None)
+
+        ids = [l.id for l in loans[:120]]
+        before = (await admin.get(f"{base_url}/api/v4/_stub/stats")).json()["requests"]
+        batch = await client.get_conditions_batch(ids)
+        after = (await admin.get(f"{base_url}/api/v4/_stub/stats")).json()["requests"]
+        if ventures_api.DISABLE_BATCH:
+            check("get_conditions_batch falls back to per-loan", after - before == len(ids) + 1, f"{after - before} requests for {len(ids)} loans")
+        else:
+            check("get_conditions_batch uses batched endpoint", after - before == 3, f"{after - before} requests for {len(ids)} loans")
+        check("batched conditions map to loans", all(len(batch[i]) == 3 for i in ids))
+
+        cond = batch[ids[1]][0]
+        check("update_condition_status", await client.update_condition_status(cond.id, "Waived"))
+        created = await client.create_loan({"businessName": "Stub Co", "loanAmount": 250000})
+        check("create_loan", created.borrower_name == "Stub Co", created.id)
+        new_conds = await client.get_conditions(created.id)
+        check("upload_document", await client.upload_document(created.id, new_conds[0].id, "gs://bucket/doc.pdf"))
+
+        # Read cache: fresh hits stay local, expired entries revalidate with If-None-Match
+        client.transport.cache.local.clear()
+        before = (await admin.get(f"{base_url}/api/v4/_stub/stats")).json()
+        for _ in range(5):
+            await client.get_loan_detail("1002")
+        mid = (await admin.get(f"{base_url}/api/v4/_stub/stats")).json()
+        check("repeat reads served from cache", mid["requests"] - before["requests"] == 1)
+        client.transport.cache.local.get(client.transport._cache_key("loan", "1002")).expires_at = 0
+        await client.get_loan_detail("1002")
+        after = (await admin.get(f"{base_url}/api/v4/_stub/stats")).json()
+        check("stale entry revalidated with ETag", after["not_modified"] - mid["not_modified"] == 1)
+        await client.get_conditions("1003")
+        await client.update_condition_status("c1003-0", "Satisfied")
+        refreshed = await client.get_conditions("1003")
+        check("condition write invalidates cached list", refreshed[0].status == "Satisfied")
+        print(f"cache stats: {client.transport.cache.stats()}")
+
+        # Identical concurrent misses share one upstream GET
+        client.transport.cache.local.clear()
+        before = (await admin.get(f"{base_url}/api/v4/_stub/stats")).json()["requests"]
+        results = await asyncio.gather(*(client.get_loan_detail("1004") for _ in range(50)))
+        after = (await admin.get(f"{base_url}/api/v4/_stub/stats")).json()["requests"]
+        check("concurrent identical reads coalesce", after - before == 1 and all(r == results[0] for r in results), f"{after - before} requests for 50 calls")
+        print(f"coalescing ratio: {ventures_flights.coalescing_ratio():.2f}")
+
+        # Revoke every token server-side; concurrent calls should trigger exactly one re-login
+        await admin.post(f"{base_url}/api/v4/_stub/reset")
+        client.transport.cache.local.clear()
+        await asyncio.gather(*(client.get_loan_detail(i) for i in ids[:25]))
+        stats = (await admin.get(f"{base_url}/api/v4/_stub/stats")).json()
+        check("concurrent 401s collapse into one login", stats["token"] == 1, f"{stats['token']} logins")
+
+    await client.close()
+
+
+async def bench(base_url: str, requests: int = 2000, concurrency: int = 50):
+    print(f"\n--- Load: {requests} get_loan_detail calls, concurrency {concurrency} ---")
+    client = RealVenturesClient(VenturesClient(username="stub", password="stub"))
+    sem = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one(i: int):
+        async with sem:
+            start = time.perf_counter()
+            await client.get_loan_detail(str(1000 + i % ventures_api.LOAN_COUNT))
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(requests)))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    print(f"throughput: {requests / elapsed:.0f} req/s")
+    print(f"p50: {latencies[len(latencies) // 2] * 1000:.1f}ms  p95: {latencies[int(len(latencies) * 0.95)] * 1000:.1f}ms")
+    await client.close()
+
+
+async def main(base_url: str):
+    await verify_integration(base_url)
+    if "--bench" in sys.argv:
+        await bench(base_url)
+
+
+if __name__ == "__main__":
+    with serve_in_thread(ventures_api.app, STUB_PORT) as url:
+        asyncio.run(main(url))